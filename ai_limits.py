@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+# ==============================================================================
+# حدود توليد الـ AI (Gemini) لكل مستخدم ولكل IP
+# - token bucket: burst صغير وبعدين معدل ثابت (per_minute) - لكل مستخدم ولكل IP
+# - حد يومي حسب نوع الحساب: trial / subscriber / admin (None = مفيش حد)
+# - العدادات في ملف SQLite محلي مشترك بين كل الـ workers (WAL + BEGIN IMMEDIATE = عملية واحدة atomic)
+# - الرفض السريع: بعد أول رفض الـ worker بيفتكر "ممنوع لحد امتى" في الذاكرة
+#   => الطلبات اللي بعدها بتترفض من غير ما تلمس الملف ولا Gemini
+# - refund: التوليد اتلغى قبل ما يرجع نتيجة (timeout) => الـ token واليوم بيرجعوا
+# ==============================================================================
+
+Decision = namedtuple('Decision', 'allowed reason retry_after')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS daily (key TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL,
+                                  PRIMARY KEY (key, day));
+"""
+
+
+class AILimiter:
+    def __init__(self, path, user_rate=(3, 6), ip_rate=(6, 12), daily=None, clock=time.time):
+        # user_rate / ip_rate: (burst, per_minute)
+        # daily: {'trial': 20, 'subscriber': 200, 'admin': None}
+        self.path = path
+        self.user_rate = user_rate
+        self.ip_rate = ip_rate
+        self.daily = daily or {'trial': 20, 'subscriber': 200, 'admin': None}
+        self.clock = clock
+        self._blocked = {}    # key => (retry_at, reason, tier) في الـ process دي بس
+        self._local = threading.local()
+        self._pid = None
+        self._pruned_day = None
+
+    def _connect(self):
+        # connection لكل thread، وجديدة بعد الـ fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._pid == os.getpid(): return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        for attempt in range(50):
+            # أول فتح للملف من كذا worker في نفس اللحظة: التحويل لـ WAL بيرجع locked على طول (الـ timeout مش بيغطيه)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                break
+            except sqlite3.OperationalError:
+                if attempt == 49: raise
+                time.sleep(0.1)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        self._local.conn, self._pid = conn, os.getpid()
+        return conn
+
+    def _fast_reject(self, keys, tier, now):
+        for key in keys:
+            blocked = self._blocked.get(key)
+            # الحد اليومي بيتغير لو الاشتراك اتجدد => مبنعتمدش على الرفض القديم
+            if blocked and blocked[0] > now and (blocked[1] != 'daily_quota' or blocked[2] == tier):
+                return Decision(False, blocked[1], blocked[0] - now)
+        return None
+
+    def acquire(self, user_key, ip_key, tier):
+        # بيخصم token من الاتنين + واحد من الحد اليومي، أو مبيخصمش حاجة خالص
+        now = self.clock()
+        keys = (f"user:{user_key}", f"ip:{ip_key}")
+        decision = self._fast_reject(keys, tier, now)
+        if decision: return decision
+
+        day = datetime.utcfromtimestamp(now).strftime('%Y-%m-%d')
+        limit = self.daily.get(tier)
+        conn = self._connect()
+        if self._pruned_day != day:
+            self._pruned_day = day
+            self.prune()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            decision, writes = self._decide(conn, keys, (self.user_rate, self.ip_rate), limit, day, now)
+            if decision.allowed:
+                conn.executemany('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)', writes)
+                conn.execute('INSERT INTO daily (key, day, used) VALUES (?, ?, 1) '
+                             'ON CONFLICT (key, day) DO UPDATE SET used = used + 1', (keys[0], day))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if not decision.allowed:
+            blocked_key = keys[1] if decision.reason == 'ip_rate' else keys[0]
+            self._blocked[blocked_key] = (now + decision.retry_after, decision.reason, tier)
+        return decision
+
+    def refund(self, user_key, ip_key, charged_at=None):
+        # عكس acquire (المسموح): token لكل bucket (لحد الـ burst) + واحد من الحد اليومي بتاع يوم الخصم
+        now = self.clock()
+        keys = (f"user:{user_key}", f"ip:{ip_key}")
+        day = datetime.utcfromtimestamp(charged_at or now).strftime('%Y-%m-%d')
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for key, (burst, per_minute) in zip(keys, (self.user_rate, self.ip_rate)):
+                row = conn.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+                if row is None: continue   # الـ bucket اتملى واتمسح خلاص
+                tokens = min(burst, row[0] + (now - row[1]) * per_minute / 60 + 1)
+                conn.execute('UPDATE bucket SET tokens = ?, updated = ? WHERE key = ?', (tokens, now, key))
+            conn.execute('UPDATE daily SET used = used - 1 WHERE key = ? AND day = ? AND used > 0', (keys[0], day))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        for key in keys: self._blocked.pop(key, None)
+
+    def _decide(self, conn, keys, rates, limit, day, now):
+        if limit is not None:
+            row = conn.execute('SELECT used FROM daily WHERE key = ? AND day = ?', (keys[0], day)).fetchone()
+            if row and row[0] >= limit:
+                midnight = (int(now) // 86400 + 1) * 86400
+                return Decision(False, 'daily_quota', midnight - now), []
+        writes = []
+        for key, (burst, per_minute), reason in zip(keys, rates, ('user_rate', 'ip_rate')):
+            row = conn.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * per_minute / 60)
+            if tokens < 1:
+                return Decision(False, reason, (1 - tokens) * 60 / per_minute), []
+            writes.append((key, tokens - 1, now))
+        return Decision(True, 'allowed', 0), writes
+
+    def usage(self, user_key, now=None):
+        now = now or self.clock()
+        day = datetime.utcfromtimestamp(now).strftime('%Y-%m-%d')
+        row = self._connect().execute('SELECT used FROM daily WHERE key = ? AND day = ?',
+                                      (f"user:{user_key}", day)).fetchone()
+        return row[0] if row else 0
+
+    def prune(self, keep_days=7):
+        # الأيام القديمة + الـ buckets اللي اتملت من زمان (مش محتاجين نفتكرها)
+        now = self.clock()
+        cutoff = datetime.utcfromtimestamp(now - keep_days * 86400).strftime('%Y-%m-%d')
+        conn = self._connect()
+        conn.execute('DELETE FROM daily WHERE day < ?', (cutoff,))
+        conn.execute('DELETE FROM bucket WHERE updated < ?', (now - 86400,))
+        self._blocked = {k: v for k, v in self._blocked.items() if v[0] > now}
@@ -1,16 +1,45 @@
 import os
 import base64
+import gzip
+import hashlib
+import hmac
+import time
 import pandas as pd
 from functools import wraps
+from types import SimpleNamespace
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
-from sqlalchemy import text
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, make_response, g, jsonify, Response, send_from_directory
+import sqlite3
+from sqlalchemy import text, event, func, select, update, bindparam, case, literal, and_, or_, union_all, inspect as sa_inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import load_only
 from io import BytesIO
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash, check_password_hash
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 import google.generativeai as genai
 import json
+from compression import CompressionMiddleware
+from metrics import Registry, WAIT_BUCKETS, timed_queue_pool
+from query_stats import QueryInspector
+from profiler import RequestProfiler
+from library_snapshot import LibrarySnapshot, process_memory
+from ai_limits import AILimiter
+from search_keys import normalize as normalize_search, keys_for, SynonymMap
+from modality_params import protocol_params, parse_query
+from related import RelatedJob
+from mail_queue import MailQueue
+from backups import BackupManager
+from search_log import SearchLog
+from pdf_export import protocol_pages, build_pdf
+import secrets
+import click
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from markupsafe import Markup
 
 # ==========================================
 # إعدادات التطبيق
@@ -48,6 +77,48 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # ... (كود تصحيح رابط قاعدة البيانات موجود هنا)
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"pool_pre_ping": True}
 
+# --- ضبط SQLite للإنتاج (الوضع الافتراضي لما DATABASE_URL مش موجود) ---
+# WAL: القراءة مبتستناش الكتابة، و NORMAL كفاية مع WAL بدل FULL
+# SQLITE_TUNING=0 يرجع الإعدادات الافتراضية (للمقارنة في benchmarks/bench_sqlite_tuning.py)
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') != '0'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 65536)),       # بالسالب = KiB (64MB)
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', 268435456)),   # 256MB
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 15000)),
+    'temp_store': 'MEMORY',
+}
+
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not SQLITE_TUNING or not isinstance(dbapi_connection, sqlite3.Connection): return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+# --- ضغط الردود (gzip/brotli) + تصغير HTML اختياري - تفاصيل في compression.py ---
+app.wsgi_app = CompressionMiddleware(
+    app.wsgi_app,
+    min_size=int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+    level=int(os.environ.get('COMPRESS_LEVEL', 6)),
+    minify=os.environ.get('MINIFY_HTML', '0') == '1',
+)
+
+# --- المقاييس (Prometheus) - التفاصيل في metrics.py، والعرض على /metrics للأدمن ---
+metrics = Registry(directory=os.environ.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics'))
+metrics.counter('http_requests_total', "Requests by route, method and status code.")
+metrics.histogram('http_request_duration_seconds', "Request latency by route.")
+metrics.counter('search_outcomes_total', "Searches by outcome (db_hit, cache_hit, ai_fallback, ai_failure).")
+metrics.histogram('gemini_request_duration_seconds', "Latency of Gemini generate_content calls.")
+metrics.counter('gemini_tokens_total', "Gemini tokens used by kind (prompt, output).")
+metrics.histogram('db_pool_checkout_wait_seconds', "Time spent waiting for a pooled DB connection.", WAIT_BUCKETS)
+metrics.counter('import_rows_total', "Protocol rows written by import source.")
+metrics.counter('import_seconds_total', "Time spent importing by source.")
+metrics.gauge('import_last_rows_per_second', "Throughput of the latest import by source.")
+app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass'] = timed_queue_pool(metrics, 'db_pool_checkout_wait_seconds')
 
 # ده السطر القديم اللي موجود عندك، خليه زي ما هو
 db = SQLAlchemy(app)
@@ -55,6 +126,40 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# --- مراقبة الـ SQL لكل request (query_stats.py): slow log + N+1 + ميزانية لكل route ---
+# الميزانية = أقصى عدد queries (شامل تحميل المستخدم من الـ session)، الـ routes اللي مش هنا من غير حد
+# في التستات (app.testing) أو QUERY_BUDGET_ENFORCE=1 الزيادة بترمي QueryBudgetExceeded
+QUERY_BUDGETS = {
+    'home': 8,                  # المستخدم + البحث (+ تحميل الكارت + سجل الـ revision لو مش في الـ cache)
+                                # + تحديث الـ snapshot (النسخة + اللي اتغير) مرة كل كام ثانية + المرادفات كل دقيقة
+                                # + البروتوكولات المشابهة (related_protocol)
+    'admin_dashboard': 4,       # المستخدم + البروتوكولات + صفحة المستخدمين المفلترة + عددهم
+    'edit_protocol': 11,        # ... + مسح/كتابة مفاتيح البحث (search_key) + عدد التصنيف + قيم الأجهزة (protocol_param)
+    'delete_protocol': 8,
+    'export_protocol_pdf': 2,
+    'api_protocol': 3,
+    'api_protocols': 2,
+    'api_library_bundle': 3,    # المستخدم + النسخة + الصفوف (أول مرة بس، بعد كده الملف من الديسك)
+    'api_library_changes': 4,
+    'api_library_synonyms': 2,  # المستخدم + المرادفات (كل دقيقة، غير كده من الذاكرة)
+    'api_library_searches': 1,  # المستخدم (السجل نفسه في الذاكرة)
+    'metrics_endpoint': 1,
+    'browse_categories': 2,     # المستخدم + جدول العدد
+    'browse_category': 3,       # ... + الصفحة من الـ index
+    'api_categories': 2,
+    'search_analytics': 5,      # المستخدم + الأيام + أكتر بحث + أكتر حاجات مش موجودة + حسب نوع الحساب
+    'api_protocols_by_params': 3,   # المستخدم + البروتوكولات (range scan على protocol_param) + القيم اللي طابقت
+    'api_protocols_lookup': 7,  # المستخدم + المفاتيح (IN) + (الـ snapshot أو ILIKE مجمعة) + البروتوكولات (IN)
+                                # + المرادفات كل دقيقة
+}
+app.config['QUERY_BUDGET_ENFORCE'] = os.environ.get('QUERY_BUDGET_ENFORCE') == '1'
+query_inspector = QueryInspector(
+    app,
+    slow_ms=int(os.environ.get('SLOW_QUERY_MS', 200)),
+    n_plus_one=int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10)),
+    budgets=QUERY_BUDGETS,
+)
+
 # ... هنا يكمل باقي الكود الخاص بالـ Routes والـ Functions ...
 # --- بيانات الموقع الثابتة ---
 @app.context_processor
@@ -71,6 +176,14 @@ def split_list_filter(s):
     return [item.strip() for item in s.split(',')]
 
 # --- 2. الجداول (Models) ---
+TRIAL_DAYS = 30
+
+def default_access_expires_at(context):
+    # نفس access_expiry على قيم الـ INSERT نفسها (created_at اللي اتكتب، مش utcnow() تانية)
+    row = context.get_current_parameters()
+    return access_expiry(SimpleNamespace(created_at=row['created_at'], is_active=row.get('is_active', True),
+                                         subscription_end=row.get('subscription_end')))
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(150), unique=True, nullable=False)
@@ -79,8 +192,15 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     subscription_end = db.Column(db.DateTime, nullable=True)
     can_print = db.Column(db.Boolean, default=False)
+    # بدل is_active بتاع flask_login: الحساب المتوقف مبيعرفش يعمل login
+    is_active = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    # آخر لحظة وصول (التجربة أو الاشتراك، أو وقت الإيقاف) متحسوبة مسبقاً => الصلاحية = مقارنة عمود واحد
+    # بتتحدث مع التسجيل وعمليات الأدمن، و sweep_user_access (flask sweep-access) بتصلح أي حاجة اتغيرت من برة
+    access_expires_at = db.Column(db.DateTime, index=True, default=default_access_expires_at)
 
 class Protocol(db.Model):
+    # تصفح التصنيفات: WHERE category = ? ORDER BY id من الـ index مباشرة (keyset pagination)
+    __table_args__ = (db.Index('ix_protocol_category_id', 'category', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     # جعلنا التصنيف 200 للأمان
     category = db.Column(db.String(200), default="General") 
@@ -114,9 +234,284 @@ class Protocol(db.Model):
     video_link = db.Column(db.Text) # أحياناً الروابط بتكون طويلة
     notes = db.Column(db.Text, nullable=True)
 
+    # رقم المراجعة: بيزيد مع كل تعديل (مفتاح الـ cache بتاع كارت النتيجة + الـ ETag)
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # onupdate بيشتغل مع الـ ORM ومع update() المجمعة في setup_db.py
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # content_hash بتاع صف ملف المكتبة الجاهز (library_artifact.py) اللي البروتوكول اتحمل منه آخر مرة
+    # تعديل الأدمن مبيغيروش => الـ deploy الجاي مبيرجعش التعديل إلا لو المصدر نفسه اتغير
+    source_hash = db.Column(db.String(64))
+
+# --- سجل تغييرات المكتبة: كل صف = نسخة جديدة (id) للمكتبة الأوفلاين (/api/library/changes) ---
+class LibraryChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    protocol_id = db.Column(db.Integer, nullable=False, index=True)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# --- مفاتيح البحث الموحدة (search_keys.py): بتتكتب وقت الحفظ => البحث بالمفتاح = index lookup ---
+class SearchKey(db.Model):
+    key = db.Column(db.String(200), primary_key=True)
+    protocol_id = db.Column(db.Integer, primary_key=True, index=True)
+
+# --- المرادفات والاختصارات (الأدمن بيعدلها من /admin/synonyms): "خشونة الركبة" => "knee osteoarthritis" ---
+class SearchSynonym(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(200), unique=True, nullable=False)
+    expansion = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def write_search_keys(connection, protocols):
+    # protocols: (id, disease_name, keywords) - الممسوح بيتبعت بـ None عشان مفاتيحه تتمسح بس
+    protocols = list(protocols)
+    if not protocols: return
+    table = SearchKey.__table__
+    ids = [p[0] for p in protocols]
+    for start in range(0, len(ids), 500):
+        connection.execute(table.delete().where(table.c.protocol_id.in_(ids[start:start + 500])))
+    rows = [{'key': key, 'protocol_id': pid} for pid, name, keywords in protocols for key in keys_for(name, keywords)]
+    if rows: connection.execute(table.insert(), rows)
+
+def refresh_search_keys(connection, protocol_ids=None):
+    # للتحميل المجمع (setup_db.py) والـ backfill: بيقرا القيم من الجدول نفسه
+    table = Protocol.__table__
+    query = select(table.c.id, table.c.disease_name, table.c.keywords)
+    if protocol_ids is None:
+        connection.execute(SearchKey.__table__.delete())
+        rows = [tuple(r) for r in connection.execute(query)]
+        if rows: connection.execute(SearchKey.__table__.insert(), [
+            {'key': key, 'protocol_id': pid} for pid, name, keywords in rows for key in keys_for(name, keywords)])
+        return
+    ids = list(dict.fromkeys(protocol_ids))
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        found = {r.id: tuple(r) for r in connection.execute(query.where(table.c.id.in_(chunk)))}
+        write_search_keys(connection, [found.get(pid, (pid, None, None)) for pid in chunk])
+
+# --- قيم الأجهزة كأرقام (modality_params.py): صف لكل قيمة (frequency 80..120 Hz) بتتكتب وقت الحفظ ---
+# البحث "TENS 80-120 Hz" = range scan على الـ index (من غير regex على النص مع كل طلب)
+class ProtocolParam(db.Model):
+    __tablename__ = 'protocol_param'
+    id = db.Column(db.Integer, primary_key=True)
+    protocol_id = db.Column(db.Integer, nullable=False, index=True)
+    source = db.Column(db.String(8), nullable=False)        # estim / us (أنهي عمود اتقرت منه)
+    modality = db.Column(db.String(16))                     # TENS / IFC / NMES / US ... (None = مش معروف)
+    param = db.Column(db.String(16), nullable=False)        # frequency / pulse_width / intensity / duty_cycle / duration
+    unit = db.Column(db.String(8), nullable=False)          # Hz / us / mA / W/cm2 / % / min
+    low = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    # الـ index بيغطي البحث كله: param + unit بالظبط ثم range على low (والباقي من نفس الـ index)
+    __table_args__ = (db.Index('ix_protocol_param_range', 'param', 'unit', 'low', 'high', 'modality', 'protocol_id'),)
+
+PROTOCOL_PARAM_SOURCES = ('estim_type', 'estim_params', 'us_type', 'us_params')
+
+def write_protocol_params(connection, protocols):
+    # protocols: dicts فيها id + PROTOCOL_PARAM_SOURCES - الممسوح بيتبعت {'id': id} بس عشان قيمه تتمسح
+    protocols = list(protocols)
+    if not protocols: return
+    table = ProtocolParam.__table__
+    ids = [p['id'] for p in protocols]
+    for start in range(0, len(ids), 500):
+        connection.execute(table.delete().where(table.c.protocol_id.in_(ids[start:start + 500])))
+    rows = [dict(value, protocol_id=p['id']) for p in protocols for value in protocol_params(p)]
+    if rows: connection.execute(table.insert(), rows)
+
+def refresh_protocol_params(connection, protocol_ids=None):
+    # للتحميل المجمع (setup_db.py) والـ backfill: بيقرا النصوص من الجدول نفسه
+    table = Protocol.__table__
+    query = select(table.c.id, *[table.c[c] for c in PROTOCOL_PARAM_SOURCES])
+    if protocol_ids is None:
+        connection.execute(ProtocolParam.__table__.delete())
+        rows = [dict(r._mapping) for r in connection.execute(query)]
+        values = [dict(value, protocol_id=p['id']) for p in rows for value in protocol_params(p)]
+        if values: connection.execute(ProtocolParam.__table__.insert(), values)
+        return
+    ids = list(dict.fromkeys(protocol_ids))
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        found = {r.id: dict(r._mapping) for r in connection.execute(query.where(table.c.id.in_(chunk)))}
+        write_protocol_params(connection, [found.get(pid, {'id': pid}) for pid in chunk])
+
+# --- عدد البروتوكولات في كل تصنيف: بيتحدث مع كل كتابة (مش GROUP BY مع كل فتحة صفحة) ---
+class CategoryCount(db.Model):
+    category = db.Column(db.String(200), primary_key=True)
+    protocols = db.Column(db.Integer, nullable=False, default=0)
+
+def adjust_category_counts(connection, deltas):
+    # deltas: {category: +n / -n} - التصنيف الفاضي (None) مش بيتعرض في التصفح
+    deltas = {c: n for c, n in deltas.items() if c and n}
+    if not deltas: return
+    table = CategoryCount.__table__
+    existing = {c for (c,) in connection.execute(select(table.c.category).where(table.c.category.in_(list(deltas))))}
+    updates = [{'b_category': c, 'b_delta': n} for c, n in deltas.items() if c in existing]
+    if updates:
+        connection.execute(table.update().where(table.c.category == bindparam('b_category'))
+                           .values(protocols=table.c.protocols + bindparam('b_delta')), updates)
+    inserts = [{'category': c, 'protocols': n} for c, n in deltas.items() if c not in existing]
+    if inserts: connection.execute(table.insert(), inserts)
+
+def refresh_category_counts(connection):
+    # العد من الأول: للتحميل المجمع (setup_db.py) والـ backfill - مرة مع الكتابة مش مع كل قراءة
+    table = CategoryCount.__table__
+    connection.execute(table.delete())
+    counts = connection.execute(select(Protocol.category, func.count()).where(Protocol.category.isnot(None))
+                                .group_by(Protocol.category)).all()
+    if counts: connection.execute(table.insert(), [{'category': c, 'protocols': n} for c, n in counts if c])
+
+def record_protocol_changes(connection, protocol_ids):
+    # بتتنادى بعد كل flush للـ ORM (تحت)، ومن التحميل المجمع في setup_db.py (اللي مبيعديش على الـ ORM)
+    rows = [{'protocol_id': i} for i in protocol_ids]
+    if rows: connection.execute(LibraryChange.__table__.insert(), rows)
+
+@event.listens_for(Protocol, 'before_update')
+def bump_protocol_revision(mapper, connection, target):
+    if db.session.is_modified(target, include_collections=False):
+        target.revision = (target.revision or 0) + 1
+
+@event.listens_for(db.session, 'after_flush')
+def log_protocol_changes(session, flush_context):
+    # insert واحد (executemany) لكل flush - مش query لكل بروتوكول في الـ import
+    changed = [o for o in session.new | session.deleted if isinstance(o, Protocol)]
+    changed += [o for o in session.dirty if isinstance(o, Protocol) and session.is_modified(o, include_collections=False)]
+    record_protocol_changes(session.connection(), [o.id for o in changed])
+    if changed: session.info['library_changed'] = True
+    # مفاتيح البحث: بس لو الاسم أو الكلمات الدلالية اتغيروا
+    keyed = [(o.id, None, None) if o in session.deleted else (o.id, o.disease_name, o.keywords) for o in changed
+             if o in session.new or o in session.deleted
+             or any(sa_inspect(o).attrs[a].history.has_changes() for a in ('disease_name', 'keywords'))]
+    write_search_keys(session.connection(), keyed)
+    # قيم الأجهزة: بس لو نوع الجهاز أو القيم اتغيروا
+    write_protocol_params(session.connection(), [
+        {'id': o.id} if o in session.deleted else {'id': o.id, **{a: getattr(o, a) for a in PROTOCOL_PARAM_SOURCES}}
+        for o in changed if o in session.new or o in session.deleted
+        or any(sa_inspect(o).attrs[a].history.has_changes() for a in PROTOCOL_PARAM_SOURCES)])
+
+    # عدد كل تصنيف: +1 للجديد، -1 للممسوح، ونقل من القديم للجديد لو التصنيف اتغير
+    deltas, unknown = Counter(), False
+    for o in changed:
+        history = sa_inspect(o).attrs.category.history
+        if o in session.new:
+            deltas[o.category] += 1
+        elif o in session.deleted:
+            old = history.deleted or history.unchanged
+            if old: deltas[old[0]] -= 1
+            else: unknown = True
+        elif history.has_changes():
+            if history.deleted: deltas[history.deleted[0]] -= 1
+            else: unknown = True   # القيمة القديمة مكانتش متحملة (load_only)
+            deltas[history.added[0] if history.added else None] += 1
+    if unknown: refresh_category_counts(session.connection())
+    else: adjust_category_counts(session.connection(), deltas)
+
+@event.listens_for(db.session, 'after_commit')
+def refresh_derived_after_commit(session):
+    # الـ worker اللي عمل التعديل يشوف الـ snapshot فوراً، والباقيين خلال LIBRARY_SNAPSHOT_CHECK_SECONDS
+    # البروتوكولات المشابهة: صفوف library_change (في نفس الـ transaction) هي اللي بتقول مين محتاج حساب
+    # والحساب نفسه بره الـ web workers (flask refresh-related)
+    if session.info.pop('library_changed', False):
+        library_snapshot.mark_stale()
+
 @login_manager.user_loader
 def load_user(user_id): return User.query.get(int(user_id))
 
+# --- صلاحية الوصول: الأدمن دايماً، وغيره 30 يوم تجربة أو اشتراك ساري ---
+def access_expiry(user):
+    # نفس access_expiry_sql بالظبط (للمستخدمين اللي الـ sweep لسه معداش عليهم)
+    if not user.is_active: return user.created_at
+    trial_end = user.created_at + timedelta(days=TRIAL_DAYS)
+    return max(trial_end, user.subscription_end) if user.subscription_end else trial_end
+
+def user_has_access(user):
+    if user.is_admin: return True
+    expires = user.access_expires_at or access_expiry(user)
+    return expires > datetime.utcnow()
+
+# --- نفس الحسبة بـ SQL: UPDATE واحدة على كل المستخدمين المختارين ---
+def sql_add_days(value, days):
+    # SQLite بيخزن التاريخ نص بشكل الـ ORM (6 أرقام بعد الثواني)، و strftime('%f') بيكتب 3 بس
+    # => الثواني من strftime والكسور زي ما هي من القيمة نفسها (الأيام الكاملة مبتغيرهاش): نفس النص بالظبط
+    # عشان المقارنة كنص و is_distinct_from في الـ sweep يفضلوا صح
+    if db.engine.dialect.name == 'sqlite':
+        shifted = func.strftime('%Y-%m-%d %H:%M:%S', value, f'+{int(days)} days')
+        return shifted.op('||', return_type=db.DateTime)(func.substr(value, 20))
+    return value + timedelta(days=int(days))
+
+def sql_latest(a, b):
+    # max() في SQLite و greatest() في Postgres بيتعاملوا مع NULL بشكل مختلف - CASE واحدة في الاتنين
+    # b فاضي => a، و a فاضي => b (المقارنة بـ NULL بتروح للـ else)
+    return case((or_(b.is_(None), a > b), a), else_=b)
+
+def active_expiry_sql():
+    return sql_latest(sql_add_days(User.created_at, TRIAL_DAYS), User.subscription_end)
+
+def access_expiry_sql():
+    return case((User.is_active == db.false(), User.created_at), else_=active_expiry_sql())
+
+def sweep_user_access():
+    # بتحسب access_expires_at للي اتغير بس (اشتراك اتعدل من برة، مستخدمين قبل العمود ده) - statement واحدة
+    now = datetime.utcnow()
+    expiry = access_expiry_sql()
+    updated = db.session.execute(update(User).where(User.access_expires_at.is_distinct_from(expiry))
+                                 .values(access_expires_at=expiry).execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    expired = db.session.query(func.count(User.id)).filter(
+        User.is_admin.isnot(True), User.access_expires_at <= now).scalar()
+    return {'updated': updated, 'expired': expired}
+
+# --- إدارة المستخدمين المجمعة: فلاتر صفحة الأدمن => شرط WHERE واحد، وكل عملية = UPDATE واحدة ---
+USER_STATUSES = ('all', 'trial', 'subscriber', 'expiring', 'expired', 'inactive')
+USER_EXPIRING_DAYS = 7
+USER_PAGE_SIZE = 200
+
+def user_selection(args):
+    # الأدمن نفسهم برة أي عملية مجمعة
+    now = datetime.utcnow()
+    conditions = [User.is_admin.isnot(True)]
+    query = (args.get('q') or '').strip()
+    if query: conditions.append(User.email.ilike(f"%{query}%"))
+    status = args.get('status', 'all')
+    if status == 'inactive':
+        conditions.append(User.is_active == db.false())
+    elif status == 'expired':
+        conditions += [User.is_active == db.true(), User.access_expires_at <= now]
+    elif status in ('trial', 'subscriber', 'expiring'):
+        conditions += [User.is_active == db.true(), User.access_expires_at > now]
+        if status == 'trial': conditions.append(or_(User.subscription_end.is_(None), User.subscription_end <= now))
+        if status == 'subscriber': conditions.append(User.subscription_end > now)
+        if status == 'expiring': conditions.append(User.access_expires_at <= now + timedelta(days=USER_EXPIRING_DAYS))
+    printing = args.get('print')
+    if printing == 'yes': conditions.append(User.can_print == db.true())
+    if printing == 'no': conditions.append(User.can_print.isnot(True))
+    return and_(*conditions)
+
+def bulk_update_users(selection, action, days=0):
+    # => عدد المستخدمين اللي اتغيروا
+    if action == 'grant_print':
+        values = {'can_print': True}
+    elif action == 'revoke_print':
+        values = {'can_print': False}
+    elif action == 'deactivate':
+        values = {'is_active': False, 'access_expires_at': User.created_at}
+    elif action == 'activate':
+        values = {'is_active': True, 'access_expires_at': active_expiry_sql()}
+    elif action == 'extend':
+        # من آخر يوم وصول (أو من النهارده لو انتهى): تجربة فاضل فيها 10 أيام + 30 = 40 يوم
+        new_end = sql_add_days(sql_latest(literal(datetime.utcnow(), db.DateTime), User.access_expires_at), days)
+        values = {'subscription_end': new_end,
+                  'access_expires_at': case((User.is_active == db.true(), new_end), else_=User.access_expires_at)}
+    else:
+        raise ValueError(f"unknown action: {action}")
+    count = db.session.execute(update(User).where(selection).values(values)
+                               .execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    return count
+
+@app.cli.command('sweep-access')
+def sweep_access_command():
+    """Recompute users' access_expires_at (run periodically, e.g. hourly from cron)."""
+    started = time.perf_counter()
+    stats = sweep_user_access()
+    print(f"✅ Access sweep: {stats} in {time.perf_counter() - started:.3f}s")
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -126,10 +521,44 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- حدود توليد الـ AI: token bucket لكل مستخدم ولكل IP + حد يومي حسب الاشتراك (ai_limits.py) ---
+ai_limiter = AILimiter(
+    os.environ.get('AI_LIMITS_DB') or os.path.join(app.instance_path, 'ai_limits.db'),
+    user_rate=(int(os.environ.get('AI_USER_BURST', 3)), float(os.environ.get('AI_USER_PER_MINUTE', 6))),
+    ip_rate=(int(os.environ.get('AI_IP_BURST', 6)), float(os.environ.get('AI_IP_PER_MINUTE', 12))),
+    daily={'trial': int(os.environ.get('AI_DAILY_TRIAL', 20)),
+           'subscriber': int(os.environ.get('AI_DAILY_SUBSCRIBER', 200)),
+           'admin': None},
+)
+# عدد الـ proxies قدام التطبيق (Heroku router = 1): الـ IP الحقيقي من X-Forwarded-For مش من الـ proxy
+AI_PROXY_HOPS = int(os.environ.get('AI_PROXY_HOPS', 0))
+metrics.counter('ai_limiter_decisions_total', "AI generation limiter decisions by result and account tier.")
+
+def ai_tier(user):
+    if user.is_admin: return 'admin'
+    if user.subscription_end and user.subscription_end > datetime.utcnow(): return 'subscriber'
+    return 'trial'
+
+def client_ip():
+    route = request.access_route
+    if AI_PROXY_HOPS and len(route) >= AI_PROXY_HOPS: return route[-AI_PROXY_HOPS]
+    return request.remote_addr or 'unknown'
+
+def acquire_ai_generation(user):
+    tier = ai_tier(user)
+    decision = ai_limiter.acquire(user.id, client_ip(), tier)
+    metrics.inc('ai_limiter_decisions_total', decision=decision.reason, tier=tier)
+    return decision
+
+def refund_ai_generation(user, charged_at):
+    # طلب اتخصم ومتبعتش لـ Gemini أو اتلغى قبل ما يخلص => يرجع للـ bucket وللحد اليومي
+    ai_limiter.refund(user.id, client_ip(), charged_at)
+    metrics.inc('ai_limiter_decisions_total', decision='refunded', tier=ai_tier(user))
+
 # --- دالة الذكاء الاصطناعي ---
 # --- دالة الذكاء الاصطناعي (النسخة المحسنة والمفصلة) ---
 # --- دالة الذكاء الاصطناعي (نسخة الاستشاري - Pro) ---
-def get_ai_protocol(disease_search):
+def get_ai_protocol(disease_search, timeout=None):
     try:
         # إعدادات لزيادة طول الإجابة وسماحية الإبداع
         # max_output_tokens=3000: يسمح بكتابة مقال طويل جداً
@@ -168,7 +597,17 @@ def get_ai_protocol(disease_search):
         If input is not medical, return JSON with key "error".
         """
         
-        response = model.generate_content(prompt, generation_config=config)
+        started = time.perf_counter()
+        try:
+            # timeout: البحث المجمع بيدي كل طلب اللي فاضل من مهلته بدل ما يفضل شاغل thread بعدها
+            options = {'request_options': {'timeout': timeout}} if timeout else {}
+            response = model.generate_content(prompt, generation_config=config, **options)
+        finally:
+            metrics.observe('gemini_request_duration_seconds', time.perf_counter() - started)
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            metrics.inc('gemini_tokens_total', usage.prompt_token_count or 0, kind='prompt')
+            metrics.inc('gemini_tokens_total', usage.candidates_token_count or 0, kind='output')
         text_response = response.text.strip()
         
         # تنظيف الرد من علامات الـ Markdown
@@ -183,61 +622,252 @@ def get_ai_protocol(disease_search):
     except Exception as e:
         print(f"❌ AI Error: {e}")
         return None
+
+# ==========================================
+# Cache لكارت نتيجة البروتوكول (templates/_protocol_result.html)
+# ==========================================
+# المفتاح: (id, revision, can_print) => أي تعديل بيغير الـ revision فالنسخة القديمة مبتترجعش تاني
+# محدود بعدد العناصر وبالحجم (الصور base64 ممكن تبقى كبيرة)
+class FragmentCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None: self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes: return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None: self._bytes -= len(old)
+            self._items[key] = value
+            self._bytes += size
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def invalidate(self, protocol_id):
+        with self._lock:
+            for key in [k for k in self._items if k[0] == protocol_id]:
+                self._bytes -= len(self._items.pop(key))
+
+protocol_fragments = FragmentCache(
+    max_entries=int(os.environ.get('FRAGMENT_CACHE_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('FRAGMENT_CACHE_MB', 64)) * 1024 * 1024,
+)
+
+@event.listens_for(Protocol, 'after_update')
+@event.listens_for(Protocol, 'after_delete')
+def drop_protocol_fragments(mapper, connection, target):
+    protocol_fragments.invalidate(target.id)
+
+# ==========================================
+# HTTP Conditional Caching (ETag + 304) لصفحة النتيجة
+# ==========================================
+# بصمة القوالب: أي deploy بيغير الصفحة بيغير كل الـ ETags
+def _templates_stamp(*names):
+    digest = hashlib.sha1()
+    for name in names:
+        with open(os.path.join(app.root_path, 'templates', name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+TEMPLATES_STAMP = _templates_stamp('index.html', '_protocol_result.html')
+
+def protocol_etag(protocol, user, can_print, related=()):
+    # الصفحة فيها إيميل المستخدم + صلاحية الطباعة، فالـ ETag لازم يختلف لكل مستخدم
+    # + قايمة المشابهة (بتتغير من غير ما الـ revision يتغير)
+    raw = f"{protocol.id}:{protocol.revision}:{user.id}:{int(can_print)}:{int(bool(user.is_admin))}:{TEMPLATES_STAMP}"
+    if related: raw += ":" + "|".join(f"{r.id}:{r.disease_name}" for r in related)
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+def render_protocol_result(result, can_print):
+    # نتيجة الذكاء الاصطناعي (dict) مش محفوظة فمفيش cache
+    if not isinstance(result, Protocol):
+        return Markup(render_template('_protocol_result.html', result=result, can_print=can_print))
+    key = (result.id, result.revision, can_print)
+    html = protocol_fragments.get(key)
+    metrics.inc('search_outcomes_total', outcome='db_hit' if html is None else 'cache_hit')
+    if html is None:
+        db.session.refresh(result) # تحميل كل الأعمدة في query واحدة
+        html = Markup(render_template('_protocol_result.html', result=result, can_print=can_print))
+        protocol_fragments.set(key, html)
+    return html
+
+# --- البروتوكولات الموجودة بالاسم: query واحدة (على دفعات) بدل filter_by لكل صف في الـ import ---
+def protocols_by_name(names):
+    names = sorted({n for n in names if n})
+    found = {}
+    for i in range(0, len(names), 500):
+        for p in Protocol.query.filter(Protocol.disease_name.in_(names[i:i + 500])):
+            found.setdefault(p.disease_name, p)
+    return found
+
+# --- سرعة الاستيراد (صفوف/ثانية) لكل مصدر ---
+def record_import(source, rows, seconds):
+    metrics.inc('import_rows_total', rows, source=source)
+    metrics.inc('import_seconds_total', seconds, source=source)
+    if seconds > 0: metrics.set('import_last_rows_per_second', rows / seconds, source=source)
+
+# ==========================================
+# تحويل ملفات JSON المولدة لصفوف بروتوكولات
+# ==========================================
+# --- تنسيق التمارين كـ HTML (المراحل 1 ثم 2 ثم 3) ---
+def format_exercises_html(ex_data, with_goal=True):
+    html = ""
+    for p_key in ["phase_1", "phase_2", "phase_3"]:
+        phase = ex_data.get(p_key)
+        if phase:
+            title = phase.get('name', p_key.title())
+            if with_goal: title = f"{title}: {phase.get('goal', '')}"
+            html += f"<h4>{title}</h4>"
+            html += "<ul>"
+            for ex in phase.get('exercises', []):
+                html += f"<li><b>{ex.get('name')}</b>: {ex.get('instructions')} <i>({ex.get('dosage')})</i></li>"
+            html += "</ul><hr>"
+    return html
+
+# --- تنسيق الملاحظات السريرية ---
+def format_notes(notes_data, inline=True):
+    if not notes_data: return ""
+    sep = " " if inline else "\n"
+    return (f"Diagnosis:{sep}{notes_data.get('assessment_diagnosis','')}\n\n"
+            f"Manual Therapy:{sep}{notes_data.get('manual_therapy','')}\n\n"
+            f"Precautions:{sep}{notes_data.get('precautions','')}")
+
+# --- عنصر JSON واحد => قاموس بأعمدة جدول Protocol ---
+def protocol_row_from_json(item):
+    d_name = item.get('condition_name')
+    category = item.get('category', 'General')
+    description = item.get('clinical_presentation', {}).get('definition', '')
+    electro = (item.get('electrotherapy') or [{}])[0] # نأخذ أول جهاز
+    return {
+        'disease_name': d_name,
+        'category': category,
+        'description': description,
+        # توليد كلمات مفتاحية تلقائية
+        'keywords': f"{d_name}, {category}, {description[:50]}",
+        'estim_type': electro.get('type', 'TENS/FES'),
+        'estim_params': electro.get('parameters', 'See notes'),
+        'estim_role': electro.get('goal', 'Pain relief'),
+        'us_type': "Ultrasound/Other",
+        'us_params': "Refer to clinical notes", # لأن الـ JSON يجمعهم
+        'exercises_list': format_exercises_html(item.get('therapeutic_exercises', {})),
+        'exercises_role': "Rehabilitation Progression",
+        'source_ref': item.get('scientific_reference', 'Kisner & Colby'),
+        'notes': format_notes(item.get('clinical_notes', {})),
+    }
+
 # ==========================================
 # 3. المسارات (Routes)
 # ==========================================
 
-# ⚠️ هام جداً: هذا الرابط بدون حماية لكي يعمل الإصلاح
-@app.route('/admin/update-db-schema')
+# ترقية قاعدة بيانات قديمة: أمر CLI مش route (بيعيد كتابة جداول كاملة، وتسجيل الدخول نفسه محتاج الأعمدة الجديدة)
+#   flask --app app update-db-schema
+@app.cli.command('update-db-schema')
 def update_db_schema():
-    try:
-        with db.engine.connect() as conn:
-            # 1. إضافة عمود can_print
-            try:
-                conn.execute(text("ALTER TABLE \"user\" ADD COLUMN can_print BOOLEAN DEFAULT FALSE"))
-            except Exception as e:
-                print(f"Column can_print might exist: {e}")
-            
-            # 2. إضافة عمود video_link
-            try:
-                conn.execute(text("ALTER TABLE protocol ADD COLUMN video_link TEXT"))
-            except Exception as e:
-                print(f"Column video_link might exist: {e}")
-
-            # 3. إضافة عمود notes
-            try:
-                conn.execute(text("ALTER TABLE protocol ADD COLUMN notes TEXT"))
-            except Exception as e:
-                print(f"Column notes might exist: {e}")
-            
-            conn.commit()
-        return "<h1>✅ ALL Columns Added Successfully! (can_print, video_link, notes) <br> <a href='/login'>Go to Login</a></h1>"
-    except Exception as e:
-        return f"<h1>Error: {str(e)}</h1>"
+    """Add missing columns, tables and indexes, then backfill the derived tables."""
+    with db.engine.connect() as conn:
+        # 1. إضافة عمود can_print
+        try:
+            conn.execute(text("ALTER TABLE \"user\" ADD COLUMN can_print BOOLEAN DEFAULT FALSE"))
+        except Exception as e:
+            print(f"Column can_print might exist: {e}")
+        
+        # 2. إضافة عمود video_link
+        try:
+            conn.execute(text("ALTER TABLE protocol ADD COLUMN video_link TEXT"))
+        except Exception as e:
+            print(f"Column video_link might exist: {e}")
+
+        # 3. إضافة عمود notes
+        try:
+            conn.execute(text("ALTER TABLE protocol ADD COLUMN notes TEXT"))
+        except Exception as e:
+            print(f"Column notes might exist: {e}")
+
+        # 4. إضافة عمود revision
+        try:
+            conn.execute(text("ALTER TABLE protocol ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+        except Exception as e:
+            print(f"Column revision might exist: {e}")
+
+        # 5. إضافة عمود updated_at
+        try:
+            conn.execute(text("ALTER TABLE protocol ADD COLUMN updated_at TIMESTAMP"))
+        except Exception as e:
+            print(f"Column updated_at might exist: {e}")
+
+        # 6. أعمدة المستخدم: is_active + access_expires_at (بتتملى بالـ sweep تحت)
+        try:
+            conn.execute(text("ALTER TABLE \"user\" ADD COLUMN is_active BOOLEAN NOT NULL DEFAULT TRUE"))
+        except Exception as e:
+            print(f"Column is_active might exist: {e}")
+        try:
+            conn.execute(text("ALTER TABLE \"user\" ADD COLUMN access_expires_at TIMESTAMP"))
+        except Exception as e:
+            print(f"Column access_expires_at might exist: {e}")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_access_expires_at ON \"user\" (access_expires_at)"))
+
+        # 7. إضافة عمود source_hash (ملف المكتبة الجاهز)
+        try:
+            conn.execute(text("ALTER TABLE protocol ADD COLUMN source_hash VARCHAR(64)"))
+        except Exception as e:
+            print(f"Column source_hash might exist: {e}")
+
+        # 8. index التصنيف (تصفح التصنيفات)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_protocol_category_id ON protocol (category, id)"))
+
+        conn.commit()
+    # 9. الجداول الجديدة (library_change, search_key, search_synonym, category_count, outbound_email, search_event,
+    #    protocol_param)
+    #    create_all بتنشئ الناقص بس
+    db.create_all()
+    # 10. مفاتيح البحث + عدد التصنيفات للبروتوكولات الموجودة قبل الجداول
+    if db.session.query(SearchKey.key).first() is None:
+        refresh_search_keys(db.session.connection())
+    refresh_category_counts(db.session.connection())
+    db.session.commit()
+    # 11. access_expires_at لكل المستخدمين الموجودين
+    sweep_user_access()
+    # 12. قيم الأجهزة كأرقام للبروتوكولات الموجودة قبل الجدول
+    if db.session.query(ProtocolParam.id).first() is None:
+        refresh_protocol_params(db.session.connection())
+        db.session.commit()
+    print("✅ Database schema is up to date")
 
 @app.route('/admin/toggle-print/<int:user_id>')
 @admin_required
 def toggle_print(user_id):
-    user = User.query.get_or_404(user_id)
-    user.can_print = not user.can_print
+    # UPDATE واحدة بترجع القيمة الجديدة (من غير ما نحمل المستخدم الأول)
+    row = db.session.execute(update(User).where(User.id == user_id).values(can_print=case((User.can_print == db.true(), False), else_=True))
+                             .returning(User.email, User.can_print).execution_options(synchronize_session=False)).first()
+    if row is None: return "User not found", 404
     db.session.commit()
-    status = "Enabled" if user.can_print else "Disabled"
-    flash(f'Printing permission {status} for {user.email}', 'info')
-    return redirect(url_for('admin_dashboard'))        
+    status = "Enabled" if row.can_print else "Disabled"
+    flash(f'Printing permission {status} for {row.email}', 'info')
+    return redirect(request.referrer or url_for('admin_dashboard'))
 
 @app.route('/', methods=['GET', 'POST'])
 @login_required
 def home():
     if not current_user.is_admin:
-        days_passed = (datetime.utcnow() - current_user.created_at).days
-        days_left = 30 - days_passed
-        has_extended_sub = current_user.subscription_end and current_user.subscription_end > datetime.utcnow()
-        if days_left <= 0 and not has_extended_sub:
+        days_left = ((current_user.access_expires_at or access_expiry(current_user)) - datetime.utcnow()).days
+        if not user_has_access(current_user):
             return redirect(url_for('subscription_expired'))
     else:
         days_left = "Unlimited (Admin)"
 
     result = None
+    ai_limited = None
     # 1. استلام الكلمة من المستخدم
     raw_query = request.args.get('disease') or request.form.get('disease')
     
@@ -247,20 +877,110 @@ def home():
         # 2. split + join: تحول أي مسافات مزدوجة في النص لمسافة واحدة
         clean_query = " ".join(raw_query.strip().split())
 
-        # 🎯 تجهيز مصطلح البحث (علامة % معناها: هات أي حاجة قبلها أو بعدها)
-        term = f"%{clean_query}%"
-
-        # 🔍 البحث في قاعدة البيانات
-        result = Protocol.query.filter(
-            (Protocol.disease_name.ilike(term)) |  # يبحث في الاسم
-            (Protocol.keywords.ilike(term))        # يبحث في الكلمات الدلالية
-        ).first()
+        # 🔍 البحث: في الـ snapshot اللي في الذاكرة لو موجود (gunicorn preload)، وإلا في قاعدة البيانات
+        search_started = time.perf_counter()
+        result = find_protocol(clean_query)
+        outcome = 'hit' if result else None
 
         # 🤖 لو ملقاش في الداتابيز، يسأل الذكاء الاصطناعي بالكلمة النظيفة
+        # ⛔ الحدود قبل Gemini: الرفض مبيلمسش الـ API خالص
         if not result:
-            result = get_ai_protocol(clean_query)
-    
-    return render_template('index.html', result=result, user=current_user, days_left=days_left)
+            decision = acquire_ai_generation(current_user)
+            if decision.allowed:
+                result = get_ai_protocol(clean_query)
+                outcome = 'ai' if result else 'ai_failure'
+                metrics.inc('search_outcomes_total', outcome='ai_fallback' if result else 'ai_failure')
+            else:
+                ai_limited = decision
+                outcome = 'ai_limited'
+                metrics.inc('search_outcomes_total', outcome='ai_limited')
+
+        # 📝 سجل البحث (في الذاكرة، بيتكتب على دفعات)
+        log_search(clean_query, outcome, search_started, current_user,
+                   protocol_id=result.id if isinstance(result, Protocol) else None)
+
+    can_print = bool(current_user.is_admin or current_user.can_print)
+
+    # 🔗 بروتوكولات مشابهة: محسوبة مسبقاً (related.py)، هنا query واحدة بالـ index
+    related = related_protocols(result.id) if isinstance(result, Protocol) else []
+
+    # 🏷️ نفس البروتوكول لنفس المستخدم => 304 من غير body ولا render
+    etag = None
+    if isinstance(result, Protocol) and request.method == 'GET':
+        etag = protocol_etag(result, current_user, can_print, related)
+        if request.if_none_match.contains(etag):
+            metrics.inc('search_outcomes_total', outcome='cache_hit')
+            response = app.response_class(status=304)
+            return _conditional_headers(response, etag, result)
+
+    result_html = render_protocol_result(result, can_print=can_print) if result else None
+    response = make_response(render_template('index.html', result=result, result_html=result_html,
+                                             related=related, searched=bool(raw_query), ai_limited=ai_limited,
+                                             user=current_user, days_left=days_left))
+    if ai_limited:
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, int(ai_limited.retry_after + 0.999)))
+    if etag:
+        _conditional_headers(response, etag, result)
+    return response
+
+def find_protocol(clean_query):
+    # بنجيب id + revision بس، والباقي (النصوص والصور) بيتحمل لو الكارت مش في الـ cache
+    columns = load_only(Protocol.id, Protocol.revision, Protocol.updated_at)
+
+    # 1. مفتاح موحد (عربي/إنجليزي + المرادفات) => بحث مطابق على الـ index
+    key = search_synonyms.expand(normalize_search(clean_query))
+    protocol_id = db.session.query(func.min(SearchKey.protocol_id)).filter(SearchKey.key == key).scalar() if key else None
+    if protocol_id is not None:
+        result = db.session.get(Protocol, protocol_id, options=[columns])
+        if result: return result
+
+    # 2. جزء من الاسم/الكلمات: الـ snapshot في الذاكرة لو موجود، وإلا ILIKE
+    if library_snapshot.ready:
+        library_snapshot.refresh()
+        protocol_id = library_snapshot.search(clean_query)
+        result = db.session.get(Protocol, protocol_id, options=[columns]) if protocol_id else None
+        if result or protocol_id is None: return result
+
+    # 🎯 تجهيز مصطلح البحث (علامة % معناها: هات أي حاجة قبلها أو بعدها)
+    term = f"%{clean_query}%"
+    return Protocol.query.options(columns).filter(
+        (Protocol.disease_name.ilike(term)) |  # يبحث في الاسم
+        (Protocol.keywords.ilike(term))        # يبحث في الكلمات الدلالية
+    ).first()
+
+def find_protocols(queries):
+    # نفس find_protocol لكذا كلمة مرة واحدة => {الكلمة: protocol_id} (اللي ملقاش مش موجود)
+    # المفاتيح كلها في query واحدة (IN على الـ primary key)، والباقي من الـ snapshot أو ILIKE واحدة مجمعة
+    keys = {q: search_synonyms.expand(normalize_search(q)) for q in queries}
+    wanted = sorted({k for k in keys.values() if k})
+    by_key = dict(db.session.query(SearchKey.key, func.min(SearchKey.protocol_id))
+                  .filter(SearchKey.key.in_(wanted)).group_by(SearchKey.key).all()) if wanted else {}
+    found = {q: by_key[k] for q, k in keys.items() if k in by_key}
+    missing = [q for q in queries if q not in found]
+    if not missing: return found
+
+    if library_snapshot.ready:
+        library_snapshot.refresh()
+        for q in missing:
+            protocol_id = library_snapshot.search(q)
+            if protocol_id: found[q] = protocol_id
+        return found
+
+    # subquery لكل كلمة (أول id بيطابق) في UNION ALL واحدة
+    parts = [select(literal(i).label('i'), func.min(Protocol.id).label('id'))
+             .where(Protocol.disease_name.ilike(f"%{q}%") | Protocol.keywords.ilike(f"%{q}%")) for i, q in enumerate(missing)]
+    for i, protocol_id in db.session.execute(parts[0] if len(parts) == 1 else union_all(*parts)):
+        if protocol_id is not None: found[missing[i]] = protocol_id
+    return found
+
+def _conditional_headers(response, etag, protocol):
+    response.set_etag(etag)
+    if protocol.updated_at: response.last_modified = protocol.updated_at
+    # private: الصفحة خاصة بالمستخدم، no-cache: المتصفح يسأل بالـ ETag كل مرة
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
 
 @app.route('/subscription')
 def subscription_expired():
@@ -269,20 +989,48 @@ def subscription_expired():
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
-    protocols = Protocol.query.all()
-    users = User.query.all()
-    return render_template('admin.html', protocols=protocols, users=users)
-
-@app.route('/admin/reset-user-password/<email>/<new_password>')
-@admin_required 
-def manual_reset(email, new_password):
-    user = User.query.filter_by(email=email).first()
-    if user:
-        user.password = generate_password_hash(new_password, method='pbkdf2:sha256')
-        db.session.commit()
-        flash(f'Success: Password for {email} updated!', 'success')
-        return redirect(url_for('admin_dashboard'))
-    return "User not found", 404
+    # الجدول بيعرض الاسم والتصنيف بس - من غير النصوص الطويلة وصور base64
+    protocols = Protocol.query.options(load_only(Protocol.id, Protocol.disease_name, Protocol.category)).all()
+    # المستخدمين: نفس فلاتر العمليات المجمعة (اللي بيظهر هنا هو اللي العملية هتتطبق عليه)
+    selection = user_selection(request.args)
+    users = User.query.filter(selection).order_by(User.id.desc()).limit(USER_PAGE_SIZE).all()
+    users_total = db.session.query(func.count(User.id)).filter(selection).scalar()
+    return render_template('admin.html', protocols=protocols, users=users, users_total=users_total,
+                           filters=request.args, statuses=USER_STATUSES, now=datetime.utcnow())
+
+@app.route('/admin/users/bulk', methods=['POST'])
+@admin_required
+def bulk_users():
+    action = request.form.get('action')
+    days = request.form.get('days', 0, type=int)
+    if action == 'extend' and not 0 < days <= 3650:
+        flash('Enter the number of days to extend (1-3650)', 'danger')
+    else:
+        try:
+            count = bulk_update_users(user_selection(request.form), action, days)
+            label = f"extend by {days} days" if action == 'extend' else action.replace('_', ' ')
+            flash(f'{label.capitalize()}: {count} users updated', 'success')
+        except ValueError as e:
+            flash(str(e), 'danger')
+    filters = {k: request.form[k] for k in ('q', 'status', 'print') if request.form.get(k)}
+    return redirect(url_for('admin_dashboard', **filters) + '#users')
+
+@app.route('/admin/reset-user-password', methods=['POST'])
+@admin_required
+def manual_reset():
+    # POST مش في الـ URL: الباسورد كان بيتسجل في الـ logs والـ history
+    new_password = request.form.get('new_password', '')
+    if len(new_password) < 6:
+        flash('Password must be at least 6 characters', 'danger')
+        return redirect(request.referrer or url_for('admin_dashboard'))
+    row = db.session.execute(update(User).where(User.id == request.form.get('user_id', type=int))
+                             .values(password=generate_password_hash(new_password, method='pbkdf2:sha256'))
+                             .returning(User.email).execution_options(synchronize_session=False)).first()
+    if row is None: return "User not found", 404
+    enqueue_email(row.email, 'password_changed', 'Your Physio Expert password was changed', by_admin=True)
+    db.session.commit()
+    flash(f'Success: Password for {row.email} updated!', 'success')
+    return redirect(request.referrer or url_for('admin_dashboard'))
 
 @app.route('/admin/add-manual', methods=['POST'])
 @admin_required
@@ -413,14 +1161,17 @@ def import_excel():
             return "" if (pd.isna(val) or str(val).strip() == 'nan') else str(val).strip()
 
         updated = 0; created = 0
+        started = time.perf_counter()
+        rows = [row for _, row in df.iterrows()]
+        existing = protocols_by_name(get_val(row, 'disease_name') for row in rows)
 
-        for _, row in df.iterrows():
+        for row in rows:
             d_name = get_val(row, 'disease_name')
             if not d_name: continue
 
-            p = Protocol.query.filter_by(disease_name=d_name).first()
+            p = existing.get(d_name)
             if not p:
-                p = Protocol(disease_name=d_name); db.session.add(p); created += 1
+                p = existing[d_name] = Protocol(disease_name=d_name); db.session.add(p); created += 1
             else:
                 updated += 1
 
@@ -447,6 +1198,7 @@ def import_excel():
             p.evidence_level = get_val(row, 'evidence_level')
 
         db.session.commit()
+        record_import('excel', created + updated, time.perf_counter() - started)
         flash(f'Done! Created {created}, Updated {updated} protocols.', 'success')
 
     except Exception as e:
@@ -470,14 +1222,49 @@ def login():
     if request.method == 'POST':
         user = User.query.filter_by(email=request.form['email']).first()
         if user and check_password_hash(user.password, request.form['password']):
-            login_user(user)
+            if not login_user(user):
+                flash('This account has been deactivated. Contact support.', 'danger')
+                return render_template('login.html')
             return redirect(url_for('home'))
         else:
             flash('Login Failed. Check email/password', 'danger')
     return render_template('login.html')
 
-@app.route('/forgot-password')
-def forgot_password(): return render_template('forgot_password.html')
+@app.route('/forgot-password', methods=['GET', 'POST'])
+def forgot_password():
+    if request.method == 'POST':
+        email = (request.form.get('email') or '').strip()
+        user = User.query.filter_by(email=email).first() if email else None
+        # نفس الرد سواء الحساب موجود أو لأ (مفيش كشف للإيميلات المسجلة)
+        if user and user.is_active and not recent_email(user.email, 'password_reset', PASSWORD_RESET_INTERVAL):
+            link = url_for('reset_password', token=password_reset_token(user), _external=True)
+            enqueue_email(user.email, 'password_reset', 'Reset your Physio Expert password',
+                          link=link, minutes=PASSWORD_RESET_MAX_AGE // 60)
+            db.session.commit()
+        flash('If an account exists for that email, a reset link is on its way. Check your inbox.', 'info')
+        return redirect(url_for('forgot_password'))
+    return render_template('forgot_password.html')
+
+@app.route('/reset-password/<token>', methods=['GET', 'POST'])
+def reset_password(token):
+    user = user_from_reset_token(token)
+    if user is None:
+        flash('This reset link is invalid or has expired. Request a new one.', 'danger')
+        return redirect(url_for('forgot_password'))
+    if request.method == 'POST':
+        password = request.form.get('password', '')
+        if len(password) < 6:
+            flash('Password must be at least 6 characters', 'danger')
+        elif password != request.form.get('confirm_password'):
+            flash('Passwords do not match', 'danger')
+        else:
+            # الباسورد الجديد بيغير الـ hash => اللينك ده (وأي توكن API قديم) مبقاش شغال
+            user.password = generate_password_hash(password, method='pbkdf2:sha256')
+            enqueue_email(user.email, 'password_changed', 'Your Physio Expert password was changed')
+            db.session.commit()
+            flash('Password updated. You can log in now.', 'success')
+            return redirect(url_for('login'))
+    return render_template('reset_password.html', email=user.email)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -492,7 +1279,12 @@ def register():
 
 @app.route('/logout')
 @login_required
-def logout(): logout_user(); return redirect(url_for('login'))
+def logout():
+    logout_user()
+    # الجهاز ممكن يكون مشترك: المكتبة الأوفلاين (IndexedDB) والـ caches والـ service worker بيتمسحوا
+    response = redirect(url_for('login'))
+    response.headers['Clear-Site-Data'] = '"cache", "storage"'
+    return response
 @app.route('/admin/update-content')
 @admin_required
 def update_content():
@@ -507,35 +1299,18 @@ def update_content():
         
         added_count = 0
         updated_count = 0
+        started = time.perf_counter()
+        by_name = protocols_by_name(item.get('condition_name') for item in data_list)
 
         for item in data_list:
             d_name = item.get('condition_name')
-            existing = Protocol.query.filter_by(disease_name=d_name).first()
-            
-            # تنسيق التمارين HTML
-            def format_exercises_html(ex_data):
-                html = ""
-                phases = ["phase_1", "phase_2", "phase_3"]
-                for p_key in phases:
-                    phase = ex_data.get(p_key)
-                    if phase:
-                        html += f"<h4>{phase.get('name', p_key.title())}</h4>"
-                        html += "<ul>"
-                        for ex in phase.get('exercises', []):
-                            html += f"<li><b>{ex.get('name')}</b>: {ex.get('instructions')} <i>({ex.get('dosage')})</i></li>"
-                        html += "</ul><hr>"
-                return html
-
-            # تنسيق الملاحظات
-            def format_notes(notes_data):
-                if not notes_data: return ""
-                return f"Diagnosis:\n{notes_data.get('assessment_diagnosis','')}\n\nManual Therapy:\n{notes_data.get('manual_therapy','')}\n\nPrecautions:\n{notes_data.get('precautions','')}"
+            existing = by_name.get(d_name)
 
             if existing:
                 p = existing
                 updated_count += 1
             else:
-                p = Protocol()
+                p = by_name[d_name] = Protocol()
                 added_count += 1
             
             p.disease_name = d_name
@@ -550,111 +1325,22 @@ def update_content():
             p.us_type = "Ultrasound"
             p.us_params = "Refer to notes"
             
-            p.exercises_list = format_exercises_html(item.get('therapeutic_exercises', {}))
+            p.exercises_list = format_exercises_html(item.get('therapeutic_exercises', {}), with_goal=False)
             p.exercises_role = "Rehabilitation Progression"
             p.source_ref = item.get('scientific_reference', 'Clinical Guidelines')
-            p.notes = format_notes(item.get('clinical_notes', {}))
-            
+            p.notes = format_notes(item.get('clinical_notes', {}), inline=False)
+
             if not existing:
                 db.session.add(p)
 
         db.session.commit()
+        record_import('update_content', added_count + updated_count, time.perf_counter() - started)
         return f"<h1>✅ Success! Added: {added_count}, Updated: {updated_count}</h1><a href='/admin'>Dashboard</a>"
 
     except Exception as e:
         return f"<h1>Error: {str(e)}</h1>"
-@app.route('/setup-sys-secure-hmna12-4-2026')
-def setup_system():
-    try:
-        # مسح القديم وإنشاء الجديد
-        db.drop_all()
-        db.create_all()
-        
-        # إنشاء الأدمن
-        admin_email = "admin@physio.com"
-        admin_pass = "AboHamzaPhysioadmin2026"
-        hashed_pw = generate_password_hash(admin_pass, method='pbkdf2:sha256')
-        db.session.add(User(email=admin_email, password=hashed_pw, is_admin=True))
-        
-        # قائمة الأمراض الكاملة (50 مرض)
-        protocols_data = [
-            {"n": "Adhesive Capsulitis", "c": "Orthopedics", "k": "frozen shoulder, stiff", "d": "Stiffness and pain in the shoulder joint.", "et": "TENS", "ep": "100Hz, continuous", "er": "Pain relief", "ut": "Ultrasound", "up": "1.5 W/cm2, 1MHz", "ur": "Deep heating", "ex": "Pendulum, Wand exercises", "ex_r": "Increase ROM", "ef": "Daily", "ei": "Pain-free", "ev": "Grade A", "src": "Kisner & Colby", "img": "/static/uploads/shoulder.jpg"},
-            {"n": "Knee Osteoarthritis", "c": "Orthopedics", "k": "knee oa, pain, joint", "d": "Degenerative joint disease affecting the knee.", "et": "IFC", "ep": "Beat freq 80-150Hz", "er": "Pain modulation", "ut": "None", "up": "None", "ur": "None", "ex": "Quads setting, SLR", "ex_r": "Strengthening", "ef": "3x/week", "ei": "Moderate", "ev": "Grade A", "src": "Dutton", "img": "/static/uploads/knee.jpg"},
-            {"n": "Low Back Pain (Mechanical)", "c": "Orthopedics", "k": "lbp, back, lumbar", "d": "Pain in the lumbar region not due to radiculopathy.", "et": "TENS", "ep": "80-100Hz", "er": "Gate control", "ut": "IR Lamp", "up": "20 mins", "ur": "Relaxation", "ex": "McKenzie, Pelvic tilt", "ex_r": "Core stability", "ef": "Daily", "ei": "Controlled", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/back.jpg"},
-            {"n": "Carpal Tunnel Syndrome", "c": "Orthopedics", "k": "cts, wrist, hand", "d": "Median nerve compression at the wrist.", "et": "Ultrasound", "ep": "0.8 W/cm2, pulsed 20%", "er": "Anti-inflammatory", "ut": "US", "up": "See above", "ur": "Healing", "ex": "Tendon gliding", "ex_r": "Mobility", "ef": "Daily", "ei": "Low", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/wrist.jpg"},
-            {"n": "Lateral Epicondylitis", "c": "Orthopedics", "k": "tennis elbow", "d": "Inflammation of the extensor origin.", "et": "Laser", "ep": "4 J/cm2", "er": "Tissue repair", "ut": "Phonophoresis", "up": "1.0 W/cm2", "ur": "Drug delivery", "ex": "Eccentric wrist ext", "ex_r": "Remodeling", "ef": "3x/week", "ei": "Intense", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/elbow.jpg"},
-            {"n": "Stroke (Hemiplegia)", "c": "Neurology", "k": "cva, neuro", "d": "Paralysis on one side of the body.", "et": "FES", "ep": "35Hz, 300us", "er": "Re-education", "ut": "None", "up": "None", "ur": "None", "ex": "Task-oriented training", "ex_r": "Neuroplasticity", "ef": "Daily", "ei": "High", "ev": "Grade A", "src": "Carr & Shepherd", "img": "/static/uploads/stroke.jpg"},
-            {"n": "Bell's Palsy", "c": "Neurology", "k": "facial, nerve", "d": "Facial nerve paralysis.", "et": "ESTR", "ep": "Interrupted DC", "er": "Muscle stimulation", "ut": "None", "up": "None", "ur": "None", "ex": "Facial expressions", "ex_r": "Function", "ef": "2x/daily", "ei": "Threshold", "ev": "Grade B", "src": "Tidy's", "img": "/static/uploads/face.jpg"},
-            {"n": "Cerebral Palsy (Spastic)", "c": "Pediatrics", "k": "cp, child, peds", "d": "Motor disorder due to brain damage.", "et": "NMES", "ep": "Antagonist muscles", "er": "Reduce spasticity", "ut": "None", "up": "None", "ur": "None", "ex": "Stretching, NDT", "ex_r": "Function", "ef": "Daily", "ei": "Mild", "ev": "Grade A", "src": "Tecklin", "img": "/static/uploads/cp.jpg"},
-            {"n": "Sciatica", "c": "Orthopedics", "k": "nerve, leg pain", "d": "Pain radiating along the sciatic nerve.", "et": "TENS", "ep": "Burst mode", "er": "Endorphin release", "ut": "Hot Pack", "up": "20 mins", "ur": "Relaxation", "ex": "Nerve gliding", "ex_r": "Mobilization", "ef": "Daily", "ei": "Comfortable", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/sciatica.jpg"},
-            {"n": "Ankle Sprain", "c": "Sports", "k": "ankle, ligament", "d": "Ligament injury in the ankle.", "et": "Cryotherapy", "ep": "Ice 15 mins", "er": "Vasoconstriction", "ut": "US", "up": "Pulsed 20%", "ur": "Healing (Subacute)", "ex": "Proprioception", "ex_r": "Balance", "ef": "3x/week", "ei": "Functional", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/ankle.jpg"},
-            {"n": "Plantar Fasciitis", "c": "Orthopedics", "k": "foot, heel", "d": "Inflammation of the plantar fascia.", "et": "Ultrasound", "ep": "1.5 W/cm2 continuous", "er": "Extensibility", "ut": "Shockwave", "up": "2000 shocks", "ur": "Break adhesions", "ex": "Calf stretching", "ex_r": "Flexibility", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "Dutton", "img": "/static/uploads/foot.jpg"},
-            {"n": "Neck Pain (Cervical Spondylosis)", "c": "Orthopedics", "k": "neck, cervical", "d": "Degeneration of cervical spine.", "et": "IFT", "ep": "4000Hz base", "er": "Pain relief", "ut": "Hot Pack", "up": "15 mins", "ur": "Relaxation", "ex": "Chin tucks", "ex_r": "Posture", "ef": "Daily", "ei": "Low", "ev": "Grade A", "src": "Maitland", "img": "/static/uploads/neck.jpg"},
-            {"n": "Rotator Cuff Tendinitis", "c": "Orthopedics", "k": "shoulder, cuff", "d": "Inflammation of shoulder tendons.", "et": "US", "ep": "1MHz, pulsed", "er": "Healing", "ut": "Laser", "up": "Low level", "ur": "Repair", "ex": "Isometrics", "ex_r": "Strength", "ef": "3x/week", "ei": "Submaximal", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/shoulder_cuff.jpg"},
-            {"n": "Patellofemoral Pain Syndrome", "k": "knee, runner", "d": "Pain around the kneecap.", "et": "Biofeedback", "ep": "VMO muscle", "er": "Re-education", "ut": "Ice", "up": "10 mins", "ur": "Pain", "ex": "VMO strengthening", "ex_r": "Tracking", "ef": "3x/week", "ei": "Moderate", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/knee_vmo.jpg"},
-            {"n": "Guillain-Barre Syndrome", "c": "Neurology", "k": "gbs, neuro", "d": "Rapid-onset muscle weakness.", "et": "None", "ep": "Avoid fatigue", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "PROM -> AAROM", "ex_r": "Maintain range", "ef": "Daily", "ei": "Gentle", "ev": "Grade B", "src": "O'Sullivan", "img": "/static/uploads/gbs.jpg"},
-            {"n": "Multiple Sclerosis", "c": "Neurology", "k": "ms, neuro", "d": "Demyelinating disease.", "et": "Cooling vest", "ep": "Minimize heat", "er": "Performance", "ut": "None", "up": "None", "ur": "None", "ex": "Energy conservation", "ex_r": "Endurance", "ef": "3x/week", "ei": "Sub-fatigue", "ev": "Grade A", "src": "O'Sullivan", "img": "/static/uploads/ms.jpg"},
-            {"n": "Rheumatoid Arthritis", "c": "Orthopedics", "k": "ra, hand, joint", "d": "Autoimmune joint inflammation.", "et": "Paraffin Wax", "ep": "Dip method", "er": "Pain/Stiffness", "ut": "TENS", "up": "Conv. mode", "ur": "Pain", "ex": "Gentle AROM", "ex_r": "Mobility", "ef": "Daily", "ei": "Painless", "ev": "Grade B", "src": "Tidy's", "img": "/static/uploads/hand_ra.jpg"},
-            {"n": "Scoliosis", "c": "Orthopedics", "k": "spine, curve", "d": "Sideways curvature of the spine.", "et": "NMES", "ep": "Convex side", "er": "Muscle balance", "ut": "None", "up": "None", "ur": "None", "ex": "Schroth method", "ex_r": "Correction", "ef": "Daily", "ei": "Corrective", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/spine.jpg"},
-            {"n": "Achilles Tendinitis", "c": "Orthopedics", "k": "heel, tendon", "d": "Overuse of the Achilles tendon.", "et": "US", "ep": "3MHz pulsed", "er": "Healing", "ut": "Eccentric load", "up": "Slow drop", "ur": "Remodeling", "ex": "Heel drops", "ex_r": "Strength", "ef": "Daily", "ei": "High-eccentric", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/heel.jpg"},
-            {"n": "Fibromyalgia", "c": "General", "k": "fibro, pain", "d": "Widespread musculoskeletal pain.", "et": "TENS", "ep": "Burst/Acupuncture", "er": "Central pain", "ut": "Heat", "up": "General", "ur": "Relaxation", "ex": "Aerobic (Low impact)", "ex_r": "Endurance", "ef": "3x/week", "ei": "Low-Moderate", "ev": "Grade A", "src": "Dutton", "img": "/static/uploads/body.jpg"},
-            {"n": "Meniscus Tear", "c": "Orthopedics", "k": "knee, locking", "d": "Tear in the knee cartilage.", "et": "NMES", "ep": "Quads", "er": "Prevent atrophy", "ut": "Ice", "up": "15 mins", "ur": "Edema", "ex": "Mini-squats", "ex_r": "Strength", "ef": "Daily", "ei": "Pain-free", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/knee_meniscus.jpg"},
-            {"n": "ACL Reconstruction", "c": "Orthopedics", "k": "knee, acl, surgery", "d": "Post-op rehab for ACL.", "et": "NMES", "ep": "Quads", "er": "Activation", "ut": "Cryo-cuff", "up": "Continuous", "ur": "Swelling", "ex": "Heel slides, Quad sets", "ex_r": "ROM & Strength", "ef": "Daily", "ei": "Protocol-based", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/acl.jpg"},
-            {"n": "Piriformis Syndrome", "c": "Orthopedics", "k": "buttock pain, sciatica", "d": "Sciatic nerve compression by piriformis.", "et": "US", "ep": "Deep heat", "er": "Relaxation", "ut": "Heat", "up": "20 mins", "ur": "Spasm", "ex": "Piriformis stretch", "ex_r": "Flexibility", "ef": "Daily", "ei": "Moderate", "ev": "Grade B", "src": "Dutton", "img": "/static/uploads/piriformis.jpg"},
-            {"n": "Thoracic Outlet Syndrome", "c": "Orthopedics", "k": "tos, arm numb", "d": "Compression of nerves/vessels in neck.", "et": "TENS", "ep": "Sensory", "er": "Pain", "ut": "Heat", "up": "Neck", "ur": "Relaxation", "ex": "Corner stretch, Scalene stretch", "ex_r": "Postural correction", "ef": "Daily", "ei": "Gentle", "ev": "Grade B", "src": "Kisner", "img": "/static/uploads/tos.jpg"},
-            {"n": "De Quervain's Tenosynovitis", "c": "Orthopedics", "k": "thumb, wrist", "d": "Pain in thumb tendons.", "et": "US", "ep": "Pulsed", "er": "Inflammation", "ut": "None", "up": "None", "ur": "None", "ex": "Thumb Spica", "ex_r": "Rest", "ef": "Daily", "ei": "Low", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/thumb.jpg"},
-            {"n": "Temporomandibular Joint Dysfunction", "c": "Orthopedics", "k": "tmj, jaw", "d": "Jaw pain and clicking.", "et": "US", "ep": "0.8 W/cm2", "er": "Relaxation", "ut": "Laser", "up": "Trigger points", "ur": "Pain", "ex": "Rocabado exercises", "ex_r": "Coordination", "ef": "Daily", "ei": "Gentle", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/tmj.jpg"},
-            {"n": "Parkinson's Disease", "c": "Neurology", "k": "pd, tremor", "d": "Neurodegenerative disorder.", "et": "Cueing (Auditory)", "ep": "Metronome", "er": "Gait", "ut": "None", "up": "None", "ur": "None", "ex": "Big & Loud (LSVT)", "ex_r": "Amplitude", "ef": "4x/week", "ei": "High", "ev": "Grade A", "src": "O'Sullivan", "img": "/static/uploads/parkinsons.jpg"},
-            {"n": "Spinal Cord Injury (Paraplegia)", "c": "Neurology", "k": "sci, paralysis", "d": "Injury to spinal cord.", "et": "FES", "ep": "Cycling", "er": "Fitness", "ut": "None", "up": "None", "ur": "None", "ex": "Transfers, Wheelchair skills", "ex_r": "Independence", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "O'Sullivan", "img": "/static/uploads/sci.jpg"},
-            {"n": "Traumatic Brain Injury", "c": "Neurology", "k": "tbi, head", "d": "Brain injury due to trauma.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Dual-task training", "ex_r": "Cognition-Motor", "ef": "Daily", "ei": "Variable", "ev": "Grade A", "src": "Carr & Shepherd", "img": "/static/uploads/tbi.jpg"},
-            {"n": "Peripheral Neuropathy", "c": "Neurology", "k": "diabetes, numbness", "d": "Nerve damage in extremities.", "et": "TENS", "ep": "Frequency modulated", "er": "Pain masking", "ut": "Anodyne (IR)", "up": "30 mins", "ur": "Circulation", "ex": "Balance training", "ex_r": "Fall prevention", "ef": "Daily", "ei": "Safe", "ev": "Grade B", "src": "Dutton", "img": "/static/uploads/foot_neuro.jpg"},
-            {"n": "Duchenne Muscular Dystrophy", "c": "Pediatrics", "k": "dmd, child", "d": "Genetic muscle wasting.", "et": "None", "ep": "Avoid eccentrics", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Swimming, Cycling", "ex_r": "Maintain function", "ef": "3x/week", "ei": "Submaximal", "ev": "Grade B", "src": "Tecklin", "img": "/static/uploads/dmd.jpg"},
-            {"n": "Spina Bifida", "c": "Pediatrics", "k": "myelomeningocele", "d": "Neural tube defect.", "et": "NMES", "ep": "Functional", "er": "Gait", "ut": "None", "up": "None", "ur": "None", "ex": "Gait training", "ex_r": "Mobility", "ef": "Daily", "ei": "Functional", "ev": "Grade A", "src": "Tecklin", "img": "/static/uploads/sb.jpg"},
-            {"n": "Torticollis", "c": "Pediatrics", "k": "wry neck, baby", "d": "Twisted neck in infants.", "et": "Microcurrent", "ep": "Gentle", "er": "Relaxation", "ut": "Warmth", "up": "Gentle", "ur": "Relaxation", "ex": "Stretching SCM", "ex_r": "Correction", "ef": "Daily", "ei": "Gentle", "ev": "Grade A", "src": "Tecklin", "img": "/static/uploads/torticollis.jpg"},
-            {"n": "Osgood-Schlatter Disease", "c": "Pediatrics", "k": "knee, growth", "d": "Tibial tuberosity pain.", "et": "Ice", "ep": "Post-activity", "er": "Pain", "ut": "None", "up": "Contraindicated", "ur": "Growth plate", "ex": "Hamstring stretch", "ex_r": "Flexibility", "ef": "Daily", "ei": "Pain-free", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/osgood.jpg"},
-            {"n": "Chronic Obstructive Pulmonary Disease", "c": "Cardiopulmonary", "k": "copd, lung", "d": "Chronic lung obstruction.", "et": "NMES", "ep": "Quads", "er": "Strength (if dyspneic)", "ut": "None", "up": "None", "ur": "None", "ex": "Pursed lip breathing", "ex_r": "Efficiency", "ef": "Daily", "ei": "Borg 3-4", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/lungs.jpg"},
-            {"n": "Myocardial Infarction (Post-Op)", "c": "Cardiopulmonary", "k": "heart attack, cardiac", "d": "Rehab after heart attack.", "et": "None", "ep": "Monitor ECG", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Phase 1: Mobilization", "ex_r": "Function", "ef": "Daily", "ei": "Low (HR+20)", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/heart.jpg"},
-            {"n": "Cystic Fibrosis", "c": "Cardiopulmonary", "k": "cf, mucus", "d": "Genetic lung disease.", "et": "None", "ep": "None", "er": "None", "ut": "Flutter/PEP", "up": "Device", "ur": "Clearance", "ex": "Aerobic", "ex_r": "Airway clearance", "ef": "Daily", "ei": "High", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/cf.jpg"},
-            {"n": "Lymphedema", "c": "Cardiopulmonary", "k": "swelling, lymph", "d": "Fluid accumulation.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Decongestive exercises", "ex_r": "Pump", "ef": "Daily", "ei": "Slow", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/lymph.jpg"},
-            {"n": "Burn Injury", "c": "Integumentary", "k": "skin, burn", "d": "Thermal injury.", "et": "TENS", "ep": "During debridement", "er": "Pain", "ut": "US (Non-thermal)", "up": "Pulsed", "ur": "Healing", "ex": "ROM (Anti-contracture)", "ex_r": "Mobility", "ef": "Daily", "ei": "Painful", "ev": "Grade A", "src": "Cameron", "img": "/static/uploads/burn.jpg"},
-            {"n": "Pressure Ulcer", "c": "Integumentary", "k": "bed sore", "d": "Skin breakdown.", "et": "HVPC", "ep": "Negative polarity", "er": "Healing", "ut": "US", "up": "Periwound", "ur": "Circulation", "ex": "Positioning", "ex_r": "Offloading", "ef": "2 hrs", "ei": "N/A", "ev": "Grade A", "src": "Cameron", "img": "/static/uploads/ulcer.jpg"},
-            {"n": "Shin Splints", "c": "Sports", "k": "mtss, leg", "d": "Medial tibial stress syndrome.", "et": "Ice", "ep": "Massage", "er": "Pain", "ut": "US", "up": "Low intensity", "ur": "Healing", "ex": "Toe taps, Calf stretch", "ex_r": "Loading", "ef": "Daily", "ei": "Low", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/shin.jpg"},
-            {"n": "Groin Strain", "c": "Sports", "k": "adductor, hip", "d": "Strain of adductor muscles.", "et": "TENS", "ep": "Pain mode", "er": "Pain", "ut": "None", "up": "None", "ur": "None", "ex": "Adductor squeeze", "ex_r": "Strength", "ef": "3x/week", "ei": "Isom->Iso", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/groin.jpg"},
-            {"n": "Hamstring Strain", "c": "Sports", "k": "thigh, pull", "d": "Tear in hamstring.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Nordic Hamstring", "ex_r": "Eccentric", "ef": "2x/week", "ei": "High", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/hamstring.jpg"},
-            {"n": "Bankart Repair", "c": "Orthopedics", "k": "shoulder instability", "d": "Post-op for instability.", "et": "NMES", "ep": "Post-delt", "er": "Strength", "ut": "None", "up": "None", "ur": "None", "ex": "Closed chain", "ex_r": "Stability", "ef": "Daily", "ei": "Graded", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/bankart.jpg"},
-            {"n": "Total Knee Arthroplasty", "c": "Orthopedics", "k": "tka, joint replacement", "d": "Knee replacement rehab.", "et": "NMES", "ep": "Quads", "er": "Activation", "ut": "None", "up": "None", "ur": "None", "ex": "Heel slides, Bikes", "ex_r": "ROM", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/tka.jpg"},
-            {"n": "Total Hip Arthroplasty", "c": "Orthopedics", "k": "tha, hip", "d": "Hip replacement rehab.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Abduction (Standing)", "ex_r": "Strength", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/tha.jpg"},
-            {"n": "Bicipital Tendinitis", "c": "Orthopedics", "k": "biceps, shoulder", "d": "Long head of biceps pain.", "et": "US", "ep": "Pulsed", "er": "Inflammation", "ut": "None", "up": "None", "ur": "None", "ex": "Speed's test exercise", "ex_r": "Strength", "ef": "3x/week", "ei": "Low", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/biceps.jpg"},
-            {"n": "Spondylolisthesis", "c": "Orthopedics", "k": "spine, slip", "d": "Vertebral slippage.", "et": "None", "ep": "Avoid ext", "er": "None", "ut": "Heat", "up": "Lumbar", "ur": "Relaxation", "ex": "Flexion bias (Williams)", "ex_r": "Stability", "ef": "Daily", "ei": "Core", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/spondylo.jpg"},
-            {"n": "Stenosis (Lumbar)", "c": "Orthopedics", "k": "narrowing, spine", "d": "Narrowing of spinal canal.", "et": "TENS", "ep": "L4-S1", "er": "Pain", "ut": "None", "up": "None", "ur": "None", "ex": "Flexion exercises", "ex_r": "Open canal", "ef": "Daily", "ei": "Gentle", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/stenosis.jpg"},
-            {"n": "Whiplash Injury", "c": "Orthopedics", "k": "wads, neck", "d": "Neck injury from acceleration.", "et": "TENS", "ep": "High rate", "er": "Acute pain", "ut": "None", "up": "None", "ur": "None", "ex": "Eye-head coordination", "ex_r": "Control", "ef": "Daily", "ei": "Pain-free", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/whiplash.jpg"}
-        ]
-
-        for p in protocols_data:
-            new_p = Protocol(
-                disease_name=p["n"], 
-                category=p.get("c", "General"),
-                keywords=p["k"], 
-                description=p["d"],
-                estim_type=p["et"], 
-                estim_params=p["ep"], 
-                estim_role=p["er"],
-                us_type=p["ut"], 
-                us_params=p["up"], 
-                us_role=p["ur"],
-                exercises_list=p["ex"], 
-                exercises_role=p["ex_r"],
-                ex_frequency=p.get("ef", "3x/week"),
-                ex_intensity=p.get("ei", "Moderate"),
-                evidence_level=p.get("ev", "Grade A"),
-                source_ref=p["src"], 
-                electrode_image=p["img"]
-            )
-            db.session.add(new_p)
-        
-        db.session.commit()
-        return "<h1>✅ System Reset & Data Updated!</h1><a href='/login'>Login</a>"
-    except Exception as e: return f"Error: {str(e)}"
+# تجهيز/مسح قاعدة البيانات مش من route: من السيرفر بس
+#   ADMIN_EMAIL=... ADMIN_PASSWORD=... python setup_db.py [--reset]
 # ==========================================
 # دالة استيراد ملف JSON المولد (للعمل على Render)
 # ==========================================
@@ -670,65 +1356,31 @@ def import_generated_json():
         
         added_count = 0
         updated_count = 0
+        started = time.perf_counter()
+        by_name = protocols_by_name(item.get('condition_name') for item in data_list)
 
         for item in data_list:
             # التحقق: هل المرض موجود مسبقاً؟
             d_name = item.get('condition_name')
-            existing = Protocol.query.filter_by(disease_name=d_name).first()
-            
-            # --- تنسيق التمارين كـ HTML ---
-            def format_exercises_html(ex_data):
-                html = ""
-                # ترتيب المراحل: 1 ثم 2 ثم 3
-                phases = ["phase_1", "phase_2", "phase_3"]
-                for p_key in phases:
-                    phase = ex_data.get(p_key)
-                    if phase:
-                        html += f"<h4>{phase.get('name', p_key.title())}: {phase.get('goal', '')}</h4>"
-                        html += "<ul>"
-                        for ex in phase.get('exercises', []):
-                            html += f"<li><b>{ex.get('name')}</b>: {ex.get('instructions')} <i>({ex.get('dosage')})</i></li>"
-                        html += "</ul><hr>"
-                return html
-
-            # --- تنسيق الملاحظات السريرية ---
-            def format_notes(notes_data):
-                if not notes_data: return ""
-                return f"Diagnosis: {notes_data.get('assessment_diagnosis','')}\n\nManual Therapy: {notes_data.get('manual_therapy','')}\n\nPrecautions: {notes_data.get('precautions','')}"
+            existing = by_name.get(d_name)
 
             # تحديد الكائن (تحديث أم جديد)
             if existing:
                 p = existing
                 updated_count += 1
             else:
-                p = Protocol()
+                p = by_name[d_name] = Protocol()
                 added_count += 1
             
             # --- تعبئة البيانات ---
-            p.disease_name = d_name
-            p.category = item.get('category', 'General')
-            p.description = item.get('clinical_presentation', {}).get('definition', '')
-            # توليد كلمات مفتاحية تلقائية
-            p.keywords = f"{d_name}, {p.category}, {p.description[:50]}" 
-            
-            # الأجهزة
-            electro = item.get('electrotherapy', [{}])[0] # نأخذ أول جهاز
-            p.estim_type = electro.get('type', 'TENS/FES')
-            p.estim_params = electro.get('parameters', 'See notes')
-            p.estim_role = electro.get('goal', 'Pain relief')
-            p.us_type = "Ultrasound/Other"
-            p.us_params = "Refer to clinical notes" # لأن الـ JSON يجمعهم
-            
-            # التمارين والمصادر
-            p.exercises_list = format_exercises_html(item.get('therapeutic_exercises', {}))
-            p.exercises_role = "Rehabilitation Progression"
-            p.source_ref = item.get('scientific_reference', 'Kisner & Colby')
-            p.notes = format_notes(item.get('clinical_notes', {}))
-            
+            for col, val in protocol_row_from_json(item).items():
+                setattr(p, col, val)
+
             if not existing:
                 db.session.add(p)
 
         db.session.commit()
+        record_import('generated_json', added_count + updated_count, time.perf_counter() - started)
         flash(f'Successfully Imported! Added: {added_count}, Updated: {updated_count}', 'success')
         return redirect(url_for('admin_dashboard'))
 
@@ -736,6 +1388,1134 @@ def import_generated_json():
         return "<h1>⚠️ Error: File 'final_physio_protocols.json' not found. Did you push it to GitHub?</h1>"
     except Exception as e:
         return f"<h1>❌ Error: {str(e)}</h1>"
+# ==========================================
+# تصدير PDF لأصحاب صلاحية الطباعة (can_print)
+# ==========================================
+# الصفحات بتتولد في threads منفصلة (مش في الـ request) وبتتخزن على الديسك حسب الـ revision
+# GET /export/pdf/<id>         => ملف بروتوكول واحد
+# GET|POST /export/pdf?ids=1,2 => ملف واحد مجمع، بيتبعت Streaming أول بأول
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or os.path.join(app.instance_path, 'pdf_cache')
+PDF_WAIT_SECONDS = float(os.environ.get('PDF_WAIT_SECONDS', 10))
+PDF_BATCH_MAX = int(os.environ.get('PDF_BATCH_MAX', 200))
+pdf_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('PDF_WORKERS', 2)), thread_name_prefix='pdf')
+_pdf_jobs = {}
+_pdf_jobs_lock = threading.Lock()
+
+def _pdf_cache_path(protocol_id, revision):
+    return os.path.join(PDF_CACHE_DIR, f"{protocol_id}-r{revision}.json")
+
+def _render_pdf_pages(protocol_id):
+    with app.app_context():
+        p = db.session.get(Protocol, protocol_id)
+        if p is None: return None
+        row = {c.name: getattr(p, c.name) for c in Protocol.__table__.columns}
+    pages = protocol_pages(row)
+
+    # التوليد ممكن ياخد وقت: لو البروتوكول اتعدل في النص فنسخة الـ revision الأحدث ممكن تكون اتكتبت خلاص
+    # => النسخة القديمة بترجع للي طلبها بس ومبتتكتبش، والمسح للـ revisions الأقدم من اللي معانا بس
+    with app.app_context():
+        current = db.session.query(Protocol.revision).filter(Protocol.id == protocol_id).scalar()
+    if current is None or row['revision'] < current: return pages
+
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    path = _pdf_cache_path(protocol_id, row['revision'])
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(pages, f)
+    os.replace(path + '.tmp', path)
+    prefix = f"{protocol_id}-r"
+    for name in os.listdir(PDF_CACHE_DIR):
+        revision = name[len(prefix):-len('.json')] if name.startswith(prefix) and name.endswith('.json') else ''
+        if revision.isdecimal() and int(revision) < row['revision']:
+            try: os.remove(os.path.join(PDF_CACHE_DIR, name))
+            except OSError: pass
+    return pages
+
+def pdf_pages_future(protocol_id, revision):
+    path = _pdf_cache_path(protocol_id, revision)
+    if os.path.exists(path):
+        future = Future()
+        with open(path, encoding='utf-8') as f:
+            future.set_result(json.load(f))
+        return future
+    key = (protocol_id, revision)
+    with _pdf_jobs_lock:
+        future = _pdf_jobs.get(key)
+        if future is None:
+            future = pdf_executor.submit(_render_pdf_pages, protocol_id)
+            _pdf_jobs[key] = future
+            future.add_done_callback(lambda _: _pdf_jobs.pop(key, None))
+    return future
+
+@event.listens_for(Protocol, 'after_update')
+def mark_pdf_stale(mapper, connection, target):
+    db.session.info.setdefault('pdf_stale', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def prerender_stale_pdfs(session):
+    # بنعيد توليد اللي كان ليه PDF قبل كده بس (البروتوكولات اللي بتتطبع فعلاً)
+    stale = session.info.pop('pdf_stale', None)
+    if not stale or not os.path.isdir(PDF_CACHE_DIR): return
+    cached = {name.split('-r')[0] for name in os.listdir(PDF_CACHE_DIR)}
+    for protocol_id in stale:
+        if str(protocol_id) in cached:
+            pdf_executor.submit(_render_pdf_pages, protocol_id)
+
+def print_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not (current_user.is_admin or current_user.can_print) or not user_has_access(current_user):
+            return "Printing is disabled for your account", 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.route('/export/pdf/<int:protocol_id>')
+@login_required
+@print_required
+def export_protocol_pdf(protocol_id):
+    row = db.session.query(Protocol.revision, Protocol.disease_name).filter(Protocol.id == protocol_id).first()
+    if row is None:
+        return "Protocol not found", 404
+    try:
+        pages = pdf_pages_future(protocol_id, row.revision).result(timeout=PDF_WAIT_SECONDS)
+    except FutureTimeout:
+        return "PDF is being prepared, please retry in a few seconds.", 202, {'Retry-After': '3'}
+    if pages is None:
+        return "Protocol not found", 404
+
+    filename = "".join(ch if ch.isalnum() else "_" for ch in row.disease_name).strip("_") or f"protocol_{protocol_id}"
+    return send_file(BytesIO(b"".join(build_pdf([pages]))), mimetype='application/pdf',
+                     download_name=f"{filename}.pdf", etag=f"pdf-{protocol_id}-{row.revision}")
+
+@app.route('/export/pdf', methods=['GET', 'POST'])
+@login_required
+@print_required
+def export_batch_pdf():
+    ids = []
+    for part in request.values.get('ids', '').split(','):
+        # isdigit() لوحدها بتقبل '²' وint() بيقع فيه => أرقام ASCII بس
+        part = part.strip()
+        if part.isascii() and part.isdigit() and int(part) not in ids: ids.append(int(part))
+    if not ids:
+        return "No protocol ids given", 400
+    if len(ids) > PDF_BATCH_MAX:
+        return f"At most {PDF_BATCH_MAX} protocols per export", 400
+
+    revisions = dict(db.session.query(Protocol.id, Protocol.revision).filter(Protocol.id.in_(ids)).all())
+    # كل البروتوكولات بتبدأ تتولد مع بعض، والملف بيتكتب بالترتيب أول ما كل واحد يخلص
+    futures = [pdf_pages_future(i, revisions[i]) for i in ids if i in revisions]
+    if not futures:
+        return "Protocol not found", 404
+
+    pages = (f.result() for f in futures)
+    return Response(build_pdf(p for p in pages if p), mimetype='application/pdf',
+                    headers={'Content-Disposition': 'attachment; filename=protocols.pdf'})
+
+# ==========================================
+# 4. REST API (JSON) للموبايل والتابلت
+# ==========================================
+# GET /api/protocols/<id>?fields=disease_name,estim_params
+# GET /api/protocols?q=knee&category=Orthopedics&page=<cursor>&limit=20
+# GET /api/protocols/by-params?q=TENS 80-120 Hz&match=overlap&page=<cursor>&limit=20
+# الدخول: Authorization: Bearer <token> من POST /api/token (أو session المتصفح العادية)
+API_TOKEN_MAX_AGE = int(os.environ.get('API_TOKEN_MAX_AGE', 30 * 24 * 3600))
+API_FIELDS = ('id', 'disease_name', 'category', 'keywords', 'description',
+              'estim_type', 'estim_params', 'estim_role', 'us_type', 'us_params', 'us_role',
+              'exercises_list', 'exercises_role', 'ex_frequency', 'ex_intensity', 'ex_progression',
+              'evidence_level', 'source_ref', 'electrode_image', 'video_link', 'notes', 'revision', 'updated_at')
+# الصورة (base64) تقيلة: مبترجعش غير لو اتطلبت بالاسم
+API_DETAIL_FIELDS = tuple(f for f in API_FIELDS if f != 'electrode_image')
+API_LIST_FIELDS = ('id', 'disease_name', 'category')
+API_PAGE_LIMIT = 100
+
+api_tokens = URLSafeTimedSerializer(app.secret_key, salt='api-token')
+
+def api_error(message, status):
+    return jsonify(error=message), status
+
+def password_fingerprint(user, purpose):
+    # بصمة للـ hash (HMAC بالـ secret_key) مش جزء منه: الـ payload بتاع itsdangerous متوقع بس مش متشفر
+    # تغيير الباسورد بيغير البصمة => كل التوكنات القديمة بتتلغي
+    digest = hmac.new(str(app.secret_key).encode(), f"{purpose}:{user.password}".encode(), hashlib.sha256)
+    return digest.hexdigest()[:16]
+
+def issue_api_token(user):
+    return api_tokens.dumps({'uid': user.id, 'pw': password_fingerprint(user, 'api-token')})
+
+def user_from_api_token(token):
+    try:
+        data = api_tokens.loads(token, max_age=API_TOKEN_MAX_AGE)
+    except (SignatureExpired, BadSignature):
+        return None
+    user = db.session.get(User, data.get('uid'))
+    if not user or not hmac.compare_digest(password_fingerprint(user, 'api-token'), str(data.get('pw'))): return None
+    return user
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        auth = request.headers.get('Authorization', '')
+        if auth.startswith('Bearer '):
+            user = user_from_api_token(auth[7:].strip())
+        else:
+            user = current_user if current_user.is_authenticated else None
+        if user is None:
+            return api_error('authentication required', 401)
+        if not user_has_access(user):
+            return api_error('subscription expired', 403)
+        g.api_user = user
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_fields(default):
+    raw = request.args.get('fields')
+    if not raw: return default, None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown: return None, api_error(f"unknown fields: {', '.join(unknown)}", 400)
+    return fields, None
+
+def api_row(row, fields):
+    item = {}
+    for f in fields:
+        value = getattr(row, f)
+        item[f] = value.isoformat() if isinstance(value, datetime) else value
+    return item
+
+def api_json(payload, etag=None):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag or hashlib.sha1(body).hexdigest()[:24])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    # الضغط بيحصل في CompressionMiddleware
+    return response.make_conditional(request)
+
+@app.route('/api/token', methods=['POST'])
+def api_token():
+    data = request.get_json(silent=True) or request.form
+    user = User.query.filter_by(email=data.get('email', '')).first()
+    if not user or not check_password_hash(user.password, data.get('password', '')):
+        return api_error('invalid credentials', 401)
+    if not user_has_access(user):
+        return api_error('subscription expired', 403)
+    return jsonify(token=issue_api_token(user), expires_in=API_TOKEN_MAX_AGE)
+
+@app.route('/api/protocols/<int:protocol_id>')
+@api_login_required
+def api_protocol(protocol_id):
+    fields, error = api_fields(API_DETAIL_FIELDS)
+    if error: return error
+
+    # الـ ETag من (id, revision, fields) => 304 من غير ما نحمل النصوص خالص
+    stamp = db.session.query(Protocol.revision).filter(Protocol.id == protocol_id).scalar()
+    if stamp is None:
+        return api_error('protocol not found', 404)
+    etag = hashlib.sha1(f"{protocol_id}:{stamp}:{','.join(fields)}".encode()).hexdigest()[:24]
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    row = db.session.query(*[getattr(Protocol, f) for f in fields]).filter(Protocol.id == protocol_id).first()
+    return api_json(api_row(row, fields), etag=etag)
+
+@app.route('/api/protocols')
+@api_login_required
+def api_protocols():
+    fields, error = api_fields(API_LIST_FIELDS)
+    if error: return error
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), API_PAGE_LIMIT)
+        after = int(request.args.get('page') or 0)
+    except ValueError:
+        return api_error('limit and page must be integers', 400)
+
+    # Keyset pagination على الـ id: الصفحة الجاية = بعد آخر id رجع (بدون OFFSET)
+    columns = [getattr(Protocol, f) for f in fields]
+    if 'id' not in fields: columns.append(Protocol.id)
+    query = db.session.query(*columns).filter(Protocol.id > after)
+    q = " ".join((request.args.get('q') or '').split())
+    if q:
+        term = f"%{q}%"
+        query = query.filter(Protocol.disease_name.ilike(term) | Protocol.keywords.ilike(term))
+    if request.args.get('category'):
+        query = query.filter(Protocol.category == request.args['category'])
+    search_started = time.perf_counter()
+    rows = query.order_by(Protocol.id).limit(limit + 1).all()
+    if q and not after:   # الصفحة الأولى بس = بحث واحد
+        log_search(q, 'hit' if rows else 'miss', search_started, g.api_user, source='api')
+
+    next_page = str(rows[limit - 1].id) if len(rows) > limit else None
+    return api_json({'items': [api_row(r, fields) for r in rows[:limit]], 'next_page': next_page})
+
+PARAM_MATCHES = ('overlap', 'within')
+
+@app.route('/api/protocols/by-params')
+@api_login_required
+def api_protocols_by_params():
+    # q: نوع الجهاز (اختياري) + قيمة أو أكتر بوحداتها: "TENS 80-120 Hz" / "US 1 MHz 1-1.5 W/cm2" / "NMES 200-300 us"
+    # match=overlap (الافتراضي): مدى البروتوكول بيتقاطع مع المطلوب (100 Hz و 50-150 Hz الاتنين بيطلعوا لـ 80-120)
+    # match=within: مدى البروتوكول كله جوه المطلوب
+    fields, error = api_fields(API_LIST_FIELDS)
+    if error: return error
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), API_PAGE_LIMIT)
+        after = int(request.args.get('page') or 0)
+    except ValueError:
+        return api_error('limit and page must be integers', 400)
+    match = request.args.get('match', 'overlap')
+    if match not in PARAM_MATCHES:
+        return api_error(f"match must be one of: {', '.join(PARAM_MATCHES)}", 400)
+    kind, values = parse_query(request.args.get('q', ''))
+    kind = (request.args.get('modality') or kind or '').upper() or None
+    if not values:
+        return api_error("q needs at least one value with a unit, e.g. 'TENS 80-120 Hz'", 400)
+
+    # قيمة واحدة = subquery واحدة على الـ index، والأكتر من قيمة = INTERSECT (البروتوكول لازم يطابق الكل)
+    table = ProtocolParam.__table__
+    matching = []
+    for v in values:
+        ranged = ((table.c.low <= v['high']) & (table.c.high >= v['low']) if match == 'overlap'
+                  else (table.c.low >= v['low']) & (table.c.high <= v['high']))
+        condition = and_(table.c.param == v['param'], table.c.unit == v['unit'], ranged)
+        if kind: condition = and_(condition, table.c.modality == kind)
+        matching.append((condition, select(table.c.protocol_id).where(condition)))
+    ids = matching[0][1] if len(matching) == 1 else matching[0][1].intersect(*[m[1] for m in matching[1:]])
+
+    columns = [getattr(Protocol, f) for f in fields]
+    if 'id' not in fields: columns.append(Protocol.id)
+    rows = (db.session.query(*columns).filter(Protocol.id.in_(ids), Protocol.id > after)
+            .order_by(Protocol.id).limit(limit + 1).all())
+    page = rows[:limit]
+
+    # القيم اللي طابقت في كل بروتوكول (عشان التطبيق يعرضها من غير ما يقرا النص)
+    matched = {}
+    if page:
+        hits = db.session.execute(
+            select(table.c.protocol_id, table.c.source, table.c.modality, table.c.param, table.c.unit, table.c.low, table.c.high)
+            .where(table.c.protocol_id.in_([r.id for r in page]), or_(*[c for c, _ in matching]))
+            .order_by(table.c.protocol_id, table.c.id))
+        for h in hits:
+            matched.setdefault(h.protocol_id, []).append(
+                {'source': h.source, 'modality': h.modality, 'param': h.param, 'unit': h.unit, 'low': h.low, 'high': h.high})
+
+    next_page = str(rows[limit - 1].id) if len(rows) > limit else None
+    return api_json({'modality': kind, 'match': match,
+                     'query': [{k: v[k] for k in ('param', 'unit', 'low', 'high')} for v in values],
+                     'items': [dict(api_row(r, fields), matched=matched.get(r.id, [])) for r in page],
+                     'next_page': next_page})
+
+# ==========================================
+# 5. المكتبة الأوفلاين (Service Worker + IndexedDB في static/library.js)
+# ==========================================
+# GET /api/library/bundle            => كل البروتوكولات (gzip) + رقم النسخة
+# GET /api/library/changes?since=<v> => اللي اتغير بعد النسخة v بس (410 = حمّل الـ bundle من الأول)
+# النسخة = آخر id في LibraryChange، والصفوف بتترجع كـ arrays بترتيب "fields" (أصغر بكتير من objects)
+LIBRARY_FIELDS = API_DETAIL_FIELDS
+LIBRARY_DIR = os.environ.get('LIBRARY_DIR') or os.path.join(app.instance_path, 'library')
+LIBRARY_DELTA_MAX = int(os.environ.get('LIBRARY_DELTA_MAX', 2000))
+_library_lock = threading.Lock()
+
+def library_version():
+    return db.session.query(func.max(LibraryChange.id)).scalar() or 0
+
+def library_rows(*criteria):
+    rows = db.session.query(*[getattr(Protocol, f) for f in LIBRARY_FIELDS]).filter(*criteria).order_by(Protocol.id)
+    return [list(api_row(r, LIBRARY_FIELDS).values()) for r in rows]
+
+def library_bundle_path(version):
+    # ملف مضغوط واحد لكل نسخة على الديسك: كل الـ workers بيشاركوه وبيتبني مرة واحدة
+    path = os.path.join(LIBRARY_DIR, f"bundle-v{version}.json.gz")
+    if os.path.exists(path): return path
+    with _library_lock:
+        if os.path.exists(path): return path
+        payload = {'version': version, 'fields': LIBRARY_FIELDS, 'protocols': library_rows()}
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        os.makedirs(LIBRARY_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(gzip.compress(body, 9))
+        os.replace(tmp, path)
+        for name in os.listdir(LIBRARY_DIR):
+            if name.startswith('bundle-v') and name.endswith('.json.gz') and name != os.path.basename(path):
+                try: os.remove(os.path.join(LIBRARY_DIR, name))
+                except OSError: pass
+    return path
+
+@app.route('/api/library/bundle')
+@api_login_required
+def api_library_bundle():
+    # النسخة قبل الصفوف: لو حصل تعديل في النص، الـ changes الجاية هتعيده (الـ upsert مبيضرش)
+    version = library_version()
+    etag = f"library-v{version}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        with open(library_bundle_path(version), 'rb') as f:
+            data = f.read()
+        response = app.response_class(mimetype='application/json')
+        if 'gzip' in request.accept_encodings:
+            response.set_data(data)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response.set_data(gzip.decompress(data))
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/library/changes')
+@api_login_required
+def api_library_changes():
+    try:
+        since = int(request.args.get('since', ''))
+    except ValueError:
+        return api_error('since must be an integer', 400)
+    version = library_version()
+    if since > version:
+        # قاعدة البيانات اتعملها reset بعد آخر sync
+        return api_error('library was reset, download the bundle again', 410)
+
+    changes = db.session.query(LibraryChange.protocol_id).distinct().filter(
+        LibraryChange.id > since, LibraryChange.id <= version)
+    changed = [pid for (pid,) in changes.limit(LIBRARY_DELTA_MAX + 1)]
+    if len(changed) > LIBRARY_DELTA_MAX:
+        return api_error('too many changes, download the bundle again', 410)
+
+    # الصفوف في query واحدة (subquery) مهما كان عدد التغييرات
+    rows = library_rows(Protocol.id.in_(changes.subquery().select())) if changed else []
+    present = {row[0] for row in rows}
+    return api_json({'version': version, 'since': since, 'fields': LIBRARY_FIELDS, 'upserted': rows,
+                     'deleted': sorted(set(changed) - present)}, etag=f"library-{since}-{version}")
+
+@app.route('/api/library/synonyms')
+@api_login_required
+def api_library_synonyms():
+    # نفس المرادفات اللي السيرفر بيستخدمها (بعد normalize) => البحث المحلي بيطلع نفس النتيجة
+    return api_json({'synonyms': search_synonyms.mapping()})
+
+@app.route('/api/library/searches', methods=['POST'])
+@api_login_required
+def api_library_searches():
+    # البحث المحلي لقى نتيجة من غير request => بيتسجل هنا في الخلفية عشان إحصائيات البحث
+    data = request.get_json(silent=True) or {}
+    query, protocol_id = data.get('query'), data.get('protocol_id')
+    if not isinstance(query, str) or not query.strip() or not isinstance(protocol_id, int) or isinstance(protocol_id, bool):
+        return api_error('query (string) and protocol_id (integer) are required', 400)
+    log_search(" ".join(query.split()), 'hit', time.perf_counter(), g.api_user, protocol_id=protocol_id, source='local')
+    return '', 204
+
+@app.route('/sw.js')
+def service_worker():
+    # من الـ root عشان الـ scope يغطي الموقع كله
+    response = send_from_directory(app.static_folder, 'sw.js', mimetype='application/javascript', max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# ==========================================
+# 6. المراقبة: /metrics (Prometheus) + /admin/profiles
+# ==========================================
+# الدخول: أدمن مسجل، أو Authorization: Bearer <METRICS_TOKEN> للـ scraper
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # قالب الـ route مش الرابط نفسه (/admin/edit/<int:id>) عشان عدد السلاسل يفضل محدود
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.inc('http_requests_total', route=route, method=request.method, status=response.status_code)
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started, route=route)
+    return response
+
+# --- Profiling لـ request واحد للأدمن: ?_profile=1 أو X-Profile: 1 (profiler.py) ---
+request_profiler = RequestProfiler(
+    app,
+    directory=os.environ.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles'),
+    keep=int(os.environ.get('PROFILE_KEEP', 50)),
+    is_allowed=lambda: current_user.is_authenticated and current_user.is_admin,
+)
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    return render_template('profiles.html', captures=request_profiler.captures())
+
+@app.route('/admin/profiles/<filename>')
+@admin_required
+def download_profile(filename):
+    path = request_profiler.path(filename)
+    if path is None:
+        return "Profile not found", 404
+    # .prof: python -m pstats <file>  أو  snakeviz <file>
+    return send_file(path, as_attachment=filename.endswith('.prof'), max_age=0)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    auth = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(auth, f"Bearer {METRICS_TOKEN}")
+    if not token_ok and not (current_user.is_authenticated and current_user.is_admin):
+        return "Admin access required", 403
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ==========================================
+# 7. Snapshot البحث المشترك بين الـ workers (library_snapshot.py + gunicorn.conf.py)
+# ==========================================
+# gunicorn بـ preload_app: الـ master بيبني الـ snapshot مرة واحدة قبل الـ fork والـ workers بيشاركوه
+# الـ generation = library_version()، وأي worker بيطبق التغييرات الجديدة في overlay صغير خاص بيه
+LIBRARY_SNAPSHOT_CHECK_SECONDS = float(os.environ.get('LIBRARY_SNAPSHOT_CHECK_SECONDS', 2))
+
+def snapshot_rows(ids=None):
+    query = db.session.query(Protocol.id, Protocol.disease_name, Protocol.keywords, Protocol.category)
+    if ids is not None: query = query.filter(Protocol.id.in_(ids))
+    return query.order_by(Protocol.id).all()
+
+def snapshot_changes(since, until):
+    changes = db.session.query(LibraryChange.protocol_id).distinct().filter(
+        LibraryChange.id > since, LibraryChange.id <= until)
+    return [pid for (pid,) in changes.limit(LIBRARY_DELTA_MAX + 1)]
+
+library_snapshot = LibrarySnapshot(snapshot_rows, library_version, snapshot_changes,
+                                   check_seconds=LIBRARY_SNAPSHOT_CHECK_SECONDS, overlay_max=LIBRARY_DELTA_MAX,
+                                   normalize=normalize_search)
+
+def preload_library_snapshot():
+    # بتتنادى من gunicorn.conf.py في الـ master قبل الـ fork
+    with app.app_context():
+        try:
+            library_snapshot.build()
+        except Exception as e:
+            print(f"⚠️ Library snapshot skipped (search uses the database): {e}")
+            return None
+        finally:
+            # مفيش connection مفتوحة تتورث للـ workers
+            db.session.remove()
+            db.engine.dispose()
+    library_snapshot.freeze()
+    return library_snapshot.stats()
+
+metrics.gauge('process_memory_bytes', "Worker memory by kind (rss, pss, shared, private) from /proc/self/smaps_rollup.")
+metrics.gauge('library_snapshot_rows', "Protocols in the shared search snapshot.")
+metrics.gauge('library_snapshot_overlay_rows', "Protocols changed since the snapshot was built (per worker).")
+metrics.gauge('library_snapshot_generation', "Library version the worker's snapshot is at.")
+
+@metrics.collector
+def collect_process_metrics():
+    pid = os.getpid()
+    for kind, value in process_memory().items():
+        metrics.set('process_memory_bytes', value, kind=kind, pid=pid)
+    if library_snapshot.ready:
+        stats = library_snapshot.stats()
+        metrics.set('library_snapshot_rows', stats['rows'], pid=pid)
+        metrics.set('library_snapshot_overlay_rows', stats['overlay'], pid=pid)
+        metrics.set('library_snapshot_generation', stats['generation'], pid=pid)
+
+# ==========================================
+# 8. المرادفات والاختصارات (search_keys.py)
+# ==========================================
+# بتتحمل مرة واحدة لكل worker في dict، والـ workers التانية بتاخد التعديل خلال SYNONYM_RELOAD_SECONDS
+search_synonyms = SynonymMap(
+    lambda: db.session.query(SearchSynonym.term, SearchSynonym.expansion).all(),
+    reload_seconds=float(os.environ.get('SYNONYM_RELOAD_SECONDS', 60)),
+)
+
+@app.route('/admin/synonyms', methods=['GET', 'POST'])
+@admin_required
+def admin_synonyms():
+    if request.method == 'POST':
+        term = " ".join(request.form.get('term', '').split())
+        expansion = " ".join(request.form.get('expansion', '').split())
+        if not normalize_search(term) or not normalize_search(expansion):
+            flash('Both the term and what it means are required', 'danger')
+        elif SearchSynonym.query.filter_by(term=term).first():
+            flash(f'"{term}" already exists', 'warning')
+        else:
+            db.session.add(SearchSynonym(term=term, expansion=expansion))
+            db.session.commit()
+            search_synonyms.invalidate()
+            flash(f'Added: {term} => {expansion}', 'success')
+        return redirect(url_for('admin_synonyms'))
+    synonyms = SearchSynonym.query.order_by(SearchSynonym.term).all()
+    return render_template('synonyms.html', synonyms=synonyms, normalize=normalize_search)
+
+@app.route('/admin/synonyms/delete/<int:id>')
+@admin_required
+def delete_synonym(id):
+    synonym = SearchSynonym.query.get_or_404(id)
+    db.session.delete(synonym)
+    db.session.commit()
+    search_synonyms.invalidate()
+    flash('Synonym Deleted', 'warning')
+    return redirect(url_for('admin_synonyms'))
+
+# ==========================================
+# 9. تصفح التصنيفات
+# ==========================================
+# العدد من category_count (بيتحدث مع الكتابة)، والقائمة keyset على index (category, id)
+CATEGORY_PAGE_SIZE = 30
+
+def category_counts():
+    return db.session.query(CategoryCount.category, CategoryCount.protocols).filter(
+        CategoryCount.protocols > 0).order_by(CategoryCount.category).all()
+
+@app.route('/categories')
+@login_required
+def browse_categories():
+    if not user_has_access(current_user):
+        return redirect(url_for('subscription_expired'))
+    return render_template('categories.html', categories=category_counts(), category=None, user=current_user)
+
+@app.route('/categories/<path:name>')
+@login_required
+def browse_category(name):
+    if not user_has_access(current_user):
+        return redirect(url_for('subscription_expired'))
+    after = request.args.get('after', 0, type=int)
+    total = db.session.query(CategoryCount.protocols).filter(CategoryCount.category == name).scalar()
+    if not total:
+        return "Category not found", 404
+    rows = db.session.query(Protocol.id, Protocol.disease_name).filter(
+        Protocol.category == name, Protocol.id > after).order_by(Protocol.id).limit(CATEGORY_PAGE_SIZE + 1).all()
+    next_after = rows[CATEGORY_PAGE_SIZE - 1].id if len(rows) > CATEGORY_PAGE_SIZE else None
+    return render_template('categories.html', category=name, total=total, protocols=rows[:CATEGORY_PAGE_SIZE],
+                           next_after=next_after, first_page=not after, user=current_user)
+
+@app.route('/api/categories')
+@api_login_required
+def api_categories():
+    # القائمة نفسها: /api/protocols?category=<name>&page=<next_page>
+    return api_json({'categories': [{'name': c, 'count': n} for c, n in category_counts()]})
+
+# ==========================================
+# 10. بروتوكولات مشابهة (related.py)
+# ==========================================
+# الجدول: أقرب RELATED_K بروتوكول لكل بروتوكول بالترتيب
+# الحساب بره الـ web workers: setup_db.py بعد الـ import، و flask refresh-related (مرة، أو --every في process لوحده)
+class RelatedProtocol(db.Model):
+    protocol_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    related_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+RELATED_FIELDS = ('disease_name', 'keywords', 'description', 'estim_type', 'us_type', 'exercises_role')
+
+def related_protocols(protocol_id):
+    # الـ join بيخفي أي بروتوكول اتمسح لحد ما الحساب الجاي يشيله
+    return db.session.query(Protocol.id, Protocol.disease_name).join(
+        RelatedProtocol, RelatedProtocol.related_id == Protocol.id).filter(
+        RelatedProtocol.protocol_id == protocol_id).order_by(RelatedProtocol.rank).all()
+
+def related_rows(ids=None):
+    columns = [Protocol.id, Protocol.category] + [getattr(Protocol, f) for f in RELATED_FIELDS]
+    if ids is None:
+        chunks = [db.session.query(*columns).order_by(Protocol.id)]
+    else:
+        ids = list(ids)
+        chunks = [db.session.query(*columns).filter(Protocol.id.in_(ids[i:i + 500])) for i in range(0, len(ids), 500)]
+    return [(r[0], r[1], dict(zip(RELATED_FIELDS, r[2:]))) for chunk in chunks for r in chunk]
+
+def related_changes(since, until):
+    # تغييرات كتير (import كبير) => حساب كامل أسرع من الجزئي
+    ids = snapshot_changes(since, until)
+    return None if len(ids) > LIBRARY_DELTA_MAX else ids
+
+def write_related(adjacency, removed, full):
+    table = RelatedProtocol.__table__
+    with db.engine.begin() as conn:
+        if full:
+            conn.execute(table.delete())
+        else:
+            ids = list(adjacency) + list(removed)
+            for i in range(0, len(ids), 500):
+                conn.execute(table.delete().where(table.c.protocol_id.in_(ids[i:i + 500])))
+        rows = [{'protocol_id': pid, 'rank': rank, 'related_id': rid, 'score': score}
+                for pid, pairs in adjacency.items() for rank, (rid, score) in enumerate(pairs)]
+        if rows: conn.execute(table.insert(), rows)
+
+related_job = RelatedJob(
+    os.environ.get('RELATED_DIR') or os.path.join(app.instance_path, 'related'),
+    load_rows=related_rows,
+    load_version=library_version,
+    load_changes=related_changes,
+    write=write_related,
+    identity=app.config['SQLALCHEMY_DATABASE_URI'],
+    k=int(os.environ.get('RELATED_K', 8)),
+    max_terms=int(os.environ.get('RELATED_MAX_TERMS', 4096)),
+)
+
+@app.cli.command('refresh-related')
+@click.option('--full', is_flag=True, help="recompute every protocol instead of the changed ones")
+@click.option('--every', type=float, default=0, metavar='SECONDS', help="keep running, checking for changes every SECONDS")
+def refresh_related_command(full, every):
+    """Recompute related protocols for the rows changed since the last run."""
+    while True:
+        started = time.perf_counter()
+        try:
+            updated = related_job.run(full=full)
+            if updated or not every:
+                print(f"🔗 Related protocols refreshed for {updated} protocols in {time.perf_counter() - started:.2f}s", flush=True)
+        except Exception as e:
+            if not every: raise
+            print(f"⚠️ Related protocols refresh failed: {e}", flush=True)
+        finally:
+            db.session.remove()
+        if not every: return
+        full = False
+        time.sleep(every)
+
+# ==========================================
+# 11. الإيميلات: طابور في قاعدة البيانات + thread بيبعت (mail_queue.py)
+# ==========================================
+# MAIL_SERVER مش متحدد => الرسايل بتفضل في الطابور لحد ما يتحدد (مفيش إرسال لـ localhost بالغلط)
+app.config.update(
+    MAIL_SERVER=os.environ.get('MAIL_SERVER', 'localhost'),
+    MAIL_PORT=int(os.environ.get('MAIL_PORT', 587)),
+    MAIL_USE_TLS=os.environ.get('MAIL_USE_TLS', '1') == '1',
+    MAIL_USE_SSL=os.environ.get('MAIL_USE_SSL') == '1',
+    MAIL_USERNAME=os.environ.get('MAIL_USERNAME'),
+    MAIL_PASSWORD=os.environ.get('MAIL_PASSWORD'),
+    MAIL_DEFAULT_SENDER=os.environ.get('MAIL_DEFAULT_SENDER', 'Physio Expert <physioexpert8@gmail.com>'),
+    MAIL_MAX_EMAILS=None,
+)
+mail = Mail(app)
+
+PASSWORD_RESET_MAX_AGE = int(os.environ.get('PASSWORD_RESET_MAX_AGE', 3600))
+PASSWORD_RESET_INTERVAL = int(os.environ.get('PASSWORD_RESET_INTERVAL', 120))  # إيميل واحد كل دقيقتين لنفس الحساب
+password_reset_tokens = URLSafeTimedSerializer(app.secret_key, salt='password-reset')
+
+class OutboundEmail(db.Model):
+    # الطابور: queued => sending (محجوزة لـ worker لحد lease_until) => sent / failed
+    __table_args__ = (db.Index('ix_outbound_email_ready', 'status', 'next_attempt_at'),
+                      db.Index('ix_outbound_email_to_kind', 'to_addr', 'kind', 'created_at'))
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    to_addr = db.Column(db.String(150), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body_text = db.Column(db.Text, nullable=False)
+    body_html = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lease_until = db.Column(db.DateTime)
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+def password_reset_token(user):
+    # زي توكن الـ API: بصمة الـ hash => اللينك بيتلغي أول ما الباسورد يتغير (استخدام واحد)
+    return password_reset_tokens.dumps({'uid': user.id, 'pw': password_fingerprint(user, 'password-reset')})
+
+def user_from_reset_token(token):
+    try:
+        data = password_reset_tokens.loads(token, max_age=PASSWORD_RESET_MAX_AGE)
+    except (SignatureExpired, BadSignature):
+        return None
+    user = db.session.get(User, data.get('uid'))
+    if not user or not user.is_active: return None
+    if not hmac.compare_digest(password_fingerprint(user, 'password-reset'), str(data.get('pw'))): return None
+    return user
+
+def recent_email(to_addr, kind, seconds):
+    since = datetime.utcnow() - timedelta(seconds=seconds)
+    return db.session.query(OutboundEmail.id).filter(
+        OutboundEmail.to_addr == to_addr, OutboundEmail.kind == kind, OutboundEmail.created_at > since).first() is not None
+
+def enqueue_email(to_addr, kind, subject, **context):
+    # بيتكتب مع الـ transaction بتاعة الـ request (بيتبعت بس لو الـ commit نجح) - الإرسال نفسه في الخلفية
+    db.session.add(OutboundEmail(
+        kind=kind, to_addr=to_addr, subject=subject,
+        body_text=render_template(f"email/{kind}.txt", **context),
+        body_html=render_template(f"email/{kind}.html", **context)))
+    db.session.info['mail_queued'] = True
+    metrics.inc('mail_queued_total', kind=kind)
+
+@event.listens_for(db.session, 'after_commit')
+def wake_mail_queue(session):
+    if session.info.pop('mail_queued', False):
+        mail_queue.wake()
+
+def claim_outbound_email(limit, lease_seconds):
+    # UPDATE واحدة بتحجز الدفعة: الشرط متكرر بره الـ subquery عشان worker تاني في نفس اللحظة
+    # (Postgres بيعيد تقييمه على الصف بعد ما الـ lock يتفك) ميحجزش نفس الرسايل
+    now = datetime.utcnow()
+    token = secrets.token_hex(8)
+    table = OutboundEmail.__table__
+    ready = or_(and_(table.c.status == 'queued', table.c.next_attempt_at <= now),
+                and_(table.c.status == 'sending', table.c.lease_until < now))
+    batch = select(table.c.id).where(ready).order_by(table.c.id).limit(limit)
+    db.session.execute(update(table).where(table.c.id.in_(batch), ready)
+                       .values(status='sending', lease_until=now + timedelta(seconds=lease_seconds), claim_token=token))
+    db.session.commit()
+    rows = db.session.execute(select(table).where(table.c.claim_token == token, table.c.status == 'sending')
+                              .order_by(table.c.id)).all()
+    db.session.commit()
+    return rows
+
+def finish_outbound_email(sent, failures):
+    now = datetime.utcnow()
+    table = OutboundEmail.__table__
+    if sent:
+        db.session.execute(update(table).where(table.c.id.in_([r.id for r in sent]))
+                           .values(status='sent', sent_at=now, attempts=table.c.attempts + 1, lease_until=None, last_error=None))
+    if failures:
+        db.session.execute(update(table).where(table.c.id == bindparam('b_id')).values(
+            status=bindparam('b_status'), attempts=table.c.attempts + 1, next_attempt_at=bindparam('b_next'),
+            last_error=bindparam('b_error'), lease_until=None),
+            [{'b_id': row.id, 'b_status': 'queued' if retry_at else 'failed', 'b_next': retry_at or now,
+              'b_error': f"{type(error).__name__}: {error}"[:500]} for row, error, retry_at in failures])
+    db.session.commit()
+    for row in sent:
+        metrics.inc('mail_messages_total', result='sent', kind=row.kind)
+        metrics.observe('mail_delivery_delay_seconds', (now - row.created_at).total_seconds())
+    for row, _, retry_at in failures:
+        metrics.inc('mail_messages_total', result='retry' if retry_at else 'failed', kind=row.kind)
+
+def smtp_connection():
+    metrics.inc('mail_smtp_connections_total')
+    return mail.connect()
+
+def outbound_message(row):
+    return Message(row.subject, recipients=[row.to_addr], body=row.body_text, html=row.body_html)
+
+metrics.counter('mail_queued_total', "Emails added to the outbound queue by kind.")
+metrics.counter('mail_messages_total', "Outbound email delivery attempts by result (sent, retry, failed) and kind.")
+metrics.counter('mail_smtp_connections_total', "SMTP connections opened by the mail queue (one is reused per batch).")
+metrics.histogram('mail_delivery_delay_seconds', "Time from queueing an email to the SMTP server accepting it.")
+
+mail_queue = MailQueue(
+    claim=claim_outbound_email,
+    finish=finish_outbound_email,
+    connect=smtp_connection,
+    build_message=outbound_message,
+    batch_size=int(os.environ.get('MAIL_BATCH_SIZE', 20)),
+    poll_seconds=float(os.environ.get('MAIL_POLL_SECONDS', 30)),
+    idle_seconds=float(os.environ.get('MAIL_IDLE_SECONDS', 30)),
+    max_attempts=int(os.environ.get('MAIL_MAX_ATTEMPTS', 6)),
+    backoff=(float(os.environ.get('MAIL_RETRY_SECONDS', 30)), 3600),
+    enabled='MAIL_SERVER' in os.environ,
+    context=app.app_context,
+)
+
+@app.before_request
+def start_mail_queue():
+    # أول request في كل worker: الـ thread يبدأ ويبعت اللي فاضل في الطابور (إعادة المحاولات)
+    mail_queue.start()
+
+@app.cli.command('drain-mail')
+def drain_mail_command():
+    """Send everything due in the outbound email queue now (cron or debugging)."""
+    print(f"📧 Mail queue: {mail_queue.drain()}")
+    counts = db.session.query(OutboundEmail.status, func.count()).group_by(OutboundEmail.status).all()
+    print(f"📬 Queue status: {dict(counts)}")
+
+# ==========================================
+# 12. النسخ الاحتياطي وقت التشغيل (backups.py)
+# ==========================================
+BACKUP_DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+metrics.counter('backups_total', "Backups by result (ok, failed) and label (scheduled, manual, pre-restore).")
+metrics.histogram('backup_duration_seconds', "Time to copy, verify and compress a backup.", buckets=BACKUP_DURATION_BUCKETS)
+metrics.gauge('backup_size_bytes', "Compressed size of the latest backup.")
+metrics.gauge('backup_last_success_timestamp_seconds', "Unix time of the latest successful backup.")
+
+def record_backup(result, error):
+    if error is not None:
+        metrics.inc('backups_total', result='failed', label='unknown')
+        return
+    metrics.inc('backups_total', result='ok', label=result['label'])
+    metrics.observe('backup_duration_seconds', result['seconds'])
+    metrics.set('backup_size_bytes', result['bytes'])
+    metrics.set('backup_last_success_timestamp_seconds', time.time())
+
+def backup_database_url():
+    # المسار اللي Flask-SQLAlchemy حله فعلاً (sqlite:///physio.db => instance/physio.db)
+    with app.app_context():
+        return db.engine.url.render_as_string(hide_password=False)
+
+backups = BackupManager(
+    database_url=backup_database_url,
+    # SQLite: مجلد backups جنب ملف القاعدة / Postgres: instance/backups
+    directory=os.environ.get('BACKUP_DIR') or (None if db_url.startswith('sqlite') else os.path.join(app.instance_path, 'backups')),
+    keep=int(os.environ.get('BACKUP_KEEP', 7)),
+    interval_seconds=float(os.environ.get('BACKUP_INTERVAL_HOURS', 24)) * 3600,   # 0 = النسخ اليدوي بس
+    pages_per_step=int(os.environ.get('BACKUP_PAGES_PER_STEP', 256)),
+    step_sleep=float(os.environ.get('BACKUP_STEP_SLEEP', 0.005)),
+    on_backup=record_backup,
+    context=app.app_context,
+)
+
+@app.before_request
+def start_backups():
+    backups.start()
+
+@app.route('/admin/backups', methods=['GET', 'POST'])
+@admin_required
+def admin_backups():
+    if request.method == 'POST':
+        backups.trigger()
+        flash('Backup started in the background - refresh in a moment to see it.', 'success')
+        return redirect(url_for('admin_backups'))
+    try:
+        entries, error = backups.list(), None
+        due = backups.seconds_until_due() if backups.interval_seconds > 0 else None
+    except (OSError, RuntimeError) as e:
+        entries, due, error = [], None, str(e)
+    return render_template('backups.html', backups=entries, error=error, keep=backups.keep,
+                           interval_hours=backups.interval_seconds / 3600,
+                           next_due=datetime.utcnow() + timedelta(seconds=max(0, due)) if due is not None else None)
+
+@app.route('/admin/backups/<name>')
+@admin_required
+def download_backup(name):
+    try:
+        path = backups.find(name, external=False)
+    except FileNotFoundError:
+        return "Backup not found", 404
+    return send_file(path, as_attachment=True, max_age=0)
+
+@app.cli.command('backup-db')
+@click.option('--label', default='manual', type=click.Choice(['manual', 'scheduled']))
+def backup_db_command(label):
+    """Take a compressed online backup of the database now (and rotate old ones)."""
+    result = backups.backup(label)
+    print(f"💾 {result['name']}: {result['bytes']} bytes in {result['seconds']} s "
+          f"({result.get('mode')}, {result.get('restarts', 0)} restarts)")
+    if result['removed']: print(f"🧹 Rotated out: {', '.join(result['removed'])}")
+
+@app.cli.command('list-backups')
+def list_backups_command():
+    """List backups, newest first."""
+    for b in backups.list():
+        print(f"{b['name']}  {b['bytes']:>12} bytes  {b.get('seconds', '?')} s")
+
+@app.cli.command('restore-db')
+@click.argument('name')
+@click.option('--no-safety-backup', is_flag=True, help="Don't back up the current database first.")
+@click.confirmation_option(prompt="Replace the current database with this backup?")
+def restore_db_command(name, no_safety_backup):
+    """Restore a backup (name from list-backups, or a path to a .db.gz/.dump file)."""
+    result = backups.restore(name, safety_backup=not no_safety_backup)
+    if result['safety_backup']: print(f"💾 Current database saved as {result['safety_backup']}")
+    print(f"✅ Restored {result['restored']} in {result['seconds']} s - restart the app workers "
+          f"so caches and the search snapshot are rebuilt.")
+
+# ==========================================
+# 13. سجل البحث + تقرير الأدمن (search_log.py)
+# ==========================================
+# outcome: hit (موجود عندنا) / miss (API من غير نتيجة) / ai (الذكاء الاصطناعي جاوب) / ai_failure / ai_limited
+# term = الكلمة بعد normalize_search (نفس مفتاح البحث) => "خشونه الركبه" و"خشونة الركبة" نفس الصف في التقرير
+SEARCH_LOG_RETENTION_DAYS = int(os.environ.get('SEARCH_LOG_RETENTION_DAYS', 90))
+SEARCH_REPORT_DAYS = (1, 7, 30, 90)
+SEARCH_REPORT_ROWS = 25
+
+class SearchEvent(db.Model):
+    __tablename__ = 'search_event'
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    term = db.Column(db.String(200), nullable=False)
+    outcome = db.Column(db.String(16), nullable=False)
+    protocol_id = db.Column(db.Integer)                 # من غير FK: السجل بيفضل لو البروتوكول اتمسح
+    latency_ms = db.Column(db.Float)
+    tier = db.Column(db.String(16))                     # trial / subscriber / admin (ai_tier)
+    source = db.Column(db.String(8), nullable=False, default='web')
+    # التقرير كله range scan على الفترة من الـ index ده (من غير ما يلمس الجدول) والمسح القديم كمان
+    __table_args__ = (db.Index('ix_search_event_report', 'created_at', 'outcome', 'term'),)
+
+SEARCH_EVENT_COLUMNS = ('created_at', 'term', 'outcome', 'protocol_id', 'latency_ms', 'tier', 'source')
+
+def log_search(query, outcome, started, user, protocol_id=None, source='web'):
+    term = (normalize_search(query) or query.lower())[:200]
+    search_log.record((datetime.utcnow(), term, outcome, protocol_id,
+                       round((time.perf_counter() - started) * 1000, 2), ai_tier(user), source))
+
+def write_search_events(rows):
+    # connection منفصلة عن الـ session (الـ thread مبيلمسش session حد تاني)
+    with db.engine.begin() as conn:
+        conn.execute(SearchEvent.__table__.insert(), [dict(zip(SEARCH_EVENT_COLUMNS, r)) for r in rows])
+
+def prune_search_events(days=None, batch=5000):
+    # على دفعات: كل DELETE قصير (الكتابة في SQLite واحدة في المرة)
+    cutoff = datetime.utcnow() - timedelta(days=days or SEARCH_LOG_RETENTION_DAYS)
+    table = SearchEvent.__table__
+    removed = 0
+    while True:
+        oldest = select(table.c.id).where(table.c.created_at < cutoff).order_by(table.c.created_at).limit(batch)
+        with db.engine.begin() as conn:
+            count = conn.execute(table.delete().where(table.c.id.in_(oldest.scalar_subquery()))).rowcount
+        removed += count
+        if count < batch: break
+    if removed: metrics.inc('search_log_pruned_total', removed)
+    return removed
+
+def record_search_log_flush(written, dropped, seconds):
+    metrics.inc('search_log_events_total', written, result='written')
+    if dropped: metrics.inc('search_log_events_total', dropped, result='dropped')
+    metrics.observe('search_log_flush_seconds', seconds)
+
+metrics.counter('search_log_events_total', "Search log rows written to search_event, or dropped when the buffer overflowed.")
+metrics.counter('search_log_pruned_total', "Search log rows deleted by retention pruning.")
+metrics.histogram('search_log_flush_seconds', "Time to write one buffered batch of search log rows.", buckets=WAIT_BUCKETS)
+metrics.gauge('search_log_buffered', "Search log rows waiting in the worker's buffer.")
+
+@metrics.collector
+def collect_search_log_metrics():
+    metrics.set('search_log_buffered', search_log.pending(), pid=os.getpid())
+
+search_log = SearchLog(
+    write=write_search_events,
+    prune=prune_search_events,
+    flush_seconds=float(os.environ.get('SEARCH_LOG_FLUSH_SECONDS', 5)),
+    batch_size=int(os.environ.get('SEARCH_LOG_BATCH', 500)),
+    max_buffer=int(os.environ.get('SEARCH_LOG_MAX_BUFFER', 20000)),
+    enabled=os.environ.get('SEARCH_LOG', '1') != '0',
+    context=app.app_context,
+    on_flush=record_search_log_flush,
+)
+
+@app.route('/admin/search-analytics')
+@admin_required
+def search_analytics():
+    days = request.args.get('days', 30, type=int)
+    if days not in SEARCH_REPORT_DAYS: days = 30
+    t = SearchEvent.__table__
+    in_window = t.c.created_at >= datetime.utcnow() - timedelta(days=days)
+    hit = case((t.c.outcome == 'hit', 1), else_=0)
+    miss = case((t.c.outcome != 'hit', 1), else_=0)
+    ai = case((t.c.outcome.in_(('ai', 'ai_failure')), 1), else_=0)
+    limited = case((t.c.outcome == 'ai_limited', 1), else_=0)
+    day = func.date(t.c.created_at).label('day')
+
+    # الذكاء الاصطناعي بياخد ثواني والبحث العادي ملي ثواني => متوسط كل واحد لوحده
+    daily = db.session.execute(
+        select(day, func.count().label('searches'), func.sum(hit).label('hits'), func.sum(ai).label('ai'),
+               func.sum(limited).label('limited'),
+               func.avg(case((t.c.outcome == 'hit', t.c.latency_ms))).label('hit_ms'),
+               func.avg(case((t.c.outcome.in_(('ai', 'ai_failure')), t.c.latency_ms))).label('ai_ms'))
+        .where(in_window).group_by(day).order_by(day)).all()
+    top_queries = db.session.execute(
+        select(t.c.term, func.count().label('searches'), func.sum(miss).label('misses'))
+        .where(in_window).group_by(t.c.term).order_by(func.count().desc(), t.c.term).limit(SEARCH_REPORT_ROWS)).all()
+    # المطلوب إضافته: اللي بيتدور عليه ومش عندنا (+ هل اتضاف من ساعتها)
+    in_library = select(SearchKey.protocol_id).where(SearchKey.key == t.c.term).exists()
+    top_misses = db.session.execute(
+        select(t.c.term, func.count().label('searches'), func.sum(ai).label('ai'),
+               func.max(t.c.created_at).label('last_seen'), in_library.label('in_library'))
+        .where(in_window, t.c.outcome != 'hit').group_by(t.c.term)
+        .order_by(func.count().desc(), t.c.term).limit(SEARCH_REPORT_ROWS)).all()
+    tiers = db.session.execute(
+        select(t.c.tier, func.count().label('searches'), func.sum(ai).label('ai'), func.sum(limited).label('limited'))
+        .where(in_window).group_by(t.c.tier).order_by(func.count().desc())).all()
+
+    totals = {k: sum(getattr(d, k) or 0 for d in daily) for k in ('searches', 'hits', 'ai', 'limited')}
+    return render_template('search_analytics.html', days=days, report_days=SEARCH_REPORT_DAYS, daily=daily,
+                           top_queries=top_queries, top_misses=top_misses, tiers=tiers, totals=totals,
+                           retention_days=SEARCH_LOG_RETENTION_DAYS, flush_seconds=search_log.flush_seconds)
+
+@app.cli.command('prune-search-log')
+@click.option('--days', type=int, default=None, help="Keep this many days (default SEARCH_LOG_RETENTION_DAYS).")
+def prune_search_log_command(days):
+    """Delete search log rows older than the retention period."""
+    print(f"🧹 Search log: {prune_search_events(days)} old rows deleted")
+
+# ==========================================
+# 14. بحث مجمع: كذا حالة مرة واحدة (مريض عنده أكتر من مرض)
+# ==========================================
+# POST /api/protocols/lookup  {"conditions": ["Knee Osteoarthritis", "Lymphedema", "Parkinson's Disease"]}
+# - الموجود عندنا: find_protocols (المفاتيح في IN واحدة) + تحميل البروتوكولات كلها في IN واحدة
+# - الباقي: الحدود (ai_limits) لكل حالة بالترتيب، واللي مسموح بيروح لـ Gemini في نفس الوقت في pool محدود
+#   => الزمن = أبطأ حالة مش مجموع الحالات، وعدد الطلبات المفتوحة لـ Gemini في كل worker مش بيزيد عن AI_BATCH_WORKERS
+# - الشغل المستني في الـ pool (شغال + في الطابور) محدود بـ AI_BATCH_MAX_PENDING: لو مفيش مكان => ai_busy من غير خصم
+# - اللي ملحقش المهلة: cancel (لو لسه في الطابور) + الخصم بيرجع، وطلب Gemini نفسه واخد نفس المهلة فمبيفضلش شاغل thread
+# - status لكل حالة: found / ai / ai_failure / ai_timeout / ai_busy / ai_limited (+ retry_after)
+BATCH_LOOKUP_MAX = int(os.environ.get('BATCH_LOOKUP_MAX', 10))
+AI_BATCH_WORKERS = int(os.environ.get('AI_BATCH_WORKERS', 4))
+AI_BATCH_MAX_PENDING = int(os.environ.get('AI_BATCH_MAX_PENDING', AI_BATCH_WORKERS * 2))
+AI_BATCH_TIMEOUT_SECONDS = float(os.environ.get('AI_BATCH_TIMEOUT_SECONDS', 60))
+ai_executor = ThreadPoolExecutor(max_workers=AI_BATCH_WORKERS, thread_name_prefix='ai')
+ai_slots = threading.BoundedSemaphore(AI_BATCH_MAX_PENDING)
+
+@app.route('/api/protocols/lookup', methods=['POST'])
+@api_login_required
+def api_protocols_lookup():
+    fields, error = api_fields(API_DETAIL_FIELDS)
+    if error: return error
+    conditions = (request.get_json(silent=True) or {}).get('conditions')
+    if not isinstance(conditions, list) or not all(isinstance(c, str) for c in conditions):
+        return api_error('conditions must be a list of strings', 400)
+    # نفس تنظيف home() + نفس الحالة مرتين = مرة واحدة
+    queries = list(dict.fromkeys(" ".join(c.split()) for c in conditions if c.strip()))
+    if not queries:
+        return api_error('conditions is empty', 400)
+    if len(queries) > BATCH_LOOKUP_MAX:
+        return api_error(f'at most {BATCH_LOOKUP_MAX} conditions per request', 400)
+
+    started = time.perf_counter()
+    ids = find_protocols(queries)
+    rows = {}
+    if ids:
+        columns = [getattr(Protocol, f) for f in fields]
+        if 'id' not in fields: columns.append(Protocol.id)
+        rows = {r.id: r for r in db.session.query(*columns).filter(Protocol.id.in_(set(ids.values())))}
+
+    results = {}
+    for q in queries:
+        row = rows.get(ids.get(q))
+        if row is None: continue
+        results[q] = {'status': 'found', 'protocol': api_row(row, fields)}
+        metrics.inc('search_outcomes_total', outcome='db_hit')
+        log_search(q, 'hit', started, g.api_user, protocol_id=row.id, source='batch')
+
+    # ⛔ مكان في الـ pool الأول (من غير خصم لو مفيش)، وبعدين الحدود قبل Gemini (زي home()): كل حالة بتتحسب لوحدها
+    pending = {}
+    deadline = time.monotonic() + AI_BATCH_TIMEOUT_SECONDS
+    ask = lambda q: get_ai_protocol(q, timeout=max(1, deadline - time.monotonic()))
+    for q in queries:
+        if q in results: continue
+        if not ai_slots.acquire(blocking=False):
+            results[q] = {'status': 'ai_busy', 'retry_after': 1}
+            metrics.inc('search_outcomes_total', outcome='ai_busy')
+            log_search(q, 'ai_limited', started, g.api_user, source='batch')
+            continue
+        decision = acquire_ai_generation(g.api_user)
+        if decision.allowed:
+            future = ai_executor.submit(ask, q)
+            future.add_done_callback(lambda _: ai_slots.release())
+            pending[q] = (future, ai_limiter.clock())
+        else:
+            ai_slots.release()
+            results[q] = {'status': 'ai_limited', 'retry_after': max(1, int(decision.retry_after + 0.999))}
+            metrics.inc('search_outcomes_total', outcome='ai_limited')
+            log_search(q, 'ai_limited', started, g.api_user, source='batch')
+
+    # 🤖 كلهم شغالين في نفس الوقت: مهلة واحدة للطلب كله
+    for q, (future, charged_at) in pending.items():
+        try:
+            data = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeout:
+            # اللي لسه في الطابور بيتلغي والخصم بيرجع؛ اللي شغال بيكمل لحد نفس المهلة => الطلب راح لـ Gemini فعلاً ومبيرجعش
+            if future.cancel():
+                refund_ai_generation(g.api_user, charged_at)
+            data, status = None, 'ai_timeout'
+        else:
+            # Gemini ممكن يرجع JSON صح بس مش object (list / string) => فشل زي أي رد بايظ
+            if not isinstance(data, dict): data = None
+            status = 'ai' if data else 'ai_failure'
+        if data:
+            results[q] = {'status': 'ai', 'protocol': {f: data.get(f) for f in fields}}
+        else:
+            results[q] = {'status': status}
+        metrics.inc('search_outcomes_total', outcome='ai_fallback' if data else status)
+        log_search(q, 'ai' if data else 'ai_failure', started, g.api_user, source='batch')
+
+    items = [dict(results[q], query=q) for q in queries]
+    return api_json({'items': items,
+                     'found': sum(1 for i in items if i['status'] == 'found'),
+                     'ai': sum(1 for i in items if i['status'] == 'ai'),
+                     'seconds': round(time.perf_counter() - started, 3)})
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
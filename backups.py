@@ -0,0 +1,319 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy.engine import make_url
+
+# ==============================================================================
+# النسخ الاحتياطي وقت التشغيل (من غير ما نوقف البحث ولا التعديل)
+# - SQLite: الـ online backup API على خطوات (pages_per_step صفحة كل خطوة + step_sleep بين الخطوات)
+#   => كل خطوة قراءة قصيرة، والـ requests بتاخد الـ CPU بين الخطوات
+#   لو حد كتب في القاعدة أثناء النسخ، SQLite بيبدأ النسخ من الأول: بعد max_restarts مرات بنكمل
+#   في خطوة واحدة (قراءة واحدة متسقة - مع WAL مبتوقفش الكتابة ولا القراءة)
+#   النسخة بتتراجع (quick_check) وبعدين gzip => physio-YYYYmmdd-HHMMSS-<label>.db.gz
+# - Postgres: pg_dump --format=custom (مضغوط، snapshot متسق من غير locks) => .dump
+# - جنب كل نسخة ملف .json فيه المدة والحجم والـ sha256 / بنحتفظ بآخر keep نسخة من كل نوع (label)
+# - الجدول: thread في كل worker بيصحى لما النسخة الجاية تستحق + flock => worker واحد بس بيعمل النسخة
+# - الاسترجاع (flask restore-db): نسخة احتياطية للحالي الأول (pre-restore) وبعدين
+#   SQLite: الـ backup API بالعكس (من الملف للقاعدة الشغالة) / Postgres: pg_restore --clean
+# ==============================================================================
+
+NAME = re.compile(r'^physio-(\d{8}-\d{6})-([a-z-]+)\.(db\.gz|dump)$')
+
+
+class BackupRestarted(Exception):
+    pass
+
+
+class BackupManager:
+    def __init__(self, database_url, directory=None, keep=7, interval_seconds=86400, first_delay=600,
+                 pages_per_step=256, step_sleep=0.005, max_restarts=3, compress_level=6,
+                 on_backup=None, context=None):
+        # database_url() => الـ URL الفعلي (SQLite: المسار المطلق بعد ما Flask-SQLAlchemy يحله)
+        # directory: None = مجلد backups جنب ملف SQLite
+        # on_backup(result أو None, error أو None) => المقاييس
+        self.database_url = database_url
+        self._directory = directory
+        self.keep = keep
+        self.interval_seconds = interval_seconds
+        self.first_delay = first_delay
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self.compress_level = compress_level
+        self.on_backup = on_backup
+        self.context = context
+        self._reset_lock()
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._requested = None
+        self._pid = None
+        self._started_at = time.time()
+
+    def _target(self):
+        url = make_url(self.database_url())
+        if url.get_backend_name() == 'sqlite':
+            if not url.database or url.database == ':memory:':
+                raise RuntimeError("In-memory SQLite databases can't be backed up")
+            return 'sqlite', os.path.abspath(url.database)
+        if url.get_backend_name() == 'postgresql':
+            return 'postgresql', url
+        raise RuntimeError(f"Backups aren't supported for {url.get_backend_name()}")
+
+    @property
+    def directory(self):
+        if self._directory: return self._directory
+        kind, target = self._target()
+        if kind != 'sqlite': raise RuntimeError("Set BACKUP_DIR for non-SQLite databases")
+        return os.path.join(os.path.dirname(target), 'backups')
+
+    # ---- الجدول ----
+    def start(self):
+        # مرة واحدة في كل process (أول request بعد الـ fork)
+        if self.interval_seconds > 0: self._ensure_thread()
+
+    def trigger(self, label='manual'):
+        # "Backup now" من لوحة الأدمن: في الخلفية، والـ request بيرجع على طول
+        self._requested = label
+        self._ensure_thread()
+        self._wake.set()
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid(): return
+        with self._start_lock:
+            if self._pid == os.getpid(): return
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name='backups', daemon=True).start()
+
+    def _loop(self):
+        while True:
+            due = self.seconds_until_due() if self.interval_seconds > 0 else None
+            # workers تانية بتاخد نفس الموعد: اللي ماخدش الـ lock بيبص تاني بعد 30 ثانية
+            self._wake.wait(None if due is None else max(30.0, due))
+            self._wake.clear()
+            label, self._requested = self._requested, None
+            try:
+                with self.context():
+                    if label: self.backup(label)
+                    elif self.interval_seconds > 0: self.backup('scheduled', wait=False, only_if_due=True)
+            except Exception as e:
+                print(f"⚠️ Backup failed: {e}")
+
+    def seconds_until_due(self):
+        # آخر نسخة مجدولة + interval، ومش قبل first_delay من بداية الـ process (الـ deploy مش وقت نسخ)
+        scheduled = [b['created_at'] for b in self.list() if b['label'] == 'scheduled']
+        last = max(scheduled).replace(tzinfo=timezone.utc).timestamp() if scheduled else 0
+        return max(last + self.interval_seconds, self._started_at + self.first_delay) - time.time()
+
+    @contextmanager
+    def _locked(self, wait=True):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False   # worker تاني بيعمل نسخة دلوقتي
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ---- النسخ ----
+    def backup(self, label='manual', wait=True, only_if_due=False):
+        # بيرجع تفاصيل النسخة، أو None لو worker تاني بيعمل نسخة / لسه مش وقتها
+        with self._locked(wait) as acquired:
+            if not acquired: return None
+            if only_if_due and self.seconds_until_due() > 0: return None
+            result = self._backup(label)
+            result['removed'] = self.rotate()
+            return result
+
+    def _backup(self, label):
+        kind, target = self._target()
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        name = f"physio-{stamp}-{label}.{'db.gz' if kind == 'sqlite' else 'dump'}"
+        path = os.path.join(self.directory, name)
+        started = time.perf_counter()
+        try:
+            stats = self._sqlite_backup(target, path) if kind == 'sqlite' else self._pg_backup(target, path)
+        except Exception as e:
+            if self.on_backup: self.on_backup(None, e)
+            raise
+        result = {
+            'name': name, 'label': label, 'engine': kind, **stats,
+            'bytes': os.path.getsize(path), 'sha256': _sha256(path),
+            'seconds': round(time.perf_counter() - started, 3),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        }
+        with open(f"{path}.json.tmp", 'w') as f: json.dump(result, f, indent=2)
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+        if self.on_backup: self.on_backup(result, None)
+        return result
+
+    def _progress(self, stats):
+        def progress(status, remaining, total):
+            stats['steps'] += 1
+            if remaining > stats['remaining']:
+                # الصفحات اللي فاضلة زادت = حد كتب في القاعدة والنسخ بدأ من الأول
+                stats['restarts'] += 1
+                if stats['restarts'] > self.max_restarts: raise BackupRestarted()
+            stats['remaining'] = remaining
+            if self.step_sleep: time.sleep(self.step_sleep)
+        return progress
+
+    def _sqlite_backup(self, source_path, path):
+        tmp_db = f"{path}.{os.getpid()}.db"
+        stats = {'mode': 'stepped' if self.pages_per_step > 0 else 'single-step',
+                 'steps': 0, 'restarts': 0, 'remaining': float('inf')}
+        started = time.perf_counter()
+        try:
+            src = sqlite3.connect(source_path, timeout=30)
+            dst = sqlite3.connect(tmp_db)
+            try:
+                try:
+                    src.backup(dst, pages=self.pages_per_step, progress=self._progress(stats))
+                except BackupRestarted:
+                    stats['mode'] = 'single-step'
+                    src.backup(dst)
+                check = dst.execute("PRAGMA quick_check").fetchone()[0]
+                if check != 'ok': raise RuntimeError(f"Backup copy failed quick_check: {check}")
+                pages, page_size = (dst.execute(f"PRAGMA {p}").fetchone()[0] for p in ('page_count', 'page_size'))
+                stats['copy_seconds'] = round(time.perf_counter() - started, 3)
+            finally:
+                src.close()
+                dst.close()
+            # الضغط بعد ما القراءة من القاعدة خلصت، على دفعات مع استراحة (نفس فكرة الخطوات)
+            with open(tmp_db, 'rb') as f, gzip.open(f"{path}.tmp", 'wb', compresslevel=self.compress_level) as out:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    out.write(block)
+                    if self.step_sleep: time.sleep(self.step_sleep)
+            os.replace(f"{path}.tmp", path)
+        finally:
+            for leftover in (tmp_db, f"{path}.tmp"):
+                if os.path.exists(leftover): os.remove(leftover)
+        del stats['remaining']
+        return {**stats, 'pages': pages, 'database_bytes': pages * page_size}
+
+    def _pg_backup(self, url, path):
+        dsn, env = _libpq(url)
+        try:
+            _run(['pg_dump', '--format=custom', f'--compress={self.compress_level}', '--no-owner', '--no-privileges',
+                  '--file', f"{path}.tmp", '--dbname', dsn], env)
+            os.replace(f"{path}.tmp", path)
+        finally:
+            if os.path.exists(f"{path}.tmp"): os.remove(f"{path}.tmp")
+        return {'mode': 'pg_dump'}
+
+    # ---- الاحتفاظ ----
+    def list(self):
+        # الأحدث الأول: [{'name', 'label', 'created_at', 'bytes', ...تفاصيل الـ .json لو موجود}]
+        if not os.path.isdir(self.directory): return []
+        entries = []
+        for name in os.listdir(self.directory):
+            match = NAME.match(name)
+            if not match: continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(f"{path}.json") as f: details = json.load(f)
+            except (OSError, ValueError):
+                details = {}
+            details.update(name=name, label=match.group(2), path=path, bytes=os.path.getsize(path),
+                           created_at=datetime.strptime(match.group(1), '%Y%m%d-%H%M%S'))
+            entries.append(details)
+        return sorted(entries, key=lambda b: b['name'][7:22], reverse=True)
+
+    def rotate(self):
+        # آخر keep نسخة من كل label (المجدولة متزقش اليدوية، والـ pre-restore متمسحش اللي اتعمل منها restore)
+        removed, seen = [], {}
+        for entry in self.list():
+            seen[entry['label']] = seen.get(entry['label'], 0) + 1
+            if seen[entry['label']] <= self.keep: continue
+            for leftover in (entry['path'], f"{entry['path']}.json"):
+                if os.path.exists(leftover): os.remove(leftover)
+            removed.append(entry['name'])
+        return removed
+
+    def find(self, name, external=True):
+        # اسم نسخة في المجلد، أو (external) مسار ملف .db.gz / .dump من برة
+        if NAME.match(name) and os.path.isfile(os.path.join(self.directory, name)):
+            return os.path.abspath(os.path.join(self.directory, name))
+        if external and os.path.isfile(name) and name.endswith(('.db.gz', '.dump')):
+            return os.path.abspath(name)
+        raise FileNotFoundError(f"Backup not found: {name}")
+
+    # ---- الاسترجاع ----
+    def restore(self, name, safety_backup=True):
+        path = self.find(name)
+        kind, target = self._target()
+        if not path.endswith('.db.gz' if kind == 'sqlite' else '.dump'):
+            raise ValueError(f"{os.path.basename(path)} isn't a {kind} backup")
+        with self._locked():
+            started = time.perf_counter()
+            before = self._backup('pre-restore')['name'] if safety_backup else None
+            if kind == 'sqlite':
+                self._sqlite_restore(path, target)
+            else:
+                dsn, env = _libpq(target)
+                _run(['pg_restore', '--clean', '--if-exists', '--no-owner', '--no-privileges', '--single-transaction',
+                      '--dbname', dsn, path], env)
+            self.rotate()
+            return {'restored': os.path.basename(path), 'safety_backup': before,
+                    'seconds': round(time.perf_counter() - started, 3)}
+
+    def _sqlite_restore(self, path, target):
+        tmp_db = os.path.join(os.path.dirname(target), f".restore-{os.getpid()}.db")
+        try:
+            with gzip.open(path, 'rb') as f, open(tmp_db, 'wb') as out:
+                shutil.copyfileobj(f, out, 1 << 20)
+            src = sqlite3.connect(tmp_db)
+            try:
+                check = src.execute("PRAGMA quick_check").fetchone()[0]
+                if check != 'ok': raise RuntimeError(f"{os.path.basename(path)} failed quick_check: {check}")
+                # خطوة واحدة: باقي الـ connections بتشوف القاعدة القديمة أو الجديدة كاملة، مش خليط
+                dst = sqlite3.connect(target, timeout=60)
+                try: src.backup(dst)
+                finally: dst.close()
+            finally:
+                src.close()
+        finally:
+            for leftover in (tmp_db, f"{tmp_db}-wal", f"{tmp_db}-shm"):
+                if os.path.exists(leftover): os.remove(leftover)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _libpq(url):
+    # الباسورد في PGPASSWORD مش في سطر الأوامر (بيظهر في ps)
+    env = dict(os.environ)
+    if url.password: env['PGPASSWORD'] = str(url.password)
+    dsn = url.set(drivername='postgresql', password=None).render_as_string(hide_password=False)
+    return dsn, env
+
+
+def _run(cmd, env):
+    try:
+        subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise RuntimeError(f"{cmd[0]} not found: install the PostgreSQL client tools")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"{cmd[0]} failed: {e.stderr.strip()[-500:]}")
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ==============================================================================
+# تحميل المكتبة: من ملفات JSON (parse + دمج + executemany) ضد ملف المكتبة الجاهز (ATTACH + INSERT ... SELECT)
+# - cold: قاعدة فاضية (أول deploy) / restart: نفس المكتبة موجودة (كل restart بعد كده)
+#   python benchmarks/bench_artifact.py --repeat 5
+#   python benchmarks/bench_artifact.py --synthetic 20000
+# ==============================================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Library load time: JSON sources vs the prebuilt SQLite artifact.")
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N', help="add N synthetic protocols to the library")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', metavar='FILE', help="write results to FILE as JSON")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='physio-artifact-')
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", RELATED_DIR=os.path.join(tmp, 'related'),
+                      AI_LIMITS_DB=os.path.join(tmp, 'ai_limits.db'))
+    from app import app, db
+    from setup_db import JSON_SOURCES, build_artifact, seed
+
+    artifact = os.path.join(tmp, 'library.db')
+    build = build_artifact(artifact, synthetic=args.synthetic)
+    sources = {'json': dict(synthetic=args.synthetic), 'artifact': dict(artifact=artifact)}
+
+    def timed(**kwargs):
+        started = time.perf_counter()
+        seed(related=False, **kwargs)
+        return time.perf_counter() - started
+
+    results = []
+    for name, kwargs in sources.items():
+        cold, restart = [], []
+        for _ in range(args.repeat):
+            with app.app_context():
+                db.drop_all()
+                db.create_all()
+            cold.append(timed(**kwargs))
+            restart.append(timed(**kwargs))
+        results.append({
+            'source': name,
+            'cold_ms': round(statistics.median(cold) * 1000, 1),
+            'restart_ms': round(statistics.median(restart) * 1000, 1),
+        })
+
+    json_bytes = sum(os.path.getsize(os.path.join(ROOT, n)) for n in JSON_SOURCES if os.path.exists(os.path.join(ROOT, n)))
+    print(f"library: {build['rows']} protocols  |  JSON sources {json_bytes} bytes  |  "
+          f"artifact {build['bytes']} bytes, built in {build['seconds']} s")
+    for r in results:
+        print(f"{r['source']:>9}: cold {r['cold_ms']:>9} ms  restart {r['restart_ms']:>9} ms  (median of {args.repeat})")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump({'build': build, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_sqlite_tuning import SEARCH_SQL, SEARCH_TERMS, connect
+
+# ==============================================================================
+# النسخ الاحتياطي وقت التشغيل: زمن النسخة + أثرها على البحث والتعديل اللي شغالين في نفس الوقت
+# - readers (processes) بيعملوا بحث + writer بيعدل بروتوكولات (زي الأدمن) طول الوقت
+# - none: من غير نسخ / stepped: backups.py (خطوات + استراحة) / single-step: كل الصفحات في خطوة واحدة
+# - بعد كده restore للنسخة في قاعدة تانية والتأكد إن عدد البروتوكولات مظبوط
+#   python benchmarks/bench_backup.py --protocols 20000 --readers 3
+# ==============================================================================
+
+
+def reader(path, pragmas, start, stop, out):
+    conn = connect(path, pragmas)
+    rng = random.Random(os.getpid())
+    latencies = []
+    start.wait()
+    while not stop.is_set():
+        term = f"%{rng.choice(SEARCH_TERMS)}%"
+        t0 = time.perf_counter()
+        conn.execute(SEARCH_SQL, (term, term)).fetchone()
+        latencies.append(time.perf_counter() - t0)
+    out.put(('reader', latencies))
+
+
+def writer(path, pragmas, start, stop, out):
+    # تعديل كل 20ms تقريباً (الأدمن / الـ import) => كل تعديل بيخلي النسخة المتدرجة تبدأ من الأول
+    conn = connect(path, pragmas)
+    max_id = conn.execute("SELECT max(id) FROM protocol").fetchone()[0]
+    rng = random.Random(1)
+    latencies = []
+    start.wait()
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.execute("UPDATE protocol SET notes = ? WHERE id = ?", (f"edited {time.time()}", rng.randrange(1, max_id + 1)))
+        conn.commit()
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(0.02)
+    out.put(('writer', latencies))
+
+
+def pct(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2) if values else None
+
+
+def run_phase(name, path, pragmas, args, backup=None, duration=None):
+    start, stop, out = mp.Event(), mp.Event(), mp.Queue()
+    procs = [mp.Process(target=reader, args=(path, pragmas, start, stop, out)) for _ in range(args.readers)]
+    if args.writer: procs.append(mp.Process(target=writer, args=(path, pragmas, start, stop, out)))
+    for p in procs: p.start()
+    start.set()
+    time.sleep(0.5)
+    result = backup() if backup else None
+    if duration: time.sleep(duration)
+    stop.set()
+    samples = [out.get() for _ in procs]
+    for p in procs: p.join()
+    reads = [x for kind, lat in samples if kind == 'reader' for x in lat]
+    writes = [x for kind, lat in samples if kind == 'writer' for x in lat]
+    return {
+        'phase': name,
+        'backup_seconds': result['seconds'] if result else None,
+        'copy_seconds': result.get('copy_seconds') if result else None,
+        'backup_mode': result.get('mode') if result else None,
+        'restarts': result.get('restarts') if result else None,
+        'database_bytes': result.get('database_bytes') if result else None,
+        'backup_bytes': result['bytes'] if result else None,
+        'search_p50_ms': pct(reads, 0.5), 'search_p95_ms': pct(reads, 0.95), 'search_p99_ms': pct(reads, 0.99),
+        'write_p95_ms': pct(writes, 0.95), 'write_max_ms': round(max(writes) * 1000, 2) if writes else None,
+        'writes': len(writes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backup duration and its impact on concurrent search latency.")
+    parser.add_argument('--protocols', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=3)
+    parser.add_argument('--no-writer', dest='writer', action='store_false', help="searches only, no concurrent edits")
+    parser.add_argument('--pages-per-step', type=int, default=256)
+    parser.add_argument('--step-sleep', type=float, default=0.005)
+    parser.add_argument('--json', metavar='FILE', help="write results to FILE as JSON")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='physio-backup-')
+    path = os.path.join(tmp, 'bench.db')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", RELATED_DIR=os.path.join(tmp, 'related'),
+               AI_LIMITS_DB=os.path.join(tmp, 'ai_limits.db'), METRICS_DIR=os.path.join(tmp, 'metrics'))
+    subprocess.run([sys.executable, os.path.join(ROOT, 'setup_db.py'), '--reset', '--synthetic', str(args.protocols),
+                    '--no-related'], env=env, check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+
+    from app import SQLITE_PRAGMAS
+    from backups import BackupManager
+
+    def manager(pages_per_step, directory):
+        return BackupManager(lambda: f"sqlite:///{path}", directory=os.path.join(tmp, directory),
+                             pages_per_step=pages_per_step, step_sleep=args.step_sleep, interval_seconds=0)
+
+    stepped = manager(args.pages_per_step, 'stepped')
+    results = [run_phase('stepped', path, SQLITE_PRAGMAS, args, backup=lambda: stepped.backup('manual')),
+               run_phase('single-step', path, SQLITE_PRAGMAS, args, backup=lambda: manager(-1, 'single').backup('manual'))]
+    results.insert(0, run_phase('none', path, SQLITE_PRAGMAS, args, duration=max(r['backup_seconds'] for r in results)))
+
+    # restore في نسخة تانية من القاعدة (مش اللي لسه بتتعدل)
+    copy = os.path.join(tmp, 'restored.db')
+    sqlite3.connect(copy).close()
+    restorer = BackupManager(lambda: f"sqlite:///{copy}", directory=stepped.directory, interval_seconds=0)
+    backup_name = stepped.list()[0]['name']
+    restored = restorer.restore(backup_name, safety_backup=False)
+    conn = sqlite3.connect(copy)
+    restored_rows = conn.execute("SELECT count(*) FROM protocol").fetchone()[0]
+    conn.close()
+
+    for r in results:
+        backup = (f"backup {r['backup_seconds']} s, copy {r['copy_seconds']} s ({r['backup_mode']}, {r['restarts']} restarts, "
+                  f"{r['database_bytes']} -> {r['backup_bytes']} bytes)" if r['backup_seconds'] else "no backup")
+        print(f"{r['phase']:>12}: search p50 {r['search_p50_ms']} ms  p95 {r['search_p95_ms']} ms  p99 {r['search_p99_ms']} ms  |  "
+              f"writes {r['writes']} (p95 {r['write_p95_ms']} ms, max {r['write_max_ms']} ms)  |  {backup}")
+    print(f"     restore: {backup_name} in {restored['seconds']} s => {restored_rows} protocols")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump({'results': results, 'restore': restored, 'restored_rows': restored_rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
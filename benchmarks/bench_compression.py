@@ -0,0 +1,97 @@
+import argparse
+import base64
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ==============================================================================
+# حجم الرد على الشبكة وتكلفة الـ CPU لكل request: بدون ضغط / gzip / brotli ± تصغير HTML
+#   python benchmarks/bench_compression.py --iterations 200
+# ==============================================================================
+
+TMP = tempfile.mkdtemp(prefix='physio-bench-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(TMP, 'bench.db')}")
+os.environ['MINIFY_HTML'] = '0'
+
+ADMIN = ('bench-admin@physio.local', 'bench-password')
+
+
+def collect_bodies():
+    from app import app, db, Protocol
+    from setup_db import seed
+    seed(reset=True, admin_email=ADMIN[0], admin_password=ADMIN[1])
+    with app.app_context():
+        # بروتوكول بصورة أقطاب base64 (~150KB) زي اللي بترفع من لوحة الأدمن
+        image = base64.b64encode(random.Random(1).randbytes(110 * 1024)).decode()
+        db.session.add(Protocol(disease_name="Bench Image Protocol", keywords="benchimage",
+                                electrode_image=f"data:image/jpeg;base64,{image}"))
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', data={'email': ADMIN[0], 'password': ADMIN[1]})
+    pages = {
+        'result (JSON import)': '/?disease=Low Back Pain',
+        'result (base64 image)': '/?disease=benchimage',
+        'admin dashboard': '/admin',
+        'api list (100)': '/api/protocols?limit=100&fields=id,disease_name,category,estim_params',
+        'login page': '/login',
+    }
+    bodies = {}
+    for name, url in pages.items():
+        r = client.get(url, headers={'Accept-Encoding': 'identity'})
+        bodies[name] = (r.mimetype, r.data)
+    return bodies
+
+
+def variants():
+    from compression import brotli
+    out = [('identity', None, None), ('gzip-1', 'gzip', 1), ('gzip-6', 'gzip', 6), ('gzip-9', 'gzip', 9)]
+    if brotli: out += [('br-4', 'br', 4), ('br-8', 'br', 8)]
+    return out
+
+
+def measure(body, mimetype, encoding, level, minify, iterations):
+    from compression import _Compressor, minify_html
+    start = time.process_time()
+    for _ in range(iterations):
+        data = body
+        if minify and mimetype == 'text/html':
+            data = minify_html(data.decode('utf-8')).encode('utf-8')
+        if encoding:
+            c = _Compressor(encoding, level, level)
+            data = c.compress(data) + c.finish()
+    cpu_ms = (time.process_time() - start) * 1000 / iterations
+    return len(data), cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes on the wire and CPU per request for each compression setting.")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--json', metavar='FILE', help="write results to FILE as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for page, (mimetype, body) in collect_bodies().items():
+        print(f"\n{page}  ({mimetype}, {len(body):,} bytes raw)")
+        for minify in (False, True):
+            if minify and mimetype != 'text/html': continue
+            for name, encoding, level in variants():
+                size, cpu_ms = measure(body, mimetype, encoding, level, minify, args.iterations)
+                label = f"{name}{' +minify' if minify else ''}"
+                print(f"  {label:<18} {size:>10,} bytes  {100 * size / len(body):6.1f}%  {cpu_ms:8.3f} ms CPU")
+                results.append({'page': page, 'variant': label, 'raw_bytes': len(body),
+                                'wire_bytes': size, 'cpu_ms': round(cpu_ms, 4)})
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(results, f, indent=2)
+    shutil.rmtree(TMP, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
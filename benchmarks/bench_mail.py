@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smtp_standin import SMTPStandIn
+
+# ==============================================================================
+# طابور الإيميلات من أوله لآخره على سيرفر SMTP محلي (smtp_standin.py):
+# - زمن الـ request (/forgot-password) مع الطابور ضد إرسال مباشر (sync) على سيرفر بطيء
+# - الطابور بيفضى: عدد اتصالات الـ SMTP (إعادة استخدام) + إعادة المحاولة بعد رفض مؤقت (451)
+# - لينك الاسترجاع من الإيميل نفسه => باسورد جديد => login + إيميل "الباسورد اتغير"
+#   python benchmarks/bench_mail.py --users 50 --latency 0.1 --fail-first 3
+# ==============================================================================
+
+
+def pct(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end mail queue check against a local SMTP stand-in.")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.1, help="SMTP server delay per message (seconds)")
+    parser.add_argument('--fail-first', type=int, default=3, help="reject the first N recipients with 451")
+    parser.add_argument('--json', metavar='FILE', help="write results to FILE as JSON")
+    args = parser.parse_args()
+
+    standin = SMTPStandIn(latency=args.latency).start()
+    tmp = tempfile.mkdtemp(prefix='physio-mail-')
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", RELATED_DIR=os.path.join(tmp, 'related'),
+                      AI_LIMITS_DB=os.path.join(tmp, 'ai_limits.db'),
+                      MAIL_SERVER='127.0.0.1', MAIL_PORT=str(standin.port), MAIL_USE_TLS='0',
+                      MAIL_RETRY_SECONDS='0.2', MAIL_POLL_SECONDS='0.2', PASSWORD_RESET_INTERVAL='0')
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, OutboundEmail, mail, Message
+
+    with app.app_context():
+        db.create_all()
+        password = generate_password_hash('old-password', method='pbkdf2:sha256')
+        db.session.add_all([User(email=f"student{i}@example.com", password=password) for i in range(args.users)])
+        db.session.commit()
+
+        # المقارنة: إرسال مباشر جوه الـ request (اتصال جديد لكل رسالة)
+        sync = []
+        for i in range(5):
+            started = time.perf_counter()
+            mail.send(Message('sync', recipients=['sync@example.com'], body='sync'))
+            sync.append(time.perf_counter() - started)
+    expected = args.users + len(sync)
+    standin.fail_left = args.fail_first   # الرفض المؤقت يبدأ مع الطابور
+
+    client = app.test_client()
+    request_times = []
+    started = time.perf_counter()
+    for i in range(args.users):
+        t0 = time.perf_counter()
+        response = client.post('/forgot-password', data={'email': f"student{i}@example.com"})
+        request_times.append(time.perf_counter() - t0)
+        assert response.status_code == 302, response.status_code
+    delivered = standin.wait_for(expected, timeout=60)
+    drain_seconds = time.perf_counter() - started
+
+    # من الإيميل للباسورد الجديد
+    reset = next(m for _, rcpts, m in standin.messages if rcpts == ['student0@example.com'])
+    link = re.search(r'http://\S+/reset-password/\S+', reset.get_body(('plain',)).get_content()).group(0)
+    path = link.split('localhost', 1)[1]
+    page = client.get(path)
+    changed = client.post(path, data={'password': 'new-password', 'confirm_password': 'new-password'})
+    reused = client.get(path)   # نفس اللينك تاني => مرفوض
+    login = app.test_client().post('/login', data={'email': 'student0@example.com', 'password': 'new-password'})
+    notice = standin.wait_for(expected + 1, timeout=10)
+
+    with app.app_context():
+        statuses = dict(db.session.query(OutboundEmail.status, db.func.count()).group_by(OutboundEmail.status).all())
+        retried = db.session.query(OutboundEmail).filter(OutboundEmail.attempts > 1).count()
+
+    checks = {
+        'all_delivered': delivered,
+        'reset_page_ok': page.status_code == 200,
+        'password_changed': changed.status_code == 302 and changed.location.endswith('/login'),
+        'link_single_use': reused.status_code == 302 and 'forgot-password' in reused.location,
+        'login_with_new_password': login.status_code == 302 and login.location.endswith('/'),
+        'changed_notice_sent': notice and standin.messages[-1][2]['Subject'].startswith('Your Physio Expert password'),
+        'transient_failures_retried': retried >= min(args.fail_first, 1) and statuses.get('failed', 0) == 0,
+    }
+    results = {
+        'users': args.users,
+        'smtp_latency_ms': args.latency * 1000,
+        'sync_send_p50_ms': pct(sync, 0.5),
+        'queued_request_p50_ms': pct(request_times, 0.5),
+        'queued_request_p95_ms': pct(request_times, 0.95),
+        'drain_seconds': round(drain_seconds, 2),
+        'messages_received': len(standin.messages),
+        'smtp_connections': standin.connections,
+        'rejected_451': standin.rejected,
+        'retried_messages': retried,
+        'queue_status': statuses,
+        'checks': checks,
+    }
+    print(f"sync send (per request):  p50 {results['sync_send_p50_ms']} ms")
+    print(f"queued request:           p50 {results['queued_request_p50_ms']} ms  p95 {results['queued_request_p95_ms']} ms")
+    print(f"drained {results['messages_received']} messages in {results['drain_seconds']} s over "
+          f"{results['smtp_connections']} SMTP connections ({standin.rejected} x 451, {retried} retried)  {statuses}")
+    for name, ok in checks.items():
+        print(f"  {'✅' if ok else '❌'} {name}")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(results, f, indent=2)
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
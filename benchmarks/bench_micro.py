@@ -0,0 +1,208 @@
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ==============================================================================
+# Micro-benchmarks للأجزاء الحساسة في app.py على مكتبات بأحجام مختلفة (بيانات وهمية من setup_db.py)
+#   python benchmarks/bench_micro.py --sizes 100,1000,10000,100000
+#   python benchmarks/bench_micro.py --compare benchmarks/results/<commit>.json
+# كل حجم بيشتغل في process لوحده على قاعدة بيانات مؤقتة جديدة
+# النتايج بتتحفظ JSON باسم الـ commit في benchmarks/results/ عشان المقارنة بين الـ commits
+# ==============================================================================
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+ADMIN = ('bench-admin@physio.local', 'bench-password')
+
+# رد Gemini نموذجي (بالـ ```json زي ما بيرجع فعلاً) - عشان نقيس التحليل من غير شبكة
+AI_RESPONSE = "```json\n" + json.dumps({
+    "disease_name": "Bench Condition", "keywords": "bench, condition, synthetic",
+    "description": "A long clinical description. " * 40,
+    "estim_type": "TENS", "estim_params": "Freq: 80-120 Hz. Width: 100 µs. Time: 20 mins.", "estim_role": "Pain relief",
+    "us_type": "Pulsed", "us_params": "1 MHz, 0.8 W/cm², 20%", "us_role": "Tissue healing",
+    "exercises_list": "".join(f"- <b>Exercise {i}</b><br>- Sets: 3 | Reps: 12<br>- Instructions: {'Move slowly. ' * 15}<br><br>" for i in range(8)),
+    "exercises_role": "Strength", "source_ref": "Bench", "video_link": "", "electrode_image": "",
+}) + "\n```"
+
+
+class _FakeResponse:
+    text = AI_RESPONSE
+    usage_metadata = None
+
+
+def timeit(fn, min_runs, min_seconds):
+    times = []
+    deadline = time.perf_counter() + min_seconds
+    while len(times) < min_runs or time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    ms = [t * 1000 for t in times]
+    return {
+        'runs': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 4),
+        'median_ms': round(statistics.median(ms), 4),
+        'p95_ms': round(ms[min(len(ms) - 1, int(0.95 * len(ms)))], 4),
+        'min_ms': round(ms[0], 4),
+    }
+
+
+def run_size(size, args):
+    # بيشتغل في process منفصلة (DATABASE_URL لازم يتحدد قبل import app)
+    import pandas as pd
+    from flask_login import login_user
+    from app import (app, Protocol, User, format_exercises_html, get_ai_protocol, model,
+                     protocol_fragments, query_inspector, render_protocol_result)
+    from setup_db import seed, synthetic_rows
+    from sqlalchemy.orm import load_only
+    import app as app_module
+
+    seed(reset=True, synthetic=size, admin_email=ADMIN[0], admin_password=ADMIN[1])
+    results = []
+
+    def bench(name, fn, runs=args.runs, seconds=args.seconds):
+        with query_inspector.capture() as queries:
+            fn()  # تسخين + عدد الـ queries لمرة واحدة
+        stats = timeit(fn, runs, seconds)
+        stats.update(name=name, size=size, queries=queries.count)
+        results.append(stats)
+        print(f"  {size:>7} {name:<28} median {stats['median_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms  "
+              f"queries {queries.count}", file=sys.stderr)
+
+    with app.app_context():
+        def search(term):
+            return lambda: Protocol.query.options(load_only(Protocol.id, Protocol.revision, Protocol.updated_at)).filter(
+                Protocol.disease_name.ilike(f"%{term}%") | Protocol.keywords.ilike(f"%{term}%")).first()
+        bench('search_hit_builtin', search('Knee Osteoarthritis'))
+        bench('search_hit_last_row', search(f"syn{size:06d}"))
+        bench('search_miss', search('no-such-condition'))
+
+        model.generate_content = lambda *a, **kw: _FakeResponse()
+        bench('get_ai_protocol_parse', lambda: get_ai_protocol('bench'))
+
+        with open(os.path.join(ROOT, 'final_physio_protocols.json'), encoding='utf-8') as f:
+            items = json.load(f)
+        exercises = [item.get('therapeutic_exercises', {}) for item in items]
+        bench('format_exercises_html_x86', lambda: [format_exercises_html(e) for e in exercises])
+
+        admin = User.query.filter_by(email=ADMIN[0]).first()
+        protocol = Protocol.query.filter(Protocol.disease_name.like('Knee Osteoarthritis%')).first()
+
+        def render_index(cached):
+            def run():
+                with app.test_request_context('/?disease=knee'):
+                    login_user(admin)
+                    if not cached: protocol_fragments.invalidate(protocol.id)
+                    html = render_protocol_result(protocol, can_print=True)
+                    app_module.render_template('index.html', result=protocol, result_html=html, searched=True,
+                                               user=admin, days_left="Unlimited (Admin)")
+            return run
+        bench('render_index_cold', render_index(cached=False))
+        bench('render_index_cached_card', render_index(cached=True))
+
+        def render_admin():
+            with app.test_request_context('/admin'):
+                login_user(admin)
+                app_module.admin_dashboard()
+        bench('render_admin', render_admin, seconds=min(args.seconds, 2))
+
+    client = app.test_client()
+    client.post('/login', data={'email': ADMIN[0], 'password': ADMIN[1]})
+    bench('export_data', lambda: client.get('/admin/export-data'), runs=3, seconds=0)
+
+    # import_excel: ملف xlsx نص صفوفه موجودة ونصها جديدة. أول مرة = insert + update، وبعدها update بس
+    # الملفات بتتجهز قبل القياس (كل مرة source_ref مختلف عشان الصفوف تتحدث فعلاً)
+    n = min(size, args.import_rows)
+    frame = pd.DataFrame([{'disease_name': r['disease_name'] if i % 2 else f"Imported {i:06d}",
+                           'category': r['category'], 'keywords': r['keywords'], 'description': r['description'],
+                           'estim_params': r['estim_params'], 'us_params': r['us_params'],
+                           'exercises_list': r['exercises_list'], 'source_ref': 'bench'}
+                          for i, r in enumerate(synthetic_rows(n))])
+    files = []
+    for k in range(4):
+        frame['source_ref'] = f"bench {k}"
+        buf = io.BytesIO(); frame.to_excel(buf, index=False); files.append(buf.getvalue())
+    times = []
+    for data in files:
+        t0 = time.perf_counter()
+        client.post('/admin/import-excel', data={'excel_file': (io.BytesIO(data), 'bench.xlsx')})
+        times.append((time.perf_counter() - t0) * 1000)
+    for name, ms in ((f'import_excel_first_{n}', times[0]), (f'import_excel_update_{n}', statistics.median(times[1:]))):
+        results.append({'name': name, 'size': size, 'runs': 1 if 'first' in name else 3, 'median_ms': round(ms, 4),
+                        'rows_per_sec': round(n / (ms / 1000), 1)})
+        print(f"  {size:>7} {name:<28} median {ms:>10.3f} ms  {n / (ms / 1000):,.0f} rows/s", file=sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old_path, new):
+    with open(old_path) as f: old = json.load(f)
+    before = {(r['name'], r['size']): r for r in old['results']}
+    print(f"\n{'benchmark':<32} {'size':>7} {old['commit']:>12} {new['commit']:>12}   change")
+    for r in new['results']:
+        o = before.get((r['name'], r['size']))
+        if not o: continue
+        change = 100 * (r['median_ms'] - o['median_ms']) / o['median_ms'] if o['median_ms'] else 0
+        print(f"{r['name']:<32} {r['size']:>7} {o['median_ms']:>10.3f}ms {r['median_ms']:>10.3f}ms   {change:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of search, AI parsing, formatting, import/export and rendering.")
+    parser.add_argument('--sizes', default='100,1000,10000', help="comma separated library sizes (synthetic protocols)")
+    parser.add_argument('--runs', type=int, default=20, help="minimum runs per benchmark")
+    parser.add_argument('--seconds', type=float, default=1.0, help="minimum seconds per benchmark")
+    parser.add_argument('--import-rows', type=int, default=2000, help="cap on rows in the import_excel file")
+    parser.add_argument('--json', metavar='FILE', help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', metavar='FILE', help="print the change against an earlier results file")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        results = run_size(args.worker, args)
+        with open(args.worker_out, 'w') as f: json.dump(results, f)
+        return
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        tmp = tempfile.mkdtemp(prefix='physio-bench-')
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   METRICS_DIR=os.path.join(tmp, 'metrics'), LIBRARY_DIR=os.path.join(tmp, 'library'),
+                   PDF_CACHE_DIR=os.path.join(tmp, 'pdf'), RELATED_DIR=os.path.join(tmp, 'related'))
+        out = os.path.join(tmp, 'results.json')
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', str(size), '--worker-out', out,
+               '--runs', str(args.runs), '--seconds', str(args.seconds), '--import-rows', str(args.import_rows)]
+        try:
+            subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(out) as f: results += json.load(f)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {'commit': git_commit(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    path = args.json or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f: json.dump(report, f, indent=2)
+    print(f"\nResults written to {path}")
+    if args.compare: compare(args.compare, report)
+
+
+if __name__ == '__main__':
+    main()
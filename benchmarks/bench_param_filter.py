@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modality_params import modality, parse, parse_query
+
+# ==============================================================================
+# البحث بقيم الأجهزة ("TENS 80-120 Hz"): الجدول المتفهرس (protocol_param) ضد قراية النص مع كل طلب
+# - scan: كل estim/us من القاعدة + parse() لكل صف وقت الطلب (اللي كان لازم يحصل من غير الجدول)
+# - index: نفس SQL الـ API (subquery لكل قيمة + INTERSECT) على ix_protocol_param_range
+# - النتيجتين لازم يطلعوا نفس البروتوكولات بالظبط
+#   python benchmarks/bench_param_filter.py --protocols 20000 --repeat 50
+# ==============================================================================
+
+QUERIES = ["TENS 80-120 Hz", "US 1 MHz 1-1.5 W/cm2", "NMES 200-300 us 15-20 min", "50-100 us", "IFC 4000 Hz",
+           "FES 20-50 Hz 10-20 mA", "5-10 min"]
+
+
+def overlaps(value, wanted):
+    return value['param'] == wanted['param'] and value['unit'] == wanted['unit'] \
+        and value['low'] <= wanted['high'] and value['high'] >= wanted['low']
+
+
+def scan(conn, kind, values):
+    ids = set()
+    for pid, estim_type, estim_params, us_type, us_params in conn.execute(
+            "SELECT id, estim_type, estim_params, us_type, us_params FROM protocol"):
+        found = [(modality(estim_type), v) for v in parse(estim_params)] + [(modality(us_type), v) for v in parse(us_params)]
+        if all(any(overlaps(v, w) and (not kind or m == kind) for m, v in found) for w in values): ids.add(pid)
+    return ids
+
+
+def indexed(conn, kind, values):
+    parts, args = [], []
+    for w in values:
+        sql = "SELECT protocol_id FROM protocol_param WHERE param = ? AND unit = ? AND low <= ? AND high >= ?"
+        args += [w['param'], w['unit'], w['high'], w['low']]
+        if kind:
+            sql += " AND modality = ?"
+            args.append(kind)
+        parts.append(sql)
+    return {pid for (pid,) in conn.execute(" INTERSECT ".join(parts), args)}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return result, round(samples[len(samples) // 2] * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed modality-parameter filter vs parsing the text per request.")
+    parser.add_argument('--protocols', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', metavar='FILE', help="write results to FILE as JSON")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='physio-params-')
+    path = os.path.join(tmp, 'bench.db')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", RELATED_DIR=os.path.join(tmp, 'related'),
+               AI_LIMITS_DB=os.path.join(tmp, 'ai_limits.db'), METRICS_DIR=os.path.join(tmp, 'metrics'))
+    subprocess.run([sys.executable, os.path.join(ROOT, 'setup_db.py'), '--reset', '--synthetic', str(args.protocols),
+                    '--no-related'], env=env, check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+
+    conn = sqlite3.connect(path)
+    params = conn.execute("SELECT count(*) FROM protocol_param").fetchone()[0]
+    results = []
+    for q in QUERIES:
+        kind, values = parse_query(q)
+        slow, scan_ms = timed(lambda: scan(conn, kind, values), max(1, args.repeat // 10))
+        fast, index_ms = timed(lambda: indexed(conn, kind, values), args.repeat)
+        assert slow == fast, f"{q}: scan {len(slow)} != index {len(fast)}"
+        results.append({'query': q, 'matches': len(fast), 'scan_ms': scan_ms, 'index_ms': index_ms})
+        print(f"{q:>28}: {len(fast):>6} protocols  |  scan + parse {scan_ms:>9} ms  |  index {index_ms:>7} ms  "
+              f"({round(scan_ms / max(index_ms, 0.001))}x)")
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT protocol_id FROM protocol_param "
+                        "WHERE param = 'frequency' AND unit = 'Hz' AND low <= 120 AND high >= 80 AND modality = 'TENS'").fetchall()
+    print(f"{args.protocols} protocols, {params} parameter rows; plan: {plan[0][-1]}")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump({'protocols': args.protocols, 'param_rows': params, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ==============================================================================
+# مقارنة إعدادات SQLite: الافتراضي ضد SQLITE_PRAGMAS بتاعة app.py
+# السيناريو: عمليات بحث متوازية (زي workers بتوع gunicorn) أثناء import شغال
+#   python benchmarks/bench_sqlite_tuning.py --readers 4 --seconds 10 --rows 20000
+# ==============================================================================
+
+SEARCH_SQL = ("SELECT id, disease_name FROM protocol "
+              "WHERE lower(disease_name) LIKE lower(?) OR lower(keywords) LIKE lower(?) LIMIT 1")
+SEARCH_TERMS = ["knee", "shoulder", "lumbar", "syn0001", "strain", "ankle", "neuropathy", "not-there"]
+
+# إعدادات SQLite الافتراضية (rollback journal + FULL sync) = زي التطبيق قبل الضبط
+DEFAULT_PROFILE = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def connect(path, pragmas):
+    conn = sqlite3.connect(path, timeout=15)
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def prepare_database(path, rows):
+    from setup_db import synthetic_rows
+    data = synthetic_rows(rows)
+    cols = sorted(data[0])
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE protocol (id INTEGER PRIMARY KEY, {', '.join(c + ' TEXT' for c in cols)})")
+    conn.executemany(f"INSERT INTO protocol ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})",
+                     [tuple(r[c] for c in cols) for r in data])
+    conn.commit()
+    conn.close()
+
+
+def reader(path, pragmas, seconds, start, out):
+    conn = connect(path, pragmas)
+    rng = random.Random(os.getpid())
+    latencies = []; errors = 0
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        term = f"%{rng.choice(SEARCH_TERMS)}%"
+        t0 = time.perf_counter()
+        try:
+            conn.execute(SEARCH_SQL, (term, term)).fetchone()
+            latencies.append(time.perf_counter() - t0)
+        except sqlite3.OperationalError:
+            errors += 1
+    out.put(('reader', latencies, errors))
+
+
+def importer(path, pragmas, seconds, batch, start, out):
+    # زي import_excel: تحديث دفعات من الصفوف وcommit بعد كل دفعة
+    conn = connect(path, pragmas)
+    max_id = conn.execute("SELECT max(id) FROM protocol").fetchone()[0]
+    rng = random.Random(1)
+    written = 0; errors = 0
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        ids = [rng.randrange(1, max_id + 1) for _ in range(batch)]
+        try:
+            conn.executemany("UPDATE protocol SET notes = ?, description = description WHERE id = ?",
+                             [(f"imported {time.time()}", i) for i in ids])
+            conn.commit()
+            written += batch
+        except sqlite3.OperationalError:
+            conn.rollback(); errors += 1
+    out.put(('importer', written, errors))
+
+
+def run_profile(name, pragmas, args):
+    tmp = tempfile.mkdtemp(prefix='physio-bench-')
+    path = os.path.join(tmp, 'bench.db')
+    prepare_database(path, args.rows)
+    # journal_mode بيتخزن في الملف نفسه، فلازم نضبطه قبل ما الـ processes تفتح
+    connect(path, pragmas).close()
+
+    start = mp.Event(); out = mp.Queue()
+    procs = [mp.Process(target=reader, args=(path, pragmas, args.seconds, start, out)) for _ in range(args.readers)]
+    procs.append(mp.Process(target=importer, args=(path, pragmas, args.seconds, args.batch, start, out)))
+    for p in procs: p.start()
+    start.set()
+    results = [out.get() for _ in procs]
+    for p in procs: p.join()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    latencies = sorted(x for kind, lat, _ in results if kind == 'reader' for x in lat)
+    written = sum(w for kind, w, _ in results if kind == 'importer')
+    pct = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 3) if latencies else None
+    return {
+        'profile': name,
+        'pragmas': pragmas,
+        'searches_per_sec': round(len(latencies) / args.seconds, 1),
+        'search_p50_ms': pct(0.50),
+        'search_p95_ms': pct(0.95),
+        'search_p99_ms': pct(0.99),
+        'search_errors': sum(e for kind, _, e in results if kind == 'reader'),
+        'import_rows_per_sec': round(written / args.seconds, 1),
+        'import_errors': sum(e for kind, _, e in results if kind == 'importer'),
+    }
+
+
+def main():
+    from app import SQLITE_PRAGMAS
+    parser = argparse.ArgumentParser(description="Concurrent search throughput during an import: default vs tuned SQLite.")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--json', metavar='FILE', help="write results to FILE as JSON")
+    args = parser.parse_args()
+
+    results = [run_profile('default', DEFAULT_PROFILE, args), run_profile('tuned', SQLITE_PRAGMAS, args)]
+    for r in results:
+        print(f"{r['profile']:>8}: {r['searches_per_sec']:>10} searches/s  p50 {r['search_p50_ms']} ms  "
+              f"p95 {r['search_p95_ms']} ms  p99 {r['search_p99_ms']} ms  errors {r['search_errors']}  |  "
+              f"import {r['import_rows_per_sec']} rows/s (errors {r['import_errors']})")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
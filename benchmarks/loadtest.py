@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import quote, urlencode
+
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==============================================================================
+# Load test من الأول للآخر على gunicorn حقيقي (على جهاز Linux واحد ومن غير نت)
+# - مستخدمين وهميين بيعملوا login، وبعدها خليط: بحث موجود / بحث مش موجود (AI stub بزمن ثابت) / API
+#   + أدمن بيعدل بروتوكولات في نفس الوقت
+# - نفس السيناريو على كذا إعداد gunicorn (worker class : workers : threads)
+# - التقرير: requests/s + p50/p95/p99 لكل endpoint
+#   python benchmarks/loadtest.py --configs sync:4:1,gthread:2:8 --users 40 --seconds 30 --ai-latency-ms 800
+# ==============================================================================
+
+PASSWORD = 'loadtest-password'
+EDIT_FIELDS = ('disease_name', 'category', 'description', 'keywords', 'estim_type', 'estim_params', 'estim_role',
+               'us_type', 'us_params', 'us_role', 'exercises_list', 'exercises_role', 'ex_frequency',
+               'source_ref', 'video_link', 'notes')
+DEFAULT_MIX = 'search_hit=70,search_miss=5,api_list=20,library_changes=5'
+
+
+# ---------------------------------------------------------------------------
+# HTTP/1.1 client صغير على asyncio streams (keep-alive + cookies)
+# ---------------------------------------------------------------------------
+class HttpClient:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+        self.cookies = {}
+
+    async def request(self, method, path, form=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = urlencode(form).encode() if form is not None else b''
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                   "Accept-Encoding: gzip", "Connection: keep-alive", f"Content-Length: {len(body)}"]
+        if form is not None: headers.append("Content-Type: application/x-www-form-urlencoded")
+        if self.cookies: headers.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        try:
+            self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+            await self.writer.drain()
+            return await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            raise
+
+    async def _read_response(self):
+        status = int((await self.reader.readuntil(b"\r\n")).split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readuntil(b"\r\n")).decode('latin-1').strip()
+            if not line: break
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                key, _, val = value.split(';')[0].partition('=')
+                self.cookies[key] = val
+            headers[name] = value
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0: break
+        elif status not in (204, 304):
+            await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try: await self.writer.wait_closed()
+            except ConnectionError: pass
+        self.reader = self.writer = None
+
+
+# ---------------------------------------------------------------------------
+# تجهيز قاعدة البيانات (مرة واحدة) + نسخة نضيفة لكل إعداد
+# ---------------------------------------------------------------------------
+def prepare_template(tmp, args):
+    path = os.path.join(tmp, 'template.db')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", METRICS_DIR=os.path.join(tmp, 'metrics'))
+    subprocess.run([sys.executable, os.path.join(ROOT, 'setup_db.py'), '--reset', '--synthetic', str(args.protocols), '--no-related',
+                    '--admin-email', 'loadtest-admin-0@physio.local', '--admin-password', PASSWORD],
+                   env=env, check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+
+    # hash واحد لكل المستخدمين (pbkdf2 بطيء عن قصد)
+    pw = generate_password_hash(PASSWORD, method='pbkdf2:sha256')
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+    conn = sqlite3.connect(path)
+    users = [(f"loadtest-user-{i}@physio.local", pw, 0, now, 0) for i in range(args.users)]
+    users += [(f"loadtest-admin-{i}@physio.local", pw, 1, now, 1) for i in range(1, args.admins)]
+    conn.executemany('INSERT INTO "user" (email, password, is_admin, created_at, can_print) VALUES (?, ?, ?, ?, ?)', users)
+    conn.commit()
+    names = [r[0] for r in conn.execute("SELECT disease_name FROM protocol ORDER BY random() LIMIT 500")]
+    cols = ", ".join(EDIT_FIELDS)
+    edits = [dict(zip(('id',) + EDIT_FIELDS, r)) for r in
+             conn.execute(f"SELECT id, {cols} FROM protocol ORDER BY random() LIMIT 200")]
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return path, names, edits
+
+
+def copy_database(template, target):
+    src, dst = sqlite3.connect(template), sqlite3.connect(target)
+    src.backup(dst)
+    src.close(); dst.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(config, db_path, tmp, args):
+    worker_class, workers, threads = config
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", LOADTEST_AI_LATENCY_MS=str(args.ai_latency_ms),
+               METRICS_DIR=os.path.join(tmp, 'metrics'), LIBRARY_DIR=os.path.join(tmp, 'library'),
+               PDF_CACHE_DIR=os.path.join(tmp, 'pdf'), SECRET_KEY='loadtest')
+    cmd = [sys.executable, '-m', 'gunicorn', '-k', worker_class, '-w', str(workers), '--threads', str(threads),
+           '-b', f'127.0.0.1:{port}', '--chdir', ROOT, '--pythonpath', 'benchmarks', '--timeout', '120',
+           '--log-level', 'warning', 'loadtest_app:app']
+    proc = subprocess.Popen(cmd, env=env, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1): return proc, port
+        except OSError:
+            if proc.poll() is not None: raise RuntimeError(f"gunicorn exited for {config}")
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"gunicorn did not start for {config}")
+
+
+# ---------------------------------------------------------------------------
+# المستخدمين الوهميين
+# ---------------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self.measure_from = 0.0
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, name, started, ok):
+        if started < self.measure_from and name != 'login': return  # الـ warm-up مش محسوب
+        if ok: self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        else: self.errors[name] = self.errors.get(name, 0) + 1
+
+
+async def timed(client, rec, name, method, path, form=None, ok_status=(200,)):
+    started = time.perf_counter()
+    try:
+        status = await client.request(method, path, form)
+        rec.add(name, started, status in ok_status)
+    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+        rec.add(name, started, False)
+
+
+async def login(port, email, rec):
+    client = HttpClient('127.0.0.1', port)
+    await timed(client, rec, 'login', 'POST', '/login', {'email': email, 'password': PASSWORD}, ok_status=(302,))
+    return client
+
+
+async def virtual_user(client, rec, deadline, mix, names, rng):
+    actions, weights = zip(*mix.items())
+    version = 0
+    while time.perf_counter() < deadline:
+        action = rng.choices(actions, weights)[0]
+        if action == 'search_hit':
+            await timed(client, rec, action, 'GET', f"/?disease={quote(rng.choice(names))}")
+        elif action == 'search_miss':
+            await timed(client, rec, action, 'GET', f"/?disease=zz-unknown-{rng.randrange(10 ** 9)}")
+        elif action == 'api_list':
+            await timed(client, rec, action, 'GET', f"/api/protocols?q={quote(rng.choice(names)[:12])}&limit=20")
+        elif action == 'library_changes':
+            await timed(client, rec, action, 'GET', f"/api/library/changes?since={version}", ok_status=(200, 410))
+            version = max(0, version + rng.randrange(-5, 50))
+    await client.close()
+
+
+async def admin_user(client, rec, deadline, edits, rng, pause):
+    n = 0
+    while time.perf_counter() < deadline:
+        row = rng.choice(edits)
+        n += 1
+        form = {k: (v or '') for k, v in row.items() if k != 'id'}
+        form['notes'] = f"{form['notes']}\nload test edit {n}"
+        await timed(client, rec, 'admin_edit', 'POST', f"/admin/edit/{row['id']}", form, ok_status=(302,))
+        await asyncio.sleep(pause)
+    await client.close()
+
+
+async def run_load(port, args, mix, names, edits):
+    rec = Recorder()
+    rng = random.Random(args.seed)
+    # الـ login الأول (pbkdf2 تقيل على الـ CPU) وبعدين يبدأ الوقت
+    users = await asyncio.gather(*[login(port, f"loadtest-user-{i}@physio.local", rec) for i in range(args.users)])
+    admins = await asyncio.gather(*[login(port, f"loadtest-admin-{i}@physio.local", rec) for i in range(args.admins)])
+    start = time.perf_counter()
+    rec.measure_from = start + args.warmup
+    deadline = start + args.warmup + args.seconds
+    tasks = [virtual_user(c, rec, deadline, mix, names, random.Random(rng.random())) for c in users]
+    tasks += [admin_user(c, rec, deadline, edits, random.Random(rng.random()), args.admin_pause) for c in admins]
+    await asyncio.gather(*tasks)
+    return rec
+
+
+def summarize(config, rec, seconds):
+    def pct(values, q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2) if values else None
+    rows = []
+    for name in sorted(set(rec.latencies) | set(rec.errors)):
+        values = sorted(rec.latencies.get(name, []))
+        rows.append({'endpoint': name, 'requests': len(values), 'errors': rec.errors.get(name, 0),
+                     'rps': None if name == 'login' else round(len(values) / seconds, 2),
+                     'p50_ms': pct(values, 0.50), 'p95_ms': pct(values, 0.95), 'p99_ms': pct(values, 0.99)})
+    total = sum(r['requests'] for r in rows if r['rps'] is not None)
+    return {'config': ':'.join(map(str, config)), 'total_rps': round(total / seconds, 2), 'endpoints': rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test against gunicorn with a stubbed Gemini.")
+    parser.add_argument('--configs', default='sync:4:1,gthread:2:8',
+                        help="comma separated worker_class:workers:threads (gevent needs the gevent package)")
+    parser.add_argument('--users', type=int, default=40, help="concurrent virtual users")
+    parser.add_argument('--admins', type=int, default=1, help="concurrent admins editing protocols")
+    parser.add_argument('--admin-pause', type=float, default=0.5, help="seconds between admin edits")
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--protocols', type=int, default=5000, help="synthetic protocols in the library")
+    parser.add_argument('--ai-latency-ms', type=float, default=800)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"action weights (default {DEFAULT_MIX})")
+    parser.add_argument('--seed', type=int, default=2026)
+    parser.add_argument('--json', metavar='FILE', help="write results to FILE as JSON")
+    args = parser.parse_args()
+
+    mix = {k: float(v) for k, v in (part.split('=') for part in args.mix.split(','))}
+    configs = []
+    for part in args.configs.split(','):
+        worker_class, workers, threads = part.split(':')
+        configs.append((worker_class, int(workers), int(threads)))
+
+    tmp = tempfile.mkdtemp(prefix='physio-load-')
+    results = []
+    try:
+        template, names, edits = prepare_template(tmp, args)
+        for config in configs:
+            db_path = os.path.join(tmp, f"{'-'.join(map(str, config))}.db")
+            copy_database(template, db_path)
+            proc, port = start_server(config, db_path, tmp, args)
+            try:
+                rec = asyncio.run(run_load(port, args, mix, names, edits))
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+            summary = summarize(config, rec, args.seconds)
+            results.append(summary)
+            print(f"\n{summary['config']}  ({args.users} users, {args.admins} admins, AI {args.ai_latency_ms:.0f} ms)"
+                  f"  total {summary['total_rps']} req/s")
+            print(f"  {'endpoint':<16} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+            for r in summary['endpoints']:
+                print(f"  {r['endpoint']:<16} {r['requests']:>7} {r['errors']:>5} {r['rps'] or '-':>8} "
+                      f"{r['p50_ms'] or '-':>9} {r['p95_ms'] or '-':>9} {r['p99_ms'] or '-':>9}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
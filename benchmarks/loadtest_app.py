@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as physio  # noqa: E402
+
+# ==============================================================================
+# التطبيق نفسه بس Gemini متبدل بـ stub (من غير شبكة) بزمن رد ثابت - لـ benchmarks/loadtest.py
+#   gunicorn --pythonpath benchmarks loadtest_app:app
+# LOADTEST_AI_LATENCY_MS: زمن رد الـ AI المزيف (افتراضي 800ms زي gemini-1.5-flash تقريباً)
+# ==============================================================================
+
+AI_LATENCY = float(os.environ.get('LOADTEST_AI_LATENCY_MS', 800)) / 1000
+
+
+class _StubResponse:
+    usage_metadata = None
+
+    def __init__(self, text):
+        self.text = text
+
+
+def fake_generate_content(prompt, generation_config=None):
+    time.sleep(AI_LATENCY)
+    name = prompt.split('"')[1] if prompt.count('"') >= 2 else "Unknown"
+    return _StubResponse("```json\n" + json.dumps({
+        "disease_name": name, "keywords": f"{name}, load test",
+        "description": f"Stub protocol for {name}. " * 20,
+        "estim_type": "TENS", "estim_params": "Freq: 80-120 Hz. Width: 100 µs.", "estim_role": "Pain relief",
+        "us_type": "Pulsed", "us_params": "1 MHz, 0.8 W/cm²", "us_role": "Tissue healing",
+        "exercises_list": "".join(f"- <b>Exercise {i}</b><br>- Sets: 3 | Reps: 12<br><br>" for i in range(8)),
+        "exercises_role": "Strength", "source_ref": "Stub", "video_link": "", "electrode_image": "",
+    }) + "\n```")
+
+
+physio.model.generate_content = fake_generate_content
+app = physio.app
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import threading
+import time
+from email import message_from_bytes, policy
+
+# ==============================================================================
+# سيرفر SMTP محلي للتجربة (بديل aiosmtpd من المكتبة القياسية): بيستقبل الرسايل ويحفظها في الذاكرة
+# - latency: تأخير لكل رسالة (زي سيرفر بطيء) / fail_first: أول N مستلمين بيترفضوا 451 (فشل مؤقت)
+# - للتطوير: python benchmarks/smtp_standin.py --port 2525
+#   وبعدين MAIL_SERVER=127.0.0.1 MAIL_PORT=2525 MAIL_USE_TLS=0 gunicorn app:app
+# ==============================================================================
+
+
+class SMTPStandIn:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_first=0, verbose=False):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail_left = fail_first
+        self.verbose = verbose
+        self.messages = []      # (mail_from, [rcpt], email.message.EmailMessage)
+        self.connections = 0
+        self.rejected = 0
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name='smtp-standin', daemon=True).start()
+        self._ready.wait(5)
+        return self
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        loop.run_forever()
+
+    def wait_for(self, count, timeout=30):
+        deadline = time.monotonic() + timeout
+        while len(self.messages) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return len(self.messages) >= count
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        reply = lambda line: writer.write(f"{line}\r\n".encode())
+        reply("220 standin ESMTP")
+        mail_from, rcpts = None, []
+        while True:
+            line = await reader.readline()
+            if not line: break
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                reply("250-standin"); reply("250 8BITMIME")
+            elif verb == 'HELO':
+                reply("250 standin")
+            elif verb == 'MAIL':
+                mail_from, rcpts = command[10:].strip(' <>'), []
+                reply("250 OK")
+            elif verb == 'RCPT':
+                if self.fail_left > 0:
+                    self.fail_left -= 1; self.rejected += 1
+                    reply("451 4.3.0 Try again later")
+                else:
+                    rcpts.append(command[8:].strip(' <>'))
+                    reply("250 OK")
+            elif verb == 'DATA':
+                reply("354 End data with <CR><LF>.<CR><LF>")
+                await writer.drain()
+                lines = []
+                while True:
+                    data = await reader.readline()
+                    if data in (b'.\r\n', b'.\n', b''): break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                if self.latency: await asyncio.sleep(self.latency)
+                message = message_from_bytes(b''.join(lines), policy=policy.default)
+                self.messages.append((mail_from, rcpts, message))
+                if self.verbose: print(f"📨 {rcpts} {message['Subject']}")
+                reply("250 OK queued")
+            elif verb in ('RSET', 'NOOP'):
+                mail_from, rcpts = None, []
+                reply("250 OK")
+            elif verb == 'QUIT':
+                reply("221 Bye")
+                await writer.drain()
+                break
+            else:
+                reply("502 Command not implemented")
+            await writer.drain()
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in that prints what it receives.")
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    standin = SMTPStandIn(port=args.port, latency=args.latency, verbose=True).start()
+    print(f"✅ SMTP stand-in on 127.0.0.1:{standin.port}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
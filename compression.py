@@ -0,0 +1,200 @@
+import re
+import zlib
+
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli  # اختياري: pip install brotli
+except ImportError:
+    brotli = None
+
+# ==============================================================================
+# WSGI Middleware: ضغط gzip/brotli + تصغير HTML (اختياري)
+# - الردود الصغيرة (أقل من min_size) بتتبعت زي ما هي
+# - الأنواع المسموحة بس (HTML, JSON, CSS, JS ...) - الصور والـ xlsx مضغوطة أصلاً
+# - الردود الكبيرة أو اللي من غير Content-Length بتتضغط Streaming قطعة قطعة
+# ==============================================================================
+
+COMPRESSIBLE_TYPES = frozenset([
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/xml', 'image/svg+xml',
+])
+
+# ETag قوي مع body مضغوط لازم يختلف عن الأصلي => بنزود لاحقة ونشيلها من If-None-Match
+_ETAG_SUFFIX = re.compile(r'-(gzip|br)"')
+
+# المناطق اللي المسافات فيها مهمة (pre-wrap في الملاحظات الطبية)
+_PROTECTED = re.compile(
+    r'<(pre|textarea|script)\b.*?</\1\s*>'
+    r'|<(\w+)\b[^>]*\bclass="[^"]*\bnotes-content\b[^"]*"[^>]*>.*?</\2\s*>',
+    re.S | re.I)
+_WHITESPACE_RUN = re.compile(r'[ \t\r\f\v]*\n\s*')
+
+
+def minify_html(html):
+    # أي مسافات فيها سطر جديد => سطر واحد (المتصفح بيعاملهم زي مسافة واحدة أصلاً)
+    out, pos = [], 0
+    for m in _PROTECTED.finditer(html):
+        out.append(_WHITESPACE_RUN.sub('\n', html[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(_WHITESPACE_RUN.sub('\n', html[pos:]))
+    return ''.join(out)
+
+
+def negotiate_encoding(accept_encoding):
+    prefs = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try: q = float(params.strip()[2:])
+            except ValueError: q = 0.0
+        if name: prefs[name] = q
+    for name in (['br'] if brotli else []) + ['gzip']:
+        if prefs.get(name, prefs.get('*', 0)) > 0:
+            return name
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding, level, brotli_quality):
+        if encoding == 'br':
+            self._c = brotli.Compressor(quality=brotli_quality)
+            self.compress, self.flush, self.finish = self._c.process, self._c.flush, self._c.finish
+        else:
+            self._c = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip header
+            self.compress = self._c.compress
+            self.flush = lambda: self._c.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = self._c.flush
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=1024, level=6, brotli_quality=5,
+                 stream_threshold=256 * 1024, minify=False, mimetypes=COMPRESSIBLE_TYPES):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.stream_threshold = stream_threshold
+        self.minify = minify
+        self.mimetypes = mimetypes
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+        suffix = None
+        if 'HTTP_IF_NONE_MATCH' in environ:
+            m = _ETAG_SUFFIX.search(environ['HTTP_IF_NONE_MATCH'])
+            suffix = m and m.group(1)
+            environ['HTTP_IF_NONE_MATCH'] = _ETAG_SUFFIX.sub('"', environ['HTTP_IF_NONE_MATCH'])
+        encoding = negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+
+        state = {}
+        def capture(status, headers, exc_info=None):
+            state.update(status=status, headers=headers, exc_info=exc_info)
+            return self._unsupported_write
+
+        app_iter = self.app(environ, capture)
+        chunks = iter(app_iter)
+        first = [] if 'status' in state else [next(chunks, b'')]
+        status, headers = state['status'], state['headers']
+
+        # 304: نرجع نفس الـ ETag اللي العميل عنده (بلاحقة الضغط)
+        if status.startswith('304') and suffix:
+            etag = _header(headers, 'etag')
+            if etag and etag.startswith('"'):
+                _set_header(headers, 'ETag', f'{etag[:-1]}-{suffix}"')
+
+        ctype = _header(headers, 'content-type') or ''
+        mimetype = ctype.split(';')[0].strip().lower()
+        if mimetype in self.mimetypes:
+            _add_vary(headers)
+
+        minify = self.minify and mimetype == 'text/html'
+        length = _header(headers, 'content-length')
+        if (not self._eligible(status, headers, mimetype) or (encoding is None and not minify)
+                or (length is not None and int(length) < self.min_size and not minify)):
+            start_response(status, headers, state['exc_info'])
+            return self._passthrough(app_iter, first, chunks)
+
+        # ---- رد معروف الحجم ومش ضخم: نضغطه مرة واحدة ----
+        if length is not None and int(length) <= self.stream_threshold:
+            try:
+                body = b''.join(_chain(first, chunks))
+            finally:
+                if hasattr(app_iter, 'close'): app_iter.close()
+            if minify:
+                body = minify_html(body.decode('utf-8')).encode('utf-8')
+            if encoding and len(body) >= self.min_size:
+                c = _Compressor(encoding, self.level, self.brotli_quality)
+                body = c.compress(body) + c.finish()
+                _mark_encoded(headers, encoding)
+            _set_header(headers, 'Content-Length', str(len(body)))
+            start_response(status, headers, state['exc_info'])
+            return [body]
+
+        if encoding is None:
+            start_response(status, headers, state['exc_info'])
+            return self._passthrough(app_iter, first, chunks)
+
+        # ---- Streaming: كل قطعة بتتضغط وتتبعت فوراً (PDF دفعة، ردود ضخمة) ----
+        _mark_encoded(headers, encoding)
+        headers[:] = [(k, v) for k, v in headers if k.lower() != 'content-length']
+        start_response(status, headers, state['exc_info'])
+        return ClosingIterator(self._stream(_chain(first, chunks), encoding), getattr(app_iter, 'close', None))
+
+    @staticmethod
+    def _passthrough(app_iter, first, chunks):
+        # من غير لف لو مقريناش حاجة: عشان wsgi.file_wrapper (sendfile) يفضل شغال للملفات
+        if not first: return app_iter
+        return ClosingIterator(_chain(first, chunks), getattr(app_iter, 'close', None))
+
+    def _stream(self, chunks, encoding):
+        c = _Compressor(encoding, self.level, self.brotli_quality)
+        for chunk in chunks:
+            if chunk:
+                data = c.compress(chunk) + c.flush()
+                if data: yield data
+        yield c.finish()
+
+    def _eligible(self, status, headers, mimetype):
+        if not status.startswith('200') or mimetype not in self.mimetypes:
+            return False
+        if _header(headers, 'content-encoding') or _header(headers, 'content-range'):
+            return False
+        return 'no-transform' not in (_header(headers, 'cache-control') or '')
+
+    @staticmethod
+    def _unsupported_write(data):
+        raise RuntimeError("CompressionMiddleware does not support the WSGI write() callable")
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+def _header(headers, name):
+    for k, v in headers:
+        if k.lower() == name: return v
+    return None
+
+
+def _set_header(headers, name, value):
+    headers[:] = [(k, v) for k, v in headers if k.lower() != name.lower()] + [(name, value)]
+
+
+def _add_vary(headers):
+    vary = _header(headers, 'vary')
+    if vary is None:
+        headers.append(('Vary', 'Accept-Encoding'))
+    elif 'accept-encoding' not in vary.lower():
+        _set_header(headers, 'Vary', f"{vary}, Accept-Encoding")
+
+
+def _mark_encoded(headers, encoding):
+    headers.append(('Content-Encoding', encoding))
+    etag = _header(headers, 'etag')
+    if etag and etag.startswith('"') and etag.endswith('"'):
+        _set_header(headers, 'ETag', f'{etag[:-1]}-{encoding}"')
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+
+# ==============================================================================
+# إعدادات gunicorn (بيتقري تلقائياً من المجلد الحالي: gunicorn app:app)
+# - preload_app: التطبيق بيتحمل في الـ master مرة واحدة، وبعدين الـ workers بيتعملوا fork
+#   => الـ snapshot بتاع البحث (library_snapshot.py) بيتبني مرة واحدة ويتشارك copy-on-write
+# - GUNICORN_PRELOAD=0 يرجع للتحميل جوه كل worker (البحث بيرجع لقاعدة البيانات)
+# - الذاكرة لكل worker (PSS/RSS) على /metrics: process_memory_bytes
+# - LIBRARY_ARTIFACT=library.db: المكتبة بتتحمل من الملف الجاهز (setup_db.py --build-artifact) قبل الـ workers
+#   الجديد والمتغير بس (content_hash) => restart من غير تغيير في المصادر مبيكتبش حاجة
+# - worker بيخرج: آخر أرقامه بتتكتب (worker_exit)، والـ master بيجمعها في archive.json ويمسح ملفه (child_exit)
+# ==============================================================================
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+library_artifact = os.environ.get('LIBRARY_ARTIFACT')
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# نفس مسار app.py (instance_path الافتراضي) - الـ master من غير preload مبيعملش import لـ app
+metrics_dir = os.environ.get('METRICS_DIR') or os.path.join(ROOT, 'instance', 'metrics')
+
+
+def load_library_artifact(server):
+    if server.cfg.preload_app:
+        from setup_db import seed
+        try:
+            seed(artifact=library_artifact)
+        except Exception as e:
+            server.log.warning("Library artifact %s not loaded: %s", library_artifact, e)
+        return
+    # من غير preload التطبيق مش متحمل في الـ master (ولازم ميتحملش هنا عشان الـ workers)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'setup_db.py'),
+                             '--artifact', library_artifact])
+    if result.returncode: server.log.warning("Library artifact %s not loaded (exit %d)", library_artifact, result.returncode)
+
+
+def when_ready(server):
+    # في الـ master بعد تحميل التطبيق وقبل أول fork
+    if library_artifact: load_library_artifact(server)
+    if not server.cfg.preload_app: return
+    from app import preload_library_snapshot
+    stats = preload_library_snapshot()
+    if stats:
+        server.log.info("Library snapshot: %(rows)d protocols, %(bytes)d bytes, generation %(generation)d", stats)
+
+
+def worker_exit(server, worker):
+    # جوه الـ worker قبل ما يخرج: الأرقام من آخر flush متضيعش
+    from app import metrics
+    try: metrics.flush()
+    except OSError as e: server.log.warning("Metrics flush on exit failed: %s", e)
+
+
+def child_exit(server, worker):
+    # في الـ master بعد ما الـ worker مات
+    from metrics import archive_worker
+    try: archive_worker(metrics_dir, worker.pid)
+    except OSError as e: server.log.warning("Metrics archive for worker %s failed: %s", worker.pid, e)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# ==============================================================================
+# ملف المكتبة الجاهز (artifact): ملفات JSON متحولة وقت الـ build لملف SQLite واحد
+# - protocol: صف لكل مرض بكل الأعمدة جاهزة (التمارين HTML متولدة خلاص) + content_hash للصف
+#   العمود الفاضي (NULL) = المصدر مبيحددش قيمته (التحميل مبيغيرش القيمة الموجودة)
+# - search_key: مفاتيح البحث لكل مرض (نفس keys_for بتاعة التطبيق)
+# - source: الملفات اللي اتبنى منها + sha256 لكل ملف / meta: نسخة الشكل + الأعمدة + hash المكتبة كلها
+# - وقت التشغيل: ATTACH للملف read-only (SQLite) و INSERT ... SELECT واحدة (setup_db.load_artifact)
+#   => مفيش JSON parsing ولا بناء صف صف مع كل deploy
+# ==============================================================================
+
+FORMAT = 1
+
+
+def content_hash(row, columns):
+    # نفس الصف = نفس الـ hash بغض النظر عن ترتيب المفاتيح في الـ JSON
+    payload = json.dumps([row.get(c) for c in columns], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def uri(path):
+    # ATTACH بالـ URI ده = read-only (أي كتابة عليه بترجع error)
+    return f"file:{os.path.abspath(path)}?mode=ro"
+
+
+def _schema(columns):
+    cols = ', '.join(f'"{c}" TEXT' for c in columns)
+    return f"""
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE source (name TEXT PRIMARY KEY, sha256 TEXT NOT NULL, bytes INTEGER NOT NULL);
+CREATE TABLE protocol (disease_name TEXT PRIMARY KEY, content_hash TEXT NOT NULL, {cols});
+CREATE TABLE search_key (disease_name TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (disease_name, key)) WITHOUT ROWID;
+"""
+
+
+def build(path, rows, columns, keys_for, sources=()):
+    # rows: صفوف بروتوكولات مدموجة (merge_rows) - columns: أعمدة المحتوى بالترتيب (من غير disease_name)
+    # بيتكتب في ملف مؤقت وبعدين os.replace => التطبيق عمره ما يشوف ملف نص مكتوب
+    started = time.perf_counter()
+    columns = [c for c in columns if c != 'disease_name']
+    previous = hashes(path) if os.path.exists(path) else {}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp): os.remove(tmp)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(_schema(columns))
+        records, current = [], {}
+        for row in rows:
+            name = row['disease_name']
+            current[name] = content_hash(row, ['disease_name'] + columns)
+            records.append((name, current[name], *[row.get(c) for c in columns]))
+        placeholders = ', '.join('?' for _ in range(len(columns) + 2))
+        conn.executemany(f"INSERT INTO protocol VALUES ({placeholders})", records)
+        conn.executemany("INSERT INTO search_key VALUES (?, ?)",
+                         [(row['disease_name'], key) for row in rows for key in keys_for(row['disease_name'], row.get('keywords'))])
+        conn.executemany("INSERT INTO source VALUES (?, ?, ?)",
+                         [(os.path.basename(p), file_sha256(p), os.path.getsize(p)) for p in sources])
+        library_hash = hashlib.sha256(''.join(sorted(current.values())).encode()).hexdigest()
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('format', str(FORMAT)), ('columns', json.dumps(columns)), ('rows', str(len(records))),
+            ('library_hash', library_hash), ('built_at', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))])
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+    return {
+        'rows': len(current),
+        'bytes': os.path.getsize(path),
+        'library_hash': library_hash,
+        # الفرق عن الملف اللي كان موجود (إيه اللي الـ deploy ده هيغيره)
+        'added': sum(1 for n in current if n not in previous),
+        'changed': sum(1 for n, h in current.items() if n in previous and previous[n] != h),
+        'removed': sum(1 for n in previous if n not in current),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def _open(path):
+    if not os.path.exists(path): raise FileNotFoundError(f"Library artifact not found: {path}")
+    return sqlite3.connect(uri(path), uri=True)
+
+
+def read_meta(path):
+    conn = _open(path)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        sources = conn.execute("SELECT name, sha256, bytes FROM source ORDER BY name").fetchall()
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"Not a library artifact: {path} ({e})")
+    finally:
+        conn.close()
+    if meta.get('format') != str(FORMAT):
+        raise ValueError(f"Library artifact format {meta.get('format')} != {FORMAT}: rebuild it (setup_db.py --build-artifact)")
+    meta['columns'] = json.loads(meta['columns'])
+    meta['rows'] = int(meta['rows'])
+    meta['sources'] = [{'name': n, 'sha256': h, 'bytes': b} for n, h, b in sources]
+    return meta
+
+
+def hashes(path):
+    conn = _open(path)
+    try:
+        return dict(conn.execute("SELECT disease_name, content_hash FROM protocol"))
+    except sqlite3.DatabaseError:
+        return {}
+    finally:
+        conn.close()
+
+
+def read_rows(path, table, columns):
+    # لقواعد البيانات اللي مفيهاش ATTACH (Postgres): الصفوف جاهزة بنفس ترتيب الأعمدة
+    conn = _open(path)
+    try:
+        return conn.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall()
+    finally:
+        conn.close()
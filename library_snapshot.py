@@ -0,0 +1,166 @@
+import gc
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+# ==============================================================================
+# نسخة read-only مضغوطة من المكتبة في الذاكرة للبحث (من غير SQL)
+# - الـ master بتاع gunicorn (preload_app) بيبنيها قبل الـ fork => كل الـ workers بيشاركوها (copy-on-write)
+# - التخزين: نص واحد كبير (الاسم + الكلمات الدلالية بعد normalize لكل بروتوكول) + arrays أرقام
+#   => عدد objects قليل جداً، فالـ refcount/GC مبيلمسوش صفحات الذاكرة المشتركة (ومعاهم gc.freeze)
+# - التعديلات بعد الـ fork: الـ generation (آخر id في library_change) بيتقارن كل check_seconds
+#   والتغييرات بتتحط في overlay صغير خاص بالـ worker، ولو كبر أوي بيتعمل rebuild
+# ==============================================================================
+
+_ROW_END = '\x1e'
+_FIELD_SEP = '\x1f'
+
+
+class Snapshot:
+    __slots__ = ('generation', 'ids', 'offsets', 'text', 'categories', 'category_index')
+
+    def __init__(self, rows, generation, normalize=str.lower):
+        # rows: (id, disease_name, keywords, category) بترتيب الـ id
+        self.generation = generation
+        self.ids = array('q')
+        self.offsets = array('q')
+        self.category_index = array('H')
+        categories = {}
+        parts, pos = [], 0
+        for pid, name, keywords, category in rows:
+            text = f"{normalize(name or '')}{_FIELD_SEP}{normalize(keywords or '')}{_ROW_END}"
+            self.ids.append(pid)
+            self.offsets.append(pos)
+            self.category_index.append(categories.setdefault(category or '', len(categories)))
+            parts.append(text)
+            pos += len(text)
+        self.text = ''.join(parts)
+        self.categories = tuple(categories)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def first(self, term, skip=()):
+        # أول id (الأصغر) اسمه أو كلماته فيها term - زي ilike + first() في SQL
+        text, offsets = self.text, self.offsets
+        pos = text.find(term)
+        while pos != -1:
+            i = bisect_right(offsets, pos) - 1
+            pid = self.ids[i]
+            if pid not in skip: return pid
+            nxt = offsets[i + 1] if i + 1 < len(offsets) else len(text)
+            pos = text.find(term, nxt)
+        return None
+
+    def category(self, i):
+        return self.categories[self.category_index[i]]
+
+    def nbytes(self):
+        return (len(self.text.encode('utf-8')) + self.ids.itemsize * len(self.ids)
+                + self.offsets.itemsize * len(self.offsets) + self.category_index.itemsize * len(self.category_index))
+
+
+class LibrarySnapshot:
+    def __init__(self, load_rows, load_version, load_changed, check_seconds=2.0, overlay_max=2000, normalize=str.lower):
+        # load_rows(ids=None) => (id, name, keywords, category) | load_version() => generation
+        # load_changed(since, until) => ids اتغيرت
+        self.load_rows = load_rows
+        self.load_version = load_version
+        self.load_changed = load_changed
+        self.check_seconds = check_seconds
+        self.overlay_max = overlay_max
+        self.normalize = normalize
+        self.base = None
+        self.overlay = {}      # id => (name, keywords) بعد normalize، أو None لو اتمسح
+        self.generation = 0
+        self._checked = 0.0
+        self._stale = False
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.base is not None
+
+    def build(self):
+        generation = self.load_version()
+        base = Snapshot(self.load_rows(), generation, self.normalize)
+        with self._lock:
+            self.base, self.overlay, self.generation = base, {}, generation
+            self._checked = time.monotonic()
+        return base
+
+    def freeze(self):
+        # في الـ master قبل الـ fork: الـ objects الموجودة تخرج من الـ GC فصفحاتها متتنسخش في الـ workers
+        gc.collect()
+        gc.freeze()
+
+    def mark_stale(self):
+        self._stale = True
+
+    def refresh(self):
+        if not self.ready: return
+        now = time.monotonic()
+        if not self._stale and now - self._checked < self.check_seconds: return
+        with self._lock:
+            if not self._stale and now - self._checked < self.check_seconds: return
+            self._stale = False
+            self._checked = now
+            version = self.load_version()
+            if version == self.generation: return
+            if version < self.generation:
+                self.build_locked(version)
+                return
+            changed = self.load_changed(self.generation, version)
+            if len(self.overlay) + len(changed) > self.overlay_max:
+                self.build_locked(version)
+                return
+            overlay = dict(self.overlay)
+            found = {row[0]: row for row in self.load_rows(changed)} if changed else {}
+            for pid in changed:
+                row = found.get(pid)
+                overlay[pid] = ((self.normalize(row[1] or ''), self.normalize(row[2] or '')) if row else None)
+            self.overlay, self.generation = overlay, version
+
+    def build_locked(self, version):
+        # rebuild جوه الـ worker (النسخة دي مش مشتركة) - بيحصل نادراً بعد import كبير
+        self.base, self.overlay, self.generation = Snapshot(self.load_rows(), version, self.normalize), {}, version
+
+    def search(self, term):
+        term = self.normalize(term)
+        if not term or _ROW_END in term or _FIELD_SEP in term: return None
+        base, overlay = self.base, self.overlay
+        hits = [pid for pid, row in overlay.items() if row and (term in row[0] or term in row[1])]
+        pid = base.first(term, skip=overlay)
+        if pid is not None: hits.append(pid)
+        return min(hits) if hits else None
+
+    def stats(self):
+        base = self.base
+        return {'rows': len(base) if base else 0, 'bytes': base.nbytes() if base else 0,
+                'overlay': len(self.overlay), 'generation': self.generation}
+
+
+def process_memory():
+    # Linux: PSS بيقسم الصفحات المشتركة على الـ processes => ده الرقم الحقيقي لكل worker
+    out = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    out[key.strip()] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        return {'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    return {
+        'rss': out.get('Rss', 0),
+        'pss': out.get('Pss', 0),
+        'shared': out.get('Shared_Clean', 0) + out.get('Shared_Dirty', 0),
+        'private': out.get('Private_Clean', 0) + out.get('Private_Dirty', 0),
+    }
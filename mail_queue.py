@@ -0,0 +1,141 @@
+import os
+import random
+import smtplib
+import threading
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+# ==============================================================================
+# طابور الإيميلات (استرجاع الباسورد والتنبيهات): الـ request بيكتب صف في الجدول بس ويرجع فوراً
+# - thread في كل worker بيسحب دفعات (batch) ويبعتها على نفس اتصال الـ SMTP
+#   (الاتصال بيفضل مفتوح طول ما فيه شغل، وبيتقفل بعد idle_seconds من غير رسايل)
+# - الحجز بـ lease: لو الـ worker مات في النص، الرسايل بترجع للطابور بعد lease_seconds
+# - الفشل المؤقت (4xx / انقطاع الاتصال) => إعادة المحاولة بعد backoff بيتضاعف (+ jitter)
+#   الفشل الدائم (5xx) أو max_attempts => failed
+# - الـ request بيصحي الـ thread بعد الـ commit، وغير كده بيبص على الطابور كل poll_seconds
+#   (إعادة المحاولات + الرسايل اللي workers تانية حطتها)
+# ==============================================================================
+
+
+def is_permanent(error):
+    # 5xx من السيرفر = الرسالة دي مش هتتبعت مهما حاولنا (عنوان غلط، مرفوضة)
+    code = getattr(error, 'smtp_code', None)
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code = min(c for c, _ in error.recipients.values())
+    return code is not None and 500 <= code < 600
+
+
+def is_connection_error(error):
+    # SMTPException نفسها OSError: الرفض (4xx/5xx) مش مشكلة في الاتصال
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)): return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class MailQueue:
+    def __init__(self, claim, finish, connect, build_message, batch_size=20, lease_seconds=300,
+                 poll_seconds=30, idle_seconds=30, max_attempts=6, backoff=(30, 3600), enabled=True, context=None):
+        # claim(limit, lease_seconds) => صفوف محجوزة للـ process دي (id, attempts, ...)
+        # finish(sent rows, [(row, error, retry_at أو None = خلاص)])
+        # connect() => context manager فيه send(message) (flask_mail: mail.connect())
+        self.claim = claim
+        self.finish = finish
+        self.connect = connect
+        self.build_message = build_message
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.idle_seconds = idle_seconds
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.enabled = enabled
+        self.context = context
+        self._reset_lock()
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        # بعد الـ fork: مفيش thread ولا اتصال SMTP متورث من الـ master
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._stack = None
+
+    # ---- الـ thread ----
+    def start(self):
+        # مرة واحدة في كل process (أول request بعد الـ fork)
+        if not self.enabled or self._pid == os.getpid(): return
+        with self._start_lock:
+            if self._pid == os.getpid(): return
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name='mail-queue', daemon=True).start()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            woke = self._wake.wait(self.idle_seconds if self._stack else self.poll_seconds)
+            self._wake.clear()
+            if not woke: self._close()
+            try:
+                with self.context():
+                    self.drain()
+            except Exception as e:
+                print(f"⚠️ Mail queue drain failed: {e}")
+
+    # ---- الإرسال ----
+    def drain(self):
+        # دفعات ورا بعض لحد ما الطابور يفضى => {'sent': n, 'retry': n, 'failed': n}
+        stats = {'sent': 0, 'retry': 0, 'failed': 0}
+        while True:
+            rows = self.claim(self.batch_size, self.lease_seconds)
+            if not rows: return stats
+            sent, failures = self._send_batch(rows)
+            self.finish(sent, failures)
+            stats['sent'] += len(sent)
+            for _, _, retry_at in failures:
+                stats['retry' if retry_at else 'failed'] += 1
+            if len(rows) < self.batch_size: return stats
+
+    def _send_batch(self, rows):
+        sent, failures = [], []
+        for i, row in enumerate(rows):
+            try:
+                self._send(self.build_message(row))
+                sent.append(row)
+            except Exception as e:
+                failures.append((row, e, self.retry_at(row, e)))
+                if is_connection_error(e):
+                    # السيرفر مش متاح: الباقي يستنى المحاولة الجاية بدل ما نفتح اتصال لكل رسالة
+                    self._close()
+                    failures += [(r, e, self.retry_at(r, e)) for r in rows[i + 1:]]
+                    break
+        return sent, failures
+
+    def _send(self, message):
+        if self._stack is not None:
+            try:
+                return self._conn.send(message)
+            except smtplib.SMTPServerDisconnected:
+                self._close()   # الاتصال المفتوح اتقفل من عند السيرفر (idle timeout): نفتح واحد جديد
+        self._connection().send(message)
+
+    def retry_at(self, row, error):
+        attempts = (row.attempts or 0) + 1
+        if is_permanent(error) or attempts >= self.max_attempts: return None
+        base, cap = self.backoff
+        delay = min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        return datetime.utcnow() + timedelta(seconds=delay)
+
+    def _connection(self):
+        if self._stack is None:
+            stack = ExitStack()
+            connection = stack.enter_context(self.connect())
+            self._stack, self._conn = stack, connection
+        return self._conn
+
+    def _close(self):
+        stack, self._stack = self._stack, None
+        if stack is None: return
+        try: stack.close()
+        except Exception: pass   # الاتصال كان مقفول أصلاً
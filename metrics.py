@@ -0,0 +1,249 @@
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+
+# ==============================================================================
+# مقاييس بصيغة Prometheus (text exposition 0.0.4) من غير مكتبات خارجية
+# - التسجيل في الذاكرة: lock + زيادة رقم في dict (ميكروثانية تقريباً) => ينفع يفضل شغال دايماً
+# - كل process (worker بتاع gunicorn) بيكتب نسخة من أرقامه في ملف <pid>.json كل flush_interval ثانية
+# - /metrics بيجمع كل الملفات => الأرقام صح مهما كان عدد الـ workers
+# - worker مات (child_exit في gunicorn.conf.py، أو /metrics لقى ملف pid مش موجود): الـ counters والـ histograms
+#   بتاعته بتتجمع في archive.json (الأرقام متقلش) والـ gauges بتاعته (pid=...) بتتشال، والملف بيتمسح
+# ==============================================================================
+
+ARCHIVE = 'archive.json'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def _label_key(labels):
+    # المفتاح هو نص الـ labels نفسه بصيغة Prometheus: route="/",status="200"
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _merge(totals, snap):
+    # counters/histograms بتتجمع، والـ gauge: آخر قيمة اتسجلت (حسب الوقت)
+    for name, series in snap['counters'].items():
+        merged = totals['counters'].setdefault(name, {})
+        for k, v in series.items(): merged[k] = merged.get(k, 0) + v
+    for name, series in snap['histograms'].items():
+        merged = totals['histograms'].setdefault(name, {})
+        for k, h in series.items():
+            if k in merged: merged[k] = [a + b for a, b in zip(merged[k], h)]
+            else: merged[k] = list(h)
+    for name, series in snap['gauges'].items():
+        merged = totals['gauges'].setdefault(name, {})
+        for k, v in series.items():
+            if k not in merged or v[1] > merged[k][1]: merged[k] = v
+    return totals
+
+
+def _empty():
+    return {'counters': {}, 'histograms': {}, 'gauges': {}}
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def archive_worker(directory, pid):
+    # ملف الـ worker اللي مات => archive.json (من غير gauges) ويتمسح؛ الـ lock عشان ميتجمعش مرتين
+    path = os.path.join(directory, f"{pid}.json")
+    if not os.path.exists(path): return False
+    with open(os.path.join(directory, 'archive.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as f: snap = json.load(f)
+        except FileNotFoundError:
+            return False   # worker تاني سبقنا
+        except ValueError:
+            snap = _empty()
+        archive_path = os.path.join(directory, ARCHIVE)
+        try:
+            with open(archive_path) as f: archive = json.load(f)
+        except (OSError, ValueError):
+            archive = _empty()
+        _merge(archive, dict(snap, gauges={}))
+        with open(f"{archive_path}.tmp", 'w') as f:
+            json.dump(archive, f, separators=(',', ':'))
+        os.replace(f"{archive_path}.tmp", archive_path)
+        os.remove(path)
+    return True
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._meta = {}       # name -> (type, help, buckets)
+        self._counters = {}   # name -> {labels: value}
+        self._histograms = {} # name -> {labels: [bucket counts..., +Inf, sum]}
+        self._gauges = {}     # name -> {labels: [value, timestamp]}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._collectors = []
+        # لو الـ fork حصل والـ lock ماسكه thread في الـ master (gunicorn preload_app) => lock جديد في الـ child
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    # ---- التعريف ----
+    def counter(self, name, help):
+        self._meta[name] = ('counter', help, None)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        self._meta[name] = ('histogram', help, tuple(buckets))
+
+    def gauge(self, name, help):
+        # الـ gauge بين الـ workers: آخر قيمة اتسجلت (حسب الوقت) هي اللي بتظهر
+        self._meta[name] = ('gauge', help, None)
+
+    def collector(self, fn):
+        # fn() بتتنادى قبل كل flush (قيم بتتقاس مش بتتعد: الذاكرة مثلاً)
+        self._collectors.append(fn)
+        return fn
+
+    # ---- التسجيل ----
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._check_fork()
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = self._meta[name][2]
+        key = _label_key(labels)
+        with self._lock:
+            self._check_fork()
+            series = self._histograms.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = [0] * (len(buckets) + 1) + [0.0]
+            h[bisect.bisect_left(buckets, value)] += 1
+            h[-1] += value
+
+    def set(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._check_fork()
+            self._gauges.setdefault(name, {})[key] = [value, time.time()]
+
+    def _check_fork(self):
+        # أول تسجيل في process جديدة (بعد fork): نبدأ من الصفر ونشغل الـ thread اللي بيكتب الملف
+        pid = os.getpid()
+        if self._pid == pid: return
+        if self._pid is not None:
+            self._counters, self._histograms, self._gauges = {}, {}, {}
+        self._pid = pid
+        if self.directory:
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    # ---- الملفات المشتركة بين الـ workers ----
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': {n: dict(s) for n, s in self._counters.items()},
+                'histograms': {n: {k: list(h) for k, h in s.items()} for n, s in self._histograms.items()},
+                'gauges': {n: {k: list(v) for k, v in s.items()} for n, s in self._gauges.items()},
+            }
+
+    def flush(self):
+        if not self.directory or self._pid != os.getpid(): return
+        for fn in self._collectors:
+            fn()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self._pid}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(self.snapshot(), f, separators=(',', ':'))
+        os.replace(f"{path}.tmp", path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try: self.flush()
+            except OSError: pass
+
+    def reap(self):
+        # ملفات pid مفيش process بيها (worker مات من غير child_exit: SIGKILL، أو من تشغيلة قبل كده)
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            pid = name[:-5]
+            if not (name.endswith('.json') and pid.isdigit()) or int(pid) == os.getpid() or _alive(int(pid)): continue
+            try: archive_worker(self.directory, int(pid))
+            except OSError: pass
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        self.reap()
+        out = []
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if not name.endswith('.json'): continue
+            try:
+                with open(os.path.join(self.directory, name)) as f: out.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # ملف بيتكتب دلوقتي أو بايظ - المرة الجاية
+        return out
+
+    # ---- العرض ----
+    def render(self):
+        totals = _empty()
+        for snap in self._snapshots():
+            _merge(totals, snap)
+        counters, histograms, gauges = totals['counters'], totals['histograms'], totals['gauges']
+
+        lines = []
+        for name, (kind, help, buckets) in sorted(self._meta.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for k, v in sorted(counters.get(name, {}).items()):
+                    lines.append(f"{name}{{{k}}} {_fmt(v)}" if k else f"{name} {_fmt(v)}")
+            elif kind == 'gauge':
+                for k, (v, _) in sorted(gauges.get(name, {}).items()):
+                    lines.append(f"{name}{{{k}}} {_fmt(v)}" if k else f"{name} {_fmt(v)}")
+            else:
+                for k, h in sorted(histograms.get(name, {}).items()):
+                    sep = "," if k else ""
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), h[:-1]):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else _fmt(float(bound))
+                        lines.append(f'{name}_bucket{{{k}{sep}le="{le}"}} {cumulative}')
+                    labels = f"{{{k}}}" if k else ""
+                    lines.append(f"{name}_sum{labels} {_fmt(float(h[-1]))}")
+                    lines.append(f"{name}_count{labels} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def timed_queue_pool(registry, name):
+    # QueuePool بيسجل الوقت اللي الـ request استناه عشان ياخد connection (pool مليان = انتظار)
+    class TimedQueuePool(QueuePool):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                registry.observe(name, time.perf_counter() - start)
+    return TimedQueuePool
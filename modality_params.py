@@ -0,0 +1,120 @@
+import re
+import unicodedata
+
+# ==============================================================================
+# قيم الأجهزة (estim_params / us_params) من نص حر لأرقام
+#   "Frequency 80-120 Hz, Pulse Width 50-100 µs" / "1 MHz (deep), 1.5 W/cm², 100%" / "Pulsed 1:4"
+# - كل رقم (أو مدى) لازم يكون جنبه وحدة، والوحدة هي اللي بتحدد القيمة:
+#   Hz/kHz/MHz => frequency (Hz) / µs => pulse_width (µs) / mA, W/cm², mW, mW/cm² => intensity (بوحدتها)
+#   min/hours => duration (دقايق) / % أو نسبة on:off => duty_cycle (%)
+#   % بعد كلمة intensity ("30-50% of max") => intensity بوحدة % / ms بعد pulse/width => pulse_width
+#   الأرقام من غير وحدة ("3 times a week"، "1-2 sec" بتاع الـ ramp، الطول الموجي nm) مبتتحسبش
+# - modality: نوع الجهاز من estim_type / us_type (TENS, IFC, NMES, FES, US, LASER, SWD, TDCS)
+# - نفس الـ parser بيفهم طلب البحث: "TENS 80–120 Hz" => modality TENS + frequency من 80 لـ 120
+# ==============================================================================
+
+PARAMS = ('frequency', 'pulse_width', 'intensity', 'duty_cycle', 'duration')
+
+MODALITIES = (
+    ('TENS', r'\btens\b|transcutaneous'),
+    ('IFC', r'\bifc\b|interferential'),
+    ('NMES', r'\bnmes\b|neuromuscular electrical'),
+    ('FES', r'\bfes\b|functional electrical'),
+    ('TDCS', r'\btdcs\b|transcranial direct'),
+    ('US', r'\bus\b|ultrasound|ultra sound'),
+    ('LASER', r'laser|\blllt\b'),
+    ('SWD', r'shortwave|short wave|diathermy|\bswd\b'),
+)
+_MODALITIES = [(code, re.compile(pattern)) for code, pattern in MODALITIES]
+
+# (الوحدة كما هي مكتوبة, param أو None = حسب الكلام اللي قبلها, الوحدة الموحدة, معامل التحويل)
+_UNITS = (
+    (r'khz', 'frequency', 'Hz', 1e3),
+    (r'mhz', 'frequency', 'Hz', 1e6),
+    (r'hz', 'frequency', 'Hz', 1),
+    (r'(?:μs|us|micro-?seconds?)', 'pulse_width', 'us', 1),
+    (r'(?:ms|milli-?seconds?)', None, 'us', 1e3),
+    (r'mw/cm\^?2', 'intensity', 'mW/cm2', 1),
+    (r'w/cm\^?2', 'intensity', 'W/cm2', 1),
+    (r'mw', 'intensity', 'mW', 1),
+    (r'ma', 'intensity', 'mA', 1),
+    (r'%', None, '%', 1),
+    (r'(?:minutes?|mins?)', 'duration', 'min', 1),
+    (r'(?:hours?|hrs?)', 'duration', 'min', 60),
+)
+_NUMBER = r'(\d+(?:\.\d+)?)'
+_VALUE = re.compile(rf'{_NUMBER}(?:\s*(?:-|–|—|to)\s*{_NUMBER})?\s*(' + '|'.join(f'(?:{u})' for u, *_ in _UNITS)
+                    + r')(?![a-z0-9])')
+_UNIT_PATTERNS = [(re.compile(rf'^{u}$'), param, unit, scale) for u, param, unit, scale in _UNITS]
+_RATIO = re.compile(r'(\d+(?:\.\d+)?)\s*:\s*(\d+(?:\.\d+)?)')
+_RATIO_CONTEXT = re.compile(r'duty|on\s*/\s*off|on\s*:\s*off|ratio|pulsed')
+_CLAUSES = re.compile(r'[;,\n]|\.(?=\s|$)')
+
+
+def _clean(text):
+    # NFKC: µ (micro sign) => μ و ² => 2 (W/cm² و W/cm2 نفس الوحدة) / casefold للوحدات (MHz = mhz)
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+
+def modality(type_text):
+    text = _clean(type_text)
+    for code, pattern in _MODALITIES:
+        if pattern.search(text): return code
+    return None
+
+
+def _unit(raw):
+    for pattern, param, unit, scale in _UNIT_PATTERNS:
+        if pattern.match(raw): return param, unit, scale
+    return None, None, None
+
+
+def _add(found, param, unit, low, high):
+    low, high = sorted((round(low, 4), round(high, 4)))
+    entry = {'param': param, 'unit': unit, 'low': low, 'high': high}
+    if entry not in found: found.append(entry)
+
+
+def parse(text):
+    # => [{'param', 'unit', 'low', 'high'}] (القيمة الواحدة: low = high)
+    found = []
+    text = _clean(text)
+    for clause in _CLAUSES.split(text):
+        duty = []
+        for match in _VALUE.finditer(clause):
+            low, high, raw = match.groups()
+            param, unit, scale = _unit(raw)
+            before = clause[:match.start()]
+            if unit == '%':
+                if 'intensit' in before or clause[match.end():].lstrip().startswith('of '): param = 'intensity'
+                else:
+                    duty += [float(low), float(high or low)]
+                    continue
+            elif param is None:
+                if 'pulse' not in before and 'width' not in before: continue   # ms بتاعة ramp مثلاً
+                param = 'pulse_width'
+            _add(found, param, unit, float(low) * scale, float(high or low) * scale)
+        if _RATIO_CONTEXT.search(clause):
+            # on:off => نسبة التشغيل: 1:4 = 20%
+            duty += [100 * float(on) / (float(on) + float(off)) for on, off in _RATIO.findall(clause)
+                     if float(on) + float(off) > 0]
+        if 'continuous' in clause: duty.append(100.0)
+        if duty: _add(found, 'duty_cycle', '%', min(duty), max(duty))
+    return found
+
+
+def protocol_params(protocol):
+    # protocol: dict أو صف فيه estim_type/estim_params/us_type/us_params => صفوف جدول protocol_param
+    rows = []
+    for source in ('estim', 'us'):
+        kind = protocol.get(f'{source}_type')
+        for value in parse(protocol.get(f'{source}_params')):
+            rows.append(dict(value, source=source, modality=modality(kind)))
+    return rows
+
+
+def parse_query(text):
+    # "TENS 80–120 Hz, 50-100 us" => ('TENS', [frequency 80..120, pulse_width 50..100])
+    values = parse(text)
+    remainder = _VALUE.sub(' ', _clean(text))
+    return modality(remainder), values
@@ -0,0 +1,169 @@
+import html
+import re
+
+# ==============================================================================
+# تصدير البروتوكول PDF - من غير مكتبات خارجية
+# protocol_pages(): بتحول البروتوكول لصفحات (content streams) - دي اللي بتتخزن في الـ cache
+# build_pdf():       بتجمع صفحات بروتوكول أو أكتر في ملف PDF واحد، وبترجعه قطعة قطعة (Streaming)
+# الخطوط: Helvetica المدمجة في أي قارئ PDF (WinAnsi) - الحروف اللي براها بتظهر "?"
+# ==============================================================================
+
+PAGE_W, PAGE_H = 595, 842          # A4 بالـ points
+MARGIN = 50
+BODY_SIZE, HEADING_SIZE, TITLE_SIZE = 10, 13, 20
+LINE_GAP = 1.45
+BRAND = "Physio Expert Pro - Clinical Protocol"
+
+
+def _pdf_text(s):
+    s = s.encode('cp1252', 'replace').decode('latin-1')
+    return s.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _wrap(text, size, indent=0):
+    # عرض Helvetica التقريبي ~0.5em للحرف - كفاية لتقسيم الأسطر
+    width = int((PAGE_W - 2 * MARGIN - indent) / (size * 0.5))
+    lines = []
+    for para in text.split('\n'):
+        words, line = para.split(), ""
+        for word in words:
+            while len(word) > width:
+                if line: lines.append(line); line = ""
+                lines.append(word[:width]); word = word[width:]
+            if not line: line = word
+            elif len(line) + 1 + len(word) <= width: line += " " + word
+            else: lines.append(line); line = word
+        lines.append(line)
+    return lines
+
+
+def html_to_blocks(fragment):
+    # التمارين جاية HTML (<h4>, <li>, <b>, <br>) => عناوين + نقاط
+    if not fragment: return []
+    text = re.sub(r'(?is)<h4[^>]*>(.*?)</h4>', lambda m: f"\n\x01{m.group(1)}\n", fragment)
+    text = re.sub(r'(?i)<li[^>]*>', "\n\x02", text)
+    text = re.sub(r'(?i)<br\s*/?>|</li>|</ul>|<hr[^>]*>', "\n", text)
+    text = html.unescape(re.sub(r'<[^>]+>', '', text))
+    blocks = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line: continue
+        if line.startswith('\x01'): blocks.append(('heading', line[1:].strip()))
+        elif line.startswith('\x02'): blocks.append(('bullet', line[1:].strip()))
+        else: blocks.append(('text', line))
+    return blocks
+
+
+class _PageWriter:
+    def __init__(self):
+        self.pages = []
+        self._new_page()
+
+    def _new_page(self):
+        self.ops = [f"BT /F2 8 Tf 0.45 g {MARGIN} {PAGE_H - 30} Td ({_pdf_text(BRAND)}) Tj ET"]
+        self.y = PAGE_H - MARGIN - 10
+        self.pages.append(self.ops)
+
+    def line(self, text, size=BODY_SIZE, bold=False, indent=0, gray=0):
+        step = size * LINE_GAP
+        if self.y - step < MARGIN:
+            self._new_page()
+        self.y -= step
+        font = 'F2' if bold else 'F1'
+        self.ops.append(f"BT /{font} {size} Tf {gray} g {MARGIN + indent} {self.y:.1f} Td ({_pdf_text(text)}) Tj ET")
+
+    def paragraph(self, text, size=BODY_SIZE, bold=False, indent=0, gray=0):
+        for part in _wrap(text or "", size, indent):
+            self.line(part, size, bold, indent, gray)
+
+    def gap(self, points=6):
+        self.y -= points
+
+    def section(self, title):
+        self.gap(8)
+        self.line(title, HEADING_SIZE, bold=True, gray=0.1)
+        self.gap(2)
+
+
+def protocol_pages(p):
+    # p: dict بأعمدة البروتوكول
+    w = _PageWriter()
+    w.paragraph(p.get('disease_name') or '', TITLE_SIZE, bold=True)
+    if p.get('category'): w.line(p['category'], 9, gray=0.4)
+
+    w.section("Clinical Presentation & Definition")
+    w.paragraph(p.get('description'))
+
+    w.section("Electrotherapy")
+    w.paragraph(f"Type: {p.get('estim_type') or '-'}", bold=True)
+    w.paragraph(f"Parameters: {p.get('estim_params') or '-'}")
+    w.paragraph(f"Goal: {p.get('estim_role') or '-'}", gray=0.3)
+
+    w.section("Ultrasound")
+    w.paragraph(f"Type: {p.get('us_type') or '-'}", bold=True)
+    w.paragraph(f"Parameters: {p.get('us_params') or '-'}")
+    w.paragraph(f"Goal: {p.get('us_role') or '-'}", gray=0.3)
+
+    w.section("Therapeutic Exercises")
+    for kind, text in html_to_blocks(p.get('exercises_list')):
+        if kind == 'heading':
+            w.gap(4); w.paragraph(text, 11, bold=True)
+        elif kind == 'bullet':
+            w.paragraph(f"• {text}", indent=10)
+        else:
+            w.paragraph(text)
+    if p.get('exercises_role'):
+        w.gap(4); w.paragraph(f"Exercise Goal: {p['exercises_role']}", bold=True)
+
+    if p.get('notes'):
+        w.section("Specialist Notes")
+        w.paragraph(p['notes'])
+
+    w.gap(10)
+    w.paragraph(f"Scientific Reference: {p.get('source_ref') or '-'}", 9, gray=0.4)
+    return ["\n".join(ops) for ops in w.pages]
+
+
+def build_pdf(page_groups):
+    # page_groups: iterable من (قوائم صفحات) - كل بروتوكول بيتكتب أول ما يجهز
+    # الترتيب: الخطوط، بعدين الصفحات، وفي الآخر شجرة الصفحات + الكتالوج + xref
+    offsets = {}
+    pos = 0
+    page_ids = []
+    next_id = 5
+
+    def obj(num, body):
+        nonlocal pos
+        offsets[num] = pos
+        data = f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+        pos += len(data)
+        return data
+
+    head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    pos = len(head)
+    yield head
+    yield obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    yield obj(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+    for pages in page_groups:
+        chunk = b""
+        for content in pages:
+            stream = content.encode('latin-1')
+            content_id, page_id = next_id, next_id + 1
+            next_id += 2
+            chunk += obj(content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            chunk += obj(page_id, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] "
+                                   f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>").encode())
+            page_ids.append(page_id)
+        yield chunk
+
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    tail = obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+    tail += obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    xref_at = pos
+    size = next_id
+    xref = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+    for num in range(1, size):
+        xref.append(f"{offsets[num]:010d} 00000 n \n")
+    xref.append(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n")
+    yield tail + "".join(xref).encode()
@@ -0,0 +1,121 @@
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import time
+
+from flask import g, request
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler  # اختياري: pip install pyinstrument
+except ImportError:
+    SamplingProfiler = None
+
+# ==============================================================================
+# Profiling لـ request واحد عند الطلب (للأدمن بس)
+#   /?disease=knee&_profile=1       أو  Header: X-Profile: 1        => cProfile
+#   _profile=sample / X-Profile: sample                              => pyinstrument (لو متسطب)
+# - من غير الـ flag: قراءة قيمة واحدة من الـ query/headers وبس، مفيش profiler بيشتغل
+# - النتيجة بتتحفظ على الديسك (ring buffer: آخر keep ملفات) + ملخص JSON بأعلى الدوال
+# - الرد بيرجع فيه X-Profile-Id، والقائمة على /admin/profiles
+# ==============================================================================
+
+FLAG = '_profile'
+HEADER = 'X-Profile'
+TOP_FUNCTIONS = 25
+_NAME = re.compile(r'^[\w.-]+$')
+
+
+def _short_path(filename):
+    for marker in ('site-packages' + os.sep, 'lib' + os.sep + 'python'):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def top_functions(stats, limit=TOP_FUNCTIONS):
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({'function': f"{_short_path(filename)}:{line}({func})" if line else func,
+                     'calls': nc, 'tottime_ms': round(tt * 1000, 3), 'cumtime_ms': round(ct * 1000, 3)})
+    rows.sort(key=lambda r: r['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+class RequestProfiler:
+    def __init__(self, app, directory, keep=50, is_allowed=lambda: False):
+        self.directory = directory
+        self.keep = keep
+        self.is_allowed = is_allowed   # بتتنادى بس لو الـ flag موجود (فيها تحميل المستخدم)
+        self._seq = itertools.count()
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _mode(self):
+        mode = request.args.get(FLAG) or request.headers.get(HEADER)
+        if not mode: return None
+        return 'sample' if mode == 'sample' and SamplingProfiler else 'cprofile'
+
+    def _start(self):
+        mode = self._mode()
+        if mode is None or not self.is_allowed(): return
+        profiler = SamplingProfiler() if mode == 'sample' else cProfile.Profile()
+        g.profile = (mode, profiler, time.perf_counter())
+        if mode == 'sample': profiler.start()
+        else: profiler.enable()
+
+    def _finish(self, response):
+        captured = g.pop('profile', None)
+        if captured is None: return response
+        mode, profiler, started = captured
+        if mode == 'sample': profiler.stop()
+        else: profiler.disable()
+        duration = time.perf_counter() - started
+
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._seq)}"
+        meta = {'name': name, 'mode': mode, 'method': request.method, 'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint, 'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2), 'created': time.time(),
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+        os.makedirs(self.directory, exist_ok=True)
+        if mode == 'sample':
+            meta['file'] = f"{name}.html"
+            with open(os.path.join(self.directory, meta['file']), 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+            meta['top'] = []
+        else:
+            meta['file'] = f"{name}.prof"
+            profiler.dump_stats(os.path.join(self.directory, meta['file']))
+            meta['top'] = top_functions(pstats.Stats(profiler, stream=io.StringIO()))
+        with open(os.path.join(self.directory, f"{name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        self._trim()
+        response.headers['X-Profile-Id'] = name
+        return response
+
+    def _trim(self):
+        # ring buffer: بنمسح الأقدم لما العدد يعدي keep
+        for meta in self.captures()[self.keep:]:
+            for filename in (meta['file'], f"{meta['name']}.json"):
+                try: os.remove(os.path.join(self.directory, filename))
+                except OSError: pass
+
+    def captures(self):
+        if not os.path.isdir(self.directory): return []
+        out = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'): continue
+            try:
+                with open(os.path.join(self.directory, filename), encoding='utf-8') as f: out.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(out, key=lambda m: m['created'], reverse=True)
+
+    def path(self, filename):
+        # اسم ملف من القائمة بس (من غير ../)
+        if not _NAME.match(filename) or not filename.endswith(('.prof', '.html')): return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
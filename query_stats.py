@@ -0,0 +1,115 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ==============================================================================
+# مراقبة الـ SQL لكل request (على مستوى cursor execute في SQLAlchemy)
+# - عدد الـ queries + الوقت الكلي + "شكل" كل statement (نفس الـ SQL بقيم مختلفة = نفس الشكل)
+# - slow query log بالـ parameters
+# - N+1: نفس الشكل اتكرر كتير في request واحد (query جوه loop)
+# - ميزانية queries لكل route: في التستات (app.testing) الزيادة = QueryBudgetExceeded
+#   وفي الإنتاج تحذير في الـ log بس
+# ==============================================================================
+
+_IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%\(\w+\)s\s*,)+\s*%\(\w+\)s\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    # IN (?, ?, ?) بأي طول = شكل واحد
+    return _SPACES.sub(' ', _IN_LIST.sub('(?...)', statement)).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestQueries:
+    __slots__ = ('count', 'seconds', 'shapes')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold):
+        # N+1 = قراءة جوه loop. الـ INSERT لكل صف من الـ ORM على SQLite طبيعي (على Postgres بيتجمع)
+        return [(shape, n) for shape, n in self.shapes.most_common()
+                if n >= threshold and shape.upper().startswith('SELECT')]
+
+
+class QueryInspector:
+    def __init__(self, app, slow_ms=200, n_plus_one=10, budgets=None, default_budget=None):
+        self.app = app
+        self.slow_seconds = slow_ms / 1000.0
+        self.n_plus_one = n_plus_one
+        self.budgets = budgets if budgets is not None else {}   # endpoint -> أقصى عدد queries (نفس الـ dict: التستات تقدر تعدله)
+        self.default_budget = default_budget
+        self._local = threading.local()
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    # ---- SQLAlchemy events ----
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started']
+        stats = getattr(self._local, 'current', None)
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.shapes[statement_shape(statement)] += 1
+        if elapsed >= self.slow_seconds:
+            where = request.path if has_request_context() else 'background'
+            params = repr(parameters)
+            if len(params) > 500: params = params[:500] + '...'
+            print(f"🐢 Slow query ({elapsed * 1000:.0f} ms, {where}): {_SPACES.sub(' ', statement)} | params={params}")
+
+    # ---- لكل request ----
+    def _start_request(self):
+        # لو فيه capture() شغال بره (test client جوه benchmark) الأرقام بتتضاف له في الآخر
+        self._local.outer = getattr(self._local, 'current', None)
+        self._local.current = RequestQueries()
+
+    def _finish_request(self, response):
+        stats = getattr(self._local, 'current', None)
+        outer = self._local.current = getattr(self._local, 'outer', None)
+        self._local.outer = None
+        if stats is None: return response
+        if outer is not None:
+            outer.count += stats.count
+            outer.seconds += stats.seconds
+            outer.shapes.update(stats.shapes)
+        response.headers.add('Server-Timing', f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"')
+
+        endpoint = request.endpoint or 'unmatched'
+        for shape, n in stats.repeated(self.n_plus_one):
+            print(f"🔁 N+1 suspected in {endpoint}: {n}x {shape[:200]}")
+
+        budget = self.budgets.get(endpoint, self.default_budget)
+        if budget is not None and stats.count > budget:
+            message = (f"{endpoint} ran {stats.count} queries (budget {budget}, {stats.seconds * 1000:.1f} ms). Top statements:\n"
+                       + "\n".join(f"  {n}x {shape[:200]}" for shape, n in stats.shapes.most_common(5)))
+            if self.app.testing or self.app.config.get('QUERY_BUDGET_ENFORCE'):
+                raise QueryBudgetExceeded(message)
+            print(f"⚠️ Query budget exceeded: {message}")
+        return response
+
+    # ---- للتستات والـ benchmarks خارج الـ request ----
+    @contextmanager
+    def capture(self):
+        previous = getattr(self._local, 'current', None)
+        stats = self._local.current = RequestQueries()
+        try:
+            yield stats
+        finally:
+            self._local.current = previous
@@ -0,0 +1,309 @@
+import fcntl
+import os
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+from search_keys import normalize
+
+# ==============================================================================
+# "بروتوكولات مشابهة": أقرب k بروتوكول لكل بروتوكول (NumPy) في جدول صغير related_protocol
+# - كل بروتوكول = vector: كلمات الاسم والكلمات الدلالية والوصف ونوع الأجهزة بأوزان لكل حقل + TF-IDF
+#   القاموس = الكلمات اللي في بروتوكولين على الأقل (كلمة في بروتوكول واحد مبتعملش تشابه) لحد max_terms
+#   والتشابه = cosine + bonus لو نفس التصنيف
+# - الحالة (الـ vectors + الجيران الحاليين + آخر نسخة اتعالجت) في ملف npz على الديسك
+#   => بعد أي تعديل/import بنحسب بس اللي اتغير + البروتوكولات اللي ممكن ترتيب جيرانها يتأثر
+# - الـ vectors sparse (CSR: indptr / indices / data) => الذاكرة على قد الكلمات الموجودة فعلاً مش N × القاموس
+#   والتشابه على أجزاء: CHUNK_ROWS بروتوكول dense في المرة × BLOCK_ROWS => الذاكرة ثابتة مهما كبرت المكتبة
+# - الـ request مبيحسبش أي تشابه: صف واحد من الجدول بالـ index (protocol_id, rank)
+# - مش بيشتغل جوه الـ web workers: التعديل بيتسجل في library_change (= الصفوف اللي محتاجة حساب)
+#   والحساب من الـ CLI (flask refresh-related / setup_db.py) أو process لوحده (refresh-related --every)
+#   + flock عشان تشغيلة واحدة بس في نفس الوقت
+# ==============================================================================
+
+FIELD_WEIGHTS = (
+    ('disease_name', 3.0),
+    ('keywords', 2.0),
+    ('description', 1.0),
+    ('estim_type', 0.5),
+    ('us_type', 0.5),
+    ('exercises_role', 0.5),
+)
+STOPWORDS = frozenset(
+    'the and for with from that this are was were has have not but its into of on in to by or as an at be is '
+    'used use pain syndrome disease condition patient patients treatment'.split())
+BLOCK_ROWS = 256      # بروتوكولات بنحسب جيرانها في المرة
+CHUNK_ROWS = 2048     # المرشحين اللي بيتحولوا dense في المرة (2048 × 4096 كلمة × 4 bytes = 32MB)
+
+
+def term_weights(fields):
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for token in normalize(fields.get(field) or '').split():
+            if len(token) < 3 or token in STOPWORDS: continue
+            weights[token] += weight
+    return weights
+
+
+def build_vocabulary(documents, max_terms):
+    # الكلمات المشتركة بين بروتوكولين أو أكتر، والأكتر انتشاراً الأول (من غير اللي في أكتر من نص المكتبة)
+    df = Counter(token for doc in documents for token in doc)
+    ceiling = max(2, len(documents) // 2)
+    terms = [t for t, n in df.most_common() if 2 <= n <= ceiling]
+    return sorted(terms[:max_terms])
+
+
+def term_matrix(documents, vocabulary):
+    # CSR: صف i = indices[indptr[i]:indptr[i + 1]] بأوزان data[...] (الكلمات اللي في القاموس بس)
+    index = {term: i for i, term in enumerate(vocabulary)}
+    indptr, indices, data = [0], [], []
+    for doc in documents:
+        cols = sorted((index[token], weight) for token, weight in doc.items() if token in index)
+        indices += [c for c, _ in cols]
+        data += [w for _, w in cols]
+        indptr.append(len(indices))
+    return np.array(indptr, np.int64), np.array(indices, np.int32), np.array(data, np.float32)
+
+
+def csr_rows(matrix, rows):
+    # الصفوف rows (بالترتيب ده) كـ CSR جديدة
+    indptr, indices, data = matrix
+    starts, lengths = indptr[rows], indptr[np.asarray(rows) + 1] - indptr[rows]
+    new_indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    taken = np.repeat(starts - new_indptr[:-1], lengths) + np.arange(new_indptr[-1])
+    return new_indptr, indices[taken], data[taken]
+
+
+def csr_concat(a, b):
+    return (np.concatenate([a[0], b[0][1:] + a[0][-1]]), np.concatenate([a[1], b[1]]), np.concatenate([a[2], b[2]]))
+
+
+def csr_dense(matrix, rows, width):
+    indptr, indices, data = csr_rows(matrix, rows)
+    out = np.zeros((len(indptr) - 1, width), np.float32)
+    out[np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)), indices] = data
+    return out
+
+
+class RelatedJob:
+    def __init__(self, directory, load_rows, load_version, load_changes, write, identity='',
+                 k=8, max_terms=4096, category_bonus=0.15):
+        # load_rows(ids=None) => [(id, category, {field: text})]
+        # load_changes(since, until) => ids اتغيرت، أو None لو كتير (=> حساب كامل)
+        # write(adjacency {id: [(related_id, score)]}, removed ids, full)
+        # identity: قاعدة البيانات اللي الحالة دي بتاعتها (ملف الحالة لقاعدة تانية = حساب كامل)
+        self.directory = directory
+        self.identity = identity
+        self.load_rows = load_rows
+        self.load_version = load_version
+        self.load_changes = load_changes
+        self.write = write
+        self.k = k
+        self.max_terms = max_terms
+        self.category_bonus = category_bonus
+
+    @property
+    def state_path(self):
+        return os.path.join(self.directory, 'related.npz')
+
+    def reset(self):
+        # بعد مسح قاعدة البيانات (setup_db.py --reset): أرقام النسخ بتبدأ من الأول
+        try: os.remove(self.state_path)
+        except OSError: pass
+
+    @contextmanager
+    def _locked(self, wait=True):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'lock'), 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False   # تشغيلة تانية بتحسب دلوقتي، وهي هتلحق التغييرات الجديدة (بتعيد لحد ما النسخة تثبت)
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ---- الحساب ----
+    def run(self, full=False, wait=True):
+        # بيرجع عدد البروتوكولات اللي جيرانها اتكتبت من جديد
+        with self._locked(wait) as acquired:
+            if not acquired: return 0
+            updated = 0
+            while True:
+                version = self.load_version()
+                state = None if full else self._load_state()
+                if state is None or state['version'] > version:
+                    updated += self._full(version)
+                elif state['version'] < version:
+                    updated += self._incremental(state, version)
+                if self.load_version() == version: return updated
+                full = False
+
+    def _full(self, version):
+        # القاموس بيتبني هنا بس: الجزئي بيستخدم نفس القاموس (كلمة جديدة خالص بتدخل مع الحساب الكامل الجاي)
+        rows = self.load_rows()
+        state = self._empty_state(version)
+        documents = [term_weights(row[2]) for row in rows]
+        state['vocabulary'] = build_vocabulary(documents, self.max_terms)
+        self._upsert(state, rows, documents)
+        weights = self._weights(state)
+        positions = np.arange(len(state['ids']))
+        state['neighbors'], state['scores'] = self._top_k(state, weights, positions)
+        self.write(self._adjacency(state, positions), [], True)
+        self._save_state(state)
+        return len(positions)
+
+    def _incremental(self, state, version):
+        changed = self.load_changes(int(state['version']), version)
+        if changed is None: return self._full(version)
+        rows = self.load_rows(changed)
+        present = {row[0] for row in rows}
+        removed = [pid for pid in changed if pid not in present]
+        self._remove(state, removed)
+        self._upsert(state, rows)
+        weights = self._weights(state)
+
+        # المتأثرين: اللي اتغيروا + اللي كان ليهم جار اتغير/اتمسح + اللي بقى قريب من بروتوكول اتغير أكتر من آخر جار عنده
+        changed_ids = np.array(changed, np.int64)
+        affected = np.isin(state['neighbors'], changed_ids).any(axis=1)
+        positions = np.searchsorted(state['ids'], np.array(sorted(present), np.int64))
+        for cand, chunk in self._chunks(state, weights):
+            for start in range(0, len(positions), BLOCK_ROWS):
+                block = positions[start:start + BLOCK_ROWS]
+                affected[cand] |= self._scores(state, weights, block, cand, chunk).max(axis=0) > state['scores'][cand, -1]
+        affected[positions] = True
+
+        targets = np.nonzero(affected)[0]
+        neighbors, scores = self._top_k(state, weights, targets)
+        state['neighbors'][targets], state['scores'][targets] = neighbors, scores
+        state['version'] = version
+        self.write(self._adjacency(state, targets), removed, False)
+        self._save_state(state)
+        return len(targets)
+
+    def _weights(self, state):
+        # TF-IDF + normalize لكل صف، وفضل CSR (نفس indptr / indices)
+        indptr, indices, data = state['tf_indptr'], state['tf_indices'], state['tf_data']
+        n = len(indptr) - 1
+        df = np.bincount(indices, minlength=len(state['vocabulary']))
+        idf = np.log((1 + n) / (1 + df)).astype(np.float32) + 1
+        weighted = data * idf[indices]
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=weighted.astype(np.float64) ** 2, minlength=n)).astype(np.float32)
+        norms[norms == 0] = 1
+        return indptr, indices, weighted / norms[rows]
+
+    def _chunks(self, state, weights):
+        # المرشحين على أجزاء: كل جزء بيتحول dense مرة واحدة بس
+        width = len(state['vocabulary'])
+        for start in range(0, len(state['ids']), CHUNK_ROWS):
+            cand = np.arange(start, min(len(state['ids']), start + CHUNK_ROWS))
+            yield cand, csr_dense(weights, cand, width)
+
+    def _scores(self, state, weights, positions, cand, chunk):
+        scores = csr_dense(weights, positions, chunk.shape[1]) @ chunk.T
+        if self.category_bonus:
+            categories = state['categories']
+            scores += self.category_bonus * (categories[positions, None] == categories[None, cand])
+        scores[positions[:, None] == cand[None, :]] = -np.inf
+        return scores
+
+    def _top_k(self, state, weights, positions):
+        neighbors = np.full((len(positions), self.k), -1, np.int64)
+        top_scores = np.full((len(positions), self.k), -np.inf, np.float32)
+        k = min(self.k, len(state['ids']) - 1)
+        if k <= 0: return neighbors, top_scores
+        # أحسن k لحد دلوقتي لكل بروتوكول، وكل جزء من المرشحين بيتدمج فيهم
+        best = np.full((len(positions), k), -np.inf, np.float32)
+        best_pos = np.zeros((len(positions), k), np.int64)
+        for cand, chunk in self._chunks(state, weights):
+            for start in range(0, len(positions), BLOCK_ROWS):
+                block = slice(start, start + BLOCK_ROWS)
+                scores = self._scores(state, weights, positions[block], cand, chunk)
+                merged = np.concatenate([best[block], scores], axis=1)
+                merged_pos = np.concatenate([best_pos[block], np.broadcast_to(cand, scores.shape)], axis=1)
+                part = np.argpartition(-merged, k - 1, axis=1)[:, :k]
+                best[block] = np.take_along_axis(merged, part, axis=1)
+                best_pos[block] = np.take_along_axis(merged_pos, part, axis=1)
+        order = np.argsort(-best, axis=1, kind='stable')
+        best = np.take_along_axis(best, order, axis=1)
+        ids = state['ids'][np.take_along_axis(best_pos, order, axis=1)]
+        ids[best <= 0] = -1
+        best[best <= 0] = -np.inf
+        neighbors[:, :k], top_scores[:, :k] = ids, best
+        return neighbors, top_scores
+
+    def _adjacency(self, state, positions):
+        out = {}
+        for pos in positions:
+            pairs = zip(state['neighbors'][pos].tolist(), state['scores'][pos].tolist())
+            out[int(state['ids'][pos])] = [(rid, round(score, 4)) for rid, score in pairs if rid >= 0]
+        return out
+
+    # ---- الحالة (npz) ----
+    def _empty_state(self, version):
+        return {'version': version, 'identity': self.identity, 'vocabulary': [], 'ids': np.zeros(0, np.int64),
+                'tf_indptr': np.zeros(1, np.int64), 'tf_indices': np.zeros(0, np.int32), 'tf_data': np.zeros(0, np.float32),
+                'categories': np.zeros(0, np.int32), 'category_names': [],
+                'neighbors': np.zeros((0, self.k), np.int64), 'scores': np.zeros((0, self.k), np.float32)}
+
+    def _upsert(self, state, rows, documents=None):
+        if not rows: return
+        names = {name: i for i, name in enumerate(state['category_names'])}
+        ids = np.array([row[0] for row in rows], np.int64)
+        documents = documents or [term_weights(row[2]) for row in rows]
+        tf = term_matrix(documents, state['vocabulary'])
+        categories = np.array([names.setdefault(row[1] or '', len(names)) for row in rows], np.int32)
+        state['category_names'] = list(names)
+
+        # الصفوف القديمة اللي اتعدلت بتتشال وبترجع بالقيم الجديدة (الجيران الحاليين بيفضلوا لحد ما تتحسب)
+        found = np.isin(ids, state['ids'])
+        old = np.searchsorted(state['ids'], ids[found])
+        neighbors = np.full((len(ids), self.k), -1, np.int64)
+        scores = np.full((len(ids), self.k), -np.inf, np.float32)
+        neighbors[found], scores[found] = state['neighbors'][old], state['scores'][old]
+        self._keep(state, ~np.isin(state['ids'], ids))
+
+        all_ids = np.concatenate([state['ids'], ids])
+        order = np.argsort(all_ids, kind='stable')
+        merged = csr_concat((state['tf_indptr'], state['tf_indices'], state['tf_data']), tf)
+        state['tf_indptr'], state['tf_indices'], state['tf_data'] = csr_rows(merged, order)
+        state['ids'] = all_ids[order]
+        state['categories'] = np.concatenate([state['categories'], categories])[order]
+        state['neighbors'] = np.concatenate([state['neighbors'], neighbors])[order]
+        state['scores'] = np.concatenate([state['scores'], scores])[order]
+
+    def _remove(self, state, removed):
+        self._keep(state, ~np.isin(state['ids'], np.array(removed, np.int64)))
+
+    def _keep(self, state, keep):
+        rows = np.nonzero(keep)[0]
+        state['tf_indptr'], state['tf_indices'], state['tf_data'] = csr_rows(
+            (state['tf_indptr'], state['tf_indices'], state['tf_data']), rows)
+        for name in ('ids', 'categories', 'neighbors', 'scores'):
+            state[name] = state[name][rows]
+
+    def _load_state(self):
+        try:
+            with np.load(self.state_path) as data:
+                state = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        if str(state.get('identity', '')) != self.identity: return None
+        if 'tf_indptr' not in state: return None   # ملف بالشكل القديم (dense) => حساب كامل
+        if state['neighbors'].shape[1] != self.k: return None
+        state['version'] = int(state['version'])
+        state['identity'] = self.identity
+        state['vocabulary'] = state['vocabulary'].tolist()
+        state['category_names'] = state['category_names'].tolist()
+        return state
+
+    def _save_state(self, state):
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **dict(state, vocabulary=np.array(state['vocabulary'], dtype=str),
+                                          category_names=np.array(state['category_names'], dtype=str)))
+        os.replace(tmp, self.state_path)
@@ -0,0 +1,73 @@
+import re
+import threading
+import time
+import unicodedata
+
+# ==============================================================================
+# مفاتيح البحث الموحدة (عربي + إنجليزي)
+# - normalize: حروف صغيرة + شيل التشكيل والتطويل + توحيد الألف/الهمزة والتاء المربوطة والألف المقصورة
+#   + الأرقام الهندية => عربية + الفاصلة العليا بتتشال + أي علامات ترقيم تانية => مسافة واحدة
+#   "الكَتِف المُتجمِّد" و "الكتف المتجمد" و "Frozen-Shoulder" و "frozen shoulder" كلها مفتاح واحد
+# - keys_for: المفاتيح اللي بتتكتب مرة واحدة وقت الحفظ (الاسم + كل كلمة دلالية) في جدول search_key
+# - SynonymMap: جدول المرادفات/الاختصارات (الأدمن بيعدله) متحول لـ dict في الذاكرة
+# ==============================================================================
+
+MAX_KEY_LENGTH = 200
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+    "'": None, '’': None,   # bell's => bells
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+_SEPARATORS = re.compile(r'[\W_]+')
+_PARENTHESES = re.compile(r'\([^)]*\)')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = _DIACRITICS.sub('', text).translate(_LETTERS)
+    return ' '.join(_SEPARATORS.sub(' ', text).split())
+
+
+def keys_for(name, keywords):
+    # "Low Back Pain (Mechanical)" => "low back pain mechanical" + "low back pain"
+    keys = set()
+    for value in [name, _PARENTHESES.sub(' ', name or '')] + (keywords or '').split(','):
+        key = normalize(value)
+        if key and len(key) <= MAX_KEY_LENGTH: keys.add(key)
+    return keys
+
+
+class SynonymMap:
+    def __init__(self, load, reload_seconds=60):
+        # load() => [(term, expansion)] من قاعدة البيانات
+        self.load = load
+        self.reload_seconds = reload_seconds
+        self._map = None
+        self._loaded = 0.0
+        self._lock = threading.Lock()
+
+    def compile(self, pairs):
+        out = {}
+        for term, expansion in pairs:
+            term, expansion = normalize(term), normalize(expansion)
+            if term and expansion and term != expansion: out[term] = expansion
+        return out
+
+    def invalidate(self):
+        self._loaded = 0.0
+
+    def mapping(self):
+        # الـ workers التانية بتاخد تعديلات الأدمن خلال reload_seconds
+        if self._map is None or time.monotonic() - self._loaded > self.reload_seconds:
+            with self._lock:
+                if self._map is None or time.monotonic() - self._loaded > self.reload_seconds:
+                    self._map = self.compile(self.load())
+                    self._loaded = time.monotonic()
+        return self._map
+
+    def expand(self, key):
+        return self.mapping().get(key, key)
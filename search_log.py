@@ -0,0 +1,108 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from itertools import chain
+
+# ==============================================================================
+# سجل عمليات البحث (إيه اللي الناس بتدور عليه، وإيه اللي مش عندنا وبيروح للذكاء الاصطناعي)
+# - الـ request بيضيف tuple في deque في الذاكرة (lock + append) ويكمل، مفيش INSERT في الـ request
+# - thread في كل worker بيكتب الموجود كل flush_seconds (أو أول ما يتجمع batch_size) في INSERT واحد
+# - لو القاعدة مش متاحة: الصفوف بترجع للـ buffer، وفوق max_buffer الأقدم بيتشال (deque(maxlen)، العدد في dropped)
+#   => الذاكرة محدودة والبحث عمره ما يستنى السجل
+# - كل prune_seconds: مسح اللي أقدم من مدة الاحتفاظ (prune() بتاعة التطبيق)
+# - عند خروج الـ worker (atexit) بيكتب اللي فاضل
+# ==============================================================================
+
+
+class SearchLog:
+    def __init__(self, write, prune=None, flush_seconds=5.0, batch_size=500, max_buffer=20000,
+                 prune_seconds=3600, enabled=True, context=None, on_flush=None):
+        # write(rows) => INSERT واحد للصفوف / prune() => عدد الصفوف اللي اتمسحت
+        # on_flush(written, dropped, seconds) => المقاييس
+        self.write = write
+        self.prune = prune
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.prune_seconds = prune_seconds
+        self.enabled = enabled
+        self.context = context
+        self.on_flush = on_flush
+        self._reset_lock()
+        os.register_at_fork(after_in_child=self._reset_lock)
+        atexit.register(self._flush_at_exit)
+
+    def _reset_lock(self):
+        # بعد الـ fork: الـ buffer المتورث بتاع الـ master (هو اللي هيكتبه) ومفيش thread
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._rows = deque(maxlen=self.max_buffer)
+        self._dropped = 0
+        self._pid = None
+        self._last_prune = time.monotonic()
+
+    def record(self, row):
+        if not self.enabled: return
+        with self._lock:
+            # القاعدة مش بتلحق / مش متاحة: الـ append بيشيل الأقدم لوحده (O(1)) ونسيب الأحدث
+            if len(self._rows) == self.max_buffer: self._dropped += 1
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+        self._start()
+        if full: self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+    def _start(self):
+        if self._pid == os.getpid(): return
+        with self._lock:
+            if self._pid == os.getpid(): return
+            self._pid = os.getpid()
+        threading.Thread(target=self._loop, name='search-log', daemon=True).start()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                with self.context():
+                    self.flush()
+                    if self.prune and time.monotonic() - self._last_prune >= self.prune_seconds:
+                        self._last_prune = time.monotonic()
+                        self.prune()
+            except Exception as e:
+                print(f"⚠️ Search log flush failed: {e}")
+
+    def _flush_at_exit(self):
+        try:
+            with self.context():
+                self.flush()
+        except Exception as e:
+            print(f"⚠️ Search log not flushed on exit: {e}")
+
+    def flush(self):
+        # بيرجع عدد الصفوف اللي اتكتبت
+        with self._flush_lock:
+            with self._lock:
+                pending, self._rows = self._rows, deque(maxlen=self.max_buffer)
+                dropped, self._dropped = self._dropped, 0
+            if not pending: return 0
+            rows = list(pending)
+            started = time.perf_counter()
+            try:
+                for i in range(0, len(rows), self.batch_size):
+                    self.write(rows[i:i + self.batch_size])
+            except Exception:
+                with self._lock:
+                    # اللي ماتكتبش يرجع قبل الجديد، في حدود max_buffer (الـ deque بيسيب الأحدث)
+                    overflow = max(0, len(rows) - i + len(self._rows) - self.max_buffer)
+                    self._rows = deque(chain(rows[i:], self._rows), maxlen=self.max_buffer)
+                    self._dropped += dropped + overflow
+                raise
+            if self.on_flush: self.on_flush(len(rows), dropped, time.perf_counter() - started)
+            return len(rows)
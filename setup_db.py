@@ -1,624 +1,450 @@
-import sqlite3
-from werkzeug.security import generate_password_hash
-
-# Connect to database
-connection = sqlite3.connect('physio.db')
-cursor = connection.cursor()
-
-# ==============================================================================
-# 1. Create Users Table
-# ==============================================================================
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        created_at TEXT NOT NULL
-    )
-""")
-
-# ==============================================================================
-# 2. Create Protocols Table (16 Columns)
-# ==============================================================================
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS protocols (
-        id INTEGER PRIMARY KEY,
-        disease_name TEXT,
-        keywords TEXT,
-        description TEXT,
-        estim_type TEXT,
-        estim_params TEXT,
-        estim_placement TEXT,
-        estim_image TEXT,
-        estim_role TEXT,
-        us_indication TEXT,
-        us_params TEXT,
-        us_role TEXT,
-        exercises_list TEXT,
-        treatment_duration TEXT,
-        expected_recovery TEXT,
-        reference TEXT
-    )
-""")
-
-# ==============================================================================
-# 3. Insert Data (16 Values per Disease)
-# ==============================================================================
-
-# 1. Frozen Shoulder
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Adhesive Capsulitis (Frozen Shoulder)',
-        'stiffness, shoulder pain, capsulitis, الكتف المتجمد',
-        'A painful disorder where the shoulder capsule becomes inflamed and stiff.',
-        'TENS (High Rate)',
-        'Freq: 100-150 Hz. Width: 50-80 µs. Time: 20 mins.',
-        'Bracket Method: 2 electrodes anterior/posterior to the joint.',
-        '/static/shoulder.jpg', 
-        'Pain modulation via Gate Control Theory.',
-        'Indicated (Continuous)', '1 MHz (deep), 1.5 W/cm², 100%.', 'Deep heating for extensibility.',
-        '1. Pendulum Exercises.\n2. Wall Climb.\n3. Wand Exercises.',
-        'Session: 45-60 mins.', 'Recovery: 3-12 months.', 'JOSPT Guidelines'
-    )
-""")
-
-# 2. Lumbar Disc Herniation
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Lumbar Disc Herniation (Sciatica)',
-        'back pain, sciatica, disc, ديسك, عرق النسا',
-        'Disc material displacement compressing the nerve root.',
-        'IFC (Interferential)',
-        'Carrier: 4000Hz. Beat: 80-150Hz. Vector: On.',
-        'Paravertebral: Two channels crossing at the level of pain (L4-S1).',
-        '/static/back.jpg',
-        'Deep pain relief and muscle relaxation.',
-        'Not for Disc', 'Avoid direct spinal application.', 'Muscle spasm relief only.',
-        '1. McKenzie Extension.\n2. Nerve Flossing.\n3. Core Stability.',
-        'Session: 45 mins.', 'Recovery: 3-6 months.', 'NASS Guidelines'
-    )
-""")
-
-# 3. Knee Osteoarthritis
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Knee Osteoarthritis',
-        'knee pain, oa, stiffness, خشونة الركبة',
-        'Degenerative wear-and-tear arthritis of the knee.',
-        'NMES (Strengthening)',
-        'Target: Quads. Freq: 50Hz. Duty: 10/50. Intensity: Motor.',
-        'One electrode on VMO motor point, one on proximal Femoral Nerve trunk.',
-        '/static/knee.jpg',
-        'Strengthening Quadriceps to offload joint.',
-        'Indicated', 'Pulsed 20% or Continuous. 1 MHz.', 'Pain relief.',
-        '1. Quad Sets.\n2. SLR.\n3. Mini Squats.',
-        'Lifelong management.', 'Pain reduction in 4-8 weeks.', 'OARSI Guidelines'
-    )
-""")
-
-# 4. Total Knee Arthroplasty (TKA)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Total Knee Arthroplasty (Post-Op TKA)',
-        'knee replacement, tka, surgery, joint replacement, تغيير مفصل الركبة',
-        'Rehabilitation following surgical replacement of the knee joint due to severe OA.',
-        'NMES (Neuromuscular Electrical Stimulation)',
-        'Target: Quadriceps. Freq: 50Hz. Intensity: Max tollerated. Time: 15-20 mins.',
-        'One electrode on VMO motor point, one on proximal Femoral Nerve trunk.',
-        '/static/tka.jpg',
-        'Crucial for reversing quadriceps inhibition (AMI) immediately post-op.',
-        'Generally Not Indicated',
-        'Avoid heat/US over metal implants directly. Cryotherapy is preferred.',
-        'Use Cryotherapy (Ice) for swelling control.',
-        'Phase 1 (0-2 wks): Ankle pumps, Quad sets, Heel slides (ROM 0-90).\nPhase 2 (3-6 wks): Mini squats, Gait training, Stationary bike.\nPhase 3: Functional training.',
-        '3-4 months supervised PT.',
-        'Return to normal low-impact activities in 3-6 months.',
-        'Ranawat et al. Consensus Guidelines'
-    )
-""")
-
-# 5. Total Hip Arthroplasty (THA)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Total Hip Arthroplasty (Post-Op THA)',
-        'hip replacement, tha, hip surgery, تغيير مفصل الفخذ',
-        'Rehabilitation after hip joint replacement. *Precautions depend on surgical approach.*',
-        'TENS (for incisional pain)',
-        'Freq: 100Hz. Intensity: Sensory. Continuous.',
-        'Electrodes placed parallel to the incision line (at least 2cm away). Do not place directly over staples.',
-        '/static/tha.jpg',
-        'Pain management to facilitate early mobilization.',
-        'Contraindicated over Plastic/Metal',
-        'Do not use Ultrasound over the prosthesis (risk of heating/loosening).',
-        'N/A',
-        '1. Ankle Pumps.\n2. Glute Squeeze.\n3. Heel Slides (within limit).\n4. Abduction (Avoid crossing midline).\n*Adhere to dislocation precautions.*',
-        '2-3 months.',
-        'Full weight bearing usually immediate (cemented) or 6 weeks (uncemented).',
-        'HSS Rehabilitation Guidelines'
-    )
-""")
-
-# 6. Rotator Cuff Repair (Post-Op)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Rotator Cuff Repair (Post-Op)',
-        'shoulder surgery, supraspinatus tear, cuff repair, قطع وتر الكتف',
-        'Rehab following surgical reattachment of torn rotator cuff tendons.',
-        'TENS (Post-op Pain)',
-        'Freq: 100Hz. Mode: Continuous. Time: As needed.',
-        'Two channels crossing the shoulder joint (Anterior/Posterior and Lateral).',
-        '/static/rotator.jpg',
-        'Pain control during passive motion phase.',
-        'Not indicated in early phase',
-        'Can weaken suture repair in first 6 weeks. Avoid.',
-        'N/A',
-        'Phase 1 (0-6 wks): PROM only (Pendulums, Pulleys). NO Active motion.\nPhase 2 (6-12 wks): AAROM -> AROM.\nPhase 3 (12+ wks): Strengthening.',
-        '4-6 months.',
-        'Full return to sport/heavy labor: 6-9 months.',
-        'ASES Rehabilitation Protocol'
-    )
-""")
-
-# 7. Mechanical Neck Pain
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Mechanical Neck Pain',
-        'neck pain, cervical, stiffness, trapezius spasm, شد عضلات الرقبة',
-        'Generalized neck pain provoked by sustained postures or movement.',
-        'TENS (Burst Mode)',
-        'Freq: 2-4 Hz (Burst). Pulse: 200 µs. Intensity: Visible twitch. Time: 20 mins.',
-        'Paravertebral (Cervical paraspinals) and Upper Trapezius.',
-        '/static/neck.jpg',
-        'Endorphin release for chronic neck pain and muscle relaxation.',
-        'Indicated (Thermal)',
-        'Frequency: 1 MHz (Trapezius) or 3 MHz (Cervical). Continuous. 1.0 W/cm².',
-        'Increase blood flow and relax tight suboccipital/paraspinal muscles.',
-        '1. Chin Tucks (Deep Neck Flexor activation).\n2. Upper Trapezius Stretch.\n3. Levator Scapulae Stretch.\n4. Scapular Retraction exercises.',
-        'Session: 45 mins. Freq: 2-3/week.',
-        'Improvement usually seen within 2-4 weeks.',
-        'APTA Orthopaedic Section Guidelines'
-    )
-""")
-
-# 8. ACL Reconstruction
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'ACL Reconstruction Rehab',
-        'acl, knee ligament, surgery, sports injury, الرباط الصليبي',
-        'Post-operative management of Anterior Cruciate Ligament reconstruction.',
-        'NMES (Russian Current)',
-        'Target: Quads (VMO). 2500Hz burst. 10/50 duty cycle. Intensity: Motor.',
-        'Bipolar placement: VMO motor point and Proximal Rectus Femoris.',
-        '/static/acl.jpg',
-        'Restore quad strength and prevent atrophy (Essential in first 6 weeks).',
-        'Not primary modality',
-        'Cryotherapy is superior for post-op swelling.',
-        'N/A',
-        'Wk 1-2: Full extension emphasis, Patellar mobs, SLR.\nWk 3-6: Closed chain (Squats, Lunges), Proprioception.\nMonth 3+: Running drills.',
-        '6-9 months.',
-        'Return to sport: 9-12 months (Must pass Hop Tests).',
-        'Moon et al. / Delaware Protocol'
-    )
-""")
-
-# 9. Hamstring Strain
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Hamstring Muscle Strain',
-        'pulled muscle, thigh pain, sprinter injury, posterior thigh, مزق العضلة الخلفية',
-        'Tear of muscle fibers in the posterior thigh.',
-        'Pulsed Shortwave or IFC',
-        'IFC: 4000Hz, Vector scan for pain.',
-        'Quadripolar (4 electrodes) surrounding the site of pain/strain on posterior thigh.',
-        '/static/hamstring.jpg',
-        'Pain relief and hematoma absorption (sub-acute).',
-        'Indicated (Pulsed initially)',
-        'Acute: Pulsed 20%, 1MHz. Chronic: Continuous 1MHz, 1.5 W/cm².',
-        'Promote collagen alignment during healing.',
-        'Phase 1: Isometric Hamstring sets, Ice.\nPhase 2: Eccentric loading (Nordic Hamstring Curl).\nPhase 3: Sprinting mechanics.',
-        '4-8 weeks.',
-        'High recurrence rate if eccentric strengthening is neglected.',
-        'Aspetar Hamstring Protocol'
-    )
-""")
-
-# 10. Meniscus Tear
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Meniscus Tear (Conservative/Post-Op)',
-        'knee locking, clicking, cartilage tear, ghoda, غضروف الركبة',
-        'Injury to the shock-absorbing cartilage in the knee.',
-        'NMES / TENS',
-        'NMES for Quad strength. TENS for joint line pain.',
-        'NMES: On Quads. TENS: Medial and Lateral joint line.',
-        '/static/meniscus.jpg',
-        'Muscle support to offload the compartment.',
-        'Indicated (Pulsed)',
-        'Low intensity pulsed ultrasound (LIPUS) may aid healing in vascular zones.',
-        'Symptom management.',
-        '1. Range of Motion (Bike).\n2. Open chain quads (avoid deep flexion initially).\n3. Balance/Proprioception.',
-        'Conservative: 6-8 weeks. Repair: 4-6 months.',
-        'Surgery indicated if locking/catching persists.',
-        'JOSPT Guidelines'
-    )
-""")
-
-# 11. Ankle Sprain
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Lateral Ankle Sprain',
-        'ankle pain, sprain, swelling, ligament tear, twist, التواء الكاحل',
-        'Injury to the lateral ligaments (ATFL, CFL) usually caused by inversion trauma.',
-        'HVPC / IFC',
-        'Freq: 120 Hz. Polarity: Negative (for edema). Time: 20-30 mins.',
-        'Surrounding the malleolus (Medial and Lateral) ensuring the current passes through the edema.',
-        '/static/ankle.jpg',
-        'Edema reduction (curbing swelling) in the acute phase.',
-        'Indicated (Pulsed only in Acute)',
-        'Acute: 20% Duty Cycle, 3 MHz, 0.5 W/cm². Chronic: 100%, 1 MHz.',
-        'Acute: Accelerate healing. Chronic: Break down adhesions/scar tissue.',
-        '1. RICE Protocol (Acute).\n2. Ankle Pumps (Range of Motion).\n3. Towel Scrunches (Intrinsics).\n4. Single Leg Balance (Proprioception).',
-        'Mild: 2 weeks. Severe: 6-12 weeks.',
-        'Return to sport depends on passing functional hop tests.',
-        'NATA Position Statement on Ankle Sprains'
-    )
-""")
-
-# 12. Tennis Elbow
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Lateral Epicondylitis (Tennis Elbow)',
-        'elbow pain, tennis elbow, grip weakness, forearm pain, التهاب الكوع',
-        'Overuse injury involving the extensor carpi radialis brevis (ECRB) tendon.',
-        'TENS (Conventional)',
-        'Freq: 100 Hz. Pulse: 100 µs. Time: 15 mins.',
-        'One electrode over the pain site (Lateral Epicondyle), one proximal over the muscle belly.',
-        '/static/elbow.jpg',
-        'Pain management to facilitate exercise performance.',
-        'Indicated (Pulsed Mode)',
-        'Frequency: 3 MHz. Intensity: 0.5-1.0 W/cm². Duty Cycle: 20% (Non-thermal). Time: 5 mins.',
-        'Stimulate collagen synthesis and tendon healing.',
-        '1. Eccentric Wrist Extension (Tyler Twist).\n2. Wrist Extensor Stretch.\n3. Grip Strengthening.',
-        'Session: 30-45 mins. Freq: 2/week.',
-        'Recovery typically takes 12 weeks to 6 months.',
-        'Bisset et al. (Physiotherapy Evidence Database)'
-    )
-""")
-
-# 13. Stroke
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Stroke Rehabilitation (Hemiplegia)',
-        'cva, stroke, paralysis, weakness, gait, hemiparesis, الجلطة الدماغية',
-        'Rehabilitation for loss of motor function/sensation after cerebral infarction.',
-        'FES (Functional Electrical Stimulation)',
-        'Target: Tibialis Anterior (for Foot Drop).',
-        'Active electrode on Tibialis Anterior motor point (below knee, lateral), Reference on tendon.',
-        '/static/stroke.jpg',
-        'Neuroplasticity and functional motor re-learning (Gait).',
-        'Not typically indicated',
-        'Focus is on neuro-facilitation techniques.',
-        'N/A',
-        '1. Task-Oriented Training (Reach to grasp).\n2. Sit-to-Stand practice.\n3. Gait Training.\n4. Constraint-Induced Movement Therapy (CIMT).',
-        'Long term (Months to Years).',
-        'Fastest recovery in first 3-6 months.',
-        'AHA/ASA Stroke Rehab Guidelines'
-    )
-""")
-
-# 14. Parkinson's
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Parkinson''s Disease',
-        'tremor, rigidity, shuffling gait, balance, pd, الشلل الرعاش',
-        'Progressive neurodegenerative disorder affecting movement control.',
-        'Biofeedback / Cueing',
-        'Auditory (Metronome) or Visual cues.',
-        'N/A (Cues are auditory/visual, not electrode based).',
-        '/static/parkinson.jpg',
-        'Overcome freezing of gait (FOG).',
-        'N/A',
-        'Not indicated.',
-        'N/A',
-        '1. LSVT BIG (Large amplitude movements).\n2. Rotational trunk exercises.\n3. Balance & Fall Prevention.\n4. Treadmill training.',
-        'Lifelong maintenance.',
-        'Goal is to delay decline and maintain independence.',
-        'European Physiotherapy Guideline'
-    )
-""")
-
-# 15. Bell's Palsy
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Bell''s Palsy (Facial Palsy)',
-        'facial paralysis, face droop, bell, weakness, شلل الوجه',
-        'Unilateral weakness or paralysis of facial muscles due to inflammation of the 7th cranial nerve.',
-        'Electrical Muscle Stimulation (EMS)',
-        'Target: Individual facial muscles. Pulse: Long duration (for denervated) or standard EMS.',
-        'Motor Point Stimulation: Specific placement on the belly of affected muscles.',
-        '/static/face.jpg',
-        'Maintain muscle bulk/prevent atrophy. *Biofeedback is preferred.*',
-        'Not standard practice',
-        'Not typically used for facial muscles due to proximity to eyes.',
-        'N/A',
-        '1. AAROM (Assisted Active ROM) for eyebrows, eyes, lips.\n2. Mime Therapy.\n3. Kabat Rehabilitation.\n4. Blowing/Whistling exercises.',
-        'Session: 30 mins. Daily home exercises.',
-        'Most recover within 3-6 months.',
-        'Clinical Practice Guidelines (Otolaryngology)'
-    )
-""")
-
-# 16. Diabetic Polyneuropathy
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Diabetic Peripheral Neuropathy',
-        'diabetes, numbness, foot pain, balance, burning feet, التهاب الأعصاب السكري',
-        'Nerve damage caused by diabetes leading to loss of sensation.',
-        'TENS / Infrared',
-        'TENS: 80-100Hz. Infrared Anodyne Therapy.',
-        'Electrodes placed along the dermatome of the leg/foot (e.g., L4, L5, S1) or surrounding painful area.',
-        '/static/neuropathy.jpg',
-        'Symptomatic pain relief and local circulation improvement.',
-        'Caution',
-        'Use with extreme caution due to loss of sensation (Burn risk).',
-        'Avoid if sensation is absent.',
-        '1. Balance Training.\n2. Gait Training.\n3. Foot Care Education.\n4. Aerobic exercise.',
-        'Chronic management.',
-        'Strict glycemic control is key.',
-        'American Diabetes Association'
-    )
-""")
-
-# 17. CABG (Open Heart)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'CABG Rehabilitation (Open Heart)',
-        'heart surgery, cardiac rehab, sternotomy, bypass, عملية قلب مفتوح',
-        'Phase I to III rehab following Coronary Artery Bypass Graft.',
-        'TENS (Sternal Pain)',
-        'Conventional TENS. Freq 100Hz.',
-        'Para-sternal region (avoid placing over heart directly/Pacemaker). Parallel to scar.',
-        '/static/cabg.jpg',
-        'Manage sternotomy pain to allow coughing/breathing.',
-        'Contraindicated over Chest',
-        'Never use therapeutic US over the heart or pacemaker.',
-        'N/A',
-        '1. Deep Breathing & Incentive Spirometry.\n2. Sternal Precautions.\n3. Progressive walking program.',
-        'Phase 1: 1 week. Phase 2: 3-6 months.',
-        'Return to work: 6-12 weeks.',
-        'AACVPR Guidelines'
-    )
-""")
-
-# 18. Renal Failure
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'ESRD & Hemodialysis Rehabilitation',
-        'kidney failure, dialysis, fatigue, weakness, renal, الغسيل الكلوي',
-        'Exercise training for patients undergoing hemodialysis.',
-        'NMES (Intradialytic)',
-        'Applied to Quads/Calves during dialysis. Freq: 30-50Hz.',
-        'Large electrodes on Quadriceps muscle belly and/or Gastrocnemius.',
-        '/static/renal.jpg',
-        'Prevent muscle wasting in sedentary dialysis patients.',
-        'N/A', 'Not standard.', 'N/A',
-        '1. Intradialytic Cycling (Bed bike).\n2. Low intensity resistance training.\n3. Energy conservation.',
-        'Ongoing (3x/week during sessions).',
-        'Improves dialysis efficiency (Kt/V).',
-        'K/DOQI Guidelines'
-    )
-""")
-
-# 19. Lymphedema
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Lymphedema Management',
-        'swelling, lymph, mastectomy, arm swelling, edema, التورم الليمفاوي',
-        'Chronic accumulation of protein-rich fluid usually after cancer surgery.',
-        'Not Primary Treatment',
-        'Electrical stimulation is rarely used. Focus is on CDT.',
-        'N/A',
-        '/static/lymph.jpg',
-        'N/A',
-        'Contraindicated (Standard Thermal)',
-        'Thermal US can increase lymph production. *Low Level Laser* is preferred.',
-        'Avoid Thermal Ultrasound.',
-        '1. Complex Decongestive Therapy (CDT).\n2. Manual Lymph Drainage (MLD).\n3. Compression Bandaging.\n4. Decongestive Exercises.',
-        'Intensive Phase: 2-4 weeks daily.',
-        'Condition is manageable but not curable.',
-        'International Society of Lymphology'
-    )
-""")
-
-# 20. Diastasis Recti
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Diastasis Recti (Post-Partum)',
-        'abdominal separation, pregnancy, tummy, post natal, انفصال عضلات البطن',
-        'Separation of the rectus abdominis muscles during/after pregnancy.',
-        'NMES (Adjunct)',
-        'Target: Rectus Abdominis. *Caution*.',
-        'Bipolar placement on Rectus Abdominis bellies (avoid midline gap).',
-        '/static/diastasis.jpg',
-        'Assist in recruitment of abdominal wall.',
-        'N/A',
-        'Real-time Ultrasound Imaging is used for *Biofeedback*.',
-        'Diagnosis and Biofeedback.',
-        '1. Transverse Abdominis Activation.\n2. Pelvic Floor Kegels.\n3. Heel Slides with core brace.',
-        '8-12 weeks.',
-        'Surgery considered if gap > 2.5cm persists.',
-        'Women''s Health PT Guidelines'
-    )
-""")
-
-# 21. Labor Pain
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Labor Pain Management',
-        'birth, delivery, labor, pain relief, pregnancy, الولادة',
-        'Non-pharmacological pain relief during the first stage of labor.',
-        'Obstetric TENS',
-        'Burst (between contractions), High Freq 100Hz (during contraction).',
-        'Paravertebral: T10-L1 (Upper) and S2-S4 (Lower).',
-        '/static/labor.jpg',
-        'Significant pain reduction via Gate Control Mechanism.',
-        'N/A', 'Not indicated.', 'N/A',
-        '1. Birthing ball exercises.\n2. Pelvic rocking.\n3. Breathing techniques.',
-        'Duration of labor.',
-        'Safe for mother and baby.',
-        'Cochrane Review on TENS'
-    )
-""")
-
-# 22. Urinary Incontinence
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Stress Urinary Incontinence',
-        'leakage, pelvic floor, bladder, weakness, women health, سلس البول',
-        'Involuntary leakage of urine during exertion.',
-        'Vaginal/Anal Electrical Stimulation',
-        'Freq: 50Hz. Time: 15-20 mins.',
-        'Internal Probe (Vaginal or Anal).',
-        '/static/pelvic.jpg',
-        'Strengthen pelvic floor muscles reflexively.',
-        'N/A', 'N/A', 'N/A',
-        '1. Kegel Exercises (Fast flicks and Long holds).\n2. The "Knack" maneuver.\n3. Core strengthening.',
-        '3-6 months.',
-        'Success rate of conservative PT is >70%.',
-        'ICS Guidelines'
-    )
-""")
-
-# 23. Osteoporosis
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Osteoporosis & Fall Prevention',
-        'bone density, fragile bones, elderly, fracture risk, هشاشة العظام',
-        'Management of reduced bone density in elderly to prevent fractures.',
-        'N/A',
-        'Modalities used only for associated pain.',
-        'N/A (Avoid spinal flexion/manipulation).',
-        '/static/osteoporosis.jpg',
-        'N/A',
-        'Caution', 'Avoid heavy manual pressure.', 'N/A',
-        '1. Weight-Bearing Exercises.\n2. Resistance Training.\n3. Balance Training (Tai Chi).\n4. Postural extension.',
-        'Lifelong.',
-        'Exercise can reduce fracture risk.',
-        'NOF Clinician''s Guide'
-    )
-""")
-
-# 24. Mechanical Low Back Pain (Repeated for safety, standard entry)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Mechanical Low Back Pain',
-        'lbp, back pain, lumbago, strain, stiffness, ألم أسفل الظهر',
-        'General non-specific low back pain involving muscles/joints.',
-        'TENS / IFC / Heat',
-        'IFC: 4000Hz. TENS: 80-100Hz. Heat pack: 20 mins.',
-        'Paravertebral muscles (Lumber region). 4 Electrodes (IFC) crossing pain center.',
-        '/static/lbp.jpg',
-        'Pain modulation to allow movement.',
-        'Indicated (Thermal)',
-        '1 MHz, Continuous, 1.5 W/cm². Paraspinal muscles.',
-        'Relax muscle spasm and increase blood flow.',
-        '1. Cat-Camel stretch.\n2. Child''s Pose.\n3. Bridging.\n4. Lumbar rotations.',
-        '4-6 weeks.',
-        'Encourage early return to activity.',
-        'ACP Guidelines for Low Back Pain'
-    )
-""")
-
-# 25. Plantar Fasciitis (FIXED: Added Placement)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Plantar Fasciitis',
-        'heel pain, foot pain, morning pain, arch pain, شوكة عظمية',
-        'Inflammation of the thick band of tissue (plantar fascia) causing heel pain.',
-        'Iontophoresis (if available) or TENS',
-        'TENS: 100 Hz, Sensory level. Ionto: Dexamethasone, 40 mA-min.',
-        'Placement: Medial calcaneal tubercle and arch (or bracket the heel).',
-        '/static/plantar.jpg',
-        'Short term pain relief.',
-        'Indicated (Pulsed or Continuous)',
-        '3 MHz, 1.0-1.5 W/cm². Continuous for chronic cases. Time: 5-8 mins.',
-        'Improve tissue extensibility before manual therapy or stretching.',
-        '1. Plantar Fascia Stretch.\n2. Calf Stretching.\n3. Frozen Water Bottle Roll.\n4. Towel Curls.',
-        'Session: 40 mins. Home program essential.',
-        'Resolution can take 6-12 months.',
-        'JOSPT Clinical Guidelines'
-    )
-""")
-
-# 26. Carpal Tunnel Syndrome (FIXED: Added Placement)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Carpal Tunnel Syndrome',
-        'wrist pain, hand numbness, tingling fingers, cts, اختناق العصب',
-        'Compression of the median nerve as it travels through the carpal tunnel in the wrist.',
-        'TENS or Ultrasound',
-        'TENS: 100 Hz, Sensory. No motor contraction.',
-        'Placement: Over the carpal tunnel (wrist) and proximal forearm.',
-        '/static/carpal.jpg',
-        'Pain management only.',
-        'Indicated (Non-Thermal)',
-        'Freq: 3 MHz. Duty Cycle: 20% (Pulsed). Intensity: 0.8 W/cm². Time: 5 mins.',
-        'Reduce inflammation within the carpal tunnel.',
-        '1. Median Nerve Gliding Exercises.\n2. Tendon Gliding Exercises.\n3. Wrist flexor stretching.',
-        'Session: 30 mins. Freq: 2/week.',
-        'Conservative management effective in mild-moderate cases.',
-        'APT Hand and Upper Extremity Guidelines'
-    )
-""")
-
-# 27. Patellofemoral Pain Syndrome (PFPS)
-cursor.execute("""
-    INSERT INTO protocols VALUES (
-        NULL,
-        'Patellofemoral Pain Syndrome (PFPS)',
-        'knee pain, runner knee, anterior knee pain, chondromalacia, صابونة الركبة',
-        'Pain around or behind the patella, aggravated by loading activities.',
-        'NMES (VMO Strengthening)',
-        'Target: Vastus Medialis Oblique (VMO). Freq: 50 Hz. Duty: 10/50.',
-        'Placement: VMO Motor point and proximal thigh.',
-        '/static/pfps.jpg',
-        'Re-education of the VMO muscle to improve patellar tracking.',
-        'Not Primary Treatment',
-        'Generally not effective for PFPS unless specifically targeting retinaculum tightness.',
-        'Adjunct only.',
-        '1. VMO Strengthening.\n2. Clamshells.\n3. Hip Abduction.\n4. IT Band Stretching.',
-        'Session: 45-60 mins. Focus on Hip/Core.',
-        '6-8 weeks of strengthening program required.',
-        'International Patellofemoral Research Consensus'
-    )
-""")
-
-connection.commit()
-connection.close()
-print("Mega Database Updated: Users Table Added + 27 Diseases FIXED & Preserved! 👤🩺")
\ No newline at end of file
+import argparse
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, inspect, select, text, update
+from werkzeug.security import generate_password_hash
+
+import library_artifact
+from app import (app, db, Protocol, User, SearchSynonym, protocol_row_from_json, record_protocol_changes,
+                 refresh_search_keys, refresh_protocol_params, refresh_category_counts, record_import, metrics,
+                 related_job)
+from search_keys import keys_for
+
+# ==============================================================================
+# أداة تحميل البيانات (Seeding) على جداول الموديلات الحقيقية Protocol / User
+# الاستخدام:
+#   python setup_db.py                      -> القائمة الأساسية + ملفات JSON
+#   python setup_db.py --reset              -> مسح الجداول وإعادة إنشائها أولاً
+#   python setup_db.py --synthetic 100000   -> إضافة بيانات وهمية للقياس (Benchmark)
+#   python setup_db.py --build-artifact library.db  -> (وقت الـ build) نفس المصادر في ملف SQLite جاهز
+#   python setup_db.py --artifact library.db        -> التحميل من الملف الجاهز بدل JSON
+#   ADMIN_EMAIL=... ADMIN_PASSWORD=... python setup_db.py  -> + حساب أدمن (أو --admin-email / --admin-password)
+# قاعدة البيانات بتتحدد من DATABASE_URL زي التطبيق بالظبط
+# ==============================================================================
+
+JSON_SOURCES = ['physio_data_partial.json', 'final_physio_protocols.json']
+
+# ==============================================================================
+# 1. القائمة الأساسية (50 مرض) - كانت مكتوبة جوه /setup-sys-... route
+# ==============================================================================
+BUILTIN_PROTOCOLS = [
+    {"n": "Adhesive Capsulitis", "c": "Orthopedics", "k": "frozen shoulder, stiff", "d": "Stiffness and pain in the shoulder joint.", "et": "TENS", "ep": "100Hz, continuous", "er": "Pain relief", "ut": "Ultrasound", "up": "1.5 W/cm2, 1MHz", "ur": "Deep heating", "ex": "Pendulum, Wand exercises", "ex_r": "Increase ROM", "ef": "Daily", "ei": "Pain-free", "ev": "Grade A", "src": "Kisner & Colby", "img": "/static/uploads/shoulder.jpg"},
+    {"n": "Knee Osteoarthritis", "c": "Orthopedics", "k": "knee oa, pain, joint", "d": "Degenerative joint disease affecting the knee.", "et": "IFC", "ep": "Beat freq 80-150Hz", "er": "Pain modulation", "ut": "None", "up": "None", "ur": "None", "ex": "Quads setting, SLR", "ex_r": "Strengthening", "ef": "3x/week", "ei": "Moderate", "ev": "Grade A", "src": "Dutton", "img": "/static/uploads/knee.jpg"},
+    {"n": "Low Back Pain (Mechanical)", "c": "Orthopedics", "k": "lbp, back, lumbar", "d": "Pain in the lumbar region not due to radiculopathy.", "et": "TENS", "ep": "80-100Hz", "er": "Gate control", "ut": "IR Lamp", "up": "20 mins", "ur": "Relaxation", "ex": "McKenzie, Pelvic tilt", "ex_r": "Core stability", "ef": "Daily", "ei": "Controlled", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/back.jpg"},
+    {"n": "Carpal Tunnel Syndrome", "c": "Orthopedics", "k": "cts, wrist, hand", "d": "Median nerve compression at the wrist.", "et": "Ultrasound", "ep": "0.8 W/cm2, pulsed 20%", "er": "Anti-inflammatory", "ut": "US", "up": "See above", "ur": "Healing", "ex": "Tendon gliding", "ex_r": "Mobility", "ef": "Daily", "ei": "Low", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/wrist.jpg"},
+    {"n": "Lateral Epicondylitis", "c": "Orthopedics", "k": "tennis elbow", "d": "Inflammation of the extensor origin.", "et": "Laser", "ep": "4 J/cm2", "er": "Tissue repair", "ut": "Phonophoresis", "up": "1.0 W/cm2", "ur": "Drug delivery", "ex": "Eccentric wrist ext", "ex_r": "Remodeling", "ef": "3x/week", "ei": "Intense", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/elbow.jpg"},
+    {"n": "Stroke (Hemiplegia)", "c": "Neurology", "k": "cva, neuro", "d": "Paralysis on one side of the body.", "et": "FES", "ep": "35Hz, 300us", "er": "Re-education", "ut": "None", "up": "None", "ur": "None", "ex": "Task-oriented training", "ex_r": "Neuroplasticity", "ef": "Daily", "ei": "High", "ev": "Grade A", "src": "Carr & Shepherd", "img": "/static/uploads/stroke.jpg"},
+    {"n": "Bell's Palsy", "c": "Neurology", "k": "facial, nerve", "d": "Facial nerve paralysis.", "et": "ESTR", "ep": "Interrupted DC", "er": "Muscle stimulation", "ut": "None", "up": "None", "ur": "None", "ex": "Facial expressions", "ex_r": "Function", "ef": "2x/daily", "ei": "Threshold", "ev": "Grade B", "src": "Tidy's", "img": "/static/uploads/face.jpg"},
+    {"n": "Cerebral Palsy (Spastic)", "c": "Pediatrics", "k": "cp, child, peds", "d": "Motor disorder due to brain damage.", "et": "NMES", "ep": "Antagonist muscles", "er": "Reduce spasticity", "ut": "None", "up": "None", "ur": "None", "ex": "Stretching, NDT", "ex_r": "Function", "ef": "Daily", "ei": "Mild", "ev": "Grade A", "src": "Tecklin", "img": "/static/uploads/cp.jpg"},
+    {"n": "Sciatica", "c": "Orthopedics", "k": "nerve, leg pain", "d": "Pain radiating along the sciatic nerve.", "et": "TENS", "ep": "Burst mode", "er": "Endorphin release", "ut": "Hot Pack", "up": "20 mins", "ur": "Relaxation", "ex": "Nerve gliding", "ex_r": "Mobilization", "ef": "Daily", "ei": "Comfortable", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/sciatica.jpg"},
+    {"n": "Ankle Sprain", "c": "Sports", "k": "ankle, ligament", "d": "Ligament injury in the ankle.", "et": "Cryotherapy", "ep": "Ice 15 mins", "er": "Vasoconstriction", "ut": "US", "up": "Pulsed 20%", "ur": "Healing (Subacute)", "ex": "Proprioception", "ex_r": "Balance", "ef": "3x/week", "ei": "Functional", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/ankle.jpg"},
+    {"n": "Plantar Fasciitis", "c": "Orthopedics", "k": "foot, heel", "d": "Inflammation of the plantar fascia.", "et": "Ultrasound", "ep": "1.5 W/cm2 continuous", "er": "Extensibility", "ut": "Shockwave", "up": "2000 shocks", "ur": "Break adhesions", "ex": "Calf stretching", "ex_r": "Flexibility", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "Dutton", "img": "/static/uploads/foot.jpg"},
+    {"n": "Neck Pain (Cervical Spondylosis)", "c": "Orthopedics", "k": "neck, cervical", "d": "Degeneration of cervical spine.", "et": "IFT", "ep": "4000Hz base", "er": "Pain relief", "ut": "Hot Pack", "up": "15 mins", "ur": "Relaxation", "ex": "Chin tucks", "ex_r": "Posture", "ef": "Daily", "ei": "Low", "ev": "Grade A", "src": "Maitland", "img": "/static/uploads/neck.jpg"},
+    {"n": "Rotator Cuff Tendinitis", "c": "Orthopedics", "k": "shoulder, cuff", "d": "Inflammation of shoulder tendons.", "et": "US", "ep": "1MHz, pulsed", "er": "Healing", "ut": "Laser", "up": "Low level", "ur": "Repair", "ex": "Isometrics", "ex_r": "Strength", "ef": "3x/week", "ei": "Submaximal", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/shoulder_cuff.jpg"},
+    {"n": "Patellofemoral Pain Syndrome", "k": "knee, runner", "d": "Pain around the kneecap.", "et": "Biofeedback", "ep": "VMO muscle", "er": "Re-education", "ut": "Ice", "up": "10 mins", "ur": "Pain", "ex": "VMO strengthening", "ex_r": "Tracking", "ef": "3x/week", "ei": "Moderate", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/knee_vmo.jpg"},
+    {"n": "Guillain-Barre Syndrome", "c": "Neurology", "k": "gbs, neuro", "d": "Rapid-onset muscle weakness.", "et": "None", "ep": "Avoid fatigue", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "PROM -> AAROM", "ex_r": "Maintain range", "ef": "Daily", "ei": "Gentle", "ev": "Grade B", "src": "O'Sullivan", "img": "/static/uploads/gbs.jpg"},
+    {"n": "Multiple Sclerosis", "c": "Neurology", "k": "ms, neuro", "d": "Demyelinating disease.", "et": "Cooling vest", "ep": "Minimize heat", "er": "Performance", "ut": "None", "up": "None", "ur": "None", "ex": "Energy conservation", "ex_r": "Endurance", "ef": "3x/week", "ei": "Sub-fatigue", "ev": "Grade A", "src": "O'Sullivan", "img": "/static/uploads/ms.jpg"},
+    {"n": "Rheumatoid Arthritis", "c": "Orthopedics", "k": "ra, hand, joint", "d": "Autoimmune joint inflammation.", "et": "Paraffin Wax", "ep": "Dip method", "er": "Pain/Stiffness", "ut": "TENS", "up": "Conv. mode", "ur": "Pain", "ex": "Gentle AROM", "ex_r": "Mobility", "ef": "Daily", "ei": "Painless", "ev": "Grade B", "src": "Tidy's", "img": "/static/uploads/hand_ra.jpg"},
+    {"n": "Scoliosis", "c": "Orthopedics", "k": "spine, curve", "d": "Sideways curvature of the spine.", "et": "NMES", "ep": "Convex side", "er": "Muscle balance", "ut": "None", "up": "None", "ur": "None", "ex": "Schroth method", "ex_r": "Correction", "ef": "Daily", "ei": "Corrective", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/spine.jpg"},
+    {"n": "Achilles Tendinitis", "c": "Orthopedics", "k": "heel, tendon", "d": "Overuse of the Achilles tendon.", "et": "US", "ep": "3MHz pulsed", "er": "Healing", "ut": "Eccentric load", "up": "Slow drop", "ur": "Remodeling", "ex": "Heel drops", "ex_r": "Strength", "ef": "Daily", "ei": "High-eccentric", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/heel.jpg"},
+    {"n": "Fibromyalgia", "c": "General", "k": "fibro, pain", "d": "Widespread musculoskeletal pain.", "et": "TENS", "ep": "Burst/Acupuncture", "er": "Central pain", "ut": "Heat", "up": "General", "ur": "Relaxation", "ex": "Aerobic (Low impact)", "ex_r": "Endurance", "ef": "3x/week", "ei": "Low-Moderate", "ev": "Grade A", "src": "Dutton", "img": "/static/uploads/body.jpg"},
+    {"n": "Meniscus Tear", "c": "Orthopedics", "k": "knee, locking", "d": "Tear in the knee cartilage.", "et": "NMES", "ep": "Quads", "er": "Prevent atrophy", "ut": "Ice", "up": "15 mins", "ur": "Edema", "ex": "Mini-squats", "ex_r": "Strength", "ef": "Daily", "ei": "Pain-free", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/knee_meniscus.jpg"},
+    {"n": "ACL Reconstruction", "c": "Orthopedics", "k": "knee, acl, surgery", "d": "Post-op rehab for ACL.", "et": "NMES", "ep": "Quads", "er": "Activation", "ut": "Cryo-cuff", "up": "Continuous", "ur": "Swelling", "ex": "Heel slides, Quad sets", "ex_r": "ROM & Strength", "ef": "Daily", "ei": "Protocol-based", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/acl.jpg"},
+    {"n": "Piriformis Syndrome", "c": "Orthopedics", "k": "buttock pain, sciatica", "d": "Sciatic nerve compression by piriformis.", "et": "US", "ep": "Deep heat", "er": "Relaxation", "ut": "Heat", "up": "20 mins", "ur": "Spasm", "ex": "Piriformis stretch", "ex_r": "Flexibility", "ef": "Daily", "ei": "Moderate", "ev": "Grade B", "src": "Dutton", "img": "/static/uploads/piriformis.jpg"},
+    {"n": "Thoracic Outlet Syndrome", "c": "Orthopedics", "k": "tos, arm numb", "d": "Compression of nerves/vessels in neck.", "et": "TENS", "ep": "Sensory", "er": "Pain", "ut": "Heat", "up": "Neck", "ur": "Relaxation", "ex": "Corner stretch, Scalene stretch", "ex_r": "Postural correction", "ef": "Daily", "ei": "Gentle", "ev": "Grade B", "src": "Kisner", "img": "/static/uploads/tos.jpg"},
+    {"n": "De Quervain's Tenosynovitis", "c": "Orthopedics", "k": "thumb, wrist", "d": "Pain in thumb tendons.", "et": "US", "ep": "Pulsed", "er": "Inflammation", "ut": "None", "up": "None", "ur": "None", "ex": "Thumb Spica", "ex_r": "Rest", "ef": "Daily", "ei": "Low", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/thumb.jpg"},
+    {"n": "Temporomandibular Joint Dysfunction", "c": "Orthopedics", "k": "tmj, jaw", "d": "Jaw pain and clicking.", "et": "US", "ep": "0.8 W/cm2", "er": "Relaxation", "ut": "Laser", "up": "Trigger points", "ur": "Pain", "ex": "Rocabado exercises", "ex_r": "Coordination", "ef": "Daily", "ei": "Gentle", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/tmj.jpg"},
+    {"n": "Parkinson's Disease", "c": "Neurology", "k": "pd, tremor", "d": "Neurodegenerative disorder.", "et": "Cueing (Auditory)", "ep": "Metronome", "er": "Gait", "ut": "None", "up": "None", "ur": "None", "ex": "Big & Loud (LSVT)", "ex_r": "Amplitude", "ef": "4x/week", "ei": "High", "ev": "Grade A", "src": "O'Sullivan", "img": "/static/uploads/parkinsons.jpg"},
+    {"n": "Spinal Cord Injury (Paraplegia)", "c": "Neurology", "k": "sci, paralysis", "d": "Injury to spinal cord.", "et": "FES", "ep": "Cycling", "er": "Fitness", "ut": "None", "up": "None", "ur": "None", "ex": "Transfers, Wheelchair skills", "ex_r": "Independence", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "O'Sullivan", "img": "/static/uploads/sci.jpg"},
+    {"n": "Traumatic Brain Injury", "c": "Neurology", "k": "tbi, head", "d": "Brain injury due to trauma.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Dual-task training", "ex_r": "Cognition-Motor", "ef": "Daily", "ei": "Variable", "ev": "Grade A", "src": "Carr & Shepherd", "img": "/static/uploads/tbi.jpg"},
+    {"n": "Peripheral Neuropathy", "c": "Neurology", "k": "diabetes, numbness", "d": "Nerve damage in extremities.", "et": "TENS", "ep": "Frequency modulated", "er": "Pain masking", "ut": "Anodyne (IR)", "up": "30 mins", "ur": "Circulation", "ex": "Balance training", "ex_r": "Fall prevention", "ef": "Daily", "ei": "Safe", "ev": "Grade B", "src": "Dutton", "img": "/static/uploads/foot_neuro.jpg"},
+    {"n": "Duchenne Muscular Dystrophy", "c": "Pediatrics", "k": "dmd, child", "d": "Genetic muscle wasting.", "et": "None", "ep": "Avoid eccentrics", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Swimming, Cycling", "ex_r": "Maintain function", "ef": "3x/week", "ei": "Submaximal", "ev": "Grade B", "src": "Tecklin", "img": "/static/uploads/dmd.jpg"},
+    {"n": "Spina Bifida", "c": "Pediatrics", "k": "myelomeningocele", "d": "Neural tube defect.", "et": "NMES", "ep": "Functional", "er": "Gait", "ut": "None", "up": "None", "ur": "None", "ex": "Gait training", "ex_r": "Mobility", "ef": "Daily", "ei": "Functional", "ev": "Grade A", "src": "Tecklin", "img": "/static/uploads/sb.jpg"},
+    {"n": "Torticollis", "c": "Pediatrics", "k": "wry neck, baby", "d": "Twisted neck in infants.", "et": "Microcurrent", "ep": "Gentle", "er": "Relaxation", "ut": "Warmth", "up": "Gentle", "ur": "Relaxation", "ex": "Stretching SCM", "ex_r": "Correction", "ef": "Daily", "ei": "Gentle", "ev": "Grade A", "src": "Tecklin", "img": "/static/uploads/torticollis.jpg"},
+    {"n": "Osgood-Schlatter Disease", "c": "Pediatrics", "k": "knee, growth", "d": "Tibial tuberosity pain.", "et": "Ice", "ep": "Post-activity", "er": "Pain", "ut": "None", "up": "Contraindicated", "ur": "Growth plate", "ex": "Hamstring stretch", "ex_r": "Flexibility", "ef": "Daily", "ei": "Pain-free", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/osgood.jpg"},
+    {"n": "Chronic Obstructive Pulmonary Disease", "c": "Cardiopulmonary", "k": "copd, lung", "d": "Chronic lung obstruction.", "et": "NMES", "ep": "Quads", "er": "Strength (if dyspneic)", "ut": "None", "up": "None", "ur": "None", "ex": "Pursed lip breathing", "ex_r": "Efficiency", "ef": "Daily", "ei": "Borg 3-4", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/lungs.jpg"},
+    {"n": "Myocardial Infarction (Post-Op)", "c": "Cardiopulmonary", "k": "heart attack, cardiac", "d": "Rehab after heart attack.", "et": "None", "ep": "Monitor ECG", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Phase 1: Mobilization", "ex_r": "Function", "ef": "Daily", "ei": "Low (HR+20)", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/heart.jpg"},
+    {"n": "Cystic Fibrosis", "c": "Cardiopulmonary", "k": "cf, mucus", "d": "Genetic lung disease.", "et": "None", "ep": "None", "er": "None", "ut": "Flutter/PEP", "up": "Device", "ur": "Clearance", "ex": "Aerobic", "ex_r": "Airway clearance", "ef": "Daily", "ei": "High", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/cf.jpg"},
+    {"n": "Lymphedema", "c": "Cardiopulmonary", "k": "swelling, lymph", "d": "Fluid accumulation.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Decongestive exercises", "ex_r": "Pump", "ef": "Daily", "ei": "Slow", "ev": "Grade A", "src": "Hillegass", "img": "/static/uploads/lymph.jpg"},
+    {"n": "Burn Injury", "c": "Integumentary", "k": "skin, burn", "d": "Thermal injury.", "et": "TENS", "ep": "During debridement", "er": "Pain", "ut": "US (Non-thermal)", "up": "Pulsed", "ur": "Healing", "ex": "ROM (Anti-contracture)", "ex_r": "Mobility", "ef": "Daily", "ei": "Painful", "ev": "Grade A", "src": "Cameron", "img": "/static/uploads/burn.jpg"},
+    {"n": "Pressure Ulcer", "c": "Integumentary", "k": "bed sore", "d": "Skin breakdown.", "et": "HVPC", "ep": "Negative polarity", "er": "Healing", "ut": "US", "up": "Periwound", "ur": "Circulation", "ex": "Positioning", "ex_r": "Offloading", "ef": "2 hrs", "ei": "N/A", "ev": "Grade A", "src": "Cameron", "img": "/static/uploads/ulcer.jpg"},
+    {"n": "Shin Splints", "c": "Sports", "k": "mtss, leg", "d": "Medial tibial stress syndrome.", "et": "Ice", "ep": "Massage", "er": "Pain", "ut": "US", "up": "Low intensity", "ur": "Healing", "ex": "Toe taps, Calf stretch", "ex_r": "Loading", "ef": "Daily", "ei": "Low", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/shin.jpg"},
+    {"n": "Groin Strain", "c": "Sports", "k": "adductor, hip", "d": "Strain of adductor muscles.", "et": "TENS", "ep": "Pain mode", "er": "Pain", "ut": "None", "up": "None", "ur": "None", "ex": "Adductor squeeze", "ex_r": "Strength", "ef": "3x/week", "ei": "Isom->Iso", "ev": "Grade B", "src": "Brotzman", "img": "/static/uploads/groin.jpg"},
+    {"n": "Hamstring Strain", "c": "Sports", "k": "thigh, pull", "d": "Tear in hamstring.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Nordic Hamstring", "ex_r": "Eccentric", "ef": "2x/week", "ei": "High", "ev": "Grade A", "src": "Brotzman", "img": "/static/uploads/hamstring.jpg"},
+    {"n": "Bankart Repair", "c": "Orthopedics", "k": "shoulder instability", "d": "Post-op for instability.", "et": "NMES", "ep": "Post-delt", "er": "Strength", "ut": "None", "up": "None", "ur": "None", "ex": "Closed chain", "ex_r": "Stability", "ef": "Daily", "ei": "Graded", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/bankart.jpg"},
+    {"n": "Total Knee Arthroplasty", "c": "Orthopedics", "k": "tka, joint replacement", "d": "Knee replacement rehab.", "et": "NMES", "ep": "Quads", "er": "Activation", "ut": "None", "up": "None", "ur": "None", "ex": "Heel slides, Bikes", "ex_r": "ROM", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/tka.jpg"},
+    {"n": "Total Hip Arthroplasty", "c": "Orthopedics", "k": "tha, hip", "d": "Hip replacement rehab.", "et": "None", "ep": "None", "er": "None", "ut": "None", "up": "None", "ur": "None", "ex": "Abduction (Standing)", "ex_r": "Strength", "ef": "Daily", "ei": "Moderate", "ev": "Grade A", "src": "Kisner", "img": "/static/uploads/tha.jpg"},
+    {"n": "Bicipital Tendinitis", "c": "Orthopedics", "k": "biceps, shoulder", "d": "Long head of biceps pain.", "et": "US", "ep": "Pulsed", "er": "Inflammation", "ut": "None", "up": "None", "ur": "None", "ex": "Speed's test exercise", "ex_r": "Strength", "ef": "3x/week", "ei": "Low", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/biceps.jpg"},
+    {"n": "Spondylolisthesis", "c": "Orthopedics", "k": "spine, slip", "d": "Vertebral slippage.", "et": "None", "ep": "Avoid ext", "er": "None", "ut": "Heat", "up": "Lumbar", "ur": "Relaxation", "ex": "Flexion bias (Williams)", "ex_r": "Stability", "ef": "Daily", "ei": "Core", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/spondylo.jpg"},
+    {"n": "Stenosis (Lumbar)", "c": "Orthopedics", "k": "narrowing, spine", "d": "Narrowing of spinal canal.", "et": "TENS", "ep": "L4-S1", "er": "Pain", "ut": "None", "up": "None", "ur": "None", "ex": "Flexion exercises", "ex_r": "Open canal", "ef": "Daily", "ei": "Gentle", "ev": "Grade A", "src": "Magee", "img": "/static/uploads/stenosis.jpg"},
+    {"n": "Whiplash Injury", "c": "Orthopedics", "k": "wads, neck", "d": "Neck injury from acceleration.", "et": "TENS", "ep": "High rate", "er": "Acute pain", "ut": "None", "up": "None", "ur": "None", "ex": "Eye-head coordination", "ex_r": "Control", "ef": "Daily", "ei": "Pain-free", "ev": "Grade B", "src": "Magee", "img": "/static/uploads/whiplash.jpg"}
+]
+
+# الحروف المختصرة => أسماء الأعمدة
+BUILTIN_KEYS = {
+    "n": "disease_name", "c": "category", "k": "keywords", "d": "description",
+    "et": "estim_type", "ep": "estim_params", "er": "estim_role",
+    "ut": "us_type", "up": "us_params", "ur": "us_role",
+    "ex": "exercises_list", "ex_r": "exercises_role",
+    "ef": "ex_frequency", "ei": "ex_intensity", "ev": "evidence_level",
+    "src": "source_ref", "img": "electrode_image",
+}
+
+PROTOCOL_DEFAULTS = {"category": "General"}
+
+
+def builtin_rows():
+    rows = []
+    for p in BUILTIN_PROTOCOLS:
+        row = {"category": "General", "ex_frequency": "3x/week", "ex_intensity": "Moderate", "evidence_level": "Grade A"}
+        row.update({BUILTIN_KEYS[k]: v for k, v in p.items()})
+        rows.append(row)
+    return rows
+
+
+def json_rows(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [protocol_row_from_json(item) for item in json.load(f) if item.get('condition_name')]
+
+# ==============================================================================
+# 2. بيانات وهمية بأي حجم (للـ Benchmarks)
+# ==============================================================================
+SYNTHETIC_CATEGORIES = ["Orthopedics", "Neurology", "Pediatrics", "Cardiopulmonary", "Sports", "Integumentary", "Geriatrics"]
+SYNTHETIC_REGIONS = ["Shoulder", "Knee", "Hip", "Ankle", "Wrist", "Elbow", "Lumbar", "Cervical", "Thoracic", "Foot"]
+SYNTHETIC_PATTERNS = ["Tendinopathy", "Sprain", "Strain", "Instability", "Impingement", "Arthropathy", "Neuropathy", "Contracture"]
+SYNTHETIC_MODALITIES = [("TENS", "Hz", "µs"), ("IFC", "Hz", "µs"), ("NMES", "Hz", "µs"), ("FES", "Hz", "µs")]
+
+
+def synthetic_rows(count, seed=2026):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(1, count + 1):
+        region = rng.choice(SYNTHETIC_REGIONS)
+        pattern = rng.choice(SYNTHETIC_PATTERNS)
+        modality, f_unit, w_unit = rng.choice(SYNTHETIC_MODALITIES)
+        f_low = rng.randrange(2, 120)
+        exercises = "".join(
+            f"<h4>Phase {ph}</h4><ul>" + "".join(
+                f"<li><b>{region} drill {ph}.{n}</b>: Controlled {pattern.lower()} loading. <i>(3 x {rng.randrange(8, 16)})</i></li>"
+                for n in range(1, 5)) + "</ul><hr>"
+            for ph in range(1, 4))
+        rows.append({
+            "disease_name": f"Synthetic {region} {pattern} {i:06d}",
+            "category": rng.choice(SYNTHETIC_CATEGORIES),
+            "keywords": f"{region.lower()}, {pattern.lower()}, syn{i:06d}",
+            "description": f"Synthetic {pattern.lower()} of the {region.lower()} used for load testing. " * rng.randrange(2, 6),
+            "estim_type": modality,
+            "estim_params": f"Freq: {f_low}-{f_low + rng.randrange(5, 60)} {f_unit}. Width: {rng.randrange(50, 300)} {w_unit}. Time: {rng.randrange(10, 40)} mins.",
+            "estim_role": "Pain modulation",
+            "us_type": "Ultrasound",
+            "us_params": f"{rng.choice(['1', '3'])} MHz, {rng.choice(['0.5', '0.8', '1.0', '1.5'])} W/cm², {rng.choice(['20%', '50%', '100%'])}",
+            "us_role": "Tissue healing",
+            "exercises_list": exercises,
+            "exercises_role": "Rehabilitation Progression",
+            "ex_frequency": "3x/week",
+            "ex_intensity": "Moderate",
+            "evidence_level": rng.choice(["Grade A", "Grade B", "Grade C"]),
+            "source_ref": "Synthetic dataset",
+            "notes": f"Diagnosis: synthetic case {i}\n\nPrecautions: none",
+        })
+    return rows
+
+# مرادفات البداية (الأدمن بيكمل عليها من /admin/synonyms) - بتتضاف بس لو الجدول فاضي
+DEFAULT_SYNONYMS = [
+    ("الكتف المتجمد", "Adhesive Capsulitis"),
+    ("خشونة الركبة", "Knee Osteoarthritis"),
+    ("خشونة الفخذ", "Hip Osteoarthritis"),
+    ("ألم أسفل الظهر", "lbp"),
+    ("الانزلاق الغضروفي", "Lumbar Disc Herniation"),
+    ("عرق النسا", "Sciatica"),
+    ("كوع التنس", "Lateral Epicondylitis"),
+    ("كوع لاعب الجولف", "Medial Epicondylitis"),
+    ("الجلطة الدماغية", "Stroke (Hemiplegia)"),
+    ("شلل الوجه", "Bell's Palsy"),
+    ("الشلل الدماغي", "Cerebral Palsy (Spastic)"),
+    ("التواء الكاحل", "Ankle Sprain"),
+    ("الشوكة العظمية", "Plantar Fasciitis"),
+    ("خشونة الرقبة", "Neck Pain (Cervical Spondylosis)"),
+    ("الرباط الصليبي", "ACL Reconstruction"),
+    ("تغيير مفصل الركبة", "Total Knee Arthroplasty"),
+    ("هشاشة العظام", "Osteoporosis"),
+    ("الجنف", "Scoliosis"),
+    ("tka", "Total Knee Arthroplasty"),
+    ("tkr", "Total Knee Arthroplasty"),
+    ("tha", "Total Hip Arthroplasty"),
+    ("acl", "ACL Reconstruction"),
+    ("gbs", "Guillain-Barre Syndrome"),
+    ("ms", "Multiple Sclerosis"),
+    ("copd", "Chronic Obstructive Pulmonary Disease"),
+    ("tmj", "Temporomandibular Joint Dysfunction"),
+    ("sci", "Spinal Cord Injury (Paraplegia)"),
+    ("tbi", "Traumatic Brain Injury"),
+]
+
+# ==============================================================================
+# 3. الدمج + التحميل المجمع (executemany في Transaction واحدة)
+# ==============================================================================
+def merge_rows(*sources):
+    # نفس المرض في أكثر من مصدر: المصدر الأحدث يكسب، والكلمات الدلالية تتجمع
+    merged = {}
+    for rows in sources:
+        for row in rows:
+            name = (row.get('disease_name') or '').strip()
+            if not name: continue
+            current = merged.setdefault(name, {})
+            keywords = [k.strip() for k in f"{current.get('keywords') or ''},{row.get('keywords') or ''}".split(',') if k.strip()]
+            current.update(row, disease_name=name)
+            current['keywords'] = ", ".join(dict.fromkeys(keywords))
+    return list(merged.values())
+
+
+@contextmanager
+def bulk_load_connection():
+    # على SQLite: WAL + synchronous=OFF أثناء التحميل فقط، وبعدها نرجع القيمة القديمة
+    with db.engine.connect() as conn:
+        is_sqlite = conn.dialect.name == 'sqlite'
+        if is_sqlite:
+            old_sync = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            conn.commit()
+        try:
+            yield conn
+        finally:
+            if is_sqlite:
+                conn.rollback()
+                conn.exec_driver_sql(f"PRAGMA synchronous={int(old_sync)}")
+                conn.commit()
+
+
+def _fill(row, keys):
+    return {k: row.get(k, PROTOCOL_DEFAULTS.get(k)) for k in keys}
+
+
+def bulk_upsert_protocols(conn, rows):
+    table = Protocol.__table__
+    existing = {r.disease_name: r._mapping for r in conn.execute(select(table))}
+
+    new_rows, changed = [], []
+    for row in rows:
+        old = existing.get(row['disease_name'])
+        if old is None:
+            new_rows.append(row)
+        elif any(old[k] != v for k, v in row.items()):
+            changed.append((old['id'], row))
+
+    if new_rows:
+        keys = sorted(set().union(*new_rows))
+        conn.execute(insert(table), [_fill(r, keys) for r in new_rows])
+
+    # التحديث: executemany واحد لكل مجموعة صفوف ليها نفس الأعمدة
+    by_shape = {}
+    for pid, row in changed:
+        by_shape.setdefault(tuple(sorted(row)), []).append(dict({f"b_{k}": v for k, v in row.items()}, b_id=pid))
+    for keys, params in by_shape.items():
+        values = {k: bindparam(f"b_{k}") for k in keys}
+        values['revision'] = table.c.revision + 1
+        stmt = update(table).where(table.c.id == bindparam('b_id')).values(values)
+        conn.execute(stmt, params)
+
+    # سجل التغييرات (المكتبة الأوفلاين): الـ ORM events مبتشتغلش هنا
+    if new_rows or changed:
+        names = {r['disease_name'] for r in new_rows}
+        new_ids = [r.id for r in conn.execute(select(table.c.id, table.c.disease_name)) if r.disease_name in names]
+        record_protocol_changes(conn, new_ids + [pid for pid, _ in changed])
+        refresh_search_keys(conn, new_ids + [pid for pid, _ in changed])
+        refresh_protocol_params(conn, new_ids + [pid for pid, _ in changed])
+        refresh_category_counts(conn)
+
+    return {'inserted': len(new_rows), 'updated': len(changed), 'unchanged': len(rows) - len(new_rows) - len(changed)}
+
+
+def ensure_synonyms(conn):
+    table = SearchSynonym.__table__
+    if conn.execute(select(table.c.id).limit(1)).first() is None:
+        conn.execute(insert(table), [{'term': t, 'expansion': e} for t, e in DEFAULT_SYNONYMS])
+
+
+def ensure_admin(conn, email, password):
+    table = User.__table__
+    admin_id = conn.execute(select(table.c.id).where(table.c.email == email)).scalar()
+    if admin_id is None:
+        conn.execute(insert(table).values(
+            email=email, password=generate_password_hash(password, method='pbkdf2:sha256'), is_admin=True))
+    else:
+        conn.execute(update(table).where(table.c.id == admin_id).values(is_admin=True))
+
+
+# ==============================================================================
+# 4. ملف المكتبة الجاهز (library_artifact.py): بيتبني مرة وقت الـ build، وبيتحمل بـ SQL على الملف نفسه
+# ==============================================================================
+def library_rows(builtin=True, json_files=True, synthetic=0):
+    # => (الصفوف المدموجة، ملفات المصدر اللي اتقرت)
+    sources, files = [], []
+    if builtin: sources.append(builtin_rows())
+    if json_files:
+        for name in JSON_SOURCES:
+            path = os.path.join(app.root_path, name)
+            if os.path.exists(path):
+                sources.append(json_rows(path))
+                files.append(path)
+            else: print(f"⚠️ {name} not found, skipped")
+    if synthetic: sources.append(synthetic_rows(synthetic))
+    return merge_rows(*sources), files
+
+
+def artifact_columns():
+    # أعمدة المحتوى بس (الـ id والـ revision والتواريخ بتاعة قاعدة البيانات نفسها)
+    skip = {'id', 'disease_name', 'revision', 'updated_at', 'source_hash'}
+    return [c.name for c in Protocol.__table__.columns if c.name not in skip]
+
+
+def build_artifact(path, builtin=True, json_files=True, synthetic=0):
+    rows, files = library_rows(builtin, json_files, synthetic)
+    columns = artifact_columns()
+    # العمود اللي المصدر مبيحددوش بيتخزن NULL (التحميل بيسيب القيمة الموجودة زي bulk_upsert_protocols)
+    rows = [dict({c: None for c in columns}, **r) for r in rows]
+    stats = library_artifact.build(path, rows, columns, keys_for, sources=files)
+    print(f"📦 Built {path}: {stats}")
+    return stats
+
+
+def _stage_artifact(conn, path, columns):
+    # Postgres مفيهوش ATTACH: الملف بيتنسخ مرة في temp tables والباقي نفس الـ SQL
+    cols = ['disease_name', 'content_hash'] + columns
+    conn.execute(text(f"CREATE TEMP TABLE artifact_protocol ({', '.join(c + ' TEXT' for c in cols)}) ON COMMIT DROP"))
+    conn.execute(text("CREATE TEMP TABLE artifact_search_key (disease_name TEXT, key TEXT) ON COMMIT DROP"))
+    conn.execute(text(f"INSERT INTO artifact_protocol ({', '.join(cols)}) VALUES ({', '.join(':' + c for c in cols)})"),
+                 [dict(zip(cols, r)) for r in library_artifact.read_rows(path, 'protocol', cols)])
+    keys = library_artifact.read_rows(path, 'search_key', ['disease_name', 'key'])
+    if keys: conn.execute(text("INSERT INTO artifact_search_key (disease_name, key) VALUES (:disease_name, :key)"),
+                          [{'disease_name': n, 'key': k} for n, k in keys])
+    return 'artifact_'
+
+
+def _copy_artifact(conn, src, columns):
+    # src: 'library.' (الملف متعمله ATTACH) أو 'artifact_' (temp tables)
+    table = Protocol.__table__
+    differs = 'IS NOT' if conn.dialect.name == 'sqlite' else 'IS DISTINCT FROM'
+    now = bindparam('now', datetime.utcnow(), type_=table.c.updated_at.type)
+    before = conn.execute(select(func.max(table.c.id))).scalar() or 0
+
+    # 1. الأمراض الجديدة (أو المكتبة كلها على قاعدة فاضية): statement واحدة
+    conn.execute(text(
+        f"INSERT INTO protocol (disease_name, {', '.join(columns)}, source_hash, revision, updated_at) "
+        f"SELECT a.disease_name, {', '.join('a.' + c for c in columns)}, a.content_hash, 0, :now FROM {src}protocol a "
+        f"WHERE a.disease_name NOT IN (SELECT disease_name FROM protocol)").bindparams(now))
+    new_ids = [pid for (pid,) in conn.execute(select(table.c.id).where(table.c.id > before))]
+    if new_ids:
+        conn.execute(text(f"INSERT INTO search_key (key, protocol_id) SELECT k.key, p.id FROM {src}search_key k "
+                          f"JOIN protocol p ON p.disease_name = k.disease_name WHERE p.id > :before"), {'before': before})
+
+    # 2. المصدر اتغير (hash مختلف) والمحتوى فعلاً مختلف => تحديث + revision جديد
+    stale = f"a.disease_name = protocol.disease_name AND protocol.source_hash {differs} a.content_hash"
+    different = ' OR '.join(f"(a.{c} IS NOT NULL AND a.{c} {differs} protocol.{c})" for c in columns)
+    changed_ids = [pid for (pid,) in conn.execute(text(
+        f"UPDATE protocol SET {', '.join(f'{c} = coalesce(a.{c}, protocol.{c})' for c in columns)}, "
+        f"source_hash = a.content_hash, revision = protocol.revision + 1, updated_at = :now "
+        f"FROM {src}protocol a WHERE {stale} AND ({different}) RETURNING protocol.id").bindparams(now))]
+    # 3. نفس المحتوى (اتحمل قبل كده من JSON مثلاً): بنسجل الـ hash بس
+    conn.execute(text(f"UPDATE protocol SET source_hash = a.content_hash FROM {src}protocol a WHERE {stale}"))
+
+    if new_ids or changed_ids:
+        record_protocol_changes(conn, new_ids + changed_ids)
+        refresh_search_keys(conn, changed_ids)
+        # قيم الأجهزة مش في الـ artifact: بتتقرا من النصوص اللي لسه اتحملت (الجديد والمتغير بس)
+        refresh_protocol_params(conn, new_ids + changed_ids)
+        refresh_category_counts(conn)
+    return {'inserted': len(new_ids), 'updated': len(changed_ids)}
+
+
+def load_artifact(conn, path):
+    # على connection مفيهاش transaction مفتوحة (ATTACH مينفعش جوه transaction)
+    meta = library_artifact.read_meta(path)
+    columns = meta['columns']
+    unknown = [c for c in columns if c not in Protocol.__table__.c]
+    if unknown: raise ValueError(f"Library artifact has unknown columns {unknown}: rebuild it (--build-artifact)")
+
+    is_sqlite = conn.dialect.name == 'sqlite'
+    if 'source_hash' not in {c['name'] for c in inspect(conn).get_columns('protocol')}:
+        conn.execute(text("ALTER TABLE protocol ADD COLUMN source_hash VARCHAR(64)"))
+    if is_sqlite:
+        conn.exec_driver_sql("ATTACH DATABASE ? AS library", (library_artifact.uri(path),))
+    conn.commit()
+    try:
+        with conn.begin():
+            src = 'library.' if is_sqlite else _stage_artifact(conn, path, columns)
+            stats = _copy_artifact(conn, src, columns)
+    finally:
+        if is_sqlite:
+            conn.exec_driver_sql("DETACH DATABASE library")
+            conn.commit()
+    stats['unchanged'] = meta['rows'] - stats['inserted'] - stats['updated']
+    stats['library_hash'] = meta['library_hash'][:12]
+    return stats
+
+
+def seed(builtin=True, json_files=True, synthetic=0, reset=False, admin_email=None, admin_password=None,
+         related=True, related_full=False, artifact=None):
+    if not artifact:
+        rows, _ = library_rows(builtin, json_files, synthetic)
+
+    with app.app_context():
+        if reset:
+            db.drop_all()
+            related_job.reset()
+        db.create_all()
+
+        started = time.perf_counter()
+        with bulk_load_connection() as conn:
+            if artifact: stats = load_artifact(conn, artifact)
+            with conn.begin():
+                if not artifact: stats = bulk_upsert_protocols(conn, rows)
+                ensure_synonyms(conn)
+                if admin_email and admin_password:
+                    ensure_admin(conn, admin_email, admin_password)
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+    record_import('artifact' if artifact else 'seed', stats['inserted'] + stats['updated'], time.perf_counter() - started)
+    metrics.flush() # الـ CLI بيخلص قبل أول flush دوري
+
+    print(f"✅ Seeded {stats['inserted'] + stats['updated'] + stats['unchanged']} protocols"
+          f"{' from ' + artifact if artifact else ''}: {stats}")
+
+    # البروتوكولات المشابهة: اللي اتغير بس (أو كله أول مرة / مع --related-full)
+    if related:
+        started = time.perf_counter()
+        with app.app_context():
+            updated = related_job.run(full=related_full)
+        print(f"🔗 Related protocols refreshed for {updated} protocols in {time.perf_counter() - started:.2f}s")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the protocol library into the app database.")
+    parser.add_argument('--reset', action='store_true', help="drop and recreate all tables first")
+    parser.add_argument('--no-builtin', action='store_true', help="skip the built-in protocol list")
+    parser.add_argument('--no-json', action='store_true', help="skip the generated JSON files")
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N', help="add N synthetic protocols")
+    parser.add_argument('--no-related', action='store_true', help="skip the related-protocols refresh")
+    parser.add_argument('--related-full', action='store_true', help="recompute related protocols from scratch")
+    parser.add_argument('--build-artifact', metavar='PATH', help="compile the selected sources into a SQLite library artifact and exit")
+    parser.add_argument('--artifact', metavar='PATH', help="load the library from a prebuilt artifact instead of the sources")
+    parser.add_argument('--admin-email', default=os.environ.get('ADMIN_EMAIL'))
+    parser.add_argument('--admin-password', default=os.environ.get('ADMIN_PASSWORD'))
+    args = parser.parse_args()
+
+    if args.build_artifact:
+        build_artifact(args.build_artifact, builtin=not args.no_builtin, json_files=not args.no_json, synthetic=args.synthetic)
+        return
+    seed(builtin=not args.no_builtin, json_files=not args.no_json, synthetic=args.synthetic,
+         reset=args.reset, admin_email=args.admin_email, admin_password=args.admin_password,
+         related=not args.no_related, related_full=args.related_full, artifact=args.artifact)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+// المكتبة الأوفلاين: نسخة كاملة من البروتوكولات في IndexedDB
+// أول مرة: GET /api/library/bundle، وبعد كده: GET /api/library/changes?since=<version> (الفرق بس)
+// + المرادفات: GET /api/library/synonyms (نفس جدول السيرفر بعد normalize)
+// البحث محلي الأول من غير أي request، بنفس قواعد find_protocol في السيرفر:
+//   normalize/keys_for نسخة من search_keys.py (tests/test_offline_library.py بيقارن الاتنين)
+//   ملقاش => الفورم بيتبعت للسيرفر عادي (ILIKE + الـ AI) لو فيه نت
+// الخروج: clear() بيمسح الـ IndexedDB والـ caches (الجهاز ممكن يكون مشترك)
+const PhysioLibrary = (() => {
+    const DB_NAME = 'physio-library';
+    const DB_VERSION = 2;   // 2: المفاتيح الموحدة متخزنة مع كل بروتوكول
+    const MAX_KEY_LENGTH = 200;
+    let dbPromise = null;
+
+    // ---- search_keys.normalize / keys_for ----
+    const DIACRITICS = /[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]/g;
+    const LETTERS = {
+        'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+        'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+        "'": '', '’': '',
+    };
+    for (let d = 0; d < 10; d++) {
+        LETTERS[String.fromCharCode(0x0660 + d)] = String(d);
+        LETTERS[String.fromCharCode(0x06f0 + d)] = String(d);
+    }
+    const LETTER_RE = new RegExp(`[${Object.keys(LETTERS).join('')}]`, 'g');
+    const SEPARATORS = /[^\p{L}\p{N}]+/gu;   // زي [\W_]+ في Python
+    const PARENTHESES = /\([^)]*\)/g;
+
+    function normalize(text) {
+        // casefold: toLowerCase + الحالتين اللي بيختلفوا فيها عملياً (ß, ς)
+        const folded = (text || '').normalize('NFKC').toLowerCase().replace(/ß/g, 'ss').replace(/ς/g, 'σ');
+        return folded.replace(DIACRITICS, '').replace(LETTER_RE, (c) => LETTERS[c])
+            .replace(SEPARATORS, ' ').trim();
+    }
+
+    function keysFor(name, keywords) {
+        const keys = new Set();
+        [name, (name || '').replace(PARENTHESES, ' ')].concat((keywords || '').split(',')).forEach((value) => {
+            const key = normalize(value);
+            if (key && [...key].length <= MAX_KEY_LENGTH) keys.add(key);
+        });
+        return [...keys];
+    }
+
+    // ---- IndexedDB ----
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const req = indexedDB.open(DB_NAME, DB_VERSION);
+                req.onupgradeneeded = () => {
+                    // نسخة قديمة => نبدأ من الأول (الـ sync الجاي بيحمل الـ bundle)
+                    const db = req.result;
+                    [...db.objectStoreNames].forEach((name) => db.deleteObjectStore(name));
+                    db.createObjectStore('protocols', { keyPath: 'id' }).createIndex('keys', '_keys', { multiEntry: true });
+                    db.createObjectStore('meta');
+                };
+                req.onsuccess = () => {
+                    req.result.onversionchange = () => req.result.close();
+                    resolve(req.result);
+                };
+                req.onerror = () => reject(req.error);
+            });
+        }
+        return dbPromise;
+    }
+
+    function tx(stores, mode, work) {
+        return openDb().then((db) => new Promise((resolve, reject) => {
+            const t = db.transaction(stores, mode);
+            const result = work(t);
+            t.oncomplete = () => resolve(result && 'result' in result ? result.result : result);
+            t.onerror = () => reject(t.error);
+        }));
+    }
+
+    function toObject(fields, row) {
+        const p = Object.fromEntries(fields.map((f, i) => [f, row[i]]));
+        p._keys = keysFor(p.disease_name, p.keywords);
+        p._name = normalize(p.disease_name);
+        p._keywords = normalize(p.keywords);
+        return p;
+    }
+
+    function getMeta(key) {
+        return tx(['meta'], 'readonly', (t) => t.objectStore('meta').get(key));
+    }
+
+    function applyBundle(data) {
+        return tx(['protocols', 'meta'], 'readwrite', (t) => {
+            const store = t.objectStore('protocols');
+            store.clear();
+            data.protocols.forEach((row) => store.put(toObject(data.fields, row)));
+            t.objectStore('meta').put(data.version, 'version');
+        });
+    }
+
+    function applyChanges(data) {
+        return tx(['protocols', 'meta'], 'readwrite', (t) => {
+            const store = t.objectStore('protocols');
+            data.upserted.forEach((row) => store.put(toObject(data.fields, row)));
+            data.deleted.forEach((id) => store.delete(id));
+            t.objectStore('meta').put(data.version, 'version');
+        });
+    }
+
+    async function fetchBundle() {
+        const res = await fetch('/api/library/bundle', { credentials: 'same-origin' });
+        if (!res.ok) throw new Error(`bundle: ${res.status}`);
+        await applyBundle(await res.json());
+    }
+
+    async function syncProtocols() {
+        const version = await getMeta('version');
+        if (version === undefined) return fetchBundle();
+        const res = await fetch(`/api/library/changes?since=${version}`, { credentials: 'same-origin' });
+        if (res.status === 410) return fetchBundle();
+        if (!res.ok) throw new Error(`changes: ${res.status}`);
+        const data = await res.json();
+        if (data.version !== version) await applyChanges(data);
+    }
+
+    async function syncSynonyms() {
+        const res = await fetch('/api/library/synonyms', { credentials: 'same-origin' });
+        if (!res.ok) throw new Error(`synonyms: ${res.status}`);
+        const data = await res.json();
+        await tx(['meta'], 'readwrite', (t) => t.objectStore('meta').put(data.synonyms, 'synonyms'));
+    }
+
+    async function sync() {
+        await syncProtocols();
+        await syncSynonyms();
+    }
+
+    // ---- البحث ----
+    const first = (rows) => rows.reduce((best, p) => (!best || p.id < best.id ? p : best), null);
+
+    async function search(query) {
+        // 1. المفتاح الموحد (بعد المرادفات) مطابق  2. جزء من الاسم/الكلمات - الأصغر id في الحالتين
+        const term = normalize(query);
+        if (!term) return null;
+        const synonyms = (await getMeta('synonyms')) || {};
+        const key = synonyms[term] || term;
+        const exact = await tx(['protocols'], 'readonly', (t) => t.objectStore('protocols').index('keys').getAll(key));
+        if (exact.length) return first(exact);
+        const all = await tx(['protocols'], 'readonly', (t) => t.objectStore('protocols').getAll());
+        return first(all.filter((p) => p._name.includes(term) || p._keywords.includes(term)));
+    }
+
+    function recordHit(query, protocolId) {
+        // سجل البحث (search analytics) في الخلفية - النتيجة ظهرت خلاص
+        fetch('/api/library/searches', {
+            method: 'POST', credentials: 'same-origin', keepalive: true,
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ query, protocol_id: protocolId }),
+        }).catch(() => null);
+    }
+
+    function render(p, box) {
+        box.classList.remove('d-none');
+        box.replaceChildren();
+        const card = document.createElement('div');
+        card.className = 'bg-white rounded shadow-sm border p-4 mb-5';
+        if (!p) {
+            card.innerHTML = '<h3 class="fw-bold text-center">No results found (offline).</h3>';
+        } else {
+            const add = (tag, cls, text) => {
+                const el = document.createElement(tag); el.className = cls; el.textContent = text || '';
+                card.appendChild(el); return el;
+            };
+            add('span', 'badge bg-secondary mb-2', 'Saved on this device');
+            add('h2', 'fw-bold', p.disease_name);
+            add('p', 'text-muted', p.description);
+            add('h5', 'fw-bold text-primary mt-4', 'Electrotherapy');
+            add('p', '', `${p.estim_type || '-'}: ${p.estim_params || '-'}`);
+            add('h5', 'fw-bold text-primary mt-4', 'Ultrasound');
+            add('p', '', `${p.us_type || '-'}: ${p.us_params || '-'}`);
+            add('h5', 'fw-bold text-primary mt-4', 'Therapeutic Exercises');
+            add('div', 'protocol-content', '').innerHTML = p.exercises_list || '';
+            if (p.notes) {
+                add('h5', 'fw-bold text-primary mt-4', 'Specialist Notes');
+                add('div', 'notes-content', p.notes);
+            }
+        }
+        box.appendChild(card);
+    }
+
+    function attach(form, box, replaced) {
+        // replaced: نتيجة السيرفر اللي في الصفحة (بتستخبى لما النتيجة المحلية تظهر)
+        async function run(query) {
+            let p = null;
+            try { p = await search(query); } catch (err) { p = null; }
+            if (!p && navigator.onLine) return false;
+            if (replaced) replaced.classList.add('d-none');
+            render(p, box);
+            history.pushState(null, '', `/?disease=${encodeURIComponent(query)}`);
+            if (p) recordHit(query, p.id);
+            return true;
+        }
+        form.addEventListener('submit', async (e) => {
+            e.preventDefault();
+            if (!(await run(form.elements.disease.value))) form.submit();
+        });
+        return run;
+    }
+
+    async function clear() {
+        if (dbPromise) {
+            const db = await dbPromise.catch(() => null);
+            if (db) db.close();
+            dbPromise = null;
+        }
+        await new Promise((resolve) => {
+            const req = indexedDB.deleteDatabase(DB_NAME);
+            req.onsuccess = req.onerror = req.onblocked = () => resolve();
+        });
+        if (window.caches) await Promise.all((await caches.keys()).map((k) => caches.delete(k)));
+    }
+
+    return { sync, search, normalize, keysFor, render, attach, clear };
+})();
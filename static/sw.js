@@ -0,0 +1,46 @@
+// Service Worker: صفحة البحث الأوفلاين والملفات الثابتة بتشتغل من غير نت
+// البيانات نفسها في IndexedDB (static/library.js) - مش هنا
+// "/" نفسها مبتتخزنش (فيها إيميل المستخدم): من غير نت بترجع static/offline.html (مفيهاش أي بيانات شخصية)
+const SHELL_CACHE = 'physio-shell-v2';
+const OFFLINE_PAGE = '/static/offline.html';
+const SHELL = [
+    OFFLINE_PAGE,
+    '/static/library.js',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+];
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(caches.open(SHELL_CACHE).then((cache) => cache.addAll(SHELL)).catch(() => null));
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+    // v1 كان فيه "/" => بيتمسح هنا
+    event.waitUntil(caches.keys().then((keys) =>
+        Promise.all(keys.filter((k) => k !== SHELL_CACHE).map((k) => caches.delete(k)))));
+    self.clients.claim();
+});
+
+self.addEventListener('fetch', (event) => {
+    const req = event.request;
+    if (req.method !== 'GET') return;
+    const url = new URL(req.url);
+
+    // صفحة البحث: من النت دايماً، ولو مفيش نرجع صفحة البحث الأوفلاين
+    if (req.mode === 'navigate' && url.pathname === '/') {
+        event.respondWith(fetch(req).catch(() => caches.match(OFFLINE_PAGE)));
+        return;
+    }
+    // الملفات الثابتة: من الـ cache وتتحدث في الخلفية
+    if (url.pathname.startsWith('/static/') || SHELL.includes(req.url)) {
+        event.respondWith(caches.open(SHELL_CACHE).then((cache) =>
+            cache.match(req).then((hit) => {
+                const update = fetch(req).then((res) => {
+                    if (res.ok) cache.put(req, res.clone());
+                    return res;
+                });
+                return hit || update;
+            })));
+    }
+});
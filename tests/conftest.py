@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ==============================================================================
+# كل التستات على قاعدة مؤقتة متجهزة بـ setup_db.py (نفس البيانات الحقيقية) قبل import app
+# - كل المسارات اللي التطبيق بيكتب فيها (metrics, ai_limits, pdf, library, backups...) في نفس الفولدر
+# - النسخ الاحتياطي المجدول مقفول => التست مبيستناش thread
+# ==============================================================================
+
+TMP = tempfile.mkdtemp(prefix='physio-tests-')
+ADMIN_EMAIL, ADMIN_PASSWORD = 'admin@example.com', 'secret-admin'
+
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(TMP, 'app.db')}",
+    'AI_LIMITS_DB': os.path.join(TMP, 'ai_limits.db'),
+    'METRICS_DIR': os.path.join(TMP, 'metrics'),
+    'RELATED_DIR': os.path.join(TMP, 'related'),
+    'PDF_CACHE_DIR': os.path.join(TMP, 'pdf'),
+    'LIBRARY_DIR': os.path.join(TMP, 'library'),
+    'PROFILE_DIR': os.path.join(TMP, 'profiles'),
+    'BACKUP_DIR': os.path.join(TMP, 'backups'),
+    'BACKUP_INTERVAL_HOURS': '0',
+})
+subprocess.run([sys.executable, os.path.join(ROOT, 'setup_db.py'), '--no-related',
+                '--admin-email', ADMIN_EMAIL, '--admin-password', ADMIN_PASSWORD],
+               check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+
+from app import app as flask_app  # noqa: E402
+
+flask_app.testing = True
+
+
+@pytest.fixture
+def app():
+    return flask_app
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/login', data={'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD})
+    return client
+
+
+@pytest.fixture
+def api_headers(app):
+    token = app.test_client().post('/api/token', json={'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
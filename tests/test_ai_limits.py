@@ -0,0 +1,134 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+from ai_limits import AILimiter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOON = datetime(2026, 3, 1, 12, tzinfo=timezone.utc).timestamp()
+
+
+class Clock:
+    def __init__(self, now=NOON):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def limits_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ai_limits.db')
+    monkeypatch.setenv('AI_LIMITS_DB', path)
+    return path
+
+
+def limiter(clock, **kwargs):
+    kwargs.setdefault('daily', {'trial': 3, 'subscriber': 100, 'admin': None})
+    return AILimiter(os.environ['AI_LIMITS_DB'], clock=clock, **kwargs)
+
+
+def acquire_in_other_process(times, now, user_rate='(3, 6)'):
+    # process تانية (worker تاني) على نفس الملف => عدد المسموح
+    code = (f"import os; from ai_limits import AILimiter\n"
+            f"limiter = AILimiter(os.environ['AI_LIMITS_DB'], user_rate={user_rate}, clock=lambda: {now!r})\n"
+            f"print(sum(limiter.acquire(1, '10.0.0.1', 'subscriber').allowed for _ in range({times})))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=os.environ, check=True,
+                         capture_output=True, text=True).stdout
+    return int(out)
+
+
+def test_burst_then_retry_after(limits_db):
+    clock = Clock()
+    ai = limiter(clock)
+    assert [ai.acquire(1, '10.0.0.1', 'subscriber').allowed for _ in range(3)] == [True, True, True]
+    denied = ai.acquire(1, '10.0.0.1', 'subscriber')
+    assert (denied.allowed, denied.reason) == (False, 'user_rate')
+    assert denied.retry_after == pytest.approx(10)   # 6 في الدقيقة => token كل 10 ثواني
+    clock.now += 10
+    assert ai.acquire(1, '10.0.0.1', 'subscriber').allowed
+    assert not ai.acquire(1, '10.0.0.1', 'subscriber').allowed
+
+
+@pytest.mark.parametrize('user_rate, ip_rate, reason', [
+    ((3, 6), (2, 12), 'ip_rate'),
+    ((2, 6), (6, 12), 'user_rate'),
+])
+def test_tighter_bucket_wins(limits_db, user_rate, ip_rate, reason):
+    ai = limiter(Clock(), user_rate=user_rate, ip_rate=ip_rate)
+    for _ in range(2): assert ai.acquire(1, '10.0.0.1', 'subscriber').allowed
+    assert ai.acquire(1, '10.0.0.1', 'subscriber').reason == reason
+
+
+def test_ip_bucket_is_shared_between_users(limits_db):
+    ai = limiter(Clock(), user_rate=(5, 6), ip_rate=(3, 12))
+    assert [ai.acquire(user, '10.0.0.1', 'subscriber').allowed for user in (1, 2, 3, 4)] == [True, True, True, False]
+    assert ai.acquire(4, '10.0.0.2', 'subscriber').allowed
+
+
+def test_daily_quota_resets_at_utc_midnight(limits_db):
+    clock = Clock()
+    ai = limiter(clock, user_rate=(100, 600))
+    assert all(ai.acquire(1, '10.0.0.1', 'trial').allowed for _ in range(3))
+    denied = ai.acquire(1, '10.0.0.1', 'trial')
+    assert (denied.allowed, denied.reason) == (False, 'daily_quota')
+    assert denied.retry_after == pytest.approx(12 * 3600)
+    assert ai.usage(1) == 3
+
+    clock.now += 12 * 3600
+    assert ai.acquire(1, '10.0.0.1', 'trial').allowed
+    assert ai.usage(1) == 1
+
+
+def test_admin_has_no_daily_quota(limits_db):
+    ai = limiter(Clock(), user_rate=(100, 600), ip_rate=(100, 600))
+    assert all(ai.acquire(1, '10.0.0.1', 'admin').allowed for _ in range(50))
+
+
+def test_fast_reject_skips_the_database(limits_db, monkeypatch):
+    ai = limiter(Clock())
+    for _ in range(3): ai.acquire(1, '10.0.0.1', 'subscriber')
+    assert not ai.acquire(1, '10.0.0.1', 'subscriber').allowed
+
+    def no_database(): raise AssertionError('fast reject touched the database')
+    monkeypatch.setattr(ai, '_connect', no_database)
+    denied = ai.acquire(1, '10.0.0.1', 'subscriber')
+    assert (denied.allowed, denied.reason) == (False, 'user_rate')
+
+
+def test_daily_block_is_dropped_when_tier_changes(limits_db):
+    ai = limiter(Clock(), user_rate=(100, 600))
+    for _ in range(3): ai.acquire(1, '10.0.0.1', 'trial')
+    assert ai.acquire(1, '10.0.0.1', 'trial').reason == 'daily_quota'
+    assert ai.acquire(1, '10.0.0.1', 'subscriber').allowed   # اشترك => الحد الجديد من القاعدة
+
+
+def test_refund_returns_token_and_daily_use(limits_db):
+    ai = limiter(Clock(), user_rate=(100, 600))
+    for _ in range(3): ai.acquire(1, '10.0.0.1', 'trial')
+    assert not ai.acquire(1, '10.0.0.1', 'trial').allowed
+    ai.refund(1, '10.0.0.1', NOON)
+    assert ai.usage(1) == 2
+    assert ai.acquire(1, '10.0.0.1', 'trial').allowed
+
+
+def test_second_process_shares_the_buckets(limits_db):
+    ai = limiter(Clock())
+    assert ai.acquire(1, '10.0.0.1', 'subscriber').allowed
+    assert acquire_in_other_process(5, NOON) == 2
+    assert not ai.acquire(1, '10.0.0.1', 'subscriber').allowed
+    assert ai.usage(1) == 3
+
+
+def test_concurrent_processes_never_overspend(limits_db):
+    code = (f"import os; from ai_limits import AILimiter\n"
+            f"limiter = AILimiter(os.environ['AI_LIMITS_DB'], user_rate=(10, 6), ip_rate=(100, 6), clock=lambda: {NOON!r})\n"
+            f"print(sum(limiter.acquire(1, '10.0.0.1', 'subscriber').allowed for _ in range(10)))")
+    procs = [subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, env=os.environ, stdout=subprocess.PIPE, text=True)
+             for _ in range(4)]
+    allowed = sum(int(p.communicate()[0]) for p in procs)
+    assert allowed == 10
+    assert limiter(Clock()).usage(1) == 10
@@ -0,0 +1,99 @@
+import json
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as physio
+from ai_limits import AILimiter
+from tests.test_ai_limits import Clock
+
+URL = '/api/protocols/lookup?fields=disease_name,description'
+UNKNOWN = ['qzxv condition one', 'qzxv condition two', 'qzxv condition three']
+
+
+class FakeGemini:
+    # بديل model.generate_content: نفس شكل الرد (text + usage_metadata)، ولو hold => بيستنى release()
+    def __init__(self, text, hold=False):
+        self.text = text
+        self.calls = []
+        self.released = threading.Event()
+        if not hold: self.released.set()
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls.append(prompt)
+        self.released.wait(5)
+        return types.SimpleNamespace(text=self.text, usage_metadata=None)
+
+    def release(self):
+        self.released.set()
+
+
+@pytest.fixture
+def gemini(monkeypatch, tmp_path):
+    # pool من worker واحد وحدود صغيرة على قاعدة مؤقتة => كل حالة بتتحدد من غير ما نعتمد على التوقيت
+    executor = ThreadPoolExecutor(max_workers=1)
+    limiter = AILimiter(str(tmp_path / 'ai_limits.db'), user_rate=(2, 1), ip_rate=(10, 1),
+                        daily={'admin': 10}, clock=Clock())
+    monkeypatch.setattr(physio, 'ai_executor', executor)
+    monkeypatch.setattr(physio, 'ai_limiter', limiter)
+    monkeypatch.setattr(physio, 'ai_slots', threading.BoundedSemaphore(2))
+
+    models = []
+
+    def install(text, hold=False):
+        models.append(FakeGemini(text, hold))
+        monkeypatch.setattr(physio, 'model', models[-1])
+        return models[-1]
+    yield install
+    for model in models: model.release()
+    executor.shutdown(wait=True)
+
+
+def lookup(app, api_headers, conditions):
+    response = app.test_client().post(URL, headers=api_headers, json={'conditions': conditions})
+    assert response.status_code == 200
+    return {item['query']: item for item in response.get_json()['items']}
+
+
+def admin_usage(app):
+    with app.app_context():
+        admin = physio.User.query.filter_by(email='admin@example.com').one()
+    return physio.ai_limiter.usage(admin.id)
+
+
+def test_ai_protocol(app, api_headers, gemini):
+    gemini(json.dumps({'disease_name': 'Qzxv', 'description': 'generated', 'keywords': 'x'}))
+    item = lookup(app, api_headers, UNKNOWN[:1])[UNKNOWN[0]]
+    assert item['status'] == 'ai'
+    assert item['protocol'] == {'disease_name': 'Qzxv', 'description': 'generated'}
+
+
+@pytest.mark.parametrize('text', ['["disease_name", "description"]', '"just a string"', '42'])
+def test_non_object_reply_is_a_failure(app, api_headers, gemini, text):
+    gemini(text)
+    assert lookup(app, api_headers, UNKNOWN[:1])[UNKNOWN[0]] == {'status': 'ai_failure', 'query': UNKNOWN[0]}
+
+
+def test_rate_limit_is_per_condition(app, api_headers, gemini):
+    gemini(json.dumps({'disease_name': 'Qzxv'}))
+    slots = physio.ai_slots
+    items = lookup(app, api_headers, UNKNOWN)
+    assert [items[q]['status'] for q in UNKNOWN] == ['ai', 'ai', 'ai_limited']
+    assert items[UNKNOWN[2]]['retry_after'] >= 1
+    assert admin_usage(app) == 2
+    # كل الأماكن رجعت للـ pool (الـ callback بيخلص في الـ worker قبل الشغلانة اللي بعدها)
+    physio.ai_executor.submit(lambda: None).result()
+    assert all(slots.acquire(blocking=False) for _ in range(2))
+
+
+def test_full_pool_is_busy_and_timeouts_refund_only_cancelled_work(app, api_headers, gemini, monkeypatch):
+    model = gemini(json.dumps({'disease_name': 'Qzxv'}), hold=True)
+    monkeypatch.setattr(physio, 'AI_BATCH_TIMEOUT_SECONDS', 0.3)
+    items = lookup(app, api_headers, UNKNOWN)
+
+    # 1: شغال في الـ worker (اتبعت لـ Gemini => الخصم مبيرجعش)  2: في الطابور (اتلغى => رجع)  3: الـ pool مليان
+    assert [items[q]['status'] for q in UNKNOWN] == ['ai_timeout', 'ai_timeout', 'ai_busy']
+    assert len(model.calls) == 1
+    assert admin_usage(app) == 1
@@ -0,0 +1,30 @@
+from itsdangerous import URLSafeTimedSerializer
+from werkzeug.security import generate_password_hash
+
+from app import User, api_tokens, db, issue_api_token
+
+
+def test_token_payload_does_not_carry_the_password_hash(app):
+    with app.app_context():
+        user = User.query.filter_by(email='admin@example.com').one()
+        payload = URLSafeTimedSerializer('any key').loads_unsafe(issue_api_token(user))[1]
+        assert payload['uid'] == user.id
+        assert payload['pw'] not in user.password
+        assert api_tokens.loads(issue_api_token(user)) == payload
+
+
+def test_password_change_revokes_tokens(app):
+    client = app.test_client()
+    with app.app_context():
+        db.session.add(User(email='token@example.com', password=generate_password_hash('first-password')))
+        db.session.commit()
+    token = client.post('/api/token', json={'email': 'token@example.com', 'password': 'first-password'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/categories', headers=headers).status_code == 200
+
+    with app.app_context():
+        user = User.query.filter_by(email='token@example.com').one()
+        user.password = generate_password_hash('second-password')
+        db.session.commit()
+    assert client.get('/api/categories', headers=headers).status_code == 401
+    assert client.get('/api/categories', headers={'Authorization': 'Bearer not-a-token'}).status_code == 401
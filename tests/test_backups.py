@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import backups
+from backups import BackupManager
+
+ROWS = 400
+
+
+class Clock(datetime):
+    # كل utcnow() بثانية جديدة => أسامي النسخ متتكررش جوه نفس الثانية
+    now = datetime(2026, 3, 1, 12)
+
+    @classmethod
+    def utcnow(cls):
+        cls.now += timedelta(seconds=1)
+        return cls.now
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(backups, 'datetime', Clock)
+    path = str(tmp_path / 'app.db')
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE protocol (id INTEGER PRIMARY KEY, name TEXT)')
+    conn.executemany('INSERT INTO protocol (name) VALUES (?)', [(f"protocol {i} " + 'x' * 200,) for i in range(ROWS)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def manager(path, **kwargs):
+    kwargs.setdefault('step_sleep', 0)
+    return BackupManager(lambda: f"sqlite:///{path}", **kwargs)
+
+
+def count(path):
+    conn = sqlite3.connect(path)
+    try: return conn.execute('SELECT count(*) FROM protocol').fetchone()[0]
+    finally: conn.close()
+
+
+def test_stepped_backup_and_restore_round_trip(db_path):
+    m = manager(db_path, pages_per_step=2)
+    result = m.backup()
+    assert result['mode'] == 'stepped' and result['steps'] > 1 and result['restarts'] == 0
+    assert result['name'].endswith('-manual.db.gz') and m.list()[0]['name'] == result['name']
+    path = os.path.join(m.directory, result['name'])
+    with open(path, 'rb') as f:
+        assert hashlib.sha256(f.read()).hexdigest() == result['sha256']
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('DELETE FROM protocol WHERE id > 10')
+    conn.commit()
+    conn.close()
+    restored = m.restore(result['name'])
+    assert restored['restored'] == result['name'] and restored['safety_backup'].endswith('-pre-restore.db.gz')
+    assert count(db_path) == ROWS
+
+    # والـ pre-restore فيها الحالة اللي كانت قبل الاسترجاع
+    m.restore(restored['safety_backup'], safety_backup=False)
+    assert count(db_path) == 10
+
+
+def test_writes_during_backup_fall_back_to_one_step(db_path):
+    class WritingDuringBackup(BackupManager):
+        def _progress(self, stats):
+            progress = super()._progress(stats)
+
+            def write_then_report(status, remaining, total):
+                writer = sqlite3.connect(db_path)
+                writer.execute("INSERT INTO protocol (name) VALUES ('written during backup')")
+                writer.commit()
+                writer.close()
+                progress(status, remaining, total)
+            return write_then_report
+
+    m = WritingDuringBackup(lambda: f"sqlite:///{db_path}", pages_per_step=2, step_sleep=0, max_restarts=2)
+    result = m.backup()
+    assert result['mode'] == 'single-step' and result['restarts'] == 3
+    with gzip.open(os.path.join(m.directory, result['name'])) as f, open(db_path + '.copy', 'wb') as out:
+        out.write(f.read())
+    assert count(db_path + '.copy') == count(db_path)
+
+
+def test_rotation_keeps_the_newest_per_label(db_path):
+    m = manager(db_path, keep=2)
+    names = {label: [m.backup(label)['name'] for _ in range(3)] for label in ('manual', 'scheduled')}
+    assert m.backup('manual')['removed'] == [names['manual'][1]]
+    assert names['manual'][0] not in {b['name'] for b in m.list()}
+    kept = [b['name'] for b in m.list()]
+    assert [n for n in kept if 'scheduled' in n] == names['scheduled'][:0:-1]
+    assert len([n for n in kept if 'manual' in n]) == 2
+    assert not [n for n in os.listdir(m.directory) if n.endswith('.json') and n[:-5] not in kept]
+
+
+def test_a_second_worker_skips_while_locked(db_path):
+    m = manager(db_path)
+    with m._locked() as acquired:
+        assert acquired
+        assert m.backup('scheduled', wait=False) is None
+    assert m.backup('scheduled', wait=False)['label'] == 'scheduled'
+
+
+def corrupt(data):
+    # عدد الـ bytes المتفتتة في header صفحة من الجدول غلط => quick_check بيرجع تقرير مش 'ok'
+    page_size = int.from_bytes(data[16:18], 'big')
+    data[page_size * 2 + 7] = 10
+    return data
+
+
+def test_corrupt_database_is_not_backed_up(db_path):
+    with open(db_path, 'rb') as f:
+        data = corrupt(bytearray(f.read()))
+    with open(db_path, 'wb') as f:
+        f.write(data)
+    m = manager(db_path)
+    with pytest.raises(RuntimeError, match='quick_check'):
+        m.backup()
+    assert m.list() == [] and [n for n in os.listdir(m.directory) if n != '.lock'] == []
+
+
+def test_corrupt_backup_is_not_restored(db_path):
+    m = manager(db_path)
+    name = m.backup()['name']
+    path = os.path.join(m.directory, name)
+    with gzip.open(path) as f:
+        data = corrupt(bytearray(f.read()))
+    with gzip.open(path, 'wb') as f:
+        f.write(bytes(data))
+
+    with pytest.raises(RuntimeError, match='quick_check'):
+        m.restore(name, safety_backup=False)
+    assert count(db_path) == ROWS
+    assert not [n for n in os.listdir(os.path.dirname(db_path)) if n.startswith('.restore-')]
@@ -0,0 +1,230 @@
+import re
+import smtplib
+import types
+from datetime import datetime, timedelta
+
+import pytest
+from itsdangerous import URLSafeTimedSerializer
+from werkzeug.security import generate_password_hash
+
+from app import (OutboundEmail, User, claim_outbound_email, db, finish_outbound_email, password_reset_token,
+                 user_from_reset_token)
+from mail_queue import MailQueue, is_connection_error, is_permanent
+
+
+class FakeSMTP:
+    # connect() زي mail.connect(): كل send بتاخد النتيجة اللي عليها الدور من outcomes (None = اتبعتت)
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.sent, self.opened, self.closed = [], 0, 0
+
+    def connect(self):
+        smtp = self
+
+        class Connection:
+            def __enter__(self):
+                smtp.opened += 1
+                return self
+
+            def __exit__(self, *exc):
+                smtp.closed += 1
+
+            def send(self, message):
+                outcome = smtp.outcomes.pop(0) if smtp.outcomes else None
+                if outcome: raise outcome
+                smtp.sent.append(message)
+
+        return Connection()
+
+
+def rows(n, attempts=0):
+    return [types.SimpleNamespace(id=i, attempts=attempts) for i in range(1, n + 1)]
+
+
+def queue(smtp, pending=(), **kwargs):
+    pending, finished = list(pending), []
+
+    def claim(limit, lease_seconds):
+        batch = pending[:limit]
+        del pending[:limit]
+        return batch
+
+    return MailQueue(claim=claim, finish=lambda sent, failures: finished.append((sent, failures)),
+                     connect=smtp.connect, build_message=lambda row: row.id, enabled=False, **kwargs), finished
+
+
+TEMPORARY = smtplib.SMTPResponseException(451, b'try again later')
+PERMANENT = smtplib.SMTPResponseException(550, b'no such user')
+DISCONNECTED = smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+
+@pytest.mark.parametrize('error, permanent, connection', [
+    (TEMPORARY, False, False),
+    (PERMANENT, True, False),
+    (smtplib.SMTPDataError(554, b'rejected'), True, False),
+    (smtplib.SMTPRecipientsRefused({'a@x.com': (550, b'unknown')}), True, False),
+    (smtplib.SMTPRecipientsRefused({'a@x.com': (450, b'mailbox busy'), 'b@x.com': (550, b'unknown')}), False, False),
+    (DISCONNECTED, False, True),
+    (smtplib.SMTPConnectError(421, b'too many connections'), False, True),
+    (ConnectionRefusedError(111, 'Connection refused'), False, True),
+    (TimeoutError('timed out'), False, True),
+])
+def test_error_classification(error, permanent, connection):
+    assert is_permanent(error) is permanent
+    assert is_connection_error(error) is connection
+
+
+def test_batch_shares_one_connection():
+    smtp = FakeSMTP()
+    mail, finished = queue(smtp, rows(5), batch_size=2)
+    assert mail.drain() == {'sent': 5, 'retry': 0, 'failed': 0}
+    assert smtp.sent == [1, 2, 3, 4, 5]
+    assert [len(sent) for sent, _ in finished] == [2, 2, 1]
+    assert smtp.opened == 1
+
+
+def test_temporary_and_permanent_rejections():
+    smtp = FakeSMTP([TEMPORARY, PERMANENT, None])
+    mail, finished = queue(smtp, rows(3))
+    assert mail.drain() == {'sent': 1, 'retry': 1, 'failed': 1}
+    sent, failures = finished[0]
+    assert [r.id for r in sent] == [3]
+    (first, _, retry_at), (second, _, never) = failures
+    assert (first.id, second.id) == (1, 2)
+    assert retry_at > datetime.utcnow() and never is None
+    assert smtp.opened == 1   # الرفض مش مشكلة في الاتصال
+
+
+def test_disconnect_defers_the_rest_of_the_batch():
+    # الاتصال وقع والاتصال الجديد وقع برضه => الباقي يستنى المحاولة الجاية من غير اتصال لكل رسالة
+    smtp = FakeSMTP([None, DISCONNECTED, DISCONNECTED])
+    mail, finished = queue(smtp, rows(4))
+    assert mail.drain() == {'sent': 1, 'retry': 3, 'failed': 0}
+    _, failures = finished[0]
+    assert [r.id for r, _, _ in failures] == [2, 3, 4]
+    assert all(retry_at for _, _, retry_at in failures)
+    assert mail._stack is None and (smtp.opened, smtp.closed) == (2, 2)
+
+
+def test_unreachable_server_fails_fast():
+    smtp = FakeSMTP()
+    def refused(): raise ConnectionRefusedError(111, 'Connection refused')
+    mail, finished = queue(smtp, rows(3))
+    mail.connect = refused
+    assert mail.drain() == {'sent': 0, 'retry': 3, 'failed': 0}
+    assert len(finished) == 1
+
+
+def test_stale_connection_is_reopened_once():
+    # السيرفر قفل الاتصال المفتوح (idle) => اتصال جديد لنفس الرسالة
+    smtp = FakeSMTP()
+    mail, _ = queue(smtp, rows(1))
+    mail._connection()
+    smtp.outcomes = [DISCONNECTED]
+    assert mail.drain()['sent'] == 1
+    assert (smtp.opened, smtp.closed) == (2, 1)
+
+
+@pytest.mark.parametrize('attempts, low, high', [
+    (0, 24, 36),        # 30 ثانية ± 20%
+    (1, 48, 72),
+    (3, 192, 288),
+    (4, 384, 576),
+])
+def test_backoff_doubles_with_jitter(attempts, low, high):
+    mail, _ = queue(FakeSMTP(), backoff=(30, 3600), max_attempts=10)
+    delay = (mail.retry_at(types.SimpleNamespace(attempts=attempts), TEMPORARY) - datetime.utcnow()).total_seconds()
+    assert low - 1 <= delay <= high
+
+
+def test_backoff_cap_and_max_attempts():
+    mail, _ = queue(FakeSMTP(), backoff=(30, 3600), max_attempts=6)
+    delay = (mail.retry_at(types.SimpleNamespace(attempts=4), TEMPORARY) - datetime.utcnow()).total_seconds()
+    assert delay <= 3600 * 1.2
+    mail.backoff = (30, 100)
+    delay = (mail.retry_at(types.SimpleNamespace(attempts=4), TEMPORARY) - datetime.utcnow()).total_seconds()
+    assert delay <= 120
+    assert mail.retry_at(types.SimpleNamespace(attempts=5), TEMPORARY) is None
+    assert mail.retry_at(types.SimpleNamespace(attempts=None), PERMANENT) is None
+
+
+# ---- الطابور الحقيقي في قاعدة البيانات ----
+@pytest.fixture
+def outbox(app):
+    with app.app_context():
+        OutboundEmail.query.delete()
+        db.session.commit()
+        yield
+        OutboundEmail.query.delete()
+        db.session.commit()
+
+
+def email(**kwargs):
+    kwargs.setdefault('kind', 'test')
+    row = OutboundEmail(to_addr='user@example.com', subject='Hi', body_text='Hi', **kwargs)
+    db.session.add(row)
+    db.session.commit()
+    return row.id
+
+
+def test_expired_lease_is_reclaimed(outbox):
+    now = datetime.utcnow()
+    abandoned = email(status='sending', lease_until=now - timedelta(seconds=1))   # worker مات وهو بيبعت
+    leased = email(status='sending', lease_until=now + timedelta(minutes=5))
+    later = email(next_attempt_at=now + timedelta(minutes=5))
+    ready = email()
+    assert [r.id for r in claim_outbound_email(10, 300)] == [abandoned, ready]
+    assert claim_outbound_email(10, 300) == []
+    assert db.session.get(OutboundEmail, leased).status == 'sending'
+    assert db.session.get(OutboundEmail, later).status == 'queued'
+
+
+def test_database_queue_retries_then_fails(outbox):
+    smtp = FakeSMTP([TEMPORARY, PERMANENT])
+    first, second = email(), email()
+    mail = MailQueue(claim=claim_outbound_email, finish=finish_outbound_email, connect=smtp.connect,
+                     build_message=lambda row: row.id, enabled=False)
+    assert mail.drain() == {'sent': 0, 'retry': 1, 'failed': 1}
+    retry, failed = db.session.get(OutboundEmail, first), db.session.get(OutboundEmail, second)
+    assert (retry.status, retry.attempts, retry.lease_until) == ('queued', 1, None)
+    assert retry.next_attempt_at > datetime.utcnow()
+    assert retry.last_error.startswith('SMTPResponseException')
+    assert (failed.status, failed.attempts) == ('failed', 1)
+
+    db.session.execute(OutboundEmail.__table__.update().values(next_attempt_at=datetime.utcnow()))
+    db.session.commit()
+    assert mail.drain() == {'sent': 1, 'retry': 0, 'failed': 0}
+    assert db.session.get(OutboundEmail, first).status == 'sent'
+
+
+def test_reset_token_works_once(app, outbox):
+    with app.app_context():
+        db.session.add(User(email='reset@example.com', password=generate_password_hash('old-password')))
+        db.session.commit()
+    client = app.test_client()
+    client.post('/forgot-password', data={'email': 'reset@example.com'})
+    with app.app_context():
+        body = OutboundEmail.query.filter_by(to_addr='reset@example.com', kind='password_reset').one().body_text
+    path = re.search(r'(/reset-password/\S+)', body).group(1)
+
+    assert client.get(path).status_code == 200
+    response = client.post(path, data={'password': 'new-password', 'confirm_password': 'new-password'})
+    assert response.headers['Location'].endswith('/login')
+    again = client.get(path)
+    assert again.status_code == 302 and again.headers['Location'].endswith('/forgot-password')
+    assert client.post(path, data={'password': 'third-one', 'confirm_password': 'third-one'}).status_code == 302
+    with app.app_context():
+        kinds = [e.kind for e in OutboundEmail.query.filter_by(to_addr='reset@example.com')]
+    assert sorted(kinds) == ['password_changed', 'password_reset']
+
+
+def test_reset_token_does_not_carry_the_password_hash(app):
+    with app.app_context():
+        user = User.query.filter_by(email='admin@example.com').one()
+        token = password_reset_token(user)
+        payload = URLSafeTimedSerializer('any key').loads_unsafe(token)[1]
+        assert payload['pw'] not in user.password
+        assert user_from_reset_token(token) is user
+        user.is_active = False
+        assert user_from_reset_token(token) is None
+        db.session.rollback()
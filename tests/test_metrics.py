@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+
+from metrics import ARCHIVE, Registry, archive_worker
+
+
+def dead_pid():
+    # pid لـ process خلصت خلاص
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+
+def registry(directory):
+    metrics = Registry(directory=str(directory), flush_interval=3600)
+    metrics.counter('requests_total', 'Requests')
+    metrics.gauge('memory_bytes', 'Memory')
+    return metrics
+
+
+def write_worker(directory, pid, requests, memory):
+    os.makedirs(directory, exist_ok=True)
+    snap = {'counters': {'requests_total': {'': requests}}, 'histograms': {},
+            'gauges': {'memory_bytes': {f'pid="{pid}"': [memory, 1.0]}}}
+    with open(os.path.join(directory, f'{pid}.json'), 'w') as f: json.dump(snap, f)
+
+
+def test_child_exit_archives_counters_and_drops_gauges(tmp_path):
+    pid = 999999999
+    write_worker(tmp_path, pid, 5, 100)
+    assert archive_worker(str(tmp_path), pid)
+    assert not archive_worker(str(tmp_path), pid)   # مرة واحدة بس
+    write_worker(tmp_path, pid + 1, 2, 200)
+    assert archive_worker(str(tmp_path), pid + 1)
+    assert sorted(os.listdir(tmp_path)) == [ARCHIVE, 'archive.lock']
+
+    metrics = registry(tmp_path)
+    metrics.inc('requests_total')
+    text = metrics.render()
+    assert 'requests_total 8' in text
+    assert 'memory_bytes{' not in text
+
+
+def test_render_reaps_files_of_dead_workers(tmp_path):
+    pid = dead_pid()
+    write_worker(tmp_path, pid, 3, 100)
+    metrics = registry(tmp_path)
+    metrics.set('memory_bytes', 50, pid=os.getpid())
+    text = metrics.render()
+    assert 'requests_total 3' in text
+    assert f'memory_bytes{{pid="{pid}"}}' not in text
+    assert f'memory_bytes{{pid="{os.getpid()}"}} 50' in text
+    assert not os.path.exists(tmp_path / f'{pid}.json')
+    assert os.path.exists(tmp_path / f'{os.getpid()}.json')
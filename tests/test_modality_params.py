@@ -0,0 +1,94 @@
+import pytest
+
+from modality_params import modality, parse, parse_query, protocol_params
+
+
+def value(param, unit, low, high=None):
+    return {'param': param, 'unit': unit, 'low': low, 'high': low if high is None else high}
+
+
+@pytest.mark.parametrize('text, values', [
+    # أمثلة الـ docstring
+    ('Frequency 80-120 Hz, Pulse Width 50-100 µs',
+     [value('frequency', 'Hz', 80, 120), value('pulse_width', 'us', 50, 100)]),
+    ('1 MHz (deep), 1.5 W/cm², 100%',
+     [value('frequency', 'Hz', 1e6), value('intensity', 'W/cm2', 1.5), value('duty_cycle', '%', 100)]),
+    ('Pulsed 1:4', [value('duty_cycle', '%', 20)]),
+    # kHz / MHz => Hz
+    ('Carrier 4 kHz, beat 80–150 Hz', [value('frequency', 'Hz', 4000), value('frequency', 'Hz', 80, 150)]),
+    ('3 MHz', [value('frequency', 'Hz', 3e6)]),
+    ('0.8-1 MHz', [value('frequency', 'Hz', 8e5, 1e6)]),
+    ('2.5 KHZ', [value('frequency', 'Hz', 2500)]),
+    # نسبة التشغيل: % لوحدها أو on:off
+    ('pulsed 20%', [value('duty_cycle', '%', 20)]),
+    ('Duty cycle 1:1', [value('duty_cycle', '%', 50)]),
+    ('ratio 1:4 and 1:1', [value('duty_cycle', '%', 20, 50)]),
+    ('on:off 10:50 sec', [value('duty_cycle', '%', 16.6667)]),
+    ('Continuous mode', [value('duty_cycle', '%', 100)]),
+    ('10:50', []),                                          # نسبة من غير كلام عن duty
+    # % بعد intensity (أو "of ...") => intensity
+    ('Intensity 30-50% of max', [value('intensity', '%', 30, 50)]),
+    ('intensity: 40%', [value('intensity', '%', 40)]),
+    ('20% of MVC', [value('intensity', '%', 20)]),
+    # باقي الوحدات
+    ('0.5 W/cm^2', [value('intensity', 'W/cm2', 0.5)]),
+    ('1.5 W/CM2', [value('intensity', 'W/cm2', 1.5)]),
+    ('5 mW/cm2, 50 mW', [value('intensity', 'mW/cm2', 5), value('intensity', 'mW', 50)]),
+    ('10-30 mA', [value('intensity', 'mA', 10, 30)]),
+    ('200 μs', [value('pulse_width', 'us', 200)]),
+    ('250 microseconds', [value('pulse_width', 'us', 250)]),
+    ('pulse width 0.2 ms', [value('pulse_width', 'us', 200)]),
+    ('15-20 min, 2 hours', [value('duration', 'min', 15, 20), value('duration', 'min', 120)]),
+    ('120-80 Hz', [value('frequency', 'Hz', 80, 120)]),
+    # الأرقام من غير وحدة (أو وحدة مش بتاعتنا) مبتتحسبش
+    ('3 times a week', []),
+    ('1-2 sec ramp', []),
+    ('ramp 500 ms', []),
+    ('wavelength 808 nm', []),
+    ('12 sets of 10', []),
+    ('80-120', []),
+    ('100 Hzz', []),
+    ('', []),
+    (None, []),
+])
+def test_parse(text, values):
+    assert parse(text) == values
+
+
+def test_same_value_is_listed_once():
+    assert parse('100 Hz; 100 Hz') == [value('frequency', 'Hz', 100)]
+
+
+@pytest.mark.parametrize('type_text, code', [
+    ('TENS (Conventional)', 'TENS'),
+    ('Interferential Current', 'IFC'),
+    ('Neuromuscular Electrical Stimulation', 'NMES'),
+    ('FES', 'FES'),
+    ('tDCS', 'TDCS'),
+    ('Therapeutic Ultrasound', 'US'),
+    ('LLLT', 'LASER'),
+    ('Shortwave Diathermy', 'SWD'),
+    ('Heat pack', None),
+    (None, None),
+])
+def test_modality(type_text, code):
+    assert modality(type_text) == code
+
+
+@pytest.mark.parametrize('query, kind, values', [
+    ('TENS 80–120 Hz, 50-100 us', 'TENS', [value('frequency', 'Hz', 80, 120), value('pulse_width', 'us', 50, 100)]),
+    ('US 1 MHz 1-1.5 W/cm2', 'US', [value('frequency', 'Hz', 1e6), value('intensity', 'W/cm2', 1, 1.5)]),
+    ('50-100 us', None, [value('pulse_width', 'us', 50, 100)]),   # us هنا وحدة مش ultrasound
+    ('ultrasound', 'US', []),
+    ('low back pain', None, []),
+])
+def test_parse_query(query, kind, values):
+    assert parse_query(query) == (kind, values)
+
+
+def test_protocol_params_keeps_source_and_modality():
+    rows = protocol_params({'estim_type': 'TENS', 'estim_params': '100 Hz', 'us_type': 'Ultrasound',
+                            'us_params': '1 MHz, pulsed 1:4'})
+    assert rows == [dict(value('frequency', 'Hz', 100), source='estim', modality='TENS'),
+                    dict(value('frequency', 'Hz', 1e6), source='us', modality='US'),
+                    dict(value('duty_cycle', '%', 20), source='us', modality='US')]
@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from app import SearchEvent, search_log, search_synonyms
+from search_keys import keys_for, normalize
+from tests.test_search_keys import KEY_CASES, NORMALIZE_CASES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTS = [text for text, _ in NORMALIZE_CASES] + [
+    'Straße', 'ΣΊΣΥΦΟΣ', 'İstanbul', 'قَدَمٌ مُسَطَّحَة', 'tendon/ligament', 'C5–C6 radiculopathy', 'x²', '½ squat', 'emoji 😀 pain']
+
+
+def library_js(script):
+    # static/library.js في node: normalize / keysFor من غير متصفح (IndexedDB مش مطلوبة هنا)
+    code = f"{open(os.path.join(ROOT, 'static', 'library.js'), encoding='utf-8').read()}\n{script}"
+    out = subprocess.run(['node', '-e', code], check=True, capture_output=True, text=True, encoding='utf-8').stdout
+    return json.loads(out)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_js_normalize_matches_search_keys():
+    got = library_js(f"console.log(JSON.stringify({json.dumps(TEXTS)}.map(PhysioLibrary.normalize)))")
+    assert got == [normalize(t) for t in TEXTS]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_js_keys_match_search_keys():
+    got = library_js(f"console.log(JSON.stringify({json.dumps([[n, k] for n, k, _ in KEY_CASES])}.map(([n, k]) => PhysioLibrary.keysFor(n, k))))")
+    assert [set(keys) for keys in got] == [keys_for(n, k) for n, k, _ in KEY_CASES]
+
+
+def test_synonyms_endpoint_serves_the_server_mapping(app, api_headers):
+    with app.app_context():
+        mapping = search_synonyms.mapping()
+    assert app.test_client().get('/api/library/synonyms', headers=api_headers).get_json() == {'synonyms': mapping}
+
+
+def test_local_hits_are_logged(app, api_headers):
+    client = app.test_client()
+    assert client.post('/api/library/searches', headers=api_headers,
+                       json={'query': '  Frozen   Shoulder ', 'protocol_id': 2}).status_code == 204
+    for bad in ({'query': 'x'}, {'query': '', 'protocol_id': 2}, {'query': 'x', 'protocol_id': '2'},
+                {'query': 'x', 'protocol_id': True}):
+        assert client.post('/api/library/searches', headers=api_headers, json=bad).status_code == 400
+    with app.app_context():
+        search_log.flush()
+        event = SearchEvent.query.order_by(SearchEvent.id.desc()).first()
+    assert (event.term, event.outcome, event.protocol_id, event.source) == ('frozen shoulder', 'hit', 2, 'local')
+
+
+def test_logout_clears_site_data(admin_client):
+    response = admin_client.get('/logout')
+    assert response.status_code == 302
+    assert response.headers['Clear-Site-Data'] == '"cache", "storage"'
+
+
+def test_service_worker_does_not_cache_the_home_page(app):
+    sw = app.test_client().get('/sw.js').get_data(as_text=True)
+    shell = sw[sw.index('const SHELL = ['):sw.index('];')]
+    assert "'/'" not in shell and 'OFFLINE_PAGE' in shell
+    offline = app.test_client().get('/static/offline.html').get_data(as_text=True)
+    assert 'PhysioLibrary.attach' in offline
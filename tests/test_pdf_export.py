@@ -0,0 +1,56 @@
+import json
+import os
+
+from sqlalchemy import update
+
+import app as physio
+from app import Protocol, db
+
+
+def test_batch_ids_are_ascii_digits_only(admin_client):
+    assert admin_client.get('/export/pdf?ids=²,٣, ,x').status_code == 400
+    response = admin_client.get('/export/pdf?ids=²,1, 1 ')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf' and response.data.startswith(b'%PDF')
+
+
+def test_slow_render_of_an_old_revision_keeps_the_newer_cache(app, monkeypatch):
+    with app.app_context():
+        protocol_id, revision = db.session.query(Protocol.id, Protocol.revision).order_by(Protocol.id).first()
+    old, new = physio._pdf_cache_path(protocol_id, revision), physio._pdf_cache_path(protocol_id, revision + 2)
+    older = physio._pdf_cache_path(protocol_id, revision + 1)
+    other = physio._pdf_cache_path(protocol_id * 10, revision)   # prefix متشابه لبروتوكول تاني
+    os.makedirs(physio.PDF_CACHE_DIR, exist_ok=True)
+    if os.path.exists(old): os.remove(old)   # من export قبل كده
+
+    def edited_while_rendering(row):
+        # التعديل + توليد الـ revision الجديد خلصوا قبل التوليد القديم (UPDATE مباشر: من غير after_commit)
+        with app.app_context():
+            db.session.execute(update(Protocol).where(Protocol.id == protocol_id).values(revision=revision + 2))
+            db.session.commit()
+        with open(new, 'w') as f:
+            json.dump(['new'], f)
+        return ['old']
+
+    try:
+        monkeypatch.setattr(physio, 'protocol_pages', edited_while_rendering)
+        assert physio._render_pdf_pages(protocol_id) == ['old']
+        assert not os.path.exists(old)
+        with open(new) as f:
+            assert json.load(f) == ['new']
+
+        # الـ revision الحالي بيتكتب وبيمسح الأقدم منه بس
+        for path in (older, other):
+            with open(path, 'w') as f:
+                json.dump(['stale'], f)
+        monkeypatch.setattr(physio, 'protocol_pages', lambda row: ['current'])
+        assert physio._render_pdf_pages(protocol_id) == ['current']
+        assert not os.path.exists(older) and os.path.exists(other)
+        with open(new) as f:
+            assert json.load(f) == ['current']
+    finally:
+        with app.app_context():
+            db.session.execute(update(Protocol).where(Protocol.id == protocol_id).values(revision=revision))
+            db.session.commit()
+        for path in (old, new, older, other):
+            if os.path.exists(path): os.remove(path)
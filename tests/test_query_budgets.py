@@ -0,0 +1,98 @@
+import shutil
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+from app import LIBRARY_DIR, QUERY_BUDGETS, Protocol, db, query_inspector
+from query_stats import QueryBudgetExceeded, QueryInspector
+
+EDIT_FIELDS = ('disease_name', 'category', 'description', 'keywords', 'estim_type', 'estim_params', 'estim_role',
+               'us_type', 'us_params', 'us_role', 'exercises_list', 'exercises_role', 'ex_frequency', 'source_ref',
+               'video_link', 'notes')
+
+
+def run(client, endpoint, method, url, **kwargs):
+    # عدد الـ queries بتاع الـ request كله (شامل تحميل المستخدم)، والزيادة عن الميزانية بترمي QueryBudgetExceeded
+    with query_inspector.capture() as stats:
+        response = client.open(url, method=method, **kwargs)
+    assert response.status_code < 400, response.get_data(as_text=True)[:300]
+    assert stats.count <= QUERY_BUDGETS[endpoint], f"{endpoint}: {stats.count} queries"
+    return response, stats
+
+
+def protocol(app, protocol_id):
+    with app.app_context():
+        p = db.session.get(Protocol, protocol_id)
+        return {f: getattr(p, f) or '' for f in EDIT_FIELDS}
+
+
+def test_every_budget_has_a_route(app):
+    assert set(QUERY_BUDGETS) <= set(app.view_functions)
+
+
+def test_web_routes_within_budget(app, admin_client):
+    name = protocol(app, 2)['disease_name']
+    run(admin_client, 'home', 'GET', f'/?disease={name}')
+    run(admin_client, 'admin_dashboard', 'GET', '/admin')
+    run(admin_client, 'browse_categories', 'GET', '/categories')
+    run(admin_client, 'browse_category', 'GET', f"/categories/{protocol(app, 2)['category']}")
+    run(admin_client, 'search_analytics', 'GET', '/admin/search-analytics')
+    run(admin_client, 'export_protocol_pdf', 'GET', '/export/pdf/2')
+    run(admin_client, 'metrics_endpoint', 'GET', '/metrics')
+
+
+def test_edit_and_delete_within_budget(app, admin_client):
+    # أسوأ حالة: الاسم والكلمات والقيم والتصنيف (لتصنيف جديد) اتغيروا مع بعض
+    form = protocol(app, 3)
+    form.update(keywords=form['keywords'] + ' budget', estim_params='Frequency: 150 Hz', category='Budget Category')
+    run(admin_client, 'edit_protocol', 'POST', '/admin/edit/3', data=form)
+    run(admin_client, 'delete_protocol', 'GET', '/admin/delete/4')
+
+
+def test_api_routes_within_budget(app, api_headers):
+    client = app.test_client()
+    run(client, 'api_protocol', 'GET', '/api/protocols/2', headers=api_headers)
+    run(client, 'api_protocols', 'GET', '/api/protocols?q=knee', headers=api_headers)
+    run(client, 'api_categories', 'GET', '/api/categories', headers=api_headers)
+    run(client, 'api_library_changes', 'GET', '/api/library/changes?since=0', headers=api_headers)
+    run(client, 'api_library_synonyms', 'GET', '/api/library/synonyms', headers=api_headers)
+    run(client, 'api_library_searches', 'POST', '/api/library/searches', json={'query': 'knee', 'protocol_id': 2},
+        headers=api_headers)
+    run(client, 'api_protocols_by_params', 'GET', '/api/protocols/by-params?q=TENS 80-120 Hz', headers=api_headers)
+    run(client, 'api_protocols_lookup', 'POST', '/api/protocols/lookup',
+        json={'conditions': ['Knee Osteoarthritis', 'parkinson', 'خشونة الركبة']}, headers=api_headers)
+
+
+def test_library_bundle_cold_and_warm(app, api_headers):
+    # cold = الملف لسه متبنيش (النسخة + الصفوف)، warm = من الديسك
+    shutil.rmtree(LIBRARY_DIR, ignore_errors=True)
+    client = app.test_client()
+    _, cold = run(client, 'api_library_bundle', 'GET', '/api/library/bundle', headers=api_headers)
+    _, warm = run(client, 'api_library_bundle', 'GET', '/api/library/bundle', headers=api_headers)
+    assert warm.count < cold.count
+
+
+@pytest.fixture
+def loop_app():
+    # تطبيق صغير فيه route بيعمل query جوه loop (N+1)
+    engine = create_engine('sqlite://')
+    loop = Flask('n_plus_one')
+    loop.testing = True
+    inspector = QueryInspector(loop, n_plus_one=10, budgets={'rows': 5})
+
+    @loop.route('/rows')
+    def rows():
+        with engine.connect() as conn:
+            return {'rows': [conn.execute(text('SELECT :i'), {'i': i}).scalar() for i in range(12)]}
+
+    yield loop
+    event.remove(Engine, 'before_cursor_execute', inspector._before_execute)
+    event.remove(Engine, 'after_cursor_execute', inspector._after_execute)
+
+
+def test_n_plus_one_loop_is_caught(loop_app, capsys):
+    with pytest.raises(QueryBudgetExceeded, match=r'rows ran 12 queries \(budget 5'):
+        loop_app.test_client().get('/rows')
+    assert 'N+1 suspected in rows: 12x SELECT ?' in capsys.readouterr().out
@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+import pytest
+
+import related
+from related import RelatedJob, build_vocabulary, term_weights
+
+WORDS = ('knee shoulder ankle lumbar cervical tendon ligament cartilage nerve muscle stiffness swelling '
+         'instability weakness fracture sprain strain arthritis bursitis capsulitis tendinopathy spasm').split()
+MODALITIES = ('TENS', 'Interferential', 'Russian', 'NMES', 'Pulsed', 'Continuous')
+CATEGORIES = ('Orthopedics', 'Neurology', 'Sports')
+
+
+def corpus(n=60, seed=7):
+    rnd = random.Random(seed)
+    rows = []
+    for pid in range(1, n + 1):
+        fields = {
+            'disease_name': ' '.join(rnd.sample(WORDS, 2)),
+            'keywords': ', '.join(rnd.sample(WORDS, 3)),
+            'description': ' '.join(rnd.choices(WORDS, k=8)),
+            'estim_type': rnd.choice(MODALITIES),
+            'us_type': rnd.choice(MODALITIES),
+        }
+        rows.append((pid * 3, rnd.choice(CATEGORIES), fields))   # ids مش متتالية
+    rows.append((1000, 'Sports', {'disease_name': 'uniqueword', 'description': 'nothing shared here'}))
+    return rows
+
+
+def brute_force(rows, max_terms, category_bonus):
+    # نفس التعريف بـ dense و float64: TF-IDF + normalize، وcosine + bonus نفس التصنيف، والبروتوكول نفسه بره
+    documents = [term_weights(fields) for _, _, fields in rows]
+    vocabulary = build_vocabulary(documents, max_terms)
+    tf = np.array([[doc.get(term, 0.0) for term in vocabulary] for doc in documents])
+    df = (tf > 0).sum(axis=0)
+    weights = tf * (np.log((1 + len(rows)) / (1 + df)) + 1)
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    weights /= np.where(norms == 0, 1, norms)
+    categories = np.array([category for _, category, _ in rows])
+    scores = weights @ weights.T + category_bonus * (categories[:, None] == categories[None, :])
+    np.fill_diagonal(scores, -np.inf)
+    return scores
+
+
+@pytest.mark.parametrize('max_terms', [4096, 12])
+def test_top_k_matches_brute_force(tmp_path, monkeypatch, max_terms):
+    # بلوكات وأجزاء صغيرة => الدمج بين الأجزاء بيتجرب فعلاً على مكتبة صغيرة
+    monkeypatch.setattr(related, 'BLOCK_ROWS', 7)
+    monkeypatch.setattr(related, 'CHUNK_ROWS', 11)
+    rows, written = corpus(), {}
+    job = RelatedJob(str(tmp_path), load_rows=lambda ids=None: rows, load_version=lambda: 1,
+                     load_changes=lambda since, until: None, write=lambda adjacency, removed, full: written.update(adjacency),
+                     k=5, max_terms=max_terms)
+    assert job.run(full=True) == len(rows)
+
+    scores = brute_force(rows, max_terms, job.category_bonus)
+    ids = [pid for pid, _, _ in rows]
+    assert set(written) == set(ids)
+    for i, pid in enumerate(ids):
+        expected = np.sort(scores[i][scores[i] > 0])[::-1][:job.k]
+        got = written[pid]
+        # نفس الدرجات بالترتيب، وكل جار درجته هي درجته فعلاً (التعادل ممكن يختار أي واحد من المتعادلين)
+        assert [score for _, score in got] == pytest.approx(expected.tolist(), abs=1e-4)
+        for rid, score in got:
+            assert scores[i, ids.index(rid)] == pytest.approx(score, abs=1e-4)
@@ -0,0 +1,97 @@
+import types
+
+import pytest
+
+import search_keys
+from search_keys import MAX_KEY_LENGTH, SynonymMap, keys_for, normalize
+
+
+NORMALIZE_CASES = [
+    # التشكيل والتطويل
+    ('الكَتِف المُتجمِّد', 'الكتف المتجمد'),
+    ('الركـــبة', 'الركبه'),
+    ('شَلَلٌ رُعَاشِيٌّ', 'شلل رعاشي'),
+    # الألف والهمزة والتاء المربوطة والألف المقصورة
+    ('إلتهاب', 'التهاب'),
+    ('أوتار', 'اوتار'),
+    ('آلام', 'الام'),
+    ('ٱلظهر', 'الظهر'),
+    ('مؤلم', 'مولم'),
+    ('رئوي', 'ريوي'),
+    ('خشونة', 'خشونه'),
+    ('الكبرى', 'الكبري'),
+    # الأرقام الهندية والفارسية
+    ('مرحلة ٣', 'مرحله 3'),
+    ('درجة ۴', 'درجه 4'),
+    # إنجليزي: حروف صغيرة + الفاصلة العليا + علامات الترقيم
+    ('Frozen-Shoulder', 'frozen shoulder'),
+    ("Bell's Palsy", 'bells palsy'),
+    ('Parkinson’s Disease', 'parkinsons disease'),
+    ('  knee__pain!!  (left) ', 'knee pain left'),
+    ('ﬁbromyalgia', 'fibromyalgia'),
+    ('', ''),
+    (None, ''),
+]
+KEY_CASES = [
+    ('Low Back Pain (Mechanical)', None, {'low back pain mechanical', 'low back pain'}),
+    ('Knee OA', 'Osteoarthritis, خشونة الركبة , ,', {'knee oa', 'osteoarthritis', 'خشونه الركبه'}),
+    ('Tennis Elbow (Lateral Epicondylitis)', 'tennis elbow',
+     {'tennis elbow lateral epicondylitis', 'tennis elbow'}),
+    ('(Unknown)', '', {'unknown'}),
+    ('Stroke', 'x' * (MAX_KEY_LENGTH + 1), {'stroke'}),
+    (None, None, set()),
+]
+
+
+@pytest.mark.parametrize('text, key', NORMALIZE_CASES)
+def test_normalize(text, key):
+    assert normalize(text) == key
+
+
+@pytest.mark.parametrize('a, b', [
+    ('الكَتِف المُتجمِّد', 'الكتف المتجمد'),
+    ('Frozen-Shoulder', 'frozen shoulder'),
+    ('إلتهاب المفاصل', 'التهاب المفاصل'),
+])
+def test_variants_share_one_key(a, b):
+    assert normalize(a) == normalize(b)
+
+
+@pytest.mark.parametrize('name, keywords, keys', KEY_CASES)
+def test_keys_for(name, keywords, keys):
+    assert keys_for(name, keywords) == keys
+
+
+def test_synonyms_are_normalized_and_self_maps_dropped():
+    synonyms = SynonymMap(lambda: [('O.A.', 'Osteo-arthritis'), ('خشونة', 'Osteoarthritis'),
+                                   ('Stroke', 'stroke'), ('', 'empty'), ('blank', '  ')])
+    assert synonyms.mapping() == {'o a': 'osteo arthritis', 'خشونه': 'osteoarthritis'}
+    assert synonyms.expand(normalize('خشونَة')) == 'osteoarthritis'
+    assert synonyms.expand('unknown') == 'unknown'
+
+
+def test_synonym_reload(monkeypatch):
+    clock = types.SimpleNamespace(now=0.0)
+    monkeypatch.setattr(search_keys, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    pairs, loads = [('lbp', 'low back pain')], []
+    synonyms = SynonymMap(lambda: loads.append(1) or list(pairs), reload_seconds=60)
+
+    assert synonyms.expand('lbp') == 'low back pain'
+    pairs[:] = [('lbp', 'lumbago')]
+    clock.now = 30
+    assert synonyms.expand('lbp') == 'low back pain'   # لسه في الذاكرة
+    assert len(loads) == 1
+    clock.now = 61
+    assert synonyms.expand('lbp') == 'lumbago'         # worker تاني: بعد reload_seconds
+    pairs[:] = []
+    synonyms.invalidate()
+    assert synonyms.expand('lbp') == 'lbp'             # نفس الـ worker: على طول
+    assert len(loads) == 3
+
+
+def test_admin_synonym_is_used_by_lookup(app, admin_client, api_headers):
+    admin_client.post('/admin/synonyms', data={'term': 'ركبة خشنة', 'expansion': 'Knee Osteoarthritis'})
+    item = app.test_client().post('/api/protocols/lookup?fields=disease_name', headers=api_headers,
+                                  json={'conditions': ['رُكبة خَشِنة']}).get_json()['items'][0]
+    assert item['status'] == 'found'
+    assert item['protocol']['disease_name'] == 'Knee Osteoarthritis'
@@ -0,0 +1,85 @@
+import os
+from contextlib import nullcontext
+
+import pytest
+
+from search_log import SearchLog
+
+
+class FlakyWrite:
+    # write(rows): بيكتب أول fail_after batch وبعدين بيقع (القاعدة وقعت في نص الـ flush)
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.batches = []
+
+    def __call__(self, rows):
+        if self.fail_after is not None and len(self.batches) >= self.fail_after:
+            raise ConnectionError('database is down')
+        self.batches.append(list(rows))
+
+
+def search_log(write, **kwargs):
+    flushed = []
+    log = SearchLog(write, context=nullcontext, on_flush=lambda *args: flushed.append(args), **kwargs)
+    log._pid = os.getpid()   # من غير الـ thread: التست بيعمل flush() بنفسه
+    return log, flushed
+
+
+def test_buffer_keeps_the_newest_rows():
+    write = FlakyWrite()
+    log, flushed = search_log(write, batch_size=4, max_buffer=10)
+    for i in range(25):
+        log.record(i)
+    assert log.pending() == 10
+    assert log.flush() == 10
+    assert write.batches == [[15, 16, 17, 18], [19, 20, 21, 22], [23, 24]]
+    assert flushed[0][:2] == (10, 15)
+    assert log.flush() == 0
+
+
+def test_failed_flush_puts_unwritten_rows_back_before_new_ones():
+    write = FlakyWrite(fail_after=1)
+    log, flushed = search_log(write, batch_size=3, max_buffer=8)
+    for i in range(8):
+        log.record(i)
+    with pytest.raises(ConnectionError):
+        log.flush()
+    assert write.batches == [[0, 1, 2]]
+    assert log.pending() == 5
+
+    # جديد وصل والقاعدة لسه واقعة => الأقدم بيتشال والعدد في dropped
+    for i in range(8, 13):
+        log.record(i)
+    with pytest.raises(ConnectionError):
+        log.flush()
+    assert log.pending() == 8
+
+    write.fail_after = None
+    assert log.flush() == 8
+    assert [row for batch in write.batches[1:] for row in batch] == list(range(5, 13))
+    assert flushed == [(8, 2, pytest.approx(flushed[0][2]))]
+
+
+def test_disabled_log_records_nothing():
+    log, _ = search_log(FlakyWrite(), enabled=False)
+    log.record('x')
+    assert log.pending() == 0
+
+
+def test_rows_recorded_during_a_failed_flush_keep_the_newest():
+    def write(rows):
+        # طلبات جديدة سجلت وهو بيكتب، وبعدين القاعدة وقعت
+        for i in range(4): log.record(f"new {i}")
+        raise ConnectionError('database is down')
+
+    log, flushed = search_log(write, batch_size=5, max_buffer=5)
+    for i in range(5):
+        log.record(i)
+    with pytest.raises(ConnectionError):
+        log.flush()
+    assert log.pending() == 5
+
+    log.write = written = FlakyWrite()
+    assert log.flush() == 5
+    assert written.batches == [[4, 'new 0', 'new 1', 'new 2', 'new 3']]
+    assert flushed[0][:2] == (5, 4)
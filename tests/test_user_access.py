@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text, update
+
+from app import TRIAL_DAYS, User, access_expiry, db, sweep_user_access, user_selection
+
+NOW = datetime.utcnow().replace(microsecond=123456)
+USERS = {
+    # email => (created_at, subscription_end, is_active)
+    'access-trial@example.com': (NOW, None, True),
+    'access-expiring@example.com': (NOW - timedelta(days=TRIAL_DAYS - 5), None, True),
+    'access-expired@example.com': (NOW - timedelta(days=TRIAL_DAYS + 30), None, True),
+    'access-subscriber@example.com': (NOW - timedelta(days=100), NOW + timedelta(days=100), True),
+    'access-inactive@example.com': (NOW - timedelta(days=3), None, False),
+}
+
+
+@pytest.fixture
+def users(app):
+    with app.app_context():
+        for email, (created_at, subscription_end, is_active) in USERS.items():
+            db.session.add(User(email=email, password='x', created_at=created_at,
+                                subscription_end=subscription_end, is_active=is_active))
+        db.session.commit()
+    yield
+    with app.app_context():
+        User.query.filter(User.email.like('access-%')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def expiries(app):
+    with app.app_context():
+        return {u.email: u.access_expires_at for u in User.query.filter(User.email.like('access-%'))}
+
+
+def selected(app, status):
+    with app.app_context():
+        return {u.email for u in User.query.filter(user_selection({'q': 'access-', 'status': status}))}
+
+
+def test_new_users_expire_from_their_own_created_at(app, users):
+    with app.app_context():
+        for user in User.query.filter(User.email.like('access-%')):
+            assert user.access_expires_at == access_expiry(user)
+    assert expiries(app)['access-trial@example.com'] == NOW + timedelta(days=TRIAL_DAYS)
+
+
+def test_status_filters(app, users):
+    assert selected(app, 'all') == set(USERS)
+    assert selected(app, 'trial') == {'access-trial@example.com', 'access-expiring@example.com'}
+    assert selected(app, 'expiring') == {'access-expiring@example.com'}
+    assert selected(app, 'expired') == {'access-expired@example.com'}
+    assert selected(app, 'subscriber') == {'access-subscriber@example.com'}
+    assert selected(app, 'inactive') == {'access-inactive@example.com'}
+
+
+def test_extend_adds_days_to_the_remaining_access(app, admin_client, users):
+    before = expiries(app)
+    started = datetime.utcnow()
+    for status in ('expiring', 'expired', 'inactive'):
+        admin_client.post('/admin/users/bulk', data={'action': 'extend', 'days': 30, 'q': 'access-', 'status': status})
+    after = expiries(app)
+
+    # فاضل 5 أيام => 35، وبنفس الكسور (6 أرقام زي الـ ORM)
+    assert after['access-expiring@example.com'] == before['access-expiring@example.com'] + timedelta(days=30)
+    assert started + timedelta(days=30) <= after['access-expired@example.com'] <= datetime.utcnow() + timedelta(days=30)
+    assert after['access-inactive@example.com'] == before['access-inactive@example.com']
+    assert after['access-trial@example.com'] == before['access-trial@example.com']
+    with app.app_context():
+        stored = db.session.execute(text("SELECT access_expires_at FROM user WHERE email LIKE 'access-%'")).scalars()
+        assert {len(value) for value in stored} == {len('2026-01-01 00:00:00.000000')}
+        assert selected(app, 'expired') == set()
+        assert selected(app, 'subscriber') == {'access-expiring@example.com', 'access-expired@example.com',
+                                               'access-subscriber@example.com'}
+
+
+def test_sweep_only_touches_changed_rows(app, admin_client, users):
+    admin_client.post('/admin/users/bulk', data={'action': 'extend', 'days': 30, 'q': 'access-', 'status': 'expiring'})
+    before = expiries(app)
+    with app.app_context():
+        sweep_user_access()
+        assert sweep_user_access()['updated'] == 0
+    # القيم اللي متغيرتش بتفضل زي ما هي بالظبط (من غير ما الكسور تتقص)
+    assert expiries(app) == before
+    with app.app_context():
+        # اشتراك اتعدل من برة التطبيق => الـ sweep بيصلح الصف ده بس
+        renewed = NOW + timedelta(days=400)
+        db.session.execute(update(User).where(User.email == 'access-expired@example.com')
+                           .values(subscription_end=renewed).execution_options(synchronize_session=False))
+        db.session.commit()
+        stats = sweep_user_access()
+    assert stats['updated'] == 1
+    assert expiries(app)['access-expired@example.com'] == renewed